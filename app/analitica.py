@@ -0,0 +1,434 @@
+"""
+Catálogo columnar en memoria para consultas analíticas.
+
+Preguntas como "duración promedio por género y década" o "favoritos por
+clasificación" se responden sobre una copia del catálogo guardada por columnas
+en arreglos de NumPy, sin SQL ad hoc ni bucles de Python:
+
+- ids, años, duraciones y favoritos por película: arreglos de enteros.
+- clasificación: código entero por película más un diccionario de valores.
+- género: una película puede tener varios ("Drama, Crimen"), así que se guardan
+  pares (fila, código de género) y un diccionario de géneros.
+
+Agrupar es combinar los códigos de cada dimensión en una sola clave entera y
+acumular con np.unique + np.bincount.
+
+La copia se carga una vez desde la base de datos y después se actualiza de forma
+incremental con los mensajes de los canales "peliculas" y "favoritos" (ver
+app/notificaciones.py): los mensajes solo marcan qué películas cambiaron y
+acumulan los favoritos agregados o quitados; antes de la siguiente consulta se
+leen de la base solo esas películas y se fusionan con operaciones vectorizadas.
+
+Como el índice de autocompletado, es estado por proceso y aproximado entre
+recargas: un favorito confirmado durante la carga puede contarse dos veces.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.estado import canal_invalidacion
+from app.models import Favorito, Pelicula, Usuario, vivos
+
+DIMENSIONES = ("genero", "clasificacion", "año", "decada")
+ORDENES = ("grupo", "peliculas", "favoritos", "duracion_promedio")
+
+
+def _separar_generos(genero: str) -> List[str]:
+    return [g.strip() for g in genero.split(",") if g.strip()]
+
+
+class _Columnas:
+    """
+    Copia inmutable del catálogo por columnas, ordenada por id.
+    Las consultas toman una referencia y la usan sin bloqueo; los cambios crean otra.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        años: np.ndarray,
+        duraciones: np.ndarray,
+        favoritos: np.ndarray,
+        clasificacion: np.ndarray,
+        clasificaciones: List[str],
+        genero_fila: np.ndarray,
+        genero_codigo: np.ndarray,
+        generos: List[str],
+    ):
+        self.ids = ids
+        self.años = años
+        self.duraciones = duraciones
+        self.favoritos = favoritos
+        self.clasificacion = clasificacion
+        self.clasificaciones = clasificaciones
+        self.genero_fila = genero_fila
+        self.genero_codigo = genero_codigo
+        self.generos = generos
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _codificar(valores: Sequence[str], diccionario: List[str], posiciones: Dict[str, int]) -> np.ndarray:
+    """Códigos enteros de `valores`, agregando al diccionario los que no estén."""
+    codigos = np.empty(len(valores), dtype=np.int32)
+    for i, valor in enumerate(valores):
+        codigo = posiciones.get(valor)
+        if codigo is None:
+            codigo = posiciones[valor] = len(diccionario)
+            diccionario.append(valor)
+        codigos[i] = codigo
+    return codigos
+
+
+def _columnas_desde_filas(
+    filas: Sequence[tuple],
+    favoritos: Dict[int, int],
+    clasificaciones: Optional[List[str]] = None,
+    generos: Optional[List[str]] = None,
+) -> _Columnas:
+    """
+    Arma las columnas a partir de filas (id, genero, duracion, año, clasificacion).
+    Los diccionarios recibidos se extienden con los valores nuevos.
+    """
+    clasificaciones = list(clasificaciones or [])
+    generos = list(generos or [])
+    ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+    duraciones = np.fromiter((f[2] for f in filas), dtype=np.int32, count=len(filas))
+    años = np.fromiter((f[3] for f in filas), dtype=np.int32, count=len(filas))
+    clasificacion = _codificar(
+        [f[4] for f in filas], clasificaciones, {c: i for i, c in enumerate(clasificaciones)}
+    ).astype(np.int16)
+
+    generos_por_fila = [_separar_generos(f[1]) for f in filas]
+    genero_fila = np.repeat(
+        np.arange(len(filas), dtype=np.int32),
+        np.fromiter((len(g) for g in generos_por_fila), dtype=np.int32, count=len(filas))
+    )
+    genero_codigo = _codificar(
+        [g for lista in generos_por_fila for g in lista], generos, {g: i for i, g in enumerate(generos)}
+    ).astype(np.int16)
+    conteos = np.fromiter((favoritos.get(int(i), 0) for i in ids), dtype=np.int64, count=len(ids))
+
+    return _Columnas(ids, años, duraciones, conteos, clasificacion, clasificaciones,
+                     genero_fila, genero_codigo, generos)
+
+
+def _fusionar(actual: _Columnas, nuevas: _Columnas, quitar: np.ndarray) -> _Columnas:
+    """
+    Quita de `actual` las filas con id en `quitar`, agrega `nuevas` (codificadas con
+    diccionarios que extienden los de `actual`) y reordena por id.
+    """
+    conservar = ~np.isin(actual.ids, quitar)
+    # Índices nuevos de las filas conservadas, para remapear los pares de género
+    nueva_posicion = np.cumsum(conservar) - 1
+    pares = conservar[actual.genero_fila]
+
+    ids = np.concatenate([actual.ids[conservar], nuevas.ids])
+    orden = np.argsort(ids, kind="stable")
+    destino = np.empty_like(orden)
+    destino[orden] = np.arange(len(orden))
+
+    genero_fila = np.concatenate([
+        nueva_posicion[actual.genero_fila[pares]],
+        nuevas.genero_fila + int(conservar.sum()),
+    ])
+    return _Columnas(
+        ids=ids[orden],
+        años=np.concatenate([actual.años[conservar], nuevas.años])[orden],
+        duraciones=np.concatenate([actual.duraciones[conservar], nuevas.duraciones])[orden],
+        favoritos=np.concatenate([actual.favoritos[conservar], nuevas.favoritos])[orden],
+        clasificacion=np.concatenate([actual.clasificacion[conservar], nuevas.clasificacion])[orden],
+        clasificaciones=nuevas.clasificaciones,
+        genero_fila=destino[genero_fila].astype(np.int32),
+        genero_codigo=np.concatenate([actual.genero_codigo[pares], nuevas.genero_codigo]),
+        generos=nuevas.generos,
+    )
+
+
+class CatalogoColumnar:
+    """
+    Agregaciones vectorizadas sobre una copia columnar de películas y favoritos.
+    Seguro entre hilos: los cambios pendientes y el reemplazo de la copia usan un lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columnas = _columnas_desde_filas([], {})
+        self._cargado = False
+        self._version = 0
+        # Cambios recibidos por el canal y todavía no aplicados
+        self._peliculas_cambiadas: set = set()
+        self._favoritos_delta: Dict[int, int] = defaultdict(int)
+        self._recargar = False
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    @property
+    def version(self) -> int:
+        """Aumenta cada vez que la copia cambia."""
+        return self._version
+
+    @property
+    def cambios_pendientes(self) -> int:
+        with self._lock:
+            return len(self._peliculas_cambiadas) + len(self._favoritos_delta)
+
+    def __len__(self) -> int:
+        return len(self._columnas)
+
+    def suscribir(self) -> None:
+        canal_invalidacion.suscribir("peliculas", self._en_pelicula)
+        canal_invalidacion.suscribir("favoritos", self._en_favorito)
+
+    def desuscribir(self) -> None:
+        canal_invalidacion.desuscribir("peliculas", self._en_pelicula)
+        canal_invalidacion.desuscribir("favoritos", self._en_favorito)
+
+    # ------------------------------------------------------------------
+    # Carga y actualización
+    # ------------------------------------------------------------------
+
+    def cargar(self, engine) -> None:
+        """Construye la copia completa desde la base de datos."""
+        with self._lock:
+            self._peliculas_cambiadas.clear()
+            self._favoritos_delta.clear()
+            self._recargar = False
+        with Session(engine) as session:
+            filas = session.exec(
+                select(Pelicula.id, Pelicula.genero, Pelicula.duracion, Pelicula.año, Pelicula.clasificacion)
+                .where(vivos(Pelicula))
+            ).all()
+            conteos = session.exec(
+                select(Favorito.id_pelicula, func.count(Favorito.id))
+                .join(Usuario, Usuario.id == Favorito.id_usuario)
+                .where(vivos(Usuario))
+                .group_by(Favorito.id_pelicula)
+            ).all()
+        self.construir(filas, dict(conteos))
+
+    def construir(self, filas: Sequence[tuple], favoritos: Dict[int, int]) -> None:
+        """
+        Reemplaza la copia.
+
+        Args:
+            filas: Secuencia de (id, genero, duracion, año, clasificacion)
+            favoritos: Favoritos por id de película
+        """
+        filas = sorted(filas, key=lambda f: f[0])
+        columnas = _columnas_desde_filas(filas, favoritos, sorted({f[4] for f in filas}),
+                                         sorted({g for f in filas for g in _separar_generos(f[1])}))
+        with self._lock:
+            self._columnas = columnas
+            self._version += 1
+            self._cargado = True
+
+    def asegurar_actualizado(self, engine) -> None:
+        """Carga la copia en el primer uso y aplica los cambios pendientes."""
+        with self._lock:
+            recargar = self._recargar or not self._cargado
+        if recargar:
+            self.cargar(engine)
+        elif self.cambios_pendientes:
+            self.refrescar(engine)
+
+    def refrescar(self, engine) -> None:
+        """
+        Aplica los cambios acumulados: vuelve a leer solo las películas marcadas y
+        suma los favoritos agregados o quitados.
+        """
+        with self._lock:
+            cambiadas, self._peliculas_cambiadas = self._peliculas_cambiadas, set()
+            delta, self._favoritos_delta = self._favoritos_delta, defaultdict(int)
+
+        filas = []
+        if cambiadas:
+            with Session(engine) as session:
+                ids = sorted(cambiadas)
+                for inicio in range(0, len(ids), 500):
+                    filas += session.exec(
+                        select(Pelicula.id, Pelicula.genero, Pelicula.duracion, Pelicula.año, Pelicula.clasificacion)
+                        .where(Pelicula.id.in_(ids[inicio:inicio + 500]), vivos(Pelicula))
+                    ).all()
+
+        with self._lock:
+            actual = self._columnas
+            columnas = actual
+            if cambiadas:
+                # Las películas editadas conservan sus favoritos; las nuevas empiezan en cero
+                quitar = np.fromiter(cambiadas, dtype=np.int64, count=len(cambiadas))
+                posiciones = np.searchsorted(actual.ids, quitar)
+                existentes = posiciones < len(actual.ids)
+                existentes[existentes] = actual.ids[posiciones[existentes]] == quitar[existentes]
+                previos = dict(zip(quitar[existentes].tolist(), actual.favoritos[posiciones[existentes]].tolist()))
+                nuevas = _columnas_desde_filas(sorted(filas), previos, actual.clasificaciones, actual.generos)
+                columnas = _fusionar(actual, nuevas, quitar)
+
+            if delta:
+                ids_delta = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+                valores = np.fromiter(delta.values(), dtype=np.int64, count=len(delta))
+                posiciones = np.searchsorted(columnas.ids, ids_delta)
+                validas = posiciones < len(columnas.ids)
+                validas[validas] = columnas.ids[posiciones[validas]] == ids_delta[validas]
+                favoritos = columnas.favoritos.copy()
+                np.add.at(favoritos, posiciones[validas], valores[validas])
+                np.maximum(favoritos, 0, out=favoritos)
+                columnas = _Columnas(columnas.ids, columnas.años, columnas.duraciones, favoritos,
+                                     columnas.clasificacion, columnas.clasificaciones,
+                                     columnas.genero_fila, columnas.genero_codigo, columnas.generos)
+
+            self._columnas = columnas
+            self._version += 1
+
+    def _en_pelicula(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        with self._lock:
+            if clave is None:
+                self._recargar = True
+            else:
+                self._peliculas_cambiadas.add(int(clave))
+
+    def _en_favorito(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        with self._lock:
+            if clave is None or not datos:
+                self._recargar = True
+            else:
+                self._favoritos_delta[datos["id_pelicula"]] += 1 if datos["accion"] == "agregado" else -1
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def agrupar(
+        self,
+        por: Iterable[str],
+        año_min: Optional[int] = None,
+        año_max: Optional[int] = None,
+        ordenar: str = "grupo",
+        limite: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Cantidad de películas, duración promedio y favoritos por grupo.
+
+        Args:
+            por: Dimensiones de agrupación (genero, clasificacion, año, decada); vacío = total
+            año_min, año_max: Filtro por año de estreno
+            ordenar: "grupo" (valores de las dimensiones) o una métrica, de mayor a menor
+            limite: Máximo de grupos a retornar
+
+        Con "genero", una película con varios géneros cuenta en cada uno.
+        """
+        por = list(dict.fromkeys(por))
+        invalidas = [d for d in por if d not in DIMENSIONES]
+        if invalidas:
+            raise ValueError(f"Dimensión inválida: {', '.join(invalidas)}. Use: {', '.join(DIMENSIONES)}")
+        if ordenar not in ORDENES:
+            raise ValueError(f"Orden inválido: {ordenar}. Use: {', '.join(ORDENES)}")
+
+        c = self._columnas
+        # Filas base: una por película, o una por (película, género) si se agrupa por género
+        if "genero" in por:
+            filas, codigo_genero = c.genero_fila, c.genero_codigo
+        else:
+            filas, codigo_genero = np.arange(len(c), dtype=np.int32), None
+        años = c.años[filas]
+        seleccion = np.ones(len(filas), dtype=bool)
+        if año_min is not None:
+            seleccion &= años >= año_min
+        if año_max is not None:
+            seleccion &= años <= año_max
+        filas, años = filas[seleccion], años[seleccion]
+        if codigo_genero is not None:
+            codigo_genero = codigo_genero[seleccion]
+        if len(filas) == 0:
+            return []
+
+        # Cada dimensión aporta un código en [0, cardinalidad); la clave combinada es mixed-radix
+        codigos, etiquetas = [], []
+        for dimension in por:
+            if dimension == "genero":
+                codigo, etiqueta = codigo_genero.astype(np.int64), c.generos
+            elif dimension == "clasificacion":
+                codigo, etiqueta = c.clasificacion[filas].astype(np.int64), c.clasificaciones
+            else:
+                valores = años if dimension == "año" else (años // 10) * 10
+                base = int(valores.min())
+                codigo, etiqueta = (valores - base).astype(np.int64), base
+            codigos.append(codigo)
+            etiquetas.append(etiqueta)
+
+        clave = np.zeros(len(filas), dtype=np.int64)
+        cardinalidades = []
+        for codigo in codigos:
+            cardinalidad = int(codigo.max()) + 1
+            clave = clave * cardinalidad + codigo
+            cardinalidades.append(cardinalidad)
+
+        # Con pocas combinaciones posibles, la clave indexa directo los acumuladores (sin ordenar)
+        combinaciones = int(np.prod(cardinalidades, dtype=np.float64))
+        if combinaciones <= max(1 << 16, len(filas)):
+            peliculas = np.bincount(clave, minlength=combinaciones)
+            grupos = np.flatnonzero(peliculas)
+            peliculas = peliculas[grupos]
+            inverso = None
+        else:
+            grupos, inverso = np.unique(clave, return_inverse=True)
+            peliculas = np.bincount(inverso)
+        indices = clave if inverso is None else inverso
+        duracion = np.bincount(indices, weights=c.duraciones[filas])
+        favoritos = np.bincount(indices, weights=c.favoritos[filas])
+        if inverso is None:
+            duracion, favoritos = duracion[grupos], favoritos[grupos]
+
+        if ordenar == "grupo":
+            orden = np.arange(len(grupos))
+        else:
+            metrica = {"peliculas": peliculas, "favoritos": favoritos, "duracion_promedio": duracion / peliculas}[ordenar]
+            orden = np.argsort(-metrica, kind="stable")[:limite]
+
+        resultado = []
+        for g in orden.tolist():
+            fila: dict = {}
+            resto = int(grupos[g])
+            valores_grupo = []
+            for cardinalidad in reversed(cardinalidades):
+                valores_grupo.append(resto % cardinalidad)
+                resto //= cardinalidad
+            for dimension, etiqueta, codigo in zip(por, etiquetas, reversed(valores_grupo)):
+                fila[dimension] = etiqueta[codigo] if isinstance(etiqueta, list) else etiqueta + codigo
+            fila["peliculas"] = int(peliculas[g])
+            fila["duracion_promedio"] = round(float(duracion[g] / peliculas[g]), 2)
+            fila["favoritos"] = int(favoritos[g])
+            fila["favoritos_promedio"] = round(float(favoritos[g] / peliculas[g]), 3)
+            resultado.append(fila)
+
+        if ordenar == "grupo":
+            # Los diccionarios crecen con valores nuevos al final: el orden es por etiqueta
+            resultado.sort(key=lambda f: tuple(f[d] for d in por))
+            resultado = resultado[:limite]
+        return resultado
+
+    def resumen(self) -> dict:
+        c = self._columnas
+        return {
+            "peliculas": len(c),
+            "favoritos": int(c.favoritos.sum()),
+            "duracion_promedio": round(float(c.duraciones.mean()), 2) if len(c) else 0.0,
+            "año_min": int(c.años.min()) if len(c) else None,
+            "año_max": int(c.años.max()) if len(c) else None,
+            "generos": len(c.generos),
+            "clasificaciones": len(c.clasificaciones),
+            "version": self._version,
+            "cambios_pendientes": self.cambios_pendientes,
+        }
+
+
+catalogo_columnar = CatalogoColumnar()
+catalogo_columnar.suscribir()
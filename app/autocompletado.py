@@ -0,0 +1,471 @@
+"""
+Índice en memoria para autocompletar títulos y directores.
+
+Los títulos normalizados (minúsculas y sin acentos) se guardan en una lista ordenada;
+las sugerencias para un prefijo son el rango [bisect_left(q), bisect_left(q + "\\uffff")),
+así que encontrarlas cuesta O(log n). Dentro del rango se ordenan por popularidad
+(cantidad de favoritos).
+
+Para prefijos muy cortos el rango puede tener cientos de miles de títulos; en ese caso
+se recorren primero las películas más populares del catálogo (`_top`), que casi
+siempre alcanzan para llenar las sugerencias sin tocar el rango completo.
+
+El índice se carga una vez desde la base de datos y luego se actualiza con los
+mensajes de los canales "peliculas" y "favoritos" (ver app/notificaciones.py).
+Es estado por proceso: cada worker tiene su copia. La popularidad es aproximada
+entre recargas: un cambio que llega durante la carga puede contarse dos veces.
+
+Los mensajes llegan por lotes (los de una transacción). Uno suelto inserta o borra
+en las listas ordenadas, O(n) por el corrimiento. Un lote grande (por ejemplo un
+PATCH que cambia el director de miles de películas) no hace eso por cada película:
+actualiza los diccionarios, deja las películas tocadas como "desfasadas" y reconstruye
+las listas con una sola fusión, fuera del lock. Mientras tanto las búsquedas ignoran
+las entradas desfasadas de las listas y revisan esas películas aparte.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.estado import canal_invalidacion
+from app.models import Favorito, Pelicula, Usuario, vivos
+from utils import normalizar_texto
+
+# Los títulos que empiezan con un artículo también se encuentran sin él ("padrino" -> "El Padrino")
+ARTICULOS = ("el ", "la ", "los ", "las ", "un ", "una ", "the ")
+FIN_PREFIJO = "\uffff"
+# Desde este tamaño, un lote de mensajes se aplica con una fusión en vez de uno por uno
+MINIMO_LOTE = 64
+
+
+def _claves_titulo(titulo: str) -> Tuple[str, ...]:
+    clave = normalizar_texto(titulo)
+    for articulo in ARTICULOS:
+        if clave.startswith(articulo) and len(clave) > len(articulo):
+            return (clave, clave[len(articulo):])
+    return (clave,)
+
+
+class IndiceAutocompletado:
+    """
+    Sugerencias por prefijo sobre títulos y directores, ordenadas por popularidad.
+    Seguro entre hilos: las escrituras llegan desde los hilos de las peticiones.
+    """
+
+    def __init__(self, tamaño_top: int = 1000, maximo_rango: int = 2000):
+        self.tamaño_top = tamaño_top
+        self.maximo_rango = maximo_rango
+
+        self._lock = threading.RLock()
+        self._fusion = threading.Lock()  # una sola fusión de listas a la vez
+        self._listo = threading.Event()
+        self._cargando = False
+        self._eventos_en_carga: List[tuple] = []
+        self._diferir = False
+        self._generacion = 0
+        self._reiniciar()
+        self.fusiones = 0
+
+    def _reiniciar(self) -> None:
+        # Títulos: listas paralelas ordenadas por clave normalizada
+        self._claves: List[str] = []
+        self._ids: List[int] = []
+        self._peliculas: Dict[int, Tuple[str, str, Tuple[str, ...]]] = {}  # id -> (titulo, director, claves)
+        self._popularidad: Dict[int, int] = defaultdict(int)
+        # Directores: clave normalizada -> [nombre, cantidad de películas, popularidad]
+        self._claves_directores: List[str] = []
+        self._directores: Dict[str, list] = {}
+        # Películas más populares, de mayor a menor
+        self._top: List[int] = []
+        self._en_top: set = set()
+        # Películas cuyas entradas en las listas no están al día: id -> claves que tienen allí
+        self._desfasadas: Dict[int, Tuple[str, ...]] = {}
+        self._directores_sucios = False
+        self._generacion += 1
+
+    @property
+    def cargado(self) -> bool:
+        return self._listo.is_set()
+
+    def __len__(self) -> int:
+        return len(self._peliculas)
+
+    def suscribir(self) -> None:
+        canal_invalidacion.suscribir_lote(("peliculas", "favoritos"), self._recibir)
+
+    def desuscribir(self) -> None:
+        canal_invalidacion.desuscribir_lote(self._recibir)
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def cargar(self, engine) -> None:
+        """Construye el índice completo desde la base de datos."""
+        with self._lock:
+            if self._cargando:
+                return
+            self._cargando = True
+            self._listo.clear()
+
+        try:
+            with Session(engine) as session:
+                peliculas = session.exec(
+                    select(Pelicula.id, Pelicula.titulo, Pelicula.director).where(vivos(Pelicula))
+                ).all()
+                conteos = session.exec(
+                    select(Favorito.id_pelicula, func.count(Favorito.id))
+                    .join(Usuario, Usuario.id == Favorito.id_usuario)
+                    .where(vivos(Usuario))
+                    .group_by(Favorito.id_pelicula)
+                ).all()
+            self.construir(peliculas, dict(conteos))
+        finally:
+            with self._lock:
+                self._cargando = False
+                eventos, self._eventos_en_carga = self._eventos_en_carga, []
+                self._listo.set()
+                self._aplicar_lote(eventos)
+            self._fusionar()
+
+    def construir(self, peliculas, popularidad: Dict[int, int]) -> None:
+        """
+        Reemplaza el contenido del índice.
+
+        Args:
+            peliculas: Secuencia de (id, titulo, director)
+            popularidad: Favoritos por id de película
+        """
+        entradas = []
+        datos_peliculas = {}
+        directores: Dict[str, list] = {}
+        for id_pelicula, titulo, director in peliculas:
+            claves = _claves_titulo(titulo)
+            datos_peliculas[id_pelicula] = (titulo, director, claves)
+            entradas.extend((clave, id_pelicula) for clave in claves)
+            clave_director = normalizar_texto(director)
+            acumulado = directores.setdefault(clave_director, [director, 0, 0])
+            acumulado[1] += 1
+            acumulado[2] += popularidad.get(id_pelicula, 0)
+        entradas.sort()
+
+        with self._lock:
+            self._reiniciar()
+            self._claves = [clave for clave, _ in entradas]
+            self._ids = [id_pelicula for _, id_pelicula in entradas]
+            self._peliculas = datos_peliculas
+            self._popularidad.update(popularidad)
+            self._directores = directores
+            self._claves_directores = sorted(directores)
+            self._top = heapq.nsmallest(
+                self.tamaño_top, (i for i in popularidad if i in datos_peliculas), key=self._orden
+            )
+            self._en_top = set(self._top)
+            self._listo.set()
+
+    def asegurar_cargado(self, engine) -> None:
+        """Carga el índice en el primer uso; si otro hilo lo está cargando, espera."""
+        if self._listo.is_set():
+            return
+        with self._lock:
+            cargando = self._cargando
+        if cargando:
+            self._listo.wait()
+        else:
+            self.cargar(engine)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _orden(self, id_pelicula: int):
+        return (-self._popularidad.get(id_pelicula, 0), self._peliculas[id_pelicula][2][0])
+
+    def buscar_titulos(self, prefijo: str, limite: int = 10) -> List[dict]:
+        clave = normalizar_texto(prefijo)
+        if not clave:
+            return []
+        with self._lock:
+            inicio = bisect_left(self._claves, clave)
+            fin = bisect_left(self._claves, clave + FIN_PREFIJO)
+
+            if fin - inicio <= self.maximo_rango:
+                candidatos = {i for i in self._ids[inicio:fin] if i not in self._desfasadas}
+                candidatos.update(self._desfasadas_con_prefijo(clave))
+                mejores = heapq.nsmallest(limite, candidatos, key=self._orden)
+            else:
+                # Rango enorme: las más populares del catálogo que coinciden llenan la lista
+                mejores = []
+                for i in self._top:
+                    claves = self._peliculas[i][2]
+                    if claves[0].startswith(clave) or (len(claves) > 1 and claves[1].startswith(clave)):
+                        mejores.append(i)
+                        if len(mejores) == limite:
+                            break
+                if len(mejores) < limite:
+                    vistos = set(mejores)
+                    extra = {
+                        i for i in self._ids[inicio:inicio + self.maximo_rango]
+                        if i not in vistos and i not in self._desfasadas
+                    }
+                    extra.update(i for i in self._desfasadas_con_prefijo(clave) if i not in vistos)
+                    mejores += heapq.nsmallest(limite - len(mejores), extra, key=self._orden)
+
+            return [
+                {
+                    "tipo": "titulo",
+                    "id_pelicula": i,
+                    "texto": self._peliculas[i][0],
+                    "director": self._peliculas[i][1],
+                    "popularidad": self._popularidad.get(i, 0),
+                }
+                for i in mejores
+            ]
+
+    def _desfasadas_con_prefijo(self, clave: str) -> List[int]:
+        """Películas desfasadas cuyas claves actuales empiezan con `clave` (solo durante una fusión)."""
+        if not self._desfasadas:
+            return []
+        return [
+            i for i in self._desfasadas
+            if i in self._peliculas and any(c.startswith(clave) for c in self._peliculas[i][2])
+        ]
+
+    def buscar_directores(self, prefijo: str, limite: int = 10) -> List[dict]:
+        clave = normalizar_texto(prefijo)
+        if not clave:
+            return []
+        with self._lock:
+            inicio = bisect_left(self._claves_directores, clave)
+            fin = min(bisect_left(self._claves_directores, clave + FIN_PREFIJO), inicio + self.maximo_rango)
+            mejores = heapq.nsmallest(
+                limite,
+                self._claves_directores[inicio:fin],
+                key=lambda c: (-self._directores[c][2], c)
+            )
+            return [
+                {
+                    "tipo": "director",
+                    "texto": self._directores[c][0],
+                    "peliculas": self._directores[c][1],
+                    "popularidad": self._directores[c][2],
+                }
+                for c in mejores
+            ]
+
+    def buscar(self, prefijo: str, limite: int = 10, tipo: Optional[str] = None) -> List[dict]:
+        """
+        Sugerencias para el prefijo, de mayor a menor popularidad.
+
+        Args:
+            tipo: "titulo", "director" o None para ambos
+        """
+        resultados = []
+        if tipo in (None, "titulo"):
+            resultados += self.buscar_titulos(prefijo, limite)
+        if tipo in (None, "director"):
+            resultados += self.buscar_directores(prefijo, limite)
+        if tipo is None:
+            resultados.sort(key=lambda r: -r["popularidad"])
+        return resultados[:limite]
+
+    # ------------------------------------------------------------------
+    # Actualización incremental
+    # ------------------------------------------------------------------
+
+    def _recibir(self, mensajes: List[tuple]) -> None:
+        with self._lock:
+            if self._cargando:
+                self._eventos_en_carga.extend(mensajes)
+                return
+            if not self._listo.is_set():
+                return
+            self._aplicar_lote(mensajes)
+        self._fusionar()
+
+    def _aplicar_lote(self, mensajes: List[tuple]) -> None:
+        """
+        Aplica los mensajes (canal, clave, datos) en orden. Si son muchos, las listas
+        ordenadas quedan para `_fusionar` y la de directores se reordena una sola vez.
+        """
+        with self._lock:
+            self._diferir = len(mensajes) >= MINIMO_LOTE
+            try:
+                for canal, clave, datos in mensajes:
+                    if not self._listo.is_set():
+                        return
+                    self._aplicar(canal, clave, datos)
+            finally:
+                self._diferir = False
+                if self._directores_sucios:
+                    self._claves_directores = sorted(self._directores)
+                    self._directores_sucios = False
+
+    def _aplicar(self, canal: str, clave: Optional[str], datos: Optional[dict]) -> None:
+        if clave is None or datos is None:
+            # Invalidación de todo el canal: se recarga en el siguiente uso
+            self._listo.clear()
+            return
+        if canal == "peliculas":
+            if datos.get("operacion") == "eliminada":
+                self.quitar_pelicula(int(clave))
+            else:
+                self.guardar_pelicula(int(clave), datos["titulo"], datos["director"])
+        elif canal == "favoritos":
+            self.sumar_popularidad(datos["id_pelicula"], 1 if datos["accion"] == "agregado" else -1)
+
+    def guardar_pelicula(self, id_pelicula: int, titulo: str, director: str) -> None:
+        """Agrega una película o actualiza su título y director."""
+        with self._lock:
+            anterior = self._peliculas.get(id_pelicula)
+            if anterior and anterior[0] == titulo and anterior[1] == director:
+                return
+            popularidad = self._popularidad.get(id_pelicula, 0)
+            if anterior:
+                self._sumar_director(anterior[1], -1, -popularidad)
+
+            self._peliculas[id_pelicula] = (titulo, director, _claves_titulo(titulo))
+            self._actualizar_claves(id_pelicula, anterior[2] if anterior else ())
+            self._sumar_director(director, 1, popularidad)
+
+    def quitar_pelicula(self, id_pelicula: int) -> None:
+        with self._lock:
+            datos = self._peliculas.pop(id_pelicula, None)
+            if datos is None:
+                return
+            self._actualizar_claves(id_pelicula, datos[2])
+            self._sumar_director(datos[1], -1, -self._popularidad.pop(id_pelicula, 0))
+            if id_pelicula in self._en_top:
+                self._en_top.discard(id_pelicula)
+                self._top.remove(id_pelicula)
+
+    # ------------------------------------------------------------------
+    # Listas ordenadas de títulos
+    # ------------------------------------------------------------------
+
+    def _actualizar_claves(self, id_pelicula: int, anteriores: Tuple[str, ...]) -> None:
+        """Las listas tienen `anteriores` para la película; las deja con sus claves actuales."""
+        datos = self._peliculas.get(id_pelicula)
+        actuales = datos[2] if datos else ()
+        if actuales == anteriores and id_pelicula not in self._desfasadas:
+            return  # cambió solo el director
+        if self._diferir or self._desfasadas:
+            # Sin tocar las listas: la fusión siguiente las pone al día
+            self._desfasadas.setdefault(id_pelicula, anteriores)
+            return
+        self._mover_claves(id_pelicula, anteriores, actuales)
+
+    def _mover_claves(self, id_pelicula: int, anteriores: Tuple[str, ...], actuales: Tuple[str, ...]) -> None:
+        if anteriores == actuales:
+            return
+        for clave in anteriores:
+            posicion = bisect_left(self._claves, clave)
+            while posicion < len(self._claves) and self._claves[posicion] == clave:
+                if self._ids[posicion] == id_pelicula:
+                    del self._claves[posicion]
+                    del self._ids[posicion]
+                    break
+                posicion += 1
+        for clave in actuales:
+            posicion = bisect_right(self._claves, clave)
+            self._claves.insert(posicion, clave)
+            self._ids.insert(posicion, id_pelicula)
+
+    def _fusionar(self) -> None:
+        """
+        Pone al día las listas de las películas desfasadas. Con pocas, las mueve una
+        por una; con muchas, arma listas nuevas fuera del lock (filtrar, agregar y un
+        sort que Timsort resuelve como la mezcla de dos tramos) y las reemplaza al final.
+        """
+        if not self._fusion.acquire(blocking=False):
+            return  # la fusión en curso también toma las desfasadas nuevas
+        try:
+            self._fusionar_tomada()
+        except BaseException:
+            self._fusion.release()
+            raise
+
+    def _fusionar_tomada(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._desfasadas) < MINIMO_LOTE:
+                    for id_pelicula, anteriores in self._desfasadas.items():
+                        datos = self._peliculas.get(id_pelicula)
+                        self._mover_claves(id_pelicula, anteriores, datos[2] if datos else ())
+                    self._desfasadas.clear()
+                    # Se suelta con el lock tomado: quien desfase otra película después, la fusiona
+                    self._fusion.release()
+                    return
+                generacion = self._generacion
+                claves, ids = self._claves, self._ids
+                tocadas = {
+                    i: self._peliculas[i][2] if i in self._peliculas else ()
+                    for i in self._desfasadas
+                }
+
+            # Mientras haya desfasadas nadie modifica `claves` ni `ids` en el lugar
+            entradas = [(clave, i) for clave, i in zip(claves, ids) if i not in tocadas]
+            entradas.extend((clave, i) for i, claves_pelicula in tocadas.items() for clave in claves_pelicula)
+            entradas.sort()
+            nuevas_claves = [clave for clave, _ in entradas]
+            nuevos_ids = [i for _, i in entradas]
+
+            with self._lock:
+                if generacion != self._generacion:
+                    continue  # el índice se recargó mientras tanto
+                self._claves, self._ids = nuevas_claves, nuevos_ids
+                for id_pelicula, claves_pelicula in tocadas.items():
+                    datos = self._peliculas.get(id_pelicula)
+                    if (datos[2] if datos else ()) == claves_pelicula:
+                        del self._desfasadas[id_pelicula]
+                    else:
+                        self._desfasadas[id_pelicula] = claves_pelicula
+                self.fusiones += 1
+
+    def sumar_popularidad(self, id_pelicula: int, delta: int) -> None:
+        with self._lock:
+            if id_pelicula not in self._peliculas:
+                return
+            self._popularidad[id_pelicula] = max(0, self._popularidad[id_pelicula] + delta)
+            self._sumar_director(self._peliculas[id_pelicula][1], 0, delta)
+            self._actualizar_top(id_pelicula)
+
+    def _sumar_director(self, director: str, peliculas: int, popularidad: int) -> None:
+        clave = normalizar_texto(director)
+        acumulado = self._directores.get(clave)
+        if acumulado is None:
+            if peliculas <= 0:
+                return
+            acumulado = self._directores[clave] = [director, 0, 0]
+            if self._diferir:
+                self._directores_sucios = True
+            else:
+                insort(self._claves_directores, clave)
+        acumulado[1] += peliculas
+        acumulado[2] = max(0, acumulado[2] + popularidad)
+        if acumulado[1] <= 0:
+            del self._directores[clave]
+            if self._diferir:
+                self._directores_sucios = True
+            else:
+                del self._claves_directores[bisect_left(self._claves_directores, clave)]
+
+    def _actualizar_top(self, id_pelicula: int) -> None:
+        if id_pelicula in self._en_top:
+            self._top.sort(key=self._orden)
+            return
+        if len(self._top) < self.tamaño_top or self._orden(id_pelicula) < self._orden(self._top[-1]):
+            self._top.append(id_pelicula)
+            self._en_top.add(id_pelicula)
+            self._top.sort(key=self._orden)
+            if len(self._top) > self.tamaño_top:
+                self._en_top.discard(self._top.pop())
+
+
+indice_autocompletado = IndiceAutocompletado()
+indice_autocompletado.suscribir()
@@ -0,0 +1,236 @@
+"""
+Caché por proceso de los ids de películas favoritas de cada usuario.
+
+Listar los favoritos de un usuario, verificar uno y calcular sus estadísticas
+consultan una y otra vez la tabla `favorito` por el mismo usuario. Esta caché
+guarda, por usuario, sus ids de película en un `array('I')` ordenado (4 bytes por
+favorito; pertenencia por búsqueda binaria). Un bitmap no conviene aquí: cada usuario
+marca pocas películas de un catálogo grande, y un bitmap ocupa un bit por película
+del catálogo, no por favorito.
+
+- Se llena la primera vez que se pide un usuario, siempre desde la primaria: una
+  réplica atrasada dejaría en la caché un conjunto viejo hasta el siguiente cambio.
+- Se mantiene al día con los mensajes de los canales "favoritos", "usuarios" y
+  "peliculas" (ver app/notificaciones.py), que cubren también los borrados en
+  cascada de un usuario o una película. Una carga que coincide con un cambio del
+  mismo usuario no se guarda.
+- Se desaloja por LRU cuando la memoria estimada supera `presupuesto_bytes`
+  (0 desactiva la caché).
+- Refleja solo lo confirmado: la cola write-behind se sigue consultando aparte.
+"""
+
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from sqlmodel import Session
+
+from app import database
+from app.config import settings
+from app.consultas import consultas
+from app.estado import canal_invalidacion
+
+# Clave int y entrada del OrderedDict, aproximado
+COSTO_ENTRADA = 100
+
+
+def contiene(ids: array, id_pelicula: int) -> bool:
+    posicion = bisect_left(ids, id_pelicula)
+    return posicion < len(ids) and ids[posicion] == id_pelicula
+
+
+class CacheFavoritos:
+    """
+    LRU de usuario -> array('I') ordenado con sus películas favoritas.
+    Seguro entre hilos: los cambios llegan desde los hilos de las peticiones.
+    """
+
+    def __init__(self, presupuesto_bytes: int = 16 * 1024 * 1024):
+        self.presupuesto_bytes = presupuesto_bytes
+        self._lock = threading.Lock()
+        self._usuarios: "OrderedDict[int, array]" = OrderedDict()
+        self._bytes = 0
+        self._cargando: Dict[int, int] = {}  # usuario -> cargas en curso
+        self._sucios: Set[int] = set()  # usuarios que cambiaron durante su carga
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojados = 0
+
+    @property
+    def habilitada(self) -> bool:
+        return self.presupuesto_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._usuarios)
+
+    def suscribir(self) -> None:
+        canal_invalidacion.suscribir("favoritos", self._en_favorito)
+        canal_invalidacion.suscribir("usuarios", self._en_usuario)
+        canal_invalidacion.suscribir("peliculas", self._en_pelicula)
+
+    def desuscribir(self) -> None:
+        canal_invalidacion.desuscribir("favoritos", self._en_favorito)
+        canal_invalidacion.desuscribir("usuarios", self._en_usuario)
+        canal_invalidacion.desuscribir("peliculas", self._en_pelicula)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def en_cache(self, id_usuario: int) -> Optional[array]:
+        """Retorna las películas del usuario si ya están en la caché, sin cargarlas."""
+        with self._lock:
+            ids = self._usuarios.get(id_usuario)
+            if ids is not None:
+                self._usuarios.move_to_end(id_usuario)
+                self.aciertos += 1
+            return ids
+
+    def peliculas(self, session: Session, id_usuario: int) -> array:
+        """
+        Ids ordenados de las películas favoritas del usuario (confirmadas).
+        El array retornado no se modifica después: los cambios lo reemplazan.
+        """
+        ids = self.en_cache(id_usuario)
+        if ids is not None:
+            return ids
+
+        with self._lock:
+            self.fallos += 1
+            self._cargando[id_usuario] = self._cargando.get(id_usuario, 0) + 1
+        ids = None
+        try:
+            ids = self._cargar(session, id_usuario)
+        finally:
+            with self._lock:
+                restantes = self._cargando.pop(id_usuario) - 1
+                if ids is not None and self.habilitada and id_usuario not in self._sucios:
+                    self._guardar(id_usuario, ids)
+                if restantes:
+                    self._cargando[id_usuario] = restantes
+                else:
+                    self._sucios.discard(id_usuario)
+        return ids
+
+    def es_favorito(self, session: Session, id_usuario: int, id_pelicula: int) -> bool:
+        return contiene(self.peliculas(session, id_usuario), id_pelicula)
+
+    def _cargar(self, session: Session, id_usuario: int) -> array:
+        statement = consultas.sentencia("ids_peliculas_favoritas")
+        parametros = {"id_usuario": id_usuario}
+        if session.info.get("replica") is None:
+            return array("I", session.exec(statement, params=parametros).all())
+        with Session(database.enrutador.primaria) as primaria:
+            return array("I", primaria.exec(statement, params=parametros).all())
+
+    # ------------------------------------------------------------------
+    # Memoria
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _costo(ids: array) -> int:
+        return sys.getsizeof(ids) + COSTO_ENTRADA
+
+    def _guardar(self, id_usuario: int, ids: array) -> None:
+        anterior = self._usuarios.pop(id_usuario, None)
+        if anterior is not None:
+            self._bytes -= self._costo(anterior)
+        costo = self._costo(ids)
+        if costo > self.presupuesto_bytes:
+            return
+        self._usuarios[id_usuario] = ids
+        self._bytes += costo
+        while self._bytes > self.presupuesto_bytes:
+            _, desalojado = self._usuarios.popitem(last=False)
+            self._bytes -= self._costo(desalojado)
+            self.desalojados += 1
+
+    def _quitar(self, id_usuario: int) -> None:
+        ids = self._usuarios.pop(id_usuario, None)
+        if ids is not None:
+            self._bytes -= self._costo(ids)
+
+    def _vaciar(self) -> None:
+        self._usuarios.clear()
+        self._bytes = 0
+        self._sucios.update(self._cargando)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._vaciar()
+            self.aciertos = self.fallos = self.desalojados = 0
+
+    def metricas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "usuarios": len(self._usuarios),
+                "bytes": self._bytes,
+                "presupuesto_bytes": self.presupuesto_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "desalojados": self.desalojados,
+            }
+
+    # ------------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------------
+
+    def _en_favorito(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        with self._lock:
+            if not datos:
+                self._vaciar()
+                return
+            id_usuario = datos["id_usuario"]
+            if id_usuario in self._cargando:
+                self._sucios.add(id_usuario)
+            ids = self._usuarios.get(id_usuario)
+            if ids is None:
+                return
+            id_pelicula = datos["id_pelicula"]
+            presente = contiene(ids, id_pelicula)
+            if datos["accion"] == "agregado" and not presente:
+                nuevos = array("I", ids)
+                nuevos.insert(bisect_left(ids, id_pelicula), id_pelicula)
+            elif datos["accion"] == "eliminado" and presente:
+                nuevos = array("I", ids)
+                del nuevos[bisect_left(ids, id_pelicula)]
+            else:
+                return
+            # Se reemplaza el array: quien ya lo tiene en la mano no lo ve cambiar
+            self._guardar(id_usuario, nuevos)
+
+    def _en_usuario(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        if clave is None or (datos or {}).get("operacion") == "eliminado":
+            with self._lock:
+                if clave is None:
+                    self._vaciar()
+                    return
+                id_usuario = int(clave)
+                self._quitar(id_usuario)
+                if id_usuario in self._cargando:
+                    self._sucios.add(id_usuario)
+
+    def _en_pelicula(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        if clave is not None and (datos or {}).get("operacion") != "eliminada":
+            return
+        with self._lock:
+            if clave is None:
+                self._vaciar()
+                return
+            self._sucios.update(self._cargando)
+            id_pelicula = int(clave)
+            for id_usuario, ids in list(self._usuarios.items()):
+                if contiene(ids, id_pelicula):
+                    nuevos = array("I", ids)
+                    del nuevos[bisect_left(ids, id_pelicula)]
+                    self._usuarios[id_usuario] = nuevos
+                    self._bytes += self._costo(nuevos) - self._costo(ids)
+
+
+cache_favoritos = CacheFavoritos(presupuesto_bytes=settings.cache_favoritos_presupuesto_bytes)
+cache_favoritos.suscribir()
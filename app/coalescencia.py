@@ -0,0 +1,161 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight, middleware ASGI).
+
+Cuando llegan a la vez muchas peticiones GET iguales a una ruta cara (populares,
+estadísticas, analítica), solo la primera (la "líder") llega al endpoint. Las demás
+esperan su respuesta ya serializada y la reciben tal cual, sin tocar la base. Como
+ocurre antes de despachar la petición, sirve igual para endpoints sync y async.
+
+- La clave es la ruta, los parámetros (en cualquier orden) y el encabezado Accept,
+  que elige el formato (ver app/formatos.py). La compresión va por fuera, así que
+  cada cliente recibe su propia codificación.
+- Solo se comparte una respuesta 200 completa. Si la líder falla, la respuesta supera
+  `maximo_bytes` o el cliente de la líder se desconecta, cada seguidora hace su
+  propia petición.
+- Al confirmarse un cambio de usuarios, películas o favoritos, los vuelos en curso
+  dejan de aceptar seguidoras. Una lectura que llega después de una escritura no
+  recibe un resultado que empezó a calcularse antes de ella.
+- Una seguidora no pasa por el limitador (app/limitador.py): no genera trabajo.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.estado import canal_invalidacion
+from app.limitador import normalizar_ruta
+
+CANALES = ("usuarios", "peliculas", "favoritos")
+
+
+class _Vuelo:
+    """Una petición líder en curso y las respuestas que va enviando."""
+
+    __slots__ = ("futuro", "mensajes", "tamaño")
+
+    def __init__(self, futuro: asyncio.Future):
+        self.futuro = futuro
+        self.mensajes: Optional[List[dict]] = []
+        self.tamaño = 0
+
+
+class Coalescedor:
+    """Vuelos en curso por clave y métricas por ruta. Solo se usa desde el event loop."""
+
+    def __init__(self, rutas: Iterable[str], maximo_bytes: int = 4 * 1024 * 1024):
+        self.rutas = {normalizar_ruta(ruta) for ruta in rutas}
+        self.maximo_bytes = maximo_bytes
+        self._en_curso: Dict[tuple, _Vuelo] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._metricas: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"ejecutadas": 0, "compartidas": 0, "sin_compartir": 0}
+        )
+
+    def suscribir_canales(self) -> None:
+        for canal in CANALES:
+            canal_invalidacion.suscribir(canal, self._en_cambio)
+
+    def desuscribir_canales(self) -> None:
+        for canal in CANALES:
+            canal_invalidacion.desuscribir(canal, self._en_cambio)
+
+    def _en_cambio(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        # Llega desde el hilo de la petición que confirmó el cambio
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and self._en_curso:
+            loop.call_soon_threadsafe(self._en_curso.clear)
+
+    def aplica(self, metodo: str, ruta: str) -> bool:
+        return metodo in ("GET", "HEAD") and normalizar_ruta(ruta) in self.rutas
+
+    def metricas(self) -> dict:
+        """Contadores por ruta: ejecutadas (líderes), compartidas y sin_compartir."""
+        por_ruta = {ruta: dict(valores) for ruta, valores in self._metricas.items()}
+        ejecutadas = sum(m["ejecutadas"] for m in por_ruta.values())
+        compartidas = sum(m["compartidas"] for m in por_ruta.values())
+        total = ejecutadas + compartidas
+        return {
+            "rutas": por_ruta,
+            "ejecutadas": ejecutadas,
+            "compartidas": compartidas,
+            "tasa_compartidas": round(compartidas / total, 4) if total else 0.0,
+            "en_curso": len(self._en_curso),
+        }
+
+    def reiniciar(self) -> None:
+        self._metricas.clear()
+
+
+def _clave(scope) -> tuple:
+    parametros = b"&".join(sorted(scope.get("query_string", b"").split(b"&")))
+    accept = next((valor for nombre, valor in scope["headers"] if nombre == b"accept"), b"")
+    return scope["method"], scope["path"], parametros, accept
+
+
+def _copia(mensaje: dict) -> dict:
+    # Los middlewares externos (compresión, CORS) modifican los encabezados en el lugar
+    if mensaje["type"] == "http.response.start":
+        return {**mensaje, "headers": list(mensaje.get("headers", []))}
+    return mensaje
+
+
+class MiddlewareCoalescencia:
+    """Middleware ASGI que aplica un `Coalescedor` a las rutas configuradas."""
+
+    def __init__(self, app, coalescedor: Optional[Coalescedor] = None):
+        self.app = app
+        self.coalescedor = coalescedor
+
+    async def __call__(self, scope, receive, send):
+        coalescedor = self.coalescedor or coalescedor_lecturas
+        if scope["type"] != "http" or not coalescedor.aplica(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        coalescedor._loop = asyncio.get_running_loop()
+        metricas = coalescedor._metricas[normalizar_ruta(scope["path"])]
+        clave = _clave(scope)
+        vuelo = coalescedor._en_curso.get(clave)
+        if vuelo is not None:
+            mensajes = await asyncio.shield(vuelo.futuro)
+            if mensajes is not None:
+                metricas["compartidas"] += 1
+                for mensaje in mensajes:
+                    await send(_copia(mensaje))
+                return
+            metricas["sin_compartir"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        vuelo = _Vuelo(coalescedor._loop.create_future())
+        coalescedor._en_curso[clave] = vuelo
+        metricas["ejecutadas"] += 1
+
+        async def enviar(mensaje: dict) -> None:
+            if vuelo.mensajes is not None:
+                if mensaje["type"] == "http.response.start" and mensaje["status"] != 200:
+                    vuelo.mensajes = None
+                else:
+                    vuelo.tamaño += len(mensaje.get("body", b""))
+                    if vuelo.tamaño > coalescedor.maximo_bytes:
+                        vuelo.mensajes = None
+                    else:
+                        vuelo.mensajes.append(_copia(mensaje))
+            await send(mensaje)
+
+        completa = False
+        try:
+            await self.app(scope, receive, enviar)
+            completa = True
+        finally:
+            if coalescedor._en_curso.get(clave) is vuelo:
+                del coalescedor._en_curso[clave]
+            vuelo.futuro.set_result(vuelo.mensajes if completa else None)
+
+
+coalescedor_lecturas = Coalescedor(
+    rutas=settings.coalescencia_rutas,
+    maximo_bytes=settings.coalescencia_maximo_bytes,
+)
+coalescedor_lecturas.suscribir_canales()
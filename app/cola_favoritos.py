@@ -0,0 +1,441 @@
+"""
+Cola write-behind para marcar y desmarcar favoritos.
+
+Con `favoritos_write_behind=True`, los endpoints que marcan o eliminan favoritos
+no escriben en la base de datos en la misma petición: registran la operación en
+un journal en disco (para no perderla si el proceso cae), la agregan a una cola
+en memoria y responden 202. Una tarea de fondo iniciada desde el lifespan confirma
+las operaciones pendientes en lotes, con una sola transacción por lote, lo que
+reduce la contención del único escritor de SQLite.
+
+Garantías:
+- **Latencia acotada**: la cola se vacía cada `intervalo` segundos.
+- **Contrapresión**: si la cola llega a su capacidad, `encolar` espera un máximo
+  de `espera_maxima` segundos y luego lanza ColaLlena (el endpoint responde 503).
+- **Recuperación**: al iniciar se reaplican los journals de procesos anteriores,
+  incluido lo que no se pudo confirmar al detener.
+  Las operaciones son idempotentes (insertar ignorando duplicados y borrar).
+  Cada journal tiene al lado un archivo `.lock` que su proceso mantiene bloqueado
+  de principio a fin, incluso mientras reescribe el journal; un journal cuyo
+  `.lock` se puede bloquear es de un proceso caído.
+- **Lectura consistente**: `estado_pendiente` expone las operaciones aún no
+  confirmadas para que verificar_favorito responda con el estado más reciente.
+- **Padres vivos**: al confirmar, se descartan (con un aviso en el log) las altas
+  de usuarios o películas eliminados mientras esperaban en la cola; si no, la
+  clave foránea haría fallar el lote entero una y otra vez.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, tuple_
+from sqlmodel import Session, col, select
+
+from app.config import settings
+from app.consultas import consultas
+from app.database import insert_ignorando_duplicados
+from app.models import Favorito, Pelicula, Usuario, vivos
+from app.notificaciones import favorito_cambiado
+from app.registro_cambios import DELETE, INSERT, anotar_cambios
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos entre procesos
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+AGREGAR = "agregar"
+ELIMINAR = "eliminar"
+
+
+class ColaLlena(Exception):
+    """La cola alcanzó su capacidad y no se liberó espacio a tiempo."""
+
+
+class Operacion:
+    """Una operación pendiente sobre el par (usuario, película)."""
+
+    __slots__ = ("seq", "id_usuario", "id_pelicula", "accion")
+
+    def __init__(self, seq: int, id_usuario: int, id_pelicula: int, accion: str):
+        self.seq = seq
+        self.id_usuario = id_usuario
+        self.id_pelicula = id_pelicula
+        self.accion = accion
+
+    def a_json(self) -> str:
+        return json.dumps({"seq": self.seq, "u": self.id_usuario, "p": self.id_pelicula, "a": self.accion})
+
+    @classmethod
+    def desde_json(cls, linea: str) -> "Operacion":
+        datos = json.loads(linea)
+        return cls(datos["seq"], datos["u"], datos["p"], datos["a"])
+
+
+class ColaFavoritos:
+    """
+    Cola en memoria con journal en disco y confirmación por lotes.
+    Es segura entre hilos: los endpoints encolan desde el threadpool
+    mientras la tarea de fondo vacía la cola.
+    """
+
+    def __init__(
+        self,
+        ruta_journal: str,
+        capacidad: int = 10000,
+        tamaño_lote: int = 500,
+        intervalo: float = 0.05,
+        espera_maxima: float = 0.2,
+        fsync: bool = True
+    ):
+        self.ruta_base = ruta_journal
+        self.capacidad = capacidad
+        self.tamaño_lote = tamaño_lote
+        self.intervalo = intervalo
+        self.espera_maxima = espera_maxima
+        self.fsync = fsync
+
+        self.engine = None
+        self.ruta_journal: Optional[str] = None
+        self._journal = None
+        self._bloqueo = None
+        self._pendientes: Deque[Operacion] = deque()
+        self._overlay: Dict[Tuple[int, int], Operacion] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._espacio = threading.Condition(self._lock)
+        self._vaciando = threading.Lock()  # un solo lote en vuelo a la vez
+
+        self.confirmadas = 0
+        self.lotes = 0
+        self.rechazadas = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.engine is not None
+
+    def __len__(self) -> int:
+        return len(self._pendientes)
+
+    def iniciar(self, engine) -> int:
+        """
+        Activa la cola sobre el engine indicado.
+        Cada proceso escribe su propio journal (sufijo con el PID) y bloquea su
+        `.lock` antes de recuperar, para que ningún otro proceso lo tome por caído;
+        los journals sin bloqueo son de procesos caídos y se reaplican aquí.
+
+        Returns:
+            int: Operaciones recuperadas de journals anteriores
+        """
+        self.engine = engine
+        self.ruta_journal = f"{self.ruta_base}.{os.getpid()}"
+        self._bloqueo = open(f"{self.ruta_journal}.lock", "a")
+        if fcntl:
+            fcntl.flock(self._bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        recuperadas = self.recuperar()
+        self._journal = open(self.ruta_journal, "a", encoding="utf-8")
+        return recuperadas
+
+    def detener(self, intentos: int = 3) -> bool:
+        """
+        Confirma lo pendiente y cierra el journal propio.
+        Si confirmar falla `intentos` veces seguidas (base bloqueada o caída), deja el
+        journal en disco para que `recuperar` lo reaplique en el próximo arranque.
+
+        Returns:
+            bool: True si se confirmó todo lo pendiente
+        """
+        if not self.activa:
+            return True
+        fallidos = 0
+        while self._pendientes and fallidos < intentos:
+            try:
+                self.vaciar()
+                fallidos = 0
+            except Exception:
+                fallidos += 1
+                logger.exception("Error al confirmar el lote de favoritos al detener la cola")
+                if fallidos < intentos:
+                    time.sleep(self.intervalo)
+        confirmado = not self._pendientes
+        if not confirmado:
+            logger.error(
+                "Quedan %d operaciones de favoritos en %s; se reaplicarán al iniciar",
+                len(self._pendientes), self.ruta_journal
+            )
+        if self._journal:
+            self._journal.close()
+            if confirmado:
+                os.remove(self.ruta_journal)
+            self._journal = None
+        if self._bloqueo:
+            # Se borra antes de soltar el bloqueo: nadie llega a verlo libre
+            os.remove(self._bloqueo.name)
+            self._bloqueo.close()
+            self._bloqueo = None
+        self.engine = None
+        return confirmado
+
+    def encolar(self, id_usuario: int, id_pelicula: int, accion: str) -> int:
+        """
+        Registra la operación en el journal y la agrega a la cola.
+
+        Returns:
+            int: Número de secuencia asignado
+
+        Raises:
+            ColaLlena: Si no hay espacio después de esperar `espera_maxima`
+        """
+        limite = time.monotonic() + self.espera_maxima
+        with self._espacio:
+            while len(self._pendientes) >= self.capacidad:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.rechazadas += 1
+                    raise ColaLlena(f"La cola de favoritos está llena ({self.capacidad} operaciones)")
+                self._espacio.wait(restante)
+
+            self._seq += 1
+            operacion = Operacion(self._seq, id_usuario, id_pelicula, accion)
+            self._journal.write(operacion.a_json() + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+
+            self._pendientes.append(operacion)
+            self._overlay[(id_usuario, id_pelicula)] = operacion
+            return operacion.seq
+
+    def estado_pendiente(self, id_usuario: int, id_pelicula: int) -> Optional[bool]:
+        """
+        Retorna True si hay un "marcar" pendiente, False si hay un "eliminar"
+        pendiente, o None si el par no tiene operaciones sin confirmar.
+        """
+        operacion = self._overlay.get((id_usuario, id_pelicula))
+        if operacion is None:
+            return None
+        return operacion.accion == AGREGAR
+
+    def es_favorito(self, session: Session, id_usuario: int, id_pelicula: int) -> bool:
+        """Estado vigente del par: lo pendiente en la cola tiene prioridad sobre la base de datos."""
+        pendiente = self.estado_pendiente(id_usuario, id_pelicula)
+        if pendiente is not None:
+            return pendiente
+        statement = consultas.sentencia("existe_favorito")
+        return session.exec(statement, params={"id_usuario": id_usuario, "id_pelicula": id_pelicula}).first() is not None
+
+    def cancelar_usuario(self, id_usuario: int) -> int:
+        """
+        Descarta las operaciones pendientes del usuario (cola, overlay y journal),
+        por ejemplo antes de borrar todos sus favoritos. Espera a que termine el
+        lote en vuelo para que ninguna se confirme después del borrado.
+
+        Returns:
+            int: Operaciones descartadas
+        """
+        with self._vaciando, self._espacio:
+            restantes = deque(op for op in self._pendientes if op.id_usuario != id_usuario)
+            descartadas = len(self._pendientes) - len(restantes)
+            if not descartadas:
+                return 0
+            self._pendientes = restantes
+            for clave in [clave for clave in self._overlay if clave[0] == id_usuario]:
+                del self._overlay[clave]
+            self._reescribir_journal()
+            self._espacio.notify_all()
+            return descartadas
+
+    def vaciar(self) -> int:
+        """
+        Confirma hasta `tamaño_lote` operaciones en una sola transacción.
+
+        Returns:
+            int: Operaciones confirmadas
+        """
+        with self._vaciando:
+            with self._lock:
+                lote = [self._pendientes[i] for i in range(min(self.tamaño_lote, len(self._pendientes)))]
+            if not lote:
+                return 0
+
+            self._aplicar(lote)
+
+            with self._espacio:
+                for _ in lote:
+                    self._pendientes.popleft()
+                for operacion in lote:
+                    clave = (operacion.id_usuario, operacion.id_pelicula)
+                    if self._overlay.get(clave) is operacion:
+                        del self._overlay[clave]
+                self._reescribir_journal()
+                self.confirmadas += len(lote)
+                self.lotes += 1
+                self._espacio.notify_all()
+            return len(lote)
+
+    def recuperar(self) -> int:
+        """
+        Reaplica los journals que no pertenecen a un proceso vivo.
+        Un journal está vivo si su proceso mantiene el bloqueo sobre su `.lock`.
+        El propio (un PID reutilizado) también se reaplica: su bloqueo ya es nuestro.
+        """
+        recuperadas = 0
+        for ruta in sorted(glob.glob(f"{glob.escape(self.ruta_base)}.*")):
+            if ruta.endswith((".lock", ".tmp")):
+                continue
+            propio = ruta == self.ruta_journal
+            bloqueo = None if propio else open(f"{ruta}.lock", "a")
+            try:
+                if bloqueo and fcntl:
+                    try:
+                        fcntl.flock(bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                try:
+                    with open(ruta, "r", encoding="utf-8") as archivo:
+                        operaciones = [Operacion.desde_json(linea) for linea in archivo if linea.strip()]
+                except FileNotFoundError:
+                    # Otro proceso lo recuperó entre el glob y el bloqueo
+                    if bloqueo and os.path.exists(bloqueo.name):
+                        os.remove(bloqueo.name)
+                    continue
+                for inicio in range(0, len(operaciones), self.tamaño_lote):
+                    self._aplicar(operaciones[inicio:inicio + self.tamaño_lote])
+                recuperadas += len(operaciones)
+                os.remove(ruta)
+                if os.path.exists(f"{ruta}.tmp"):
+                    os.remove(f"{ruta}.tmp")
+                if bloqueo:
+                    os.remove(bloqueo.name)
+            finally:
+                if bloqueo:
+                    bloqueo.close()
+        if recuperadas:
+            logger.info("Recuperadas %d operaciones de favoritos del journal", recuperadas)
+        return recuperadas
+
+    async def ejecutar(self) -> None:
+        """
+        Tarea de fondo: vacía la cola cada `intervalo` segundos.
+        Si se cancela con un lote en vuelo, termina de esperarlo antes de salir,
+        para que el vaciado final de `detener` no se superponga con él.
+        """
+        while True:
+            try:
+                while self._pendientes:
+                    vaciado = asyncio.ensure_future(asyncio.to_thread(self.vaciar))
+                    try:
+                        await asyncio.shield(vaciado)
+                    except asyncio.CancelledError:
+                        await asyncio.gather(vaciado, return_exceptions=True)
+                        raise
+            except Exception:
+                logger.exception("Error al confirmar el lote de favoritos")
+            await asyncio.sleep(self.intervalo)
+
+    def _aplicar(self, operaciones: List[Operacion]) -> None:
+        # Solo importa la última operación de cada par dentro del lote
+        finales: Dict[Tuple[int, int], str] = {}
+        for operacion in operaciones:
+            finales[(operacion.id_usuario, operacion.id_pelicula)] = operacion.accion
+
+        agregar = [{"id_usuario": u, "id_pelicula": p} for (u, p), a in finales.items() if a == AGREGAR]
+        eliminar = [par for par, a in finales.items() if a == ELIMINAR]
+
+        tabla = Favorito.__table__
+        with Session(self.engine) as session:
+            if agregar:
+                agregar = self._con_padres_vivos(session, agregar)
+            # RETURNING informa solo las filas que realmente cambiaron (no los duplicados)
+            if agregar:
+                statement = insert_ignorando_duplicados(Favorito, session).returning(*tabla.c)
+                agregados = session.exec(statement, params=agregar).all()
+                for fila in agregados:
+                    favorito_cambiado(session, fila.id_usuario, fila.id_pelicula, agregado=True,
+                                      fecha_marcado=fila.fecha_marcado)
+                anotar_cambios(session, "favorito", INSERT, [fila._mapping for fila in agregados])
+            if eliminar:
+                statement = (
+                    delete(tabla)
+                    .where(tuple_(tabla.c.id_usuario, tabla.c.id_pelicula).in_(eliminar))
+                    .returning(*tabla.c)
+                )
+                eliminados = session.exec(statement).all()
+                for fila in eliminados:
+                    favorito_cambiado(session, fila.id_usuario, fila.id_pelicula, agregado=False,
+                                      fecha_marcado=fila.fecha_marcado)
+                anotar_cambios(session, "favorito", DELETE, [fila._mapping for fila in eliminados])
+            session.commit()
+
+    def _con_padres_vivos(self, session: Session, agregar: List[dict]) -> List[dict]:
+        """Las altas cuyo usuario y película siguen existiendo y no están eliminados."""
+        ids_usuarios = {fila["id_usuario"] for fila in agregar}
+        ids_peliculas = {fila["id_pelicula"] for fila in agregar}
+        usuarios = set(session.exec(
+            select(Usuario.id).where(col(Usuario.id).in_(ids_usuarios), vivos(Usuario))
+        ).all())
+        peliculas = set(session.exec(
+            select(Pelicula.id).where(col(Pelicula.id).in_(ids_peliculas), vivos(Pelicula))
+        ).all())
+        validas = [fila for fila in agregar if fila["id_usuario"] in usuarios and fila["id_pelicula"] in peliculas]
+        if len(validas) < len(agregar):
+            logger.warning(
+                "Se descartan %d favoritos encolados de usuarios o películas eliminados",
+                len(agregar) - len(validas)
+            )
+        return validas
+
+    def _reescribir_journal(self) -> None:
+        # Deja en el journal solo lo que sigue pendiente (se llama con el lock tomado).
+        # El bloqueo entre procesos está en el `.lock`, así que reemplazar el archivo no lo suelta
+        if not self._pendientes:
+            self._journal.truncate(0)
+            self._journal.seek(0)
+            return
+        temporal = f"{self.ruta_journal}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.writelines(operacion.a_json() + "\n" for operacion in self._pendientes)
+            archivo.flush()
+            if self.fsync:
+                os.fsync(archivo.fileno())
+        self._journal.close()
+        os.replace(temporal, self.ruta_journal)
+        self._journal = open(self.ruta_journal, "a", encoding="utf-8")
+
+
+cola_favoritos = ColaFavoritos(
+    settings.favoritos_journal,
+    capacidad=settings.favoritos_capacidad,
+    tamaño_lote=settings.favoritos_lote,
+    intervalo=settings.favoritos_intervalo_ms / 1000,
+    espera_maxima=settings.favoritos_espera_maxima_ms / 1000,
+    fsync=settings.favoritos_fsync,
+)
+
+
+def encolar_o_rechazar(id_usuario: int, id_pelicula: int, accion: str) -> None:
+    """
+    Encola la operación desde un endpoint.
+
+    Raises:
+        HTTPException: 503 con Retry-After si la cola está llena
+    """
+    try:
+        cola_favoritos.encolar(id_usuario, id_pelicula, accion)
+    except ColaLlena:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas operaciones de favoritos pendientes, intente de nuevo",
+            headers={"Retry-After": str(max(1, math.ceil(cola_favoritos.intervalo)))}
+        )
@@ -0,0 +1,166 @@
+"""
+Compresión negociada de respuestas (middleware ASGI).
+
+Se elige la codificación según Accept-Encoding (valores q). A igual q se prefiere zstd,
+luego br y luego gzip. zstd y br solo se ofrecen si están instalados los paquetes
+`zstandard` y `brotli`; gzip viene con Python.
+
+- Solo se comprimen tipos de texto, JSON, NDJSON y MessagePack. Server-Sent Events no:
+  cada evento debe llegar apenas se envía.
+- Una respuesta de un solo bloque más chica que `minimo` bytes se envía tal cual: el
+  encabezado y el costo de CPU no compensan.
+- Las respuestas en varios bloques (StreamingResponse, como GET /api/changes) se
+  comprimen a medida que se envían, sin juntarlas en memoria.
+"""
+
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+PREFERENCIA = ("zstd", "br", "gzip")
+
+_TIPOS_COMPRIMIBLES = ("text/", "application/json", "application/x-ndjson", "application/msgpack",
+                       "application/javascript", "application/xml")
+_TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+
+def codificaciones_disponibles() -> List[str]:
+    return [
+        codificacion for codificacion in PREFERENCIA
+        if codificacion == "gzip"
+        or (codificacion == "br" and brotli is not None)
+        or (codificacion == "zstd" and zstandard is not None)
+    ]
+
+
+def elegir_codificacion(accept_encoding: str, disponibles: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Codificación a usar según Accept-Encoding, o None para enviar sin comprimir.
+    `*` vale para las codificaciones que el cliente no nombra.
+    """
+    disponibles = codificaciones_disponibles() if disponibles is None else disponibles
+    valores: Dict[str, float] = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        clave, _, valor = parametros.strip().partition("=")
+        if clave.strip() == "q":
+            try:
+                q = float(valor)
+            except ValueError:
+                q = 0.0
+        valores[nombre] = q
+
+    comodin = valores.get("*", 0.0)
+    mejor, mejor_q = None, 0.0
+    for codificacion in disponibles:
+        q = valores.get(codificacion, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+
+def es_comprimible(tipo: str) -> bool:
+    tipo = tipo.lower()
+    if tipo.startswith(_TIPOS_EXCLUIDOS):
+        return False
+    return tipo.startswith(_TIPOS_COMPRIMIBLES) or "+json" in tipo
+
+
+class _Compresor:
+    """Interfaz común para los compresores incrementales de cada codificación."""
+
+    def __init__(self, codificacion: str, niveles: Dict[str, int]):
+        nivel = niveles[codificacion]
+        if codificacion == "gzip":
+            compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+            self.comprimir, self.terminar = compresor.compress, compresor.flush
+        elif codificacion == "br":
+            compresor = brotli.Compressor(quality=nivel)
+            self.comprimir, self.terminar = compresor.process, compresor.finish
+        else:
+            compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+            self.comprimir, self.terminar = compresor.compress, compresor.flush
+
+
+class MiddlewareCompresion:
+    """Comprime las respuestas HTTP según Accept-Encoding."""
+
+    def __init__(self, app, minimo: int = 1024, niveles: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.minimo = minimo
+        self.niveles = {"gzip": 6, "br": 4, "zstd": 3, **(niveles or {})}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _RespuestaComprimida(self, codificacion, send))
+
+
+class _RespuestaComprimida:
+    """Envoltura de `send` para una respuesta: decide con el primer bloque si comprime."""
+
+    def __init__(self, middleware: MiddlewareCompresion, codificacion: Optional[str], send):
+        self.middleware = middleware
+        self.codificacion = codificacion
+        self.send = send
+        self.inicio: Optional[dict] = None
+        self.compresor: Optional[_Compresor] = None
+        self.decidido = False
+
+    async def __call__(self, mensaje: dict) -> None:
+        if mensaje["type"] == "http.response.start":
+            self.inicio = mensaje
+            return
+        if mensaje["type"] != "http.response.body" or (self.decidido and self.compresor is None):
+            await self.send(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+        if not self.decidido:
+            self.decidido = True
+            encabezados = MutableHeaders(scope=self.inicio)
+            if not es_comprimible(encabezados.get("content-type", "")) or "content-encoding" in encabezados:
+                await self.send(self.inicio)
+                await self.send(mensaje)
+                return
+            encabezados.add_vary_header("Accept-Encoding")
+            if self.codificacion is None or (not mas and len(cuerpo) < self.middleware.minimo):
+                await self.send(self.inicio)
+                await self.send(mensaje)
+                return
+
+            self.compresor = _Compresor(self.codificacion, self.middleware.niveles)
+            encabezados["Content-Encoding"] = self.codificacion
+            if mas:
+                del encabezados["Content-Length"]
+            else:
+                comprimido = self.compresor.comprimir(cuerpo) + self.compresor.terminar()
+                encabezados["Content-Length"] = str(len(comprimido))
+                await self.send(self.inicio)
+                await self.send({"type": "http.response.body", "body": comprimido})
+                return
+            await self.send(self.inicio)
+
+        comprimido = self.compresor.comprimir(cuerpo)
+        if not mas:
+            comprimido += self.compresor.terminar()
+        await self.send({"type": "http.response.body", "body": comprimido, "more_body": mas})
+
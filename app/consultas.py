@@ -0,0 +1,260 @@
+"""
+Registro de las consultas fijas de los routers, construidas una sola vez.
+
+Construir un `select()` y calcular su clave de caché cuesta decenas de microsegundos
+por petición, aunque el SQL compilado ya esté en la caché del engine. Cada consulta
+de este módulo se define una vez con parámetros con nombre (`bindparam`) y se
+ejecuta pasando los valores:
+
+    statement = consultas.sentencia("favorito_por_par")
+    session.exec(statement, params={"id_usuario": 1, "id_pelicula": 2}).first()
+
+Una sentencia ya construida no cambia, así que SQLAlchemy memoriza su clave y la
+encuentra en la caché de SQL compilado (`CACHE_SENTENCIAS_SQL`) sin recorrerla.
+Las consultas con filtros opcionales (la búsqueda de películas tiene 2^6
+combinaciones) se construyen una vez por combinación: la variante es la tupla de
+filtros presentes.
+
+`metricas()` reporta, por consulta, cuántas veces se construyó y cuántas se
+reutilizó, y los aciertos de la caché de SQL compilado de los engines del enrutador de sesiones
+(la primaria y las réplicas).
+"""
+
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import Integer, bindparam, delete, event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlmodel import col, select
+
+from app.database import observar_engines, select_filas
+from app.models import Favorito, Pelicula, Usuario, vivos
+from utils import normalizar_texto
+
+
+class RegistroConsultas:
+    """Constructores de consultas por nombre y sentencias ya construidas por variante."""
+
+    def __init__(self):
+        self._constructores: Dict[str, Callable] = {}
+        self._sentencias: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        self._metricas: Dict[str, Dict[str, int]] = defaultdict(lambda: {"construidas": 0, "reutilizadas": 0})
+        self.sql_aciertos = 0
+        self.sql_fallos = 0
+
+    def definir(self, nombre: str) -> Callable:
+        """Decorador: registra el constructor de la consulta `nombre`."""
+        def registrar(constructor: Callable) -> Callable:
+            self._constructores[nombre] = constructor
+            return constructor
+        return registrar
+
+    def sentencia(self, nombre: str, *variante):
+        """Retorna la sentencia `nombre` para la variante dada, construyéndola la primera vez."""
+        clave = (nombre, variante)
+        statement = self._sentencias.get(clave)
+        if statement is not None:
+            with self._lock:
+                self._metricas[nombre]["reutilizadas"] += 1
+            return statement
+        with self._lock:
+            statement = self._sentencias.get(clave)
+            if statement is None:
+                statement = self._constructores[nombre](*variante)
+                self._sentencias[clave] = statement
+                self._metricas[nombre]["construidas"] += 1
+            else:
+                self._metricas[nombre]["reutilizadas"] += 1
+        return statement
+
+    def observar(self, engine) -> None:
+        """Cuenta los aciertos y fallos de la caché de SQL compilado de `engine`."""
+        if not event.contains(engine, "before_cursor_execute", self._en_ejecucion):
+            event.listen(engine, "before_cursor_execute", self._en_ejecucion)
+
+    def _en_ejecucion(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        acierto = getattr(context, "cache_hit", None)
+        if acierto is CACHE_HIT:
+            with self._lock:
+                self.sql_aciertos += 1
+        elif acierto is CACHE_MISS:
+            with self._lock:
+                self.sql_fallos += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            por_consulta = {nombre: dict(valores) for nombre, valores in self._metricas.items()}
+            aciertos, fallos = self.sql_aciertos, self.sql_fallos
+        reutilizadas = sum(m["reutilizadas"] for m in por_consulta.values())
+        pedidas = reutilizadas + sum(m["construidas"] for m in por_consulta.values())
+        compiladas = aciertos + fallos
+        return {
+            "consultas": por_consulta,
+            "variantes": len(self._sentencias),
+            "tasa_reutilizadas": round(reutilizadas / pedidas, 4) if pedidas else 0.0,
+            "sql_compilado": {
+                "aciertos": aciertos,
+                "fallos": fallos,
+                "tasa_aciertos": round(aciertos / compiladas, 4) if compiladas else 0.0,
+            },
+        }
+
+    def reiniciar(self) -> None:
+        """Reinicia los contadores (las sentencias construidas se conservan)."""
+        with self._lock:
+            self._metricas.clear()
+            self.sql_aciertos = 0
+            self.sql_fallos = 0
+
+
+consultas = RegistroConsultas()
+observar_engines(consultas.observar)
+
+
+def _entero(nombre: str):
+    return bindparam(nombre, type_=Integer)
+
+
+# ----------------------------------------------------------------------
+# Películas
+# ----------------------------------------------------------------------
+
+# Filtros de la búsqueda, en el orden en que forman la variante.
+# Título y director se comparan contra sus columnas normalizadas (ver condiciones_busqueda)
+FILTROS_BUSQUEDA = {
+    "titulo": lambda: col(Pelicula.titulo_normalizado).contains(bindparam("titulo")),
+    "director": lambda: col(Pelicula.director_normalizado).contains(bindparam("director")),
+    "genero": lambda: col(Pelicula.genero).contains(bindparam("genero")),
+    "año": lambda: Pelicula.año == bindparam("año"),
+    "año_min": lambda: Pelicula.año >= bindparam("año_min"),
+    "año_max": lambda: Pelicula.año <= bindparam("año_max"),
+}
+
+
+def parametros_busqueda(titulo: Optional[str] = None, director: Optional[str] = None,
+                        genero: Optional[str] = None, año: Optional[int] = None,
+                        año_min: Optional[int] = None, año_max: Optional[int] = None) -> dict:
+    """Valores de los filtros presentes, ya normalizados, en el orden de FILTROS_BUSQUEDA."""
+    valores = {
+        "titulo": normalizar_texto(titulo) if titulo else None,
+        "director": normalizar_texto(director) if director else None,
+        "genero": genero or None,
+        "año": año or None,
+        "año_min": año_min or None,
+        "año_max": año_max or None,
+    }
+    return {filtro: valor for filtro, valor in valores.items() if valor is not None}
+
+
+@consultas.definir("buscar_peliculas")
+def _buscar_peliculas(*filtros: str):
+    return select_filas(Pelicula).where(vivos(Pelicula), *(FILTROS_BUSQUEDA[filtro]() for filtro in filtros))
+
+
+@consultas.definir("listar_peliculas")
+def _listar_peliculas():
+    return select_filas(Pelicula).where(vivos(Pelicula)).offset(_entero("skip")).limit(_entero("limit"))
+
+
+@consultas.definir("peliculas_por_clasificacion")
+def _peliculas_por_clasificacion():
+    return (
+        select_filas(Pelicula)
+        .where(vivos(Pelicula), Pelicula.clasificacion == bindparam("clasificacion"))
+        .limit(_entero("limit"))
+    )
+
+
+@consultas.definir("peliculas_recientes")
+def _peliculas_recientes():
+    # Recorre el índice parcial ix_pelicula_recientes, que solo tiene las películas vivas
+    return (
+        select_filas(Pelicula)
+        .where(vivos(Pelicula))
+        .order_by(col(Pelicula.fecha_creacion).desc())
+        .limit(_entero("limit"))
+    )
+
+
+# ----------------------------------------------------------------------
+# Usuarios
+# ----------------------------------------------------------------------
+
+@consultas.definir("listar_usuarios")
+def _listar_usuarios():
+    return select_filas(Usuario).where(vivos(Usuario)).offset(_entero("skip")).limit(_entero("limit"))
+
+
+# ----------------------------------------------------------------------
+# Favoritos
+# ----------------------------------------------------------------------
+
+# Los favoritos de un usuario o película eliminados siguen en la tabla hasta la
+# compactación: las consultas que los listan o cuentan se unen con los vivos
+
+@consultas.definir("listar_favoritos")
+def _listar_favoritos():
+    return (
+        select_filas(Favorito)
+        .join(Usuario, Usuario.id == Favorito.id_usuario)
+        .join(Pelicula, Pelicula.id == Favorito.id_pelicula)
+        .where(vivos(Usuario), vivos(Pelicula))
+        .offset(_entero("skip"))
+        .limit(_entero("limit"))
+    )
+
+
+@consultas.definir("favorito_por_par")
+def _favorito_por_par():
+    return select(Favorito).where(
+        Favorito.id_usuario == bindparam("id_usuario"),
+        Favorito.id_pelicula == bindparam("id_pelicula")
+    )
+
+
+@consultas.definir("existe_favorito")
+def _existe_favorito():
+    return select(Favorito.id).where(
+        Favorito.id_usuario == bindparam("id_usuario"),
+        Favorito.id_pelicula == bindparam("id_pelicula")
+    )
+
+
+@consultas.definir("favoritos_de_usuario")
+def _favoritos_de_usuario():
+    return (
+        select(Favorito)
+        .join(Pelicula, Pelicula.id == Favorito.id_pelicula)
+        .where(Favorito.id_usuario == bindparam("id_usuario"), vivos(Pelicula))
+    )
+
+
+@consultas.definir("favoritos_de_pelicula")
+def _favoritos_de_pelicula():
+    return (
+        select(Favorito)
+        .join(Usuario, Usuario.id == Favorito.id_usuario)
+        .where(Favorito.id_pelicula == bindparam("id_pelicula"), vivos(Usuario))
+    )
+
+
+@consultas.definir("ids_peliculas_favoritas")
+def _ids_peliculas_favoritas():
+    return (
+        select(Favorito.id_pelicula)
+        .join(Usuario, Usuario.id == Favorito.id_usuario)
+        .join(Pelicula, Pelicula.id == Favorito.id_pelicula)
+        .where(Favorito.id_usuario == bindparam("id_usuario"), vivos(Usuario), vivos(Pelicula))
+        .order_by(Favorito.id_pelicula)
+    )
+
+
+@consultas.definir("borrar_favoritos")
+def _borrar_favoritos(columna: str, por_lotes: bool):
+    tabla = Favorito.__table__
+    condicion = tabla.c[columna] == bindparam("valor")
+    if por_lotes:
+        condicion = tabla.c.id.in_(select(tabla.c.id).where(condicion).limit(_entero("limite")))
+    return delete(tabla).where(condicion).returning(*tabla.c)
@@ -3,22 +3,401 @@ Configuración de la base de datos y gestión de sesiones.
 Utiliza SQLModel para ORM y gestión de conexiones.
 """
 
-from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+import threading
+import time
+from datetime import datetime
+
+from fastapi import Request
+from sqlalchemy import bindparam, event, or_, update
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+from sqlmodel import SQLModel, create_engine, Session, select
+from typing import Callable, Dict, Generator, List, Optional, Sequence
 
 from app.config import settings
+from app.estado import canal_invalidacion
+from app.registro_cambios import DELETE, UPDATE, anotar_cambios
+
+
+def es_sqlite(url: str) -> bool:
+    """Indica si la URL de conexión corresponde a SQLite."""
+    return url.startswith("sqlite")
+
+
+def configurar_sqlite(engine, wal: bool = True) -> None:
+    """
+    Aplica los PRAGMA recomendados a cada conexión SQLite nueva.
+
+    - **journal_mode=WAL**: los lectores no bloquean al escritor, necesario
+      cuando varios procesos (workers) comparten el mismo archivo
+    - **synchronous=NORMAL**: seguro en modo WAL y mucho más rápido que FULL
+    - **busy_timeout**: espera al bloqueo de escritura en lugar de fallar de inmediato
+    - **foreign_keys=ON**: SQLite no aplica las claves foráneas si no se pide en cada
+      conexión; con él, borrar un usuario o una película borra sus favoritos
+      (ON DELETE CASCADE) sin que el ORM los cargue
+    """
+    @event.listens_for(engine, "connect")
+    def _pragmas_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def crear_engine_bd(url: str, echo: bool = False, wal: bool = True):
+    """
+    Crea un engine para la URL indicada con la configuración propia de cada motor.
+    connect_args (check_same_thread) es específico para SQLite.
+    """
+    if es_sqlite(url):
+        nuevo_engine = create_engine(
+            url,
+            echo=echo,  # Muestra las consultas SQL en consola si debug=True
+            connect_args={"check_same_thread": False},  # Necesario para SQLite
+            query_cache_size=settings.cache_sentencias_sql
+        )
+        configurar_sqlite(nuevo_engine, wal=wal)
+        return nuevo_engine
+    return create_engine(
+        url,
+        echo=echo,
+        pool_pre_ping=True,  # Descarta conexiones cortadas por el servidor (PostgreSQL, MySQL)
+        query_cache_size=settings.cache_sentencias_sql
+    )
 
 
-# TODO: Crear el engine de la base de datos
 # El engine es la conexión principal a la base de datos
-# connect_args es específico para SQLite, remover para otras bases de datos
-engine = create_engine(
-    settings.database_url,
-    echo=settings.debug,  # Muestra las consultas SQL en consola si debug=True
-    connect_args={"check_same_thread": False}  # Necesario para SQLite
+engine = crear_engine_bd(settings.database_url, echo=settings.debug, wal=settings.sqlite_wal)
+
+
+def crear_engine_invalidacion():
+    """
+    Retorna el engine donde se guardan los mensajes del canal de invalidación.
+    Por defecto es la misma base de datos de la aplicación, compartida por todos los workers.
+    """
+    if not settings.invalidacion_url:
+        return engine
+    return crear_engine_bd(settings.invalidacion_url)
+
+
+SOLO_LECTURA = "solo_lectura"
+
+
+def crear_sesion_lectura(bind) -> Session:
+    """
+    Sesión para consultas. Sin autoflush: no hay cambios que enviar antes de cada
+    SELECT. Sin expire_on_commit: los objetos cargados no se vuelven a pedir a la base.
+    Queda marcada como de solo lectura: intentar confirmar cambios en ella es un error.
+    """
+    return Session(bind, autoflush=False, expire_on_commit=False, info={SOLO_LECTURA: True})
+
+
+def select_filas(modelo):
+    """
+    SELECT de todas las columnas de la tabla de `modelo`, para los endpoints que
+    solo serializan lo que leen. Retorna filas inmutables en lugar de objetos del ORM:
+    no pasan por el identity map ni guardan estado para detectar cambios, que es la
+    mayor parte del costo de cargar una página de resultados (ver benchmarks/sesiones.py).
+    Las filas tienen los atributos de las columnas, pero no las relaciones.
+    """
+    return select(*modelo.__table__.c)
+
+
+@event.listens_for(Session, "before_flush")
+def _impedir_escritura(session: Session, flush_context, instances) -> None:
+    if not session.info.get(SOLO_LECTURA):
+        return
+    if session.new or session.deleted or any(session.is_modified(objeto) for objeto in session.dirty):
+        raise InvalidRequestError(
+            "La sesión es de solo lectura (petición GET o get_session_lectura); use una sesión de escritura"
+        )
+
+
+# Funciones que reciben cada engine de los enrutadores (ver `observar_engines`)
+_observadores_engine: List[Callable] = []
+
+
+class EnrutadorSesiones:
+    """
+    Reparte las sesiones entre la base primaria y sus réplicas de lectura.
+
+    - Las lecturas van a una réplica elegida por turno rotativo ("round_robin")
+      o por menor cantidad de conexiones activas ("menos_conexiones").
+    - Las escrituras van siempre a la primaria.
+    - Lectura de las propias escrituras: después de un commit, las lecturas del
+      mismo cliente van a la primaria durante `ventana_lectura_propia` segundos,
+      para que no vea datos viejos mientras las réplicas se ponen al día.
+    - Una réplica que falla al conectar se descarta durante `enfriamiento`
+      segundos; si no queda ninguna disponible se lee de la primaria.
+    """
+
+    ESTRATEGIAS = ("round_robin", "menos_conexiones")
+
+    def __init__(
+        self,
+        primaria,
+        replicas: Sequence = (),
+        estrategia: str = "round_robin",
+        ventana_lectura_propia: float = 5.0,
+        enfriamiento: float = 30.0
+    ):
+        if estrategia not in self.ESTRATEGIAS:
+            raise ValueError(f"Estrategia inválida '{estrategia}'. Use: {', '.join(self.ESTRATEGIAS)}")
+
+        self.primaria = primaria
+        self.replicas = list(replicas)
+        self.estrategia = estrategia
+        self.ventana_lectura_propia = ventana_lectura_propia
+        self.enfriamiento = enfriamiento
+
+        self._lock = threading.Lock()
+        self._turno = 0
+        self._activas = [0] * len(self.replicas)
+        self._caida_hasta = [0.0] * len(self.replicas)
+        self._primaria_hasta: Dict[str, float] = {}
+
+        for indice, replica in enumerate(self.replicas):
+            self._contar_conexiones(replica, indice)
+        for observador in _observadores_engine:
+            for engine_enrutado in self.engines():
+                observador(engine_enrutado)
+        if self.replicas:
+            canal_invalidacion.suscribir("lectura_propia", self._leer_de_primaria)
+
+    def _contar_conexiones(self, replica, indice: int) -> None:
+        @event.listens_for(replica, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self._activas[indice] += 1
+
+        @event.listens_for(replica, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self._activas[indice] = max(0, self._activas[indice] - 1)
+
+    def engines(self) -> list:
+        """La primaria y las réplicas."""
+        return [self.primaria, *self.replicas]
+
+    def replicas_disponibles(self) -> List[int]:
+        """Índices de las réplicas que no están en enfriamiento."""
+        ahora = time.monotonic()
+        return [i for i, hasta in enumerate(self._caida_hasta) if hasta <= ahora]
+
+    def elegir_replica(self) -> Optional[int]:
+        """Retorna el índice de la réplica a usar, o None si no hay ninguna disponible."""
+        disponibles = self.replicas_disponibles()
+        if not disponibles:
+            return None
+        with self._lock:
+            if self.estrategia == "menos_conexiones":
+                return min(disponibles, key=lambda i: self._activas[i])
+            self._turno += 1
+            return disponibles[self._turno % len(disponibles)]
+
+    def marcar_caida(self, indice: int) -> None:
+        self._caida_hasta[indice] = time.monotonic() + self.enfriamiento
+
+    def marcar_escritura(self, cliente: Optional[str]) -> None:
+        """
+        Registra que el cliente acaba de escribir (activa la lectura de sus propias escrituras).
+        Se anuncia por el canal de invalidación para que los demás workers también
+        envíen a la primaria las siguientes lecturas de ese cliente.
+        """
+        if cliente is None or not self.replicas:
+            return
+        canal_invalidacion.publicar("lectura_propia", cliente)
+
+    def _leer_de_primaria(self, cliente: Optional[str], datos: Optional[dict] = None) -> None:
+        if cliente is None:
+            return
+        with self._lock:
+            self._primaria_hasta[cliente] = time.monotonic() + self.ventana_lectura_propia
+            if len(self._primaria_hasta) > 10000:
+                ahora = time.monotonic()
+                self._primaria_hasta = {c: t for c, t in self._primaria_hasta.items() if t > ahora}
+
+    def lee_de_primaria(self, cliente: Optional[str]) -> bool:
+        return cliente is not None and self._primaria_hasta.get(cliente, 0.0) > time.monotonic()
+
+    def sesion_lectura(self, cliente: Optional[str] = None) -> Session:
+        """
+        Abre una sesión de solo lectura (ver `crear_sesion_lectura`).
+        La conexión a una réplica se abre de inmediato para detectar si está caída antes de usarla.
+        """
+        if self.replicas and not self.lee_de_primaria(cliente):
+            for _ in range(len(self.replicas)):
+                indice = self.elegir_replica()
+                if indice is None:
+                    break
+                session = crear_sesion_lectura(self.replicas[indice])
+                try:
+                    session.connection()
+                    session.info["replica"] = indice
+                    return session
+                except DBAPIError:
+                    session.close()
+                    self.marcar_caida(indice)
+        return crear_sesion_lectura(self.primaria)
+
+    def sesion_escritura(self, cliente: Optional[str] = None) -> Session:
+        """Abre una sesión sobre la primaria que registra la escritura al hacer commit."""
+        session = Session(self.primaria)
+        if self.replicas:
+            event.listen(session, "after_commit", lambda s: self.marcar_escritura(cliente))
+        return session
+
+
+enrutador = EnrutadorSesiones(
+    engine,
+    [crear_engine_bd(url) for url in settings.replica_urls],
+    estrategia=settings.replica_estrategia,
+    ventana_lectura_propia=settings.replica_ventana_lectura_propia,
+    enfriamiento=settings.replica_enfriamiento,
 )
 
 
+def observar_engines(observador: Callable) -> None:
+    """
+    Llama a `observador(engine)` con la primaria y cada réplica del enrutador actual
+    y de los que se creen después, para instrumentar solo los engines de la aplicación.
+    """
+    _observadores_engine.append(observador)
+    for engine_enrutado in enrutador.engines():
+        observador(engine_enrutado)
+
+
+def insert_ignorando_duplicados(modelo, session: Session):
+    """
+    INSERT que ignora las filas que violan una restricción única
+    (ON CONFLICT DO NOTHING en SQLite y PostgreSQL, INSERT IGNORE en MySQL).
+    Permite repetir inserciones sin error, por ejemplo al reaplicar un journal.
+
+    Se construye sobre la tabla (Core) y no sobre el modelo: el INSERT ORM pasa por
+    el camino de inserción masiva del ORM, que no reutiliza la sentencia compilada.
+    """
+    tabla = modelo.__table__
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(tabla).on_conflict_do_nothing()
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        return insert(tabla).prefix_with("IGNORE")
+    from sqlalchemy.dialects.sqlite import insert
+    return insert(tabla).on_conflict_do_nothing()
+
+
+def insert_o_actualizar(modelo, session: Session, claves: Sequence[str], excluir: Sequence[str] = (), donde=None):
+    """
+    INSERT que, si la fila choca con la restricción única formada por `claves`,
+    actualiza la fila existente con los valores nuevos (upsert).
+    Las columnas en `excluir` (además de la clave primaria) no se sobrescriben.
+    Si la tabla tiene columna `version`, la fila actualizada la incrementa.
+    Si el índice único es parcial, `donde` es su condición (SQLite y PostgreSQL la exigen).
+    """
+    tabla = modelo.__table__
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        sentencia = insert(tabla)
+        valores = {
+            c.name: sentencia.inserted[c.name] for c in tabla.columns
+            if not c.primary_key and c.name not in claves and c.name not in excluir
+        }
+        if "version" in tabla.c:
+            valores["version"] = tabla.c.version + 1
+        return sentencia.on_duplicate_key_update(valores)
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    sentencia = insert(tabla)
+    valores = {
+        c.name: sentencia.excluded[c.name] for c in tabla.columns
+        if not c.primary_key and c.name not in claves and c.name not in excluir
+    }
+    if "version" in tabla.c:
+        valores["version"] = tabla.c.version + 1
+    return sentencia.on_conflict_do_update(index_elements=list(claves), index_where=donde, set_=valores)
+
+
+def actualizar_con_version(session: Session, modelo, id_registro: int, cambios: dict, version: Optional[int] = None):
+    """
+    Actualiza un registro con un solo UPDATE ... RETURNING e incrementa su versión.
+
+    Con `version`, solo se actualiza si la versión guardada coincide (bloqueo optimista).
+    El cambio queda en el registro de cambios, en la misma transacción.
+
+    Returns:
+        La fila actualizada, o None si no existe el registro (o está eliminado) o la
+        versión no coincide
+    """
+    tabla = modelo.__table__
+    statement = update(tabla).where(tabla.c.id == id_registro)
+    if "fecha_eliminacion" in tabla.c:
+        statement = statement.where(tabla.c.fecha_eliminacion.is_(None))
+    if version is not None:
+        statement = statement.where(tabla.c.version == version)
+    statement = statement.values(**cambios, version=tabla.c.version + 1).returning(*tabla.c)
+    fila = session.exec(statement).first()
+    if fila is not None:
+        anotar_cambios(session, tabla.name, UPDATE, [fila._mapping])
+    return fila
+
+
+def obtener_vivo(session: Session, modelo, id_registro: int):
+    """Como session.get, pero retorna None si el usuario o la película está eliminado."""
+    registro = session.get(modelo, id_registro)
+    if registro is None or registro.fecha_eliminacion is not None:
+        return None
+    return registro
+
+
+def marcar_eliminado(session: Session, modelo, id_registro: int):
+    """
+    Borrado lógico: llena `fecha_eliminacion` con un solo UPDATE ... RETURNING e
+    incrementa la versión. Para el registro de cambios es el borrado ("delete"); la
+    fila y sus favoritos se borran después, en la compactación (app/purga.py).
+
+    Returns:
+        La fila eliminada, o None si no existe o ya estaba eliminada
+    """
+    tabla = modelo.__table__
+    fila = session.exec(
+        update(tabla)
+        .where(tabla.c.id == id_registro, tabla.c.fecha_eliminacion.is_(None))
+        .values(fecha_eliminacion=datetime.now(), version=tabla.c.version + 1)
+        .returning(*tabla.c)
+    ).first()
+    if fila is not None:
+        anotar_cambios(session, tabla.name, DELETE, [fila._mapping])
+    return fila
+
+
+def etag_de_version(version: int) -> str:
+    """Valor del encabezado ETag para una versión de un registro."""
+    return f'"{version}"'
+
+
+def version_de_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Extrae la versión esperada del encabezado If-Match.
+    Retorna None si el encabezado no viene o es "*" (sin precondición).
+
+    Raises:
+        ValueError: Si el valor no es un ETag emitido por la API
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    valor = if_match.strip()
+    if valor.startswith("W/"):
+        valor = valor[2:]
+    return int(valor.strip('"'))
+
+
 # TODO: Función para crear todas las tablas
 def create_db_and_tables():
     """
@@ -42,11 +421,49 @@ def drop_db_and_tables():
     print("Tablas de la base de datos eliminadas")
 
 
+def rellenar_columnas_busqueda(session: Session) -> int:
+    """
+    Calcula las columnas de búsqueda (título y director normalizados, slug) de las
+    películas que no las tienen, por ejemplo en una base creada antes de que existieran.
+
+    Returns:
+        int: Cantidad de películas actualizadas
+    """
+    from app.models import Pelicula, columnas_busqueda
+
+    tabla = Pelicula.__table__
+    filas = session.exec(
+        select(tabla.c.id, tabla.c.titulo, tabla.c.director, tabla.c.año)
+        .where(or_(tabla.c.slug.is_(None), tabla.c.slug == ""))
+    ).all()
+    if filas:
+        session.connection().execute(
+            update(tabla).where(tabla.c.id == bindparam("id_pelicula")),
+            [{"id_pelicula": fila.id, **columnas_busqueda(fila._mapping)} for fila in filas]
+        )
+        session.commit()
+    return len(filas)
+
+
+def identificar_cliente(request: Request) -> str:
+    """
+    Identifica al cliente para la lectura de sus propias escrituras.
+    Usa el encabezado X-Cliente-Id si viene, o la IP de origen.
+    """
+    cliente = request.headers.get("x-cliente-id")
+    if cliente:
+        return cliente
+    return request.client.host if request.client else "anonimo"
+
+
 # Obtener una sesión de base de datos
-def get_session() -> Generator[Session, None, None]:
+def get_session(request: Request) -> Generator[Session, None, None]:
     """
     Generador de sesiones de base de datos.
     Se usa como dependencia en los endpoints de FastAPI.
+
+    Las peticiones GET y HEAD reciben una sesión de solo lectura, sobre una
+    réplica si hay réplicas configuradas; el resto usa la primaria.
     
     Uso en endpoints:
         @app.get("/items")
@@ -54,7 +471,22 @@ def get_session() -> Generator[Session, None, None]:
             items = session.exec(select(Item)).all()
             return items
     """
-    with Session(engine) as session:
+    cliente = identificar_cliente(request)
+    if request.method in ("GET", "HEAD"):
+        session = enrutador.sesion_lectura(cliente)
+    else:
+        session = enrutador.sesion_escritura(cliente)
+
+    with session:
+        yield session
+
+
+def get_session_lectura(request: Request) -> Generator[Session, None, None]:
+    """
+    Sesión de solo lectura para endpoints POST que solo consultan (por ejemplo, cuando
+    los parámetros no caben en la URL). Se enruta como un GET.
+    """
+    with enrutador.sesion_lectura(identificar_cliente(request)) as session:
         yield session
 
 
@@ -94,19 +526,22 @@ class DatabaseSession:
         self.session.close()
 
 
-# TODO: Opcional - Función para inicializar datos de prueba
-def init_sample_data():
+# Función para inicializar datos de prueba
+def init_sample_data(usuarios: int = 5, peliculas: int = 10, favoritos: int = 15, semilla: int = 42):
     """
     Inicializa la base de datos con datos de prueba.
     Útil para desarrollo y testing.
+
+    Solo carga datos si la tabla de usuarios está vacía. Los datos se generan con
+    app.datos_sinteticos, así que la misma semilla produce siempre los mismos registros;
+    para volúmenes grandes usar directamente `python -m app.datos_sinteticos`.
     """
-    # TODO: Crear usuarios, películas y favoritos de ejemplo
-    # with Session(engine) as session:
-    #     # Crear usuarios de ejemplo
-    #     if not session.exec(select(Usuario)).first():
-    #         usuarios = [...]
-    #         for usuario in usuarios:
-    #             session.add(usuario)
-    #         session.commit()
-    pass
+    from app.models import Usuario
+    from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos
+
+    with Session(engine) as session:
+        if session.exec(select(Usuario)).first():
+            return None
 
+    generador = GeneradorDatos(usuarios=usuarios, peliculas=peliculas, favoritos=favoritos, semilla=semilla)
+    return cargar_datos_sinteticos(engine, generador)
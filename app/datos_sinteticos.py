@@ -0,0 +1,309 @@
+"""
+Generador determinista de datos sintéticos a gran escala.
+Produce usuarios, películas y favoritos con distribuciones realistas:
+- Popularidad de películas tipo Zipf (pocas películas concentran muchos favoritos)
+- Cantidad de favoritos por usuario con cola pesada (Pareto)
+- Mezclas de géneros ponderadas y directores con filmografías desiguales
+
+Uso desde código:
+    generador = GeneradorDatos(usuarios=100_000, peliculas=50_000, favoritos=2_000_000, semilla=7)
+    cargar_datos_sinteticos(engine, generador)
+
+Uso desde la línea de comandos:
+    python -m app.datos_sinteticos peliculas_grande.db --usuarios 100000 --peliculas 50000 --favoritos 2000000
+"""
+
+import argparse
+import itertools
+import random
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event, func, insert
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.models import Usuario, Pelicula, Favorito
+
+
+NOMBRES = [
+    "María", "José", "Ana", "Juan", "Lucía", "Carlos", "Sofía", "Andrés", "Valentina", "Camilo",
+    "Laura", "Santiago", "Isabel", "Mateo", "Daniela", "Sebastián", "Paula", "Felipe", "Mariana", "Tomás",
+]
+APELLIDOS = [
+    "García", "Pérez", "Martínez", "Rodríguez", "Fernández", "López", "Gómez", "Díaz", "Muñoz", "Chamorro",
+    "Ramírez", "Torres", "Vargas", "Castro", "Ortiz", "Rojas", "Jiménez", "Herrera", "Moreno", "Suárez",
+]
+SUSTANTIVOS = [
+    "El Señor", "La Noche", "El Camino", "La Ciudad", "El Silencio", "La Memoria", "El Viaje", "La Canción",
+    "El Laberinto", "La Sombra", "El Secreto", "La Pasión", "El Último Tren", "La Isla", "El Regreso",
+    "La Frontera", "El Jardín", "La Tormenta", "El Espejo", "La Promesa", "El Invierno", "La Huida",
+    "El Guardián", "La Máscara", "El Océano", "La Estación", "El Corazón", "La Herencia", "El Eclipse",
+    "La Leyenda", "El Faro", "La Carta",
+]
+COMPLEMENTOS = [
+    "Eterna", "de los Anillos", "sin Fin", "Perdida", "del Sur", "de Medianoche", "Interestelar",
+    "de Cristal", "Salvaje", "de Papel", "Oculta", "del Tiempo", "de Fuego", "Prohibida", "del Norte",
+    "de Hierro", "Dorada", "en la Niebla", "Infinita", "de las Estrellas", "Rota", "del Desierto",
+    "Silenciosa", "de Plata", "Imposible", "del Mar", "Olvidada", "de Invierno", "Brillante", "del Abismo",
+]
+SECUELAS = ["", " II", " III", " IV", " V"]
+GENEROS = [
+    ("Drama", 30), ("Comedia", 20), ("Acción", 18), ("Thriller", 12), ("Romance", 10), ("Ciencia Ficción", 9),
+    ("Terror", 8), ("Animación", 7), ("Aventura", 7), ("Crimen", 6), ("Fantasía", 5), ("Documental", 4),
+    ("Musical", 2), ("Western", 1),
+]
+CLASIFICACIONES = [("G", 8), ("PG", 20), ("PG-13", 38), ("R", 30), ("NC-17", 4)]
+MAX_FAVORITOS_USUARIO = 20000
+
+
+def _sin_acentos(texto: str) -> str:
+    normalizado = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in normalizado if not unicodedata.combining(c))
+
+
+def _acumulados(pesos: List[float]) -> List[float]:
+    return list(itertools.accumulate(pesos))
+
+
+class GeneradorDatos:
+    """
+    Generador determinista: la misma semilla produce exactamente las mismas filas.
+
+    Los IDs se asignan de forma explícita a partir de los desplazamientos indicados,
+    de modo que los favoritos referencian usuarios y películas generados.
+    Las fechas se calculan relativas a `referencia` (por defecto, el momento
+    de creación del generador); fijarla hace que las fechas también sean reproducibles.
+    """
+
+    def __init__(
+        self,
+        usuarios: int = 1000,
+        peliculas: int = 1000,
+        favoritos: int = 10000,
+        semilla: int = 42,
+        zipf_s: float = 1.07,
+        pareto_alfa: float = 1.3,
+        referencia: Optional[datetime] = None,
+        desplazamiento_usuarios: int = 0,
+        desplazamiento_peliculas: int = 0,
+    ):
+        self.usuarios = usuarios
+        self.peliculas = peliculas
+        self.favoritos = favoritos
+        self.semilla = semilla
+        self.zipf_s = zipf_s
+        self.pareto_alfa = pareto_alfa
+        self.referencia = referencia or datetime.now()
+        self.desplazamiento_usuarios = desplazamiento_usuarios
+        self.desplazamiento_peliculas = desplazamiento_peliculas
+
+    def _rng(self, flujo: str) -> random.Random:
+        # Un generador independiente por tipo de fila: cambiar el número de
+        # películas no altera los usuarios generados, y viceversa
+        return random.Random(f"{self.semilla}:{flujo}")
+
+    def iter_usuarios(self) -> Iterator[Dict]:
+        """Genera las filas de usuario como diccionarios listos para insertar."""
+        rng = self._rng("usuarios")
+        for i in range(1, self.usuarios + 1):
+            id_usuario = self.desplazamiento_usuarios + i
+            nombre = rng.choice(NOMBRES)
+            apellido = rng.choice(APELLIDOS)
+            local = _sin_acentos(f"{nombre}.{apellido}").lower()
+            yield {
+                "id": id_usuario,
+                "nombre": f"{nombre} {apellido}",
+                "correo": f"{local}{id_usuario}@ejemplo.com",
+                "fecha_registro": self.referencia - timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60)),
+            }
+
+    def iter_peliculas(self) -> Iterator[Dict]:
+        """
+        Genera las filas de película.
+        Los títulos combinan sustantivo, complemento y número de secuela sin repetirse;
+        los directores siguen una distribución Zipf (pocos directores muy prolíficos).
+        """
+        rng = self._rng("peliculas")
+        combinaciones = len(SUSTANTIVOS) * len(COMPLEMENTOS)
+        orden = list(range(combinaciones))
+        rng.shuffle(orden)
+
+        directores = [f"{n} {a}" for n in NOMBRES for a in APELLIDOS]
+        rng.shuffle(directores)
+        acumulado_directores = _acumulados([1 / (k ** 1.2) for k in range(1, len(directores) + 1)])
+        nombres_genero = [g for g, _ in GENEROS]
+        pesos_genero = [p for _, p in GENEROS]
+        nombres_clasificacion = [c for c, _ in CLASIFICACIONES]
+        acumulado_clasificacion = _acumulados([p for _, p in CLASIFICACIONES])
+
+        for i in range(self.peliculas):
+            id_pelicula = self.desplazamiento_peliculas + i + 1
+            indice = self.desplazamiento_peliculas + i
+            combinacion = orden[indice % combinaciones]
+            vuelta = indice // combinaciones
+            titulo = f"{SUSTANTIVOS[combinacion // len(COMPLEMENTOS)]} {COMPLEMENTOS[combinacion % len(COMPLEMENTOS)]}"
+            titulo += SECUELAS[vuelta % len(SECUELAS)]
+            if vuelta >= len(SECUELAS):
+                titulo += f" ({vuelta // len(SECUELAS) + 1})"
+
+            cantidad_generos = rng.choices((1, 2, 3), weights=(55, 35, 10))[0]
+            generos: List[str] = []
+            while len(generos) < cantidad_generos:
+                genero = rng.choices(nombres_genero, weights=pesos_genero)[0]
+                if genero not in generos:
+                    generos.append(genero)
+
+            yield {
+                "id": id_pelicula,
+                "titulo": titulo,
+                "director": rng.choices(directores, cum_weights=acumulado_directores)[0],
+                "genero": ", ".join(generos),
+                "duracion": max(60, min(240, int(rng.gauss(110, 22)))),
+                "año": min(2025, max(1920, int(2025 - rng.expovariate(1 / 18)))),
+                "clasificacion": rng.choices(nombres_clasificacion, cum_weights=acumulado_clasificacion)[0],
+                "sinopsis": f"{titulo}: una historia de {generos[0].lower()} dirigida por un autor reconocido.",
+                "fecha_creacion": self.referencia - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+            }
+
+    def cantidades_por_usuario(self) -> List[int]:
+        """
+        Calcula cuántos favoritos tendrá cada usuario (cola pesada tipo Pareto).
+        Se escalan para sumar aproximadamente `favoritos` y nunca superan
+        la mitad del catálogo ni MAX_FAVORITOS_USUARIO.
+        """
+        if self.usuarios == 0 or self.peliculas == 0:
+            return [0] * self.usuarios
+        rng = self._rng("cantidades")
+        pesos = [rng.paretovariate(self.pareto_alfa) for _ in range(self.usuarios)]
+        escala = self.favoritos / sum(pesos)
+        tope = max(1, min(self.peliculas // 2, MAX_FAVORITOS_USUARIO))
+        return [min(tope, int(p * escala + rng.random())) for p in pesos]
+
+    def iter_favoritos(self) -> Iterator[Dict]:
+        """
+        Genera las filas de favorito sin pares (usuario, película) repetidos.
+        La película de cada favorito se elige con popularidad Zipf sobre un orden
+        aleatorio del catálogo, para que la popularidad no dependa del ID.
+        """
+        if self.peliculas == 0:
+            return
+        rng = self._rng("favoritos")
+        ranking = list(range(self.desplazamiento_peliculas + 1, self.desplazamiento_peliculas + self.peliculas + 1))
+        rng.shuffle(ranking)
+        acumulado = _acumulados([1 / (k ** self.zipf_s) for k in range(1, self.peliculas + 1)])
+        ventana = timedelta(days=365)
+
+        for i, cantidad in enumerate(self.cantidades_por_usuario(), start=1):
+            id_usuario = self.desplazamiento_usuarios + i
+            elegidas = set()
+            for _ in range(4):
+                if len(elegidas) >= cantidad:
+                    break
+                elegidas.update(rng.choices(ranking, cum_weights=acumulado, k=cantidad - len(elegidas)))
+            # La cola de Zipf casi nunca sale: se completa con muestreo uniforme
+            while len(elegidas) < cantidad:
+                elegidas.add(ranking[rng.randrange(self.peliculas)])
+            for pelicula in sorted(elegidas):
+                yield {
+                    "id_usuario": id_usuario,
+                    "id_pelicula": pelicula,
+                    "fecha_marcado": self.referencia - rng.random() * ventana,
+                }
+
+
+def _en_lotes(filas: Iterator[Dict], tamaño: int) -> Iterator[List[Dict]]:
+    while True:
+        lote = list(itertools.islice(filas, tamaño))
+        if not lote:
+            return
+        yield lote
+
+
+def cargar_datos_sinteticos(engine, generador: GeneradorDatos, tamaño_lote: int = 20000) -> Dict[str, int]:
+    """
+    Inserta los datos del generador usando inserciones masivas (executemany) por lotes.
+    Los IDs del generador se desplazan para no chocar con filas ya existentes.
+
+    Returns:
+        dict: Cantidad de filas insertadas por tabla
+    """
+    SQLModel.metadata.create_all(engine)
+    totales = {"usuarios": 0, "peliculas": 0, "favoritos": 0}
+
+    with Session(engine) as session:
+        generador.desplazamiento_usuarios = session.exec(select(func.coalesce(func.max(Usuario.id), 0))).one()
+        generador.desplazamiento_peliculas = session.exec(select(func.coalesce(func.max(Pelicula.id), 0))).one()
+
+        for modelo, filas, clave in (
+            (Usuario, generador.iter_usuarios(), "usuarios"),
+            (Pelicula, generador.iter_peliculas(), "peliculas"),
+            (Favorito, generador.iter_favoritos(), "favoritos"),
+        ):
+            for lote in _en_lotes(filas, tamaño_lote):
+                session.connection().execute(insert(modelo.__table__), lote)
+                totales[clave] += len(lote)
+            session.commit()
+
+    return totales
+
+
+def generar_archivo_sqlite(ruta: str, generador: GeneradorDatos, tamaño_lote: int = 50000) -> Dict[str, int]:
+    """
+    Produce un archivo SQLite listo para usar con los datos del generador.
+    Durante la carga desactiva el journal y la sincronización a disco, algo
+    seguro aquí porque si la carga falla el archivo simplemente se descarta.
+    """
+    engine = create_engine(f"sqlite:///{ruta}")
+
+    @event.listens_for(engine, "connect")
+    def _pragmas_carga(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+    try:
+        return cargar_datos_sinteticos(engine, generador, tamaño_lote)
+    finally:
+        engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.datos_sinteticos",
+        description="Genera un archivo SQLite con datos sintéticos a gran escala"
+    )
+    parser.add_argument("ruta", help="Archivo SQLite a crear o completar")
+    parser.add_argument("--usuarios", type=int, default=10000)
+    parser.add_argument("--peliculas", type=int, default=10000)
+    parser.add_argument("--favoritos", type=int, default=200000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--zipf", type=float, default=1.07, help="Exponente de popularidad Zipf")
+    parser.add_argument("--pareto", type=float, default=1.3, help="Alfa de favoritos por usuario")
+    parser.add_argument("--lote", type=int, default=50000, help="Filas por inserción masiva")
+    args = parser.parse_args(argv)
+
+    generador = GeneradorDatos(
+        usuarios=args.usuarios,
+        peliculas=args.peliculas,
+        favoritos=args.favoritos,
+        semilla=args.semilla,
+        zipf_s=args.zipf,
+        pareto_alfa=args.pareto,
+    )
+    inicio = time.perf_counter()
+    totales = generar_archivo_sqlite(args.ruta, generador, args.lote)
+    duracion = time.perf_counter() - inicio
+
+    filas = sum(totales.values())
+    print(
+        f"{args.ruta}: {totales['usuarios']} usuarios, {totales['peliculas']} películas, "
+        f"{totales['favoritos']} favoritos en {duracion:.1f}s ({filas / duracion:,.0f} filas/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
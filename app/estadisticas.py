@@ -0,0 +1,233 @@
+"""
+Estadísticas generales de la plataforma y su difusión en vivo (Server-Sent Events).
+
+GET /api/estadisticas/stream mantiene abierta una conexión por cliente, pero las
+consultas de agregación se hacen una sola vez por proceso y el resultado se reparte
+a todos los clientes conectados (`DifusorEstadisticas`):
+
+- Los cambios de usuarios, películas y favoritos llegan por el canal de invalidación
+  y despiertan al difusor de inmediato. Además, cada `sondeo` segundos compara el
+  último número de secuencia del registro de cambios, para enterarse también de lo
+  que escriben otros workers.
+- Entre dos cálculos pasan al menos `intervalo_minimo` segundos: una ráfaga de
+  cambios se resume en un solo cálculo y un solo envío (coalescencia).
+- Solo se envía cuando el resultado cambió. Si un cliente es lento, su cola guarda
+  únicamente el último resultado; nunca recibe una fila de eventos atrasados.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Optional, Set
+
+from sqlalchemy import and_, func
+from sqlmodel import Session, select
+
+from app import database
+from app.config import settings
+from app.estado import canal_invalidacion
+from app.models import Cambio, Favorito, Pelicula, Usuario, vivos
+
+logger = logging.getLogger(__name__)
+
+CANALES = ("usuarios", "peliculas", "favoritos")
+
+
+def calcular_estadisticas(session: Session) -> dict:
+    """
+    Totales de usuarios, películas y favoritos, película más popular y usuario más activo.
+    """
+    # Los usuarios y películas eliminados (y sus favoritos) no cuentan hasta la compactación
+    total_usuarios = session.exec(select(func.count(Usuario.id)).where(vivos(Usuario))).one()
+    total_peliculas = session.exec(select(func.count(Pelicula.id)).where(vivos(Pelicula))).one()
+    total_favoritos = session.exec(
+        select(func.count(Favorito.id))
+        .join(Usuario, Usuario.id == Favorito.id_usuario)
+        .join(Pelicula, Pelicula.id == Favorito.id_pelicula)
+        .where(vivos(Usuario), vivos(Pelicula))
+    ).one()
+
+    statement_pelicula = (
+        select(Pelicula, func.count(Usuario.id).label("count"))
+        .outerjoin(Favorito, Pelicula.id == Favorito.id_pelicula)
+        .outerjoin(Usuario, and_(Usuario.id == Favorito.id_usuario, vivos(Usuario)))
+        .where(vivos(Pelicula))
+        .group_by(Pelicula.id)
+        .order_by(func.count(Usuario.id).desc())
+        .limit(1)
+    )
+    top_pelicula = session.exec(statement_pelicula).first()
+
+    statement_usuario = (
+        select(Usuario, func.count(Pelicula.id).label("count"))
+        .outerjoin(Favorito, Usuario.id == Favorito.id_usuario)
+        .outerjoin(Pelicula, and_(Pelicula.id == Favorito.id_pelicula, vivos(Pelicula)))
+        .where(vivos(Usuario))
+        .group_by(Usuario.id)
+        .order_by(func.count(Pelicula.id).desc())
+        .limit(1)
+    )
+    top_usuario = session.exec(statement_usuario).first()
+
+    return {
+        "total_usuarios": total_usuarios,
+        "total_peliculas": total_peliculas,
+        "total_favoritos": total_favoritos,
+        "pelicula_mas_popular": top_pelicula[0].titulo if top_pelicula and top_pelicula[1] > 0 else "Ninguna",
+        "usuario_mas_activo": top_usuario[0].nombre if top_usuario and top_usuario[1] > 0 else "Ninguno"
+    }
+
+
+def formato_sse(evento: str, datos: dict, id_evento: Optional[int] = None) -> str:
+    """Serializa un evento en el formato text/event-stream."""
+    lineas = [f"event: {evento}"]
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"data: {json.dumps(datos, ensure_ascii=False)}")
+    return "\n".join(lineas) + "\n\n"
+
+
+class DifusorEstadisticas:
+    """
+    Calcula las estadísticas una vez y las reparte a todos los clientes conectados.
+    La tarea de cálculo corre solo mientras haya al menos un cliente.
+    """
+
+    def __init__(self, intervalo_minimo: float = 1.0, sondeo: float = 2.0, heartbeat: float = 15.0):
+        self.intervalo_minimo = intervalo_minimo
+        self.sondeo = sondeo
+        self.heartbeat = heartbeat
+
+        self._clientes: Set[asyncio.Queue] = set()
+        self._tarea: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._despertar: Optional[asyncio.Event] = None
+        self._secuencia: Optional[int] = None
+        self.ultimo: Optional[dict] = None
+        self.calculos = 0
+        self.envios = 0
+
+    @property
+    def clientes(self) -> int:
+        return len(self._clientes)
+
+    def suscribir_canales(self) -> None:
+        for canal in CANALES:
+            canal_invalidacion.suscribir(canal, self._en_cambio)
+
+    def desuscribir_canales(self) -> None:
+        for canal in CANALES:
+            canal_invalidacion.desuscribir(canal, self._en_cambio)
+
+    def _en_cambio(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        # Llega desde el hilo de la petición que confirmó el cambio
+        loop, despertar = self._loop, self._despertar
+        if loop is not None and despertar is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(despertar.set)
+
+    # ------------------------------------------------------------------
+    # Clientes
+    # ------------------------------------------------------------------
+
+    async def conectar(self) -> asyncio.Queue:
+        """Registra un cliente; su cola recibe de inmediato el último resultado conocido."""
+        cola: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._clientes.add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._loop = asyncio.get_running_loop()
+            self._despertar = asyncio.Event()
+            self._tarea = asyncio.create_task(self._ejecutar())
+        if self.ultimo is not None:
+            cola.put_nowait(self.ultimo)
+        return cola
+
+    def desconectar(self, cola: asyncio.Queue) -> None:
+        self._clientes.discard(cola)
+        if not self._clientes:
+            self.detener()
+
+    def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    def _difundir(self, datos: dict) -> None:
+        self.ultimo = datos
+        self.envios += 1
+        for cola in list(self._clientes):
+            if cola.full():
+                cola.get_nowait()  # el cliente no leyó el anterior: solo importa el más reciente
+            cola.put_nowait(datos)
+
+    async def eventos(self, request):
+        """
+        Generador de eventos SSE para un cliente. Envía un comentario cada
+        `heartbeat` segundos sin cambios para mantener viva la conexión.
+        """
+        cola = await self.conectar()
+        try:
+            while True:
+                try:
+                    datos = await asyncio.wait_for(cola.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                yield formato_sse("estadisticas", datos, datos["secuencia"])
+        finally:
+            self.desconectar(cola)
+
+    # ------------------------------------------------------------------
+    # Cálculo compartido
+    # ------------------------------------------------------------------
+
+    async def _ejecutar(self) -> None:
+        ultimo_calculo = 0.0
+        while self._clientes:
+            espera = ultimo_calculo + self.intervalo_minimo - time.monotonic()
+            if espera > 0:
+                # Los cambios que lleguen mientras tanto se atienden con un solo cálculo
+                await asyncio.sleep(espera)
+            self._despertar.clear()
+            ultimo_calculo = time.monotonic()
+            try:
+                datos = await asyncio.to_thread(self._calcular_si_cambio)
+            except Exception:
+                logger.exception("Error al calcular las estadísticas en vivo")
+                datos = None
+            if datos is not None:
+                self._difundir(datos)
+
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=self.sondeo)
+            except asyncio.TimeoutError:
+                pass
+
+    def _calcular_si_cambio(self) -> Optional[dict]:
+        """
+        Recalcula si el registro de cambios avanzó desde el último cálculo.
+        Retorna el nuevo resultado, o None si no cambió nada visible.
+        """
+        with database.enrutador.sesion_lectura() as session:
+            secuencia = session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+            if secuencia == self._secuencia and self.ultimo is not None:
+                return None
+            estadisticas = calcular_estadisticas(session)
+        self.calculos += 1
+        self._secuencia = secuencia
+
+        anterior = dict(self.ultimo or {})
+        anterior.pop("secuencia", None)
+        if estadisticas == anterior:
+            return None
+        return {"secuencia": secuencia, **estadisticas}
+
+
+difusor_estadisticas = DifusorEstadisticas(
+    intervalo_minimo=settings.estadisticas_intervalo_minimo,
+    sondeo=settings.estadisticas_sondeo,
+    heartbeat=settings.estadisticas_heartbeat,
+)
+difusor_estadisticas.suscribir_canales()
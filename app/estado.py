@@ -0,0 +1,246 @@
+"""
+Estado por proceso y canal de invalidación entre procesos.
+
+Cuando la API corre con varios workers (python -m app.lanzador --workers N),
+cada proceso tiene su propia memoria. Por eso el estado se divide en:
+
+- **Estado por proceso**: cachés, índices en memoria y contadores. Son rápidos
+  pero cada worker tiene su copia, así que nunca son la fuente de verdad.
+- **Estado compartido**: la base de datos. Todo lo que deba ser consistente entre
+  workers se lee o escribe allí.
+
+Para que las cachés por proceso no diverjan, cada cambio se anuncia en el
+`canal_invalidacion`: quien publica notifica de inmediato a los suscriptores de su
+propio proceso y, si el canal está conectado a una base de datos, deja el mensaje en
+una tabla que los demás workers consultan periódicamente (un pub/sub sencillo
+respaldado por SQLite o PostgreSQL).
+
+Uso:
+    canal_invalidacion.suscribir("peliculas", lambda clave, datos: cache.pop(clave, None))
+    canal_invalidacion.publicar("peliculas", str(pelicula.id))
+
+Quien prefiera procesar juntos los mensajes de una misma transacción (o de un mismo
+sondeo) se suscribe con `suscribir_lote`: recibe la lista de tuplas (canal, clave, datos).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, delete, func, insert, select
+
+
+logger = logging.getLogger(__name__)
+
+# Identificador único de este proceso (el PID puede reutilizarse entre reinicios)
+ID_PROCESO = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Callback de suscripción: recibe la clave invalidada (None = todo el canal) y datos opcionales
+Suscriptor = Callable[[Optional[str], Optional[dict]], None]
+# Callback de suscripción por lotes: recibe los mensajes (canal, clave, datos) publicados juntos
+SuscriptorLote = Callable[[List[tuple]], None]
+
+# La tabla vive en su propio MetaData: es infraestructura del canal, no parte del modelo de datos
+metadata_estado = MetaData()
+
+tabla_invalidacion = Table(
+    "invalidacion",
+    metadata_estado,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("canal", String(100), nullable=False),
+    Column("clave", String(200), nullable=True),
+    Column("datos", Text, nullable=True),
+    Column("origen", String(50), nullable=False),
+    Column("creado", Float, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+
+class CanalInvalidacion:
+    """
+    Pub/sub de invalidaciones, local al proceso y opcionalmente entre procesos.
+
+    Sin conectar, funciona solo dentro del proceso (modo de un solo worker y tests).
+    Con `conectar(engine)`, además persiste cada mensaje y `sondear()` entrega
+    los mensajes publicados por otros procesos.
+    """
+
+    def __init__(self, origen: str = ID_PROCESO):
+        self.origen = origen
+        self._suscriptores: Dict[str, List[Suscriptor]] = defaultdict(list)
+        self._suscriptores_lote: List[Tuple[frozenset, SuscriptorLote]] = []
+        self._engine = None
+        self._ultimo_id = 0
+        self._lock = threading.Lock()
+        self.publicados = 0
+        self.recibidos = 0
+
+    @property
+    def conectado(self) -> bool:
+        return self._engine is not None
+
+    def suscribir(self, canal: str, callback: Suscriptor) -> None:
+        """Registra un callback para los mensajes de un canal."""
+        self._suscriptores[canal].append(callback)
+
+    def desuscribir(self, canal: str, callback: Suscriptor) -> None:
+        """Elimina un callback registrado previamente."""
+        if callback in self._suscriptores.get(canal, []):
+            self._suscriptores[canal].remove(callback)
+
+    def suscribir_lote(self, canales: Iterable[str], callback: SuscriptorLote) -> None:
+        """Registra un callback que recibe juntos los mensajes de los canales indicados."""
+        self._suscriptores_lote.append((frozenset(canales), callback))
+
+    def desuscribir_lote(self, callback: SuscriptorLote) -> None:
+        self._suscriptores_lote = [(c, f) for c, f in self._suscriptores_lote if f != callback]
+
+    def conectar(self, engine) -> None:
+        """
+        Conecta el canal a una base de datos compartida por todos los workers.
+        Solo se reciben mensajes publicados después de conectar.
+        """
+        metadata_estado.create_all(engine)
+        with engine.connect() as conn:
+            self._ultimo_id = conn.execute(
+                select(func.coalesce(func.max(tabla_invalidacion.c.id), 0))
+            ).scalar_one()
+        self._engine = engine
+
+    def desconectar(self) -> None:
+        self._engine = None
+
+    def publicar(self, canal: str, clave: Optional[str] = None, datos: Optional[dict] = None) -> None:
+        """
+        Publica una invalidación.
+        Los suscriptores locales se ejecutan de inmediato; los demás procesos
+        la reciben en su siguiente sondeo.
+
+        Args:
+            canal (str): Nombre del canal (por ejemplo "peliculas")
+            clave (str): Elemento invalidado; None invalida todo el canal
+            datos (dict): Información adicional serializable a JSON
+        """
+        self._despachar(canal, clave, datos)
+        self._despachar_lote([(canal, clave, datos)])
+        self.publicados += 1
+
+        if self._engine is not None:
+            with self._engine.begin() as conn:
+                conn.execute(insert(tabla_invalidacion).values(
+                    canal=canal,
+                    clave=clave,
+                    datos=json.dumps(datos) if datos is not None else None,
+                    origen=self.origen,
+                    creado=time.time(),
+                ))
+
+    def publicar_varios(self, mensajes: List[tuple]) -> None:
+        """
+        Publica varias invalidaciones (tuplas canal, clave, datos) y, si el canal
+        está conectado, las persiste en una sola transacción.
+        """
+        if not mensajes:
+            return
+        for canal, clave, datos in mensajes:
+            self._despachar(canal, clave, datos)
+        self._despachar_lote(mensajes)
+        self.publicados += len(mensajes)
+
+        if self._engine is not None:
+            ahora = time.time()
+            with self._engine.begin() as conn:
+                conn.execute(insert(tabla_invalidacion), [
+                    {
+                        "canal": canal,
+                        "clave": clave,
+                        "datos": json.dumps(datos) if datos is not None else None,
+                        "origen": self.origen,
+                        "creado": ahora,
+                    }
+                    for canal, clave, datos in mensajes
+                ])
+
+    def sondear(self) -> int:
+        """
+        Entrega a los suscriptores locales los mensajes publicados por otros procesos.
+
+        Returns:
+            int: Cantidad de mensajes entregados
+        """
+        if self._engine is None:
+            return 0
+
+        with self._lock:
+            with self._engine.connect() as conn:
+                filas = conn.execute(
+                    select(tabla_invalidacion)
+                    .where(tabla_invalidacion.c.id > self._ultimo_id)
+                    .order_by(tabla_invalidacion.c.id)
+                ).all()
+
+            entregados = []
+            for fila in filas:
+                self._ultimo_id = fila.id
+                if fila.origen == self.origen:
+                    continue
+                datos = json.loads(fila.datos) if fila.datos else None
+                self._despachar(fila.canal, fila.clave, datos)
+                entregados.append((fila.canal, fila.clave, datos))
+            self._despachar_lote(entregados)
+
+            self.recibidos += len(entregados)
+            return len(entregados)
+
+    def purgar(self, antiguedad_segundos: float = 300) -> int:
+        """Elimina mensajes más viejos que la antigüedad indicada."""
+        if self._engine is None:
+            return 0
+        with self._engine.begin() as conn:
+            resultado = conn.execute(
+                delete(tabla_invalidacion).where(tabla_invalidacion.c.creado < time.time() - antiguedad_segundos)
+            )
+            return resultado.rowcount
+
+    async def escuchar(self, intervalo: float = 0.5, purgar_cada: int = 600) -> None:
+        """
+        Tarea de fondo que sondea el canal periódicamente.
+        Se inicia desde el lifespan de la aplicación cuando hay varios workers.
+        """
+        vueltas = 0
+        while True:
+            try:
+                await asyncio.to_thread(self.sondear)
+                vueltas += 1
+                if vueltas % purgar_cada == 0:
+                    await asyncio.to_thread(self.purgar)
+            except Exception:
+                logger.exception("Error al sondear el canal de invalidación")
+            await asyncio.sleep(intervalo)
+
+    def _despachar(self, canal: str, clave: Optional[str], datos: Optional[dict]) -> None:
+        for callback in list(self._suscriptores.get(canal, [])):
+            try:
+                callback(clave, datos)
+            except Exception:
+                logger.exception("Error en suscriptor del canal '%s'", canal)
+
+    def _despachar_lote(self, mensajes: List[tuple]) -> None:
+        for canales, callback in list(self._suscriptores_lote):
+            propios = [mensaje for mensaje in mensajes if mensaje[0] in canales]
+            if not propios:
+                continue
+            try:
+                callback(propios)
+            except Exception:
+                logger.exception("Error en suscriptor por lotes de los canales %s", sorted(canales))
+
+
+# Instancia global usada por toda la aplicación
+canal_invalidacion = CanalInvalidacion()
@@ -0,0 +1,209 @@
+"""
+Cambios de favoritos en vivo por WebSocket (WS /api/favoritos/ws).
+
+Un cliente que muestra los favoritos de uno o más usuarios se suscribe a sus ids y
+recibe cada favorito agregado o quitado, en lugar de volver a pedir la lista completa.
+Los cambios salen del canal "favoritos" (ver app/notificaciones.py), así que llegan
+sin importar por dónde se hicieron: marcar/desmarcar, crear, borrar todos o la cola
+write-behind, y también los de otros workers si el canal está conectado.
+
+Cada conexión tiene una cola acotada. Si un cliente no lee y su cola se llena, se le
+cierra la conexión (código 4008) en lugar de acumular memoria o frenar a los demás;
+el cliente debe reconectarse y volver a leer la lista completa.
+
+Protocolo (JSON):
+    cliente -> {"accion": "suscribir" | "desuscribir", "usuarios": [1, 2]}
+    servidor -> {"tipo": "suscripciones", "usuarios": [1, 2]}
+    servidor -> {"tipo": "favorito", "accion": "agregado" | "eliminado", "id_usuario": 1, "id_pelicula": 7}
+    servidor -> {"tipo": "error", "detalle": "..."}
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.config import settings
+from app.estado import canal_invalidacion
+
+CIERRE_CONSUMIDOR_LENTO = 4008
+
+
+class ConexionFavoritos:
+    """Una conexión WebSocket con su cola de salida y los usuarios a los que está suscrita."""
+
+    def __init__(self, websocket: WebSocket, capacidad: int):
+        self.websocket = websocket
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=capacidad)
+        self.usuarios: Set[int] = set()
+        self.tarea_envio: Optional[asyncio.Task] = None
+        self.descartada = False
+        self.desconectada = False
+
+
+class CentralFavoritos:
+    """
+    Reparte los cambios de favoritos a las conexiones suscritas a cada usuario.
+    Todo el estado se toca solo desde el event loop; los avisos que llegan desde
+    otros hilos se reenvían con call_soon_threadsafe.
+    """
+
+    def __init__(self, capacidad_cola: int = 100, maximo_usuarios: int = 100):
+        self.capacidad_cola = capacidad_cola
+        self.maximo_usuarios = maximo_usuarios
+        self._por_usuario: Dict[int, Set[ConexionFavoritos]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Cierres en curso: el loop solo guarda referencias débiles a las tareas
+        self._cierres: Set[asyncio.Task] = set()
+        self.conexiones = 0
+        self.enviados = 0
+        self.descartadas = 0
+
+    def suscribir_canal(self) -> None:
+        canal_invalidacion.suscribir("favoritos", self._en_favorito)
+
+    def desuscribir_canal(self) -> None:
+        canal_invalidacion.desuscribir("favoritos", self._en_favorito)
+
+    def _en_favorito(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        loop = self._loop
+        if not datos or loop is None or loop.is_closed() or not self.conexiones:
+            return
+        loop.call_soon_threadsafe(self._distribuir, datos)
+
+    # ------------------------------------------------------------------
+    # Distribución (en el event loop)
+    # ------------------------------------------------------------------
+
+    def _distribuir(self, datos: dict) -> None:
+        conexiones = self._por_usuario.get(datos["id_usuario"])
+        if not conexiones:
+            return
+        # Se serializa una vez para todas las conexiones
+        texto = json.dumps({
+            "tipo": "favorito",
+            "accion": datos["accion"],
+            "id_usuario": datos["id_usuario"],
+            "id_pelicula": datos["id_pelicula"],
+        })
+        for conexion in list(conexiones):
+            try:
+                conexion.cola.put_nowait(texto)
+            except asyncio.QueueFull:
+                self._descartar(conexion)
+
+    def _descartar(self, conexion: ConexionFavoritos) -> None:
+        """Cierra una conexión cuya cola se llenó (el cliente no está leyendo)."""
+        if conexion.descartada:
+            return
+        conexion.descartada = True
+        self.descartadas += 1
+        self._quitar_suscripciones(conexion, list(conexion.usuarios))
+        if conexion.tarea_envio is not None:
+            conexion.tarea_envio.cancel()
+        tarea = asyncio.get_running_loop().create_task(self._cerrar(conexion, CIERRE_CONSUMIDOR_LENTO))
+        self._cierres.add(tarea)
+        tarea.add_done_callback(self._cierres.discard)
+
+    async def _cerrar(self, conexion: ConexionFavoritos, codigo: int) -> None:
+        try:
+            await conexion.websocket.close(code=codigo, reason="consumidor lento")
+        except Exception:
+            pass
+
+    def _agregar_suscripciones(self, conexion: ConexionFavoritos, usuarios: Iterable[int]) -> None:
+        for id_usuario in usuarios:
+            if id_usuario in conexion.usuarios:
+                continue
+            if len(conexion.usuarios) >= self.maximo_usuarios:
+                raise ValueError(f"Máximo {self.maximo_usuarios} usuarios por conexión")
+            conexion.usuarios.add(id_usuario)
+            self._por_usuario[id_usuario].add(conexion)
+
+    def _quitar_suscripciones(self, conexion: ConexionFavoritos, usuarios: Iterable[int]) -> None:
+        for id_usuario in usuarios:
+            conexion.usuarios.discard(id_usuario)
+            conexiones = self._por_usuario.get(id_usuario)
+            if conexiones is not None:
+                conexiones.discard(conexion)
+                if not conexiones:
+                    del self._por_usuario[id_usuario]
+
+    def suscriptores(self, id_usuario: int) -> int:
+        return len(self._por_usuario.get(id_usuario, ()))
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida de una conexión
+    # ------------------------------------------------------------------
+
+    async def _enviar(self, conexion: ConexionFavoritos) -> None:
+        while True:
+            texto = await conexion.cola.get()
+            try:
+                await conexion.websocket.send_text(texto)
+            except (WebSocketDisconnect, RuntimeError):
+                # El cliente se fue: no se le encola nada más y la tarea termina sin error
+                conexion.desconectada = True
+                self._quitar_suscripciones(conexion, list(conexion.usuarios))
+                return
+            self.enviados += 1
+
+    async def _responder(self, conexion: ConexionFavoritos, mensaje: dict) -> None:
+        # Las respuestas a comandos pasan por la misma cola para no mezclarse con los envíos
+        try:
+            conexion.cola.put_nowait(json.dumps(mensaje))
+        except asyncio.QueueFull:
+            self._descartar(conexion)
+
+    async def _atender_comando(self, conexion: ConexionFavoritos, mensaje) -> None:
+        if not isinstance(mensaje, dict) or mensaje.get("accion") not in ("suscribir", "desuscribir"):
+            await self._responder(conexion, {"tipo": "error", "detalle": "Acción inválida: use suscribir o desuscribir"})
+            return
+        usuarios = mensaje.get("usuarios")
+        if not isinstance(usuarios, list) or not all(isinstance(u, int) and not isinstance(u, bool) for u in usuarios):
+            await self._responder(conexion, {"tipo": "error", "detalle": "usuarios debe ser una lista de ids"})
+            return
+        try:
+            if mensaje["accion"] == "suscribir":
+                self._agregar_suscripciones(conexion, usuarios)
+            else:
+                self._quitar_suscripciones(conexion, usuarios)
+        except ValueError as error:
+            await self._responder(conexion, {"tipo": "error", "detalle": str(error)})
+            return
+        await self._responder(conexion, {"tipo": "suscripciones", "usuarios": sorted(conexion.usuarios)})
+
+    async def atender(self, websocket: WebSocket, usuarios: Iterable[int] = ()) -> None:
+        """Atiende una conexión desde que se acepta hasta que se cierra."""
+        await websocket.accept()
+        self._loop = asyncio.get_running_loop()
+        conexion = ConexionFavoritos(websocket, self.capacidad_cola)
+        self.conexiones += 1
+        conexion.tarea_envio = asyncio.create_task(self._enviar(conexion))
+        try:
+            usuarios = list(usuarios)
+            if usuarios:
+                await self._atender_comando(conexion, {"accion": "suscribir", "usuarios": usuarios})
+            while not conexion.descartada:
+                texto = await websocket.receive_text()
+                try:
+                    mensaje = json.loads(texto)
+                except ValueError:
+                    mensaje = None
+                await self._atender_comando(conexion, mensaje)
+        except (WebSocketDisconnect, RuntimeError):
+            # RuntimeError: la conexión ya se cerró desde el servidor (consumidor lento)
+            pass
+        finally:
+            self.conexiones -= 1
+            conexion.tarea_envio.cancel()
+            self._quitar_suscripciones(conexion, list(conexion.usuarios))
+
+
+central_favoritos = CentralFavoritos(
+    capacidad_cola=settings.favoritos_ws_capacidad,
+    maximo_usuarios=settings.favoritos_ws_maximo_usuarios,
+)
+central_favoritos.suscribir_canal()
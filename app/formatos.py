@@ -0,0 +1,124 @@
+"""
+Formato negociado de las respuestas de listas y estadísticas.
+
+- **Codificación**, según el encabezado Accept: JSON (por defecto) o MessagePack
+  (`application/msgpack`), si el paquete `msgpack` está instalado. Si no lo está,
+  se responde JSON.
+- **Disposición**, según `?formato=`. Con `filas` (por defecto) se responde una lista
+  de objetos. Con `columnar` se responde `{"cantidad": n, "columnas": {"id": [...], "titulo": [...]}}`.
+  En columnar cada clave va una sola vez y los objetos anidados se aplanan con punto
+  (`"pelicula.titulo"`). Solo aplica a listas.
+
+La compresión (zstd, br, gzip) la agrega después el middleware de app/compresion.py.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import Query, Request, Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import msgpack
+except ImportError:  # dependencia opcional
+    msgpack = None
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+_ALIAS_MSGPACK = frozenset({MEDIA_MSGPACK, "application/x-msgpack", "application/vnd.msgpack"})
+
+FILAS = "filas"
+COLUMNAR = "columnar"
+
+_ADAPTADOR_LIBRE = TypeAdapter(Any)
+
+
+def elegir_media(accept: str) -> str:
+    """Elige JSON o MessagePack según Accept (valores q; a igual q, el primero listado)."""
+    mejor, mejor_q = MEDIA_JSON, 0.0
+    for parte in accept.split(","):
+        media, _, parametros = parte.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for parametro in parametros.split(";"):
+            nombre, _, valor = parametro.strip().partition("=")
+            if nombre == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        if media in _ALIAS_MSGPACK and msgpack is not None:
+            candidata = MEDIA_MSGPACK
+        elif media in (MEDIA_JSON, "application/*", "*/*"):
+            candidata = MEDIA_JSON
+        else:
+            continue
+        if q > mejor_q:
+            mejor, mejor_q = candidata, q
+    return mejor
+
+
+def a_columnas(filas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convierte una lista de objetos en un objeto de columnas (claves una sola vez)."""
+    planas = [_aplanar(fila) for fila in filas]
+    nombres: Dict[str, None] = {}
+    for fila in planas:
+        nombres.update(dict.fromkeys(fila))
+    return {
+        "cantidad": len(planas),
+        "columnas": {nombre: [fila.get(nombre) for fila in planas] for nombre in nombres},
+    }
+
+
+def _aplanar(objeto: Dict[str, Any], prefijo: str = "") -> Dict[str, Any]:
+    plano: Dict[str, Any] = {}
+    for clave, valor in objeto.items():
+        if isinstance(valor, dict):
+            plano.update(_aplanar(valor, f"{prefijo}{clave}."))
+        else:
+            plano[f"{prefijo}{clave}"] = valor
+    return plano
+
+
+@lru_cache(maxsize=None)
+def _adaptador_lista(modelo: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[modelo])
+
+
+class FormatoRespuesta:
+    """Formato elegido para una petición; arma la respuesta con `responder`."""
+
+    def __init__(self, media: str = MEDIA_JSON, disposicion: str = FILAS):
+        self.media = media
+        self.disposicion = disposicion
+
+    def responder(self, datos: Any, modelo: Optional[Type[BaseModel]] = None) -> Response:
+        """
+        Serializa `datos` en el formato elegido. Con `modelo`, `datos` es una lista de
+        objetos (por ejemplo filas del ORM) que se validan y serializan con ese esquema.
+        """
+        if modelo is not None:
+            adaptador = _adaptador_lista(modelo)
+            valores = adaptador.validate_python(datos, from_attributes=True)
+            if self.media == MEDIA_JSON and self.disposicion == FILAS:
+                # Camino común: pydantic-core escribe el JSON directamente
+                return self._respuesta(adaptador.dump_json(valores))
+            datos = adaptador.dump_python(valores, mode="json")
+
+        if self.disposicion == COLUMNAR and isinstance(datos, list):
+            datos = a_columnas(datos)
+        if self.media == MEDIA_MSGPACK:
+            return self._respuesta(msgpack.packb(datos, use_bin_type=True))
+        return self._respuesta(_ADAPTADOR_LIBRE.dump_json(datos))
+
+    def _respuesta(self, contenido: bytes) -> Response:
+        return Response(content=contenido, media_type=self.media, headers={"Vary": "Accept"})
+
+
+def negociar_formato(
+    request: Request,
+    formato: str = Query(FILAS, pattern="^(filas|columnar)$",
+                         description="filas (lista de objetos) o columnar (claves una vez, arreglos de valores)")
+) -> FormatoRespuesta:
+    """Dependencia: formato de la respuesta según Accept y ?formato=."""
+    return FormatoRespuesta(elegir_media(request.headers.get("accept", "")), formato)
@@ -0,0 +1,237 @@
+"""
+Limitación de tasa y descarte de carga (middleware ASGI).
+
+Dos capas, en este orden:
+
+1. **Tasa por cliente y ruta** (token bucket): cada IP tiene una cubeta por método y
+   ruta (con los ids normalizados a `{id}`). Las rutas pesadas tienen tasas propias
+   (`limite_tasas_rutas`). Sin tokens se responde 429 con Retry-After.
+   Se usa la IP y no X-Cliente-Id, porque ese encabezado lo elige el cliente.
+2. **Concurrencia global por proceso** con dos carriles: las escrituras tienen
+   lugares reservados y se atienden antes que las lecturas en espera, así una ola de
+   lecturas pesadas no las deja sin turno. Quien no consigue lugar espera en cola;
+   si la cola está estancada (el primero lleva más de `espera_objetivo`) o la espera
+   supera `espera_maxima`, se responde 503 con Retry-After de inmediato en lugar de
+   acumular hilos y conexiones a la base.
+
+Los sondeos (/health, /) y las preflight CORS no pasan por ninguna capa; las
+conexiones largas (SSE, WebSocket) solo por la de tasa al conectarse, o por
+ninguna. Los límites son por proceso: con N workers, la capacidad total es N veces.
+"""
+
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+LECTURA = "lectura"
+ESCRITURA = "escritura"
+
+METODOS_LECTURA = frozenset({"GET", "HEAD"})
+RUTAS_SONDEO = frozenset({"/health", "/"})
+RUTAS_PERSISTENTES = frozenset({"/api/estadisticas/stream"})
+RUTAS_LECTURA_POST = frozenset({"/api/favoritos/verificar"})  # POST que solo consultan
+
+_SEGMENTO_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def normalizar_ruta(ruta: str) -> str:
+    """/api/usuarios/12/favoritos/7/ -> /api/usuarios/{id}/favoritos/{id}"""
+    return _SEGMENTO_ID.sub("/{id}", ruta).rstrip("/") or "/"
+
+
+class CubetaTokens:
+    """Token bucket: `capacidad` tokens que se recargan a `tasa` por segundo."""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "actualizado")
+
+    def __init__(self, tasa: float, capacidad: float, ahora: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.actualizado = ahora
+
+    def consumir(self, ahora: float) -> float:
+        """Toma un token. Retorna 0 si había, o los segundos hasta que haya uno."""
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+
+class LimitadorConcurrencia:
+    """
+    Semáforo con dos carriles y descarte por tiempo en cola. Solo se usa desde el
+    event loop, así que no necesita locks.
+    """
+
+    def __init__(self, maximo: int, reservadas_escritura: int = 0,
+                 espera_objetivo: float = 0.1, espera_maxima: float = 0.5):
+        self.maximo = maximo
+        self.reservadas_escritura = min(reservadas_escritura, maximo - 1)
+        self.espera_objetivo = espera_objetivo
+        self.espera_maxima = espera_maxima
+        self.en_curso = 0
+        self._colas: Dict[str, deque] = {ESCRITURA: deque(), LECTURA: deque()}
+
+    def _cupo(self, carril: str) -> int:
+        return self.maximo if carril == ESCRITURA else self.maximo - self.reservadas_escritura
+
+    def en_espera(self, carril: str) -> int:
+        return len(self._colas[carril])
+
+    def _hay_lugar(self, carril: str) -> bool:
+        # Una lectura no se adelanta a escrituras que ya esperan
+        if carril == LECTURA and self._colas[ESCRITURA]:
+            return False
+        return not self._colas[carril] and self.en_curso < self._cupo(carril)
+
+    async def adquirir(self, carril: str) -> bool:
+        """Espera un lugar. Retorna False si la petición debe descartarse."""
+        if self._hay_lugar(carril):
+            self.en_curso += 1
+            return True
+
+        cola = self._colas[carril]
+        ahora = time.monotonic()
+        if cola and ahora - cola[0][0] > self.espera_objetivo:
+            # La cola no se está vaciando: esperar solo haría la respuesta más lenta
+            return False
+
+        futuro = asyncio.get_running_loop().create_future()
+        entrada = (ahora, futuro)
+        cola.append(entrada)
+        try:
+            await asyncio.wait((futuro,), timeout=self.espera_maxima)
+        except asyncio.CancelledError:
+            if futuro.done():
+                self.liberar()
+            else:
+                futuro.cancel()
+                cola.remove(entrada)
+            raise
+        if futuro.done():
+            return True
+        futuro.cancel()
+        cola.remove(entrada)
+        return False
+
+    def liberar(self) -> None:
+        self.en_curso -= 1
+        for carril in (ESCRITURA, LECTURA):
+            cola = self._colas[carril]
+            while cola and self.en_curso < self._cupo(carril):
+                _, futuro = cola.popleft()
+                futuro.set_result(True)
+                self.en_curso += 1
+
+
+class LimitadorCarga:
+    """Configuración y estado de las dos capas para un proceso."""
+
+    def __init__(self, tasa: float = 50.0, rafaga: float = 100.0,
+                 tasas_rutas: Optional[Dict[str, float]] = None,
+                 concurrencia: int = 15, reservadas_escritura: int = 3,
+                 espera_objetivo: float = 0.1, espera_maxima: float = 0.5,
+                 maximo_cubetas: int = 10000, habilitado: bool = True):
+        self.habilitado = habilitado
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.tasas_rutas = {normalizar_ruta(r): t for r, t in (tasas_rutas or {}).items()}
+        self.maximo_cubetas = maximo_cubetas
+        self.concurrencia = LimitadorConcurrencia(concurrencia, reservadas_escritura, espera_objetivo, espera_maxima)
+        self._cubetas: "OrderedDict[tuple, CubetaTokens]" = OrderedDict()
+        self.rechazadas_tasa = 0
+        self.rechazadas_carga = 0
+
+    def reiniciar(self) -> None:
+        self._cubetas.clear()
+        self.rechazadas_tasa = 0
+        self.rechazadas_carga = 0
+
+    def consumir(self, cliente: str, metodo: str, ruta: str) -> float:
+        """Toma un token de la cubeta del cliente. Retorna 0 o los segundos a esperar."""
+        ruta = normalizar_ruta(ruta)
+        clave = (cliente, metodo, ruta)
+        ahora = time.monotonic()
+        cubeta = self._cubetas.get(clave)
+        if cubeta is None:
+            tasa = self.tasas_rutas.get(ruta)
+            cubeta = CubetaTokens(tasa, max(1.0, 2 * tasa), ahora) if tasa else CubetaTokens(self.tasa, self.rafaga, ahora)
+            self._cubetas[clave] = cubeta
+            if len(self._cubetas) > self.maximo_cubetas:
+                # La menos usada recientemente; si estaba inactiva, ya estaría llena
+                self._cubetas.popitem(last=False)
+        else:
+            self._cubetas.move_to_end(clave)
+        espera = cubeta.consumir(ahora)
+        if espera:
+            self.rechazadas_tasa += 1
+        return espera
+
+
+def _respuesta_rechazo(codigo: int, detalle: str, segundos: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detalle},
+        status_code=codigo,
+        headers={"Retry-After": str(max(1, math.ceil(segundos)))},
+    )
+
+
+class MiddlewareLimitador:
+    """Middleware ASGI que aplica un `LimitadorCarga` a las peticiones HTTP."""
+
+    def __init__(self, app, limitador: Optional[LimitadorCarga] = None):
+        self.app = app
+        self.limitador = limitador
+
+    async def __call__(self, scope, receive, send):
+        limitador = self.limitador or limitador_carga
+        if (scope["type"] != "http" or not limitador.habilitado
+                or scope["path"] in RUTAS_SONDEO or scope["method"] == "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        cliente = scope["client"][0] if scope.get("client") else "anonimo"
+        espera = limitador.consumir(cliente, scope["method"], scope["path"])
+        if espera:
+            respuesta = _respuesta_rechazo(429, "Demasiadas peticiones; intente más tarde", espera)
+            await respuesta(scope, receive, send)
+            return
+
+        if scope["path"] in RUTAS_PERSISTENTES:
+            await self.app(scope, receive, send)
+            return
+
+        concurrencia = limitador.concurrencia
+        lectura = scope["method"] in METODOS_LECTURA or normalizar_ruta(scope["path"]) in RUTAS_LECTURA_POST
+        carril = LECTURA if lectura else ESCRITURA
+        if not await concurrencia.adquirir(carril):
+            limitador.rechazadas_carga += 1
+            respuesta = _respuesta_rechazo(503, "Servidor sobrecargado; intente más tarde", concurrencia.espera_maxima)
+            await respuesta(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            concurrencia.liberar()
+
+
+limitador_carga = LimitadorCarga(
+    tasa=settings.limite_tasa,
+    rafaga=settings.limite_rafaga,
+    tasas_rutas=settings.limite_tasas_rutas,
+    concurrencia=settings.limite_concurrencia,
+    reservadas_escritura=settings.limite_reservadas_escritura,
+    espera_objetivo=settings.limite_espera_objetivo_ms / 1000,
+    espera_maxima=settings.limite_espera_maxima_ms / 1000,
+    habilitado=settings.limite_habilitado,
+)
@@ -4,22 +4,53 @@ Define la estructura de las tablas de la base de datos.
 SQLModel combina SQLAlchemy con Pydantic para validación automática.
 """
 
+from sqlalchemy import Index, String, Text, UniqueConstraint, cast, func, text
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from datetime import datetime
 
+from utils import generar_slug, normalizar_texto
+
+
+# Borrado lógico: eliminar un usuario o una película solo llena `fecha_eliminacion`
+# y las consultas filtran con `vivos(modelo)`. La compactación (app/purga.py) borra
+# después las filas y sus favoritos. Los índices parciales solo incluyen las filas
+# vivas (o solo las eliminadas), así que las lápidas no ocupan lugar en ellos
+VIVAS = text("fecha_eliminacion IS NULL")
+ELIMINADAS = text("fecha_eliminacion IS NOT NULL")
+
+
+def indice_parcial(nombre: str, *columnas: str, condicion=VIVAS, unique: bool = False) -> Index:
+    """Índice restringido a las filas que cumplen `condicion` (SQLite y PostgreSQL)."""
+    return Index(nombre, *columnas, unique=unique, sqlite_where=condicion, postgresql_where=condicion)
+
+
+def vivos(modelo):
+    """Condición WHERE de las filas no eliminadas de Usuario o Pelicula."""
+    return modelo.__table__.c.fecha_eliminacion.is_(None)
+
 
 class Usuario(SQLModel, table=True):
     """
     Modelo de Usuario.
     Representa a los usuarios registrados en la plataforma.
     """
+    # El correo es único solo entre los usuarios vivos: uno eliminado no impide registrarlo de nuevo
+    __table_args__ = (
+        indice_parcial("ix_usuario_correo", "correo", unique=True),
+        indice_parcial("ix_usuario_eliminados", "fecha_eliminacion", condicion=ELIMINADAS),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nombre: str = Field(max_length=100, index=True)
-    correo: str = Field(unique=True, max_length=150, index=True)
+    correo: str = Field(max_length=150)
     fecha_registro: datetime = Field(default_factory=datetime.now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"}, description="Aumenta en cada actualización")
+    fecha_eliminacion: Optional[datetime] = Field(default=None, exclude=True)
 
-    favoritos: List["Favorito"] = Relationship(back_populates="usuario", cascade_delete=True)
+    # passive_deletes: al borrar el usuario el ORM no carga sus favoritos; los borra
+    # la base (ON DELETE CASCADE) o la compactación de app/purga.py en lotes
+    favoritos: List["Favorito"] = Relationship(back_populates="usuario", cascade_delete=True, passive_deletes=True)
 
     def __repr__(self):
         return f"<Usuario(id={self.id}, nombre={self.nombre}, correo={self.correo})>"
@@ -29,13 +60,41 @@ class Usuario(SQLModel, table=True):
         return len(self.favoritos) if self.favoritos else 0
 
 
+def slug_pelicula(titulo: str, año: int) -> str:
+    """Slug de una película: título y año ("El Padrino", 1972 -> "el-padrino-1972")."""
+    return "-".join(parte for parte in (generar_slug(titulo), str(año)) if parte)
+
+
+# Las columnas de búsqueda se calculan al insertar, tanto con el ORM como con
+# INSERT Core (ON CONFLICT, lotes, datos sintéticos), a partir de los parámetros de la fila
+def _titulo_normalizado(contexto) -> str:
+    return normalizar_texto(contexto.get_current_parameters()["titulo"])
+
+
+def _director_normalizado(contexto) -> str:
+    return normalizar_texto(contexto.get_current_parameters()["director"])
+
+
+def _slug(contexto) -> str:
+    parametros = contexto.get_current_parameters()
+    return slug_pelicula(parametros["titulo"], parametros["año"])
+
+
 class Pelicula(SQLModel, table=True):
     """
     Modelo de Película.
     Representa las películas disponibles en la plataforma.
     """
+    # El índice único compuesto impide duplicados (título, año) entre las películas vivas,
+    # incluso entre inserciones concurrentes, y también sirve a las consultas por título
+    __table_args__ = (
+        indice_parcial("ix_pelicula_titulo_año", "titulo", "año", unique=True),
+        indice_parcial("ix_pelicula_recientes", "fecha_creacion"),
+        indice_parcial("ix_pelicula_eliminadas", "fecha_eliminacion", condicion=ELIMINADAS),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    titulo: str = Field(max_length=200, index=True)
+    titulo: str = Field(max_length=200)
     director: str = Field(max_length=150)
     genero: str = Field(max_length=100)
     duracion: int = Field(description="Duración en minutos")
@@ -43,21 +102,70 @@ class Pelicula(SQLModel, table=True):
     clasificacion: str = Field(max_length=10)
     sinopsis: Optional[str] = Field(default=None, max_length=1000)
     fecha_creacion: datetime = Field(default_factory=datetime.now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"}, description="Aumenta en cada actualización")
+    fecha_eliminacion: Optional[datetime] = Field(default=None, exclude=True)
+
+    # Copias de título y director en minúsculas y sin acentos, para buscar con índice
+    # sin aplicar funciones a la columna. No se exponen ni se envían al insertar (exclude)
+    titulo_normalizado: Optional[str] = Field(
+        default=None, max_length=200, nullable=False, index=True, exclude=True,
+        sa_column_kwargs={"default": _titulo_normalizado}
+    )
+    director_normalizado: Optional[str] = Field(
+        default=None, max_length=150, nullable=False, index=True, exclude=True,
+        sa_column_kwargs={"default": _director_normalizado}
+    )
+    slug: Optional[str] = Field(
+        default=None, max_length=220, nullable=False, index=True, exclude=True,
+        sa_column_kwargs={"default": _slug}
+    )
 
-    favoritos: List["Favorito"] = Relationship(back_populates="pelicula", cascade_delete=True)
+    favoritos: List["Favorito"] = Relationship(back_populates="pelicula", cascade_delete=True, passive_deletes=True)
 
     def __repr__(self):
         return f"<Pelicula(id={self.id}, titulo={self.titulo}, año={self.año})>"
 
 
+def columnas_busqueda(cambios: dict) -> dict:
+    """
+    Valores de las columnas de búsqueda para un UPDATE de película con `cambios`.
+
+    Si solo cambia el título o solo el año, el slug se arma en SQL con el valor
+    que la fila ya tiene, para no leerla antes de actualizar.
+    """
+    tabla = Pelicula.__table__
+    valores = {}
+    titulo, año = cambios.get("titulo"), cambios.get("año")
+    if titulo is not None:
+        valores["titulo_normalizado"] = normalizar_texto(titulo)
+    if cambios.get("director") is not None:
+        valores["director_normalizado"] = normalizar_texto(cambios["director"])
+
+    if titulo is not None and año is not None:
+        valores["slug"] = slug_pelicula(titulo, año)
+    elif titulo is not None:
+        prefijo = generar_slug(titulo)
+        año_actual = cast(tabla.c.año, String)
+        valores["slug"] = prefijo + "-" + año_actual if prefijo else año_actual
+    elif año is not None:
+        # El slug guardado termina con el año actual: se conserva lo anterior a él
+        prefijo = func.substr(
+            tabla.c.slug, 1, func.length(tabla.c.slug) - func.length(cast(tabla.c.año, String)), type_=String
+        )
+        valores["slug"] = prefijo + str(año)
+    return valores
+
+
 class Favorito(SQLModel, table=True):
     """
     Modelo de Favorito.
     Representa la relación muchos-a-muchos entre usuarios y películas.
     """
+    __table_args__ = (UniqueConstraint("id_usuario", "id_pelicula", name="unique_user_movie"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     id_usuario: int = Field(foreign_key="usuario.id", ondelete="CASCADE")
-    id_pelicula: int = Field(foreign_key="pelicula.id", ondelete="CASCADE")
+    id_pelicula: int = Field(foreign_key="pelicula.id", ondelete="CASCADE", index=True)
     fecha_marcado: datetime = Field(default_factory=datetime.now)
 
     usuario: Optional[Usuario] = Relationship(back_populates="favoritos")
@@ -66,3 +174,63 @@ class Favorito(SQLModel, table=True):
     def __repr__(self):
         return f"<Favorito(id={self.id}, usuario_id={self.id_usuario}, pelicula_id={self.id_pelicula})>"
 
+
+class Cambio(SQLModel, table=True):
+    """
+    Modelo de Cambio.
+    Registro de solo inserción con cada alta, modificación y baja de usuarios,
+    películas y favoritos, escrito en la misma transacción que el cambio.
+    El id es el número de secuencia: crece siempre y nunca se reutiliza.
+    """
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entidad: str = Field(max_length=20, description="usuario, pelicula o favorito")
+    id_entidad: int
+    operacion: str = Field(max_length=10, description="insert, update o delete")
+    datos: Optional[str] = Field(default=None, sa_type=Text, description="Fila en JSON tras el cambio (antes, si es delete)")
+    fecha: datetime = Field(default_factory=datetime.now)
+
+    def __repr__(self):
+        return f"<Cambio(id={self.id}, {self.operacion} {self.entidad}={self.id_entidad})>"
+
+
+class ResumenFavoritos(SQLModel, table=True):
+    """
+    Modelo de ResumenFavoritos.
+    Favoritos marcados por película en cada intervalo (hora, día, semana), que
+    app/tendencias.py mantiene a partir del registro de cambios. Las consultas de
+    tendencias leen esta tabla en lugar de recorrer `favorito`.
+    """
+    __tablename__ = "resumen_favoritos"
+
+    granularidad: str = Field(primary_key=True, max_length=10, description="hora, dia o semana")
+    inicio: datetime = Field(primary_key=True, description="Comienzo del intervalo")
+    id_pelicula: int = Field(primary_key=True, index=True)
+    cantidad: int = Field(default=0, description="Favoritos marcados en el intervalo que siguen vigentes")
+
+    def __repr__(self):
+        return f"<ResumenFavoritos({self.granularidad} {self.inicio}, pelicula={self.id_pelicula}: {self.cantidad})>"
+
+
+class Progreso(SQLModel, table=True):
+    """
+    Modelo de Progreso.
+    Último número de secuencia del registro de cambios que procesó cada consumidor.
+    """
+    nombre: str = Field(primary_key=True, max_length=50)
+    secuencia: int = Field(default=0)
+    fecha: datetime = Field(default_factory=datetime.now)
+
+
+class PuntajeTendencia(SQLModel, table=True):
+    """
+    Modelo de PuntajeTendencia.
+    Copia periódica del ranking en memoria de app/ranking_tendencia.py: el puntaje
+    de cada película (favoritos que decaen con el tiempo) tal como era en `fecha`.
+    """
+    __tablename__ = "puntaje_tendencia"
+
+    id_pelicula: int = Field(primary_key=True)
+    puntaje: float
+    fecha: datetime = Field(default_factory=datetime.now)
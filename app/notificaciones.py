@@ -0,0 +1,100 @@
+"""
+Publicación de los cambios confirmados en el canal de invalidación.
+
+Los índices y cachés en memoria (por ejemplo el autocompletado) se mantienen al día
+con los mensajes de los canales "peliculas" y "favoritos". Los mensajes se publican
+solo después del commit, para que nadie vea un cambio que luego se deshace:
+
+- Los cambios hechos con el ORM (session.add, session.delete) se detectan solos en after_flush.
+- Las sentencias Core (INSERT ... ON CONFLICT, UPDATE masivos) no pasan por el ORM:
+  quien las ejecuta registra lo que modificó con las funciones de este módulo.
+
+Mensajes:
+    "usuarios", clave=id, datos={"operacion": "guardado" | "eliminado"}
+    "peliculas", clave=id, datos={"operacion": "guardada", "titulo": ..., "director": ...}
+    "peliculas", clave=id, datos={"operacion": "eliminada"}
+    "favoritos", clave="usuario:pelicula", datos={"accion": "agregado" | "eliminado",
+                                                  "id_usuario": ..., "id_pelicula": ...,
+                                                  "fecha_marcado": ISO 8601}
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.estado import canal_invalidacion
+from app.models import Favorito, Pelicula, Usuario
+
+CLAVE_PENDIENTES = "cambios_pendientes"
+
+
+def registrar_cambio(session: Session, canal: str, clave: Optional[str], datos: Optional[dict]) -> None:
+    """Agrega un mensaje que se publicará cuando la sesión confirme la transacción."""
+    session.info.setdefault(CLAVE_PENDIENTES, []).append((canal, clave, datos))
+
+
+def usuario_cambiado(session: Session, id_usuario: int, eliminado: bool = False) -> None:
+    registrar_cambio(session, "usuarios", str(id_usuario), {"operacion": "eliminado" if eliminado else "guardado"})
+
+
+def pelicula_guardada(session: Session, id_pelicula: int, titulo: str, director: str) -> None:
+    registrar_cambio(session, "peliculas", str(id_pelicula), {
+        "operacion": "guardada", "titulo": titulo, "director": director
+    })
+
+
+def pelicula_eliminada(session: Session, id_pelicula: int) -> None:
+    registrar_cambio(session, "peliculas", str(id_pelicula), {"operacion": "eliminada"})
+
+
+def favorito_cambiado(session: Session, id_usuario: int, id_pelicula: int, agregado: bool,
+                      fecha_marcado: Optional[datetime] = None) -> None:
+    """`fecha_marcado` es cuándo se marcó el favorito, también al quitarlo (el ranking de tendencia la usa)."""
+    datos = {
+        "accion": "agregado" if agregado else "eliminado",
+        "id_usuario": id_usuario,
+        "id_pelicula": id_pelicula,
+    }
+    if fecha_marcado is not None:
+        datos["fecha_marcado"] = fecha_marcado.isoformat()
+    registrar_cambio(session, "favoritos", f"{id_usuario}:{id_pelicula}", datos)
+
+
+@event.listens_for(Session, "after_flush")
+def _recolectar_cambios_orm(session: Session, flush_context) -> None:
+    # En after_flush, new/dirty/deleted todavía describen lo que se acaba de escribir
+    for objeto in session.new:
+        if isinstance(objeto, Pelicula):
+            pelicula_guardada(session, objeto.id, objeto.titulo, objeto.director)
+        elif isinstance(objeto, Favorito):
+            favorito_cambiado(session, objeto.id_usuario, objeto.id_pelicula, agregado=True,
+                              fecha_marcado=objeto.fecha_marcado)
+        elif isinstance(objeto, Usuario):
+            usuario_cambiado(session, objeto.id)
+    for objeto in session.dirty:
+        if isinstance(objeto, Pelicula) and session.is_modified(objeto):
+            pelicula_guardada(session, objeto.id, objeto.titulo, objeto.director)
+        elif isinstance(objeto, Usuario) and session.is_modified(objeto):
+            usuario_cambiado(session, objeto.id)
+    for objeto in session.deleted:
+        if isinstance(objeto, Pelicula):
+            pelicula_eliminada(session, objeto.id)
+        elif isinstance(objeto, Usuario):
+            usuario_cambiado(session, objeto.id, eliminado=True)
+        elif isinstance(objeto, Favorito):
+            favorito_cambiado(session, objeto.id_usuario, objeto.id_pelicula, agregado=False,
+                              fecha_marcado=objeto.fecha_marcado)
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_cambios(session: Session) -> None:
+    cambios = session.info.pop(CLAVE_PENDIENTES, None)
+    if cambios:
+        canal_invalidacion.publicar_varios(cambios)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(session: Session) -> None:
+    session.info.pop(CLAVE_PENDIENTES, None)
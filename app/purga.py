@@ -0,0 +1,181 @@
+"""
+Compactación de los usuarios y películas eliminados, con sus favoritos.
+
+Eliminar un usuario o una película es un borrado lógico (`database.marcar_eliminado`):
+un UPDATE de una fila, sin importar cuántos favoritos tenga. Las filas eliminadas y
+sus favoritos quedan en la base, fuera de todas las consultas (`models.vivos`), hasta
+que el compactador las borra de verdad:
+
+- Solo dentro de `horas` (las de menos carga; vacío = a cualquier hora). Si la
+  ventana termina a mitad de una purga, se retoma en la siguiente.
+- Los favoritos se borran en lotes de `lote` con un DELETE ... RETURNING por el
+  índice, una transacción por lote y `pausa` segundos entre lotes, para que las
+  demás escrituras se intercalen con el único escritor de SQLite.
+- Al final se borra la fila; la clave foránea ON DELETE CASCADE (PRAGMA
+  foreign_keys=ON) se lleva cualquier favorito que haya llegado mientras tanto.
+
+Los favoritos borrados quedan en el registro de cambios, pero no se vuelven a
+publicar en el canal de invalidación: las cachés ya los descontaron cuando se
+anunció la eliminación del usuario o la película.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple, Type
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.consultas import consultas
+from app.models import Pelicula, Usuario
+from app.notificaciones import favorito_cambiado
+from app.registro_cambios import DELETE, anotar_cambios
+
+logger = logging.getLogger(__name__)
+
+# Columna de `favorito` que apunta a cada modelo padre
+COLUMNAS = {Usuario: "id_usuario", Pelicula: "id_pelicula"}
+
+
+def borrar_favoritos(session: Session, columna: str, valor: int, limite: int = 0, publicar: bool = True) -> int:
+    """
+    Borra los favoritos con `columna` == `valor` (todos, o hasta `limite`) en la
+    transacción de `session` y los anota en el registro de cambios.
+
+    Args:
+        publicar: Anunciar cada favorito eliminado en el canal de invalidación
+
+    Returns:
+        int: Favoritos borrados
+    """
+    statement = consultas.sentencia("borrar_favoritos", columna, bool(limite))
+    parametros = {"valor": valor, "limite": limite} if limite else {"valor": valor}
+    filas = session.exec(statement, params=parametros).all()
+    if publicar:
+        for fila in filas:
+            favorito_cambiado(session, fila.id_usuario, fila.id_pelicula, agregado=False,
+                              fecha_marcado=fila.fecha_marcado)
+    anotar_cambios(session, "favorito", DELETE, [fila._mapping for fila in filas])
+    return len(filas)
+
+
+class CompactadorEliminados:
+    """Borra en lotes, fuera de las horas pico, las filas con borrado lógico y sus favoritos."""
+
+    def __init__(self, lote: int = 1000, pausa: float = 0.05, horas: Iterable[int] = (), intervalo: float = 300.0):
+        self.lote = lote
+        self.pausa = pausa
+        self.horas = frozenset(horas)
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self.compactados = 0
+        self.favoritos_borrados = 0
+        self.lotes = 0
+        self.interrumpidas = 0
+        self.ultima: Optional[datetime] = None
+
+    def en_horario(self, ahora: Optional[datetime] = None) -> bool:
+        return not self.horas or (ahora or datetime.now()).hour in self.horas
+
+    def pendientes(self, session: Session) -> List[Tuple[Type, int]]:
+        """Usuarios y películas eliminados, del más antiguo al más nuevo (índices parciales)."""
+        eliminados = []
+        for modelo in (Pelicula, Usuario):
+            tabla = modelo.__table__
+            ids = session.exec(
+                select(tabla.c.id)
+                .where(tabla.c.fecha_eliminacion.is_not(None))
+                .order_by(tabla.c.fecha_eliminacion)
+            ).all()
+            eliminados.extend((modelo, id_entidad) for id_entidad in ids)
+        return eliminados
+
+    def purgar(self, engine, modelo: Type, id_entidad: int) -> Optional[int]:
+        """
+        Borra los favoritos de una entidad eliminada en lotes y luego la entidad.
+
+        Returns:
+            Favoritos borrados, o None si se interrumpió al salir del horario
+        """
+        columna = COLUMNAS[modelo]
+        tabla = modelo.__table__
+        total = 0
+        while True:
+            with Session(engine) as session:
+                borrados = borrar_favoritos(session, columna, id_entidad, limite=self.lote, publicar=False)
+                session.commit()
+            total += borrados
+            with self._lock:
+                self.favoritos_borrados += borrados
+                self.lotes += 1
+            if borrados < self.lote:
+                break
+            time.sleep(self.pausa)
+            if not self.en_horario():
+                with self._lock:
+                    self.interrumpidas += 1
+                return None
+
+        with Session(engine) as session:
+            # Solo si sigue eliminada; su baja ya está en el registro de cambios
+            resultado = session.exec(
+                delete(tabla).where(tabla.c.id == id_entidad, tabla.c.fecha_eliminacion.is_not(None))
+            )
+            session.commit()
+        if resultado.rowcount:
+            with self._lock:
+                self.compactados += 1
+        return total
+
+    def compactar(self, engine) -> int:
+        """
+        Purga todos los eliminados pendientes mientras dure el horario.
+
+        Returns:
+            int: Usuarios y películas borrados
+        """
+        with Session(engine) as session:
+            pendientes = self.pendientes(session)
+        compactados = 0
+        for modelo, id_entidad in pendientes:
+            if not self.en_horario():
+                break
+            if self.purgar(engine, modelo, id_entidad) is None:
+                break
+            compactados += 1
+            time.sleep(self.pausa)
+        with self._lock:
+            self.ultima = datetime.now()
+        return compactados
+
+    async def ejecutar(self, engine) -> None:
+        """Tarea de fondo: cada `intervalo` segundos, compacta si está dentro del horario."""
+        while True:
+            try:
+                if self.en_horario():
+                    await asyncio.to_thread(self.compactar, engine)
+            except Exception:
+                logger.exception("Error al compactar los eliminados")
+            await asyncio.sleep(self.intervalo)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "compactados": self.compactados,
+                "favoritos_borrados": self.favoritos_borrados,
+                "lotes": self.lotes,
+                "interrumpidas": self.interrumpidas,
+                "ultima": self.ultima.isoformat() if self.ultima else None,
+            }
+
+
+compactador_eliminados = CompactadorEliminados(
+    lote=settings.compactacion_lote,
+    pausa=settings.compactacion_pausa_ms / 1000,
+    horas=settings.compactacion_horas,
+    intervalo=settings.compactacion_intervalo,
+)
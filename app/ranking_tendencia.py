@@ -0,0 +1,331 @@
+"""
+Ranking en memoria de las películas en tendencia, con puntajes que decaen.
+
+Cada favorito aporta 1 al marcarse y su aporte se reduce a la mitad cada
+`vida_media` segundos, así que el puntaje de una película es la suma de
+2^(-edad / vida_media) sobre sus favoritos.
+
+Para no recalcular todos los puntajes a medida que pasa el tiempo se usa
+decaimiento "hacia adelante": se guarda cada aporte escalado a un instante
+base fijo, exp(tasa · (t_evento - base)), y el puntaje real se obtiene al leer
+multiplicando por exp(-tasa · (ahora - base)). Como ese factor es el mismo para
+todas las películas, el orden de los valores guardados no cambia con el tiempo:
+marcar o quitar un favorito cuesta O(1) más reubicar la película en el top, y
+leer el top no recorre el catálogo. Cuando el exponente crece demasiado se
+cambia la base y se reescalan los valores (una vez cada varios meses).
+
+Las `tamaño_top` películas con más puntaje se guardan ordenadas. Si una película
+del top baja mientras hay otras fuera de él, el top se reconstruye con un
+montículo (heapq) en la siguiente lectura.
+
+Se mantiene al día con los mensajes de los canales "favoritos" y "peliculas"
+(ver app/notificaciones.py) y se copia cada `intervalo` segundos a la tabla
+puntaje_tendencia, de donde se recupera al arrancar. Es estado por proceso:
+cada worker recibe los mismos mensajes y tiene su copia.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.estado import canal_invalidacion
+from app.models import Pelicula, PuntajeTendencia, ResumenFavoritos, vivos
+
+logger = logging.getLogger(__name__)
+
+# Con exponentes mayores se cambia la base para no desbordar los float
+EXPONENTE_MAXIMO = 500.0
+# Puntajes menores se descartan (a la película le quedan menos de una milésima de favorito)
+PUNTAJE_MINIMO = 1e-3
+
+
+class RankingTendencia:
+    """
+    Puntajes de tendencia por película y sus `tamaño_top` mejores, ordenados.
+    Seguro entre hilos: las escrituras llegan desde los hilos de las peticiones.
+    """
+
+    def __init__(self, vida_media: float = 86400.0, tamaño_top: int = 100, intervalo: float = 60.0):
+        if vida_media <= 0:
+            raise ValueError("La vida media debe ser positiva")
+        self.vida_media = vida_media
+        self.tasa = math.log(2) / vida_media
+        self.tamaño_top = tamaño_top
+        self.intervalo = intervalo
+
+        self._lock = threading.RLock()
+        self._listo = threading.Event()
+        self._cargando = False
+        self._base = time.time()
+        # id_pelicula -> puntaje escalado a la base
+        self._puntajes: Dict[int, float] = {}
+        # (-puntaje, id_pelicula) de las mejores películas, de mayor a menor puntaje
+        self._top: List[Tuple[float, int]] = []
+        self._top_sucio = False
+
+        self.eventos = 0
+        self.reconstrucciones = 0
+        self.guardados = 0
+
+    @property
+    def cargado(self) -> bool:
+        return self._listo.is_set()
+
+    def __len__(self) -> int:
+        return len(self._puntajes)
+
+    def suscribir(self) -> None:
+        canal_invalidacion.suscribir("favoritos", self._en_favorito)
+        canal_invalidacion.suscribir("peliculas", self._en_pelicula)
+
+    def desuscribir(self) -> None:
+        canal_invalidacion.desuscribir("favoritos", self._en_favorito)
+        canal_invalidacion.desuscribir("peliculas", self._en_pelicula)
+
+    # ------------------------------------------------------------------
+    # Decaimiento
+    # ------------------------------------------------------------------
+
+    def _peso(self, instante: float) -> float:
+        """Aporte de un favorito marcado en `instante`, escalado a la base."""
+        if not self._puntajes:
+            self._base = instante
+        exponente = self.tasa * (instante - self._base)
+        if exponente > EXPONENTE_MAXIMO:
+            self._rebasar(instante)
+            exponente = 0.0
+        return math.exp(exponente)
+
+    def _rebasar(self, instante: float) -> None:
+        factor = math.exp(-self.tasa * (instante - self._base))
+        self._puntajes = {i: p * factor for i, p in self._puntajes.items() if p * factor > 0}
+        self._top = [(p * factor, i) for p, i in self._top if i in self._puntajes]
+        self._base = instante
+
+    def _factor(self, ahora: float) -> float:
+        """Convierte un puntaje escalado a la base en el puntaje real en `ahora`."""
+        return math.exp(-self.tasa * (ahora - self._base))
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+
+    def _en_favorito(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        # Una invalidación de todo el canal no dice qué cambió; los puntajes se
+        # corrigen solos a medida que decaen, así que se ignora
+        if datos is None:
+            return
+        marcado = datos.get("fecha_marcado")
+        self.sumar(
+            datos["id_pelicula"], 1 if datos["accion"] == "agregado" else -1,
+            marcado=datetime.fromisoformat(marcado).timestamp() if marcado else None,
+        )
+
+    def _en_pelicula(self, clave: Optional[str], datos: Optional[dict]) -> None:
+        if clave is not None and datos is not None and datos.get("operacion") == "eliminada":
+            self.quitar_pelicula(int(clave))
+
+    def sumar(self, id_pelicula: int, signo: int = 1, ahora: Optional[float] = None,
+              marcado: Optional[float] = None) -> None:
+        """
+        Registra en `ahora` un favorito marcado (signo 1) o quitado (signo -1).
+
+        El favorito aporta lo que vale uno marcado en `marcado` (por defecto, `ahora`):
+        quitar uno viejo resta su aporte ya decaído, no el de uno recién marcado.
+        El puntaje nunca baja de 0.
+        """
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            self.eventos += 1
+            peso_actual = self._peso(ahora)
+            peso = peso_actual
+            if marcado is not None and marcado < ahora:
+                peso *= math.exp(-self.tasa * (ahora - marcado))
+            anterior = self._puntajes.get(id_pelicula, 0.0)
+            puntaje = anterior + peso if signo > 0 else anterior - peso
+            if puntaje < PUNTAJE_MINIMO * peso_actual:
+                if anterior:
+                    del self._puntajes[id_pelicula]
+                    self._reubicar(id_pelicula, anterior, None)
+                return
+            self._puntajes[id_pelicula] = puntaje
+            self._reubicar(id_pelicula, anterior, puntaje)
+
+    def quitar_pelicula(self, id_pelicula: int) -> None:
+        with self._lock:
+            anterior = self._puntajes.pop(id_pelicula, None)
+            if anterior is not None:
+                self._reubicar(id_pelicula, anterior, None)
+
+    def _reubicar(self, id_pelicula: int, anterior: float, puntaje: Optional[float]) -> None:
+        """Mantiene el top ordenado tras cambiar el puntaje de una película (None: se quitó)."""
+        if self._top_sucio:
+            return
+        clave_anterior = (-anterior, id_pelicula)
+        posicion = bisect_left(self._top, clave_anterior)
+        en_top = posicion < len(self._top) and self._top[posicion] == clave_anterior
+        if en_top:
+            del self._top[posicion]
+        hay_afuera = len(self._puntajes) > len(self._top) + (puntaje is not None)
+
+        if en_top and hay_afuera and (puntaje is None or puntaje < anterior):
+            # Bajó o salió una del top y puede haber otra afuera que la supere
+            self._top_sucio = True
+            return
+        if puntaje is None:
+            return
+        clave = (-puntaje, id_pelicula)
+        if len(self._top) < self.tamaño_top or clave < self._top[-1]:
+            insort(self._top, clave)
+            if len(self._top) > self.tamaño_top:
+                self._top.pop()
+
+    def _reconstruir_top(self) -> None:
+        self._top = heapq.nsmallest(self.tamaño_top, ((-p, i) for i, p in self._puntajes.items()))
+        self._top_sucio = False
+        self.reconstrucciones += 1
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def top(self, limite: int = 10, ahora: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Las `limite` películas con más puntaje, como (id_pelicula, puntaje en `ahora`)."""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            if self._top_sucio:
+                self._reconstruir_top()
+            factor = self._factor(ahora)
+            return [(i, -p * factor) for p, i in self._top[:limite]]
+
+    def puntaje(self, id_pelicula: int, ahora: Optional[float] = None) -> float:
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            return self._puntajes.get(id_pelicula, 0.0) * self._factor(ahora)
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def guardar(self, engine, ahora: Optional[float] = None) -> int:
+        """
+        Reemplaza el contenido de puntaje_tendencia con los puntajes actuales.
+
+        Returns:
+            int: Películas guardadas
+        """
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            factor = self._factor(ahora)
+            filas = [
+                {"id_pelicula": i, "puntaje": p * factor}
+                for i, p in self._puntajes.items()
+                if p * factor >= PUNTAJE_MINIMO
+            ]
+        fecha = datetime.fromtimestamp(ahora)
+        for fila in filas:
+            fila["fecha"] = fecha
+
+        with Session(engine) as session:
+            session.exec(delete(PuntajeTendencia))
+            if filas:
+                session.exec(insert(PuntajeTendencia), params=filas)
+            session.commit()
+        with self._lock:
+            self.guardados += 1
+        return len(filas)
+
+    def cargar(self, engine) -> None:
+        """
+        Suma a los puntajes en memoria los guardados en puntaje_tendencia. Si la
+        tabla está vacía (primer arranque), parte de los resúmenes por hora de
+        app/tendencias.py, sin leer la tabla favorito.
+        """
+        with self._lock:
+            if self._cargando:
+                return
+            self._cargando = True
+
+        try:
+            with Session(engine) as session:
+                filas = session.exec(
+                    select(PuntajeTendencia.id_pelicula, PuntajeTendencia.puntaje, PuntajeTendencia.fecha)
+                ).all()
+                if not filas:
+                    filas = self._desde_resumenes(session)
+            with self._lock:
+                for id_pelicula, puntaje, fecha in filas:
+                    escalado = puntaje * self._peso(fecha.timestamp())
+                    if escalado > 0:
+                        self._puntajes[id_pelicula] = self._puntajes.get(id_pelicula, 0.0) + escalado
+                self._reconstruir_top()
+        finally:
+            with self._lock:
+                self._cargando = False
+                self._listo.set()
+
+    def _desde_resumenes(self, session: Session) -> List[Tuple[int, float, datetime]]:
+        """Cada intervalo de una hora cuenta como favoritos marcados a la mitad de la hora."""
+        filas = session.exec(
+            select(ResumenFavoritos.id_pelicula, ResumenFavoritos.inicio, ResumenFavoritos.cantidad)
+            .join(Pelicula, Pelicula.id == ResumenFavoritos.id_pelicula)
+            .where(ResumenFavoritos.granularidad == "hora", vivos(Pelicula))
+        ).all()
+        media_hora = timedelta(minutes=30)
+        totales: Dict[int, float] = {}
+        ahora = datetime.now()
+        for id_pelicula, inicio, cantidad in filas:
+            edad = (ahora - (inicio + media_hora)).total_seconds()
+            totales[id_pelicula] = totales.get(id_pelicula, 0.0) + cantidad * math.exp(-self.tasa * edad)
+        return [(i, p, ahora) for i, p in totales.items() if p > 0]
+
+    def asegurar_cargado(self, engine) -> None:
+        """Carga los puntajes en el primer uso; si otro hilo los está cargando, espera."""
+        if self._listo.is_set():
+            return
+        with self._lock:
+            cargando = self._cargando
+        if cargando:
+            self._listo.wait()
+        else:
+            self.cargar(engine)
+
+    async def ejecutar(self, engine) -> None:
+        """Tarea de fondo: carga los puntajes y los guarda cada `intervalo` segundos."""
+        try:
+            await asyncio.to_thread(self.asegurar_cargado, engine)
+        except Exception:
+            logger.exception("Error al cargar el ranking de tendencia")
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await asyncio.to_thread(self.guardar, engine)
+            except Exception:
+                logger.exception("Error al guardar el ranking de tendencia")
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "peliculas": len(self._puntajes),
+                "eventos": self.eventos,
+                "reconstrucciones": self.reconstrucciones,
+                "guardados": self.guardados,
+            }
+
+
+ranking_tendencia = RankingTendencia(
+    vida_media=settings.trending_vida_media_horas * 3600,
+    tamaño_top=settings.trending_tamaño_top,
+    intervalo=settings.trending_intervalo_guardado,
+)
+ranking_tendencia.suscribir()
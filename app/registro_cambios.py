@@ -0,0 +1,93 @@
+"""
+Registro de cambios (change data capture) de usuarios, películas y favoritos.
+
+Cada alta, modificación o baja agrega una fila a la tabla `cambio` dentro de la
+misma transacción que la modifica: si la transacción se deshace, el registro
+también. El id de la fila es un número de secuencia creciente, así que un
+consumidor recuerda el último que procesó y pide solo los siguientes
+(GET /api/changes?since=N) en lugar de releer todo.
+
+- Los cambios hechos con el ORM (session.add, session.delete, atributos modificados)
+  se registran solos en el evento after_flush de la sesión.
+- Las sentencias Core (INSERT ... ON CONFLICT, UPDATE ... RETURNING, DELETE masivos)
+  no pasan por el ORM: quien las ejecuta llama a `anotar_cambios` con las filas que
+  retornó la sentencia.
+
+En SQLite las escrituras se serializan, así que los números de secuencia quedan en
+orden de commit. En PostgreSQL dos transacciones pueden confirmar fuera de orden;
+ahí conviene que el consumidor relea con un margen (since = último - N).
+"""
+
+import json
+from datetime import datetime
+from typing import Iterable, Mapping
+
+from sqlalchemy import event, inspect, insert
+from sqlmodel import Session
+
+from app.models import Cambio, Favorito, Pelicula, Usuario
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+MODELOS_REGISTRADOS = (Usuario, Pelicula, Favorito)
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _fila_cambio(entidad: str, operacion: str, fila: Mapping, fecha: datetime) -> dict:
+    return {
+        "entidad": entidad,
+        "id_entidad": fila["id"],
+        "operacion": operacion,
+        "datos": json.dumps(dict(fila), default=_a_json, ensure_ascii=False),
+        "fecha": fecha,
+    }
+
+
+def anotar_cambios(session: Session, entidad: str, operacion: str, filas: Iterable[Mapping]) -> None:
+    """
+    Registra cambios hechos con sentencias Core, en la transacción de `session`.
+
+    Args:
+        entidad: Nombre de la tabla (usuario, pelicula, favorito)
+        operacion: insert, update o delete
+        filas: Filas completas afectadas (por ejemplo, las de RETURNING); deben incluir "id"
+    """
+    fecha = datetime.now()
+    registros = [_fila_cambio(entidad, operacion, fila, fecha) for fila in filas]
+    if registros:
+        session.connection().execute(insert(Cambio.__table__), registros)
+
+
+def _columnas_cargadas(objeto) -> dict:
+    # Solo los valores ya cargados: leer un atributo expirado dentro del flush dispararía otra consulta
+    estado = inspect(objeto)
+    columnas = {
+        atributo.key: estado.dict[atributo.key]
+        for atributo in estado.mapper.column_attrs
+        if atributo.key in estado.dict
+    }
+    if "id" not in columnas and estado.identity:
+        columnas["id"] = estado.identity[0]
+    return columnas
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios_orm(session: Session, flush_context) -> None:
+    fecha = datetime.now()
+    registros = []
+    for operacion, objetos in ((INSERT, session.new), (UPDATE, session.dirty), (DELETE, session.deleted)):
+        for objeto in objetos:
+            if not isinstance(objeto, MODELOS_REGISTRADOS):
+                continue
+            if operacion == UPDATE and not session.is_modified(objeto, include_collections=False):
+                continue
+            registros.append(_fila_cambio(objeto.__tablename__, operacion, _columnas_cargadas(objeto), fecha))
+    if registros:
+        session.connection().execute(insert(Cambio.__table__), registros)
@@ -0,0 +1,113 @@
+"""
+Router de Analítica.
+Agregaciones sobre el catálogo columnar en memoria (app/analitica.py) y
+tendencias de favoritos por intervalo (app/tendencias.py).
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+from typing import List, Optional
+
+from app.analitica import catalogo_columnar
+from app.database import get_session
+from app.formatos import FormatoRespuesta, negociar_formato
+from app.tendencias import agregador_tendencias
+
+router = APIRouter(
+    prefix="/api/analytics",
+    tags=["Analítica"]
+)
+
+
+@router.get("/resumen")
+def resumen_catalogo(
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
+):
+    """
+    Totales del catálogo: películas, favoritos, duración promedio y rango de años.
+    Incluye la versión de la copia en memoria y los cambios que aún no aplicó.
+    """
+    catalogo_columnar.asegurar_actualizado(session.get_bind())
+    return formato.responder(catalogo_columnar.resumen())
+
+
+@router.get("/agrupar")
+def agrupar_catalogo(
+    por: List[str] = Query([], description="Dimensiones: genero, clasificacion, año, decada"),
+    año_min: Optional[int] = Query(None, description="Año mínimo"),
+    año_max: Optional[int] = Query(None, description="Año máximo"),
+    ordenar: str = Query("grupo", description="grupo, peliculas, favoritos o duracion_promedio"),
+    limite: Optional[int] = Query(None, ge=1, le=10000),
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
+):
+    """
+    Cantidad de películas, duración promedio y favoritos por grupo.
+
+    Ejemplos:
+    - `?por=genero&por=decada`: duración promedio por género y década
+    - `?por=clasificacion&ordenar=favoritos`: favoritos por clasificación
+
+    Con **por=genero**, una película con varios géneros cuenta en cada uno.
+    Con **formato=columnar**, una columna por dimensión y por métrica.
+    """
+    catalogo_columnar.asegurar_actualizado(session.get_bind())
+    try:
+        grupos = catalogo_columnar.agrupar(por, año_min, año_max, ordenar, limite)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error)
+        )
+    return formato.responder(grupos)
+
+
+@router.get("/tendencias/top")
+def tendencias_top(
+    granularidad: str = Query("dia", description="hora, dia o semana"),
+    intervalos: int = Query(7, ge=1, description="Cuántos intervalos hacia atrás, incluido el actual"),
+    limite: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
+):
+    """
+    Películas con más favoritos marcados en los últimos intervalos.
+
+    Ejemplos:
+    - `?granularidad=dia&intervalos=7`: top de los últimos siete días (hoy incluido)
+    - `?granularidad=hora&intervalos=24`: top de las últimas 24 horas
+
+    Se calcula desde los resúmenes por intervalo, con hasta `TENDENCIAS_INTERVALO`
+    segundos de atraso; los favoritos que se quitaron no cuentan.
+    """
+    try:
+        peliculas = agregador_tendencias.top(session, granularidad, intervalos, limite)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error)
+        )
+    return formato.responder(peliculas)
+
+
+@router.get("/tendencias/serie")
+def tendencias_serie(
+    granularidad: str = Query("dia", description="hora, dia o semana"),
+    intervalos: int = Query(30, ge=1, description="Cuántos intervalos hacia atrás, incluido el actual"),
+    pelicula_id: Optional[int] = Query(None, description="Solo los favoritos de esta película"),
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
+):
+    """
+    Favoritos marcados en cada intervalo (por ejemplo, por día en los últimos 30 días),
+    de todo el catálogo o de una película. Los intervalos sin favoritos van en cero.
+    """
+    try:
+        serie = agregador_tendencias.serie(session, granularidad, intervalos, pelicula_id)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error)
+        )
+    return formato.responder(serie)
@@ -0,0 +1,73 @@
+"""
+Router del registro de cambios.
+Permite a cachés e índices externos seguir las modificaciones en lugar de releer todo.
+"""
+
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from app.database import get_session
+from app.models import Cambio
+
+router = APIRouter(
+    prefix="/api/changes",
+    tags=["Cambios"]
+)
+
+TAMAÑO_LOTE = 500
+
+
+@router.get("/")
+def listar_cambios(
+    since: int = Query(0, ge=0, description="Último número de secuencia ya procesado"),
+    limit: int = Query(10000, ge=1, le=100000, description="Máximo de cambios a enviar"),
+    entidad: Optional[str] = Query(None, pattern="^(usuario|pelicula|favorito)$"),
+    session: Session = Depends(get_session)
+):
+    """
+    Envía los cambios con número de secuencia mayor que `since`, en orden.
+
+    La respuesta es NDJSON (un objeto JSON por línea) y se transmite por lotes, así que
+    puede recorrer el registro completo sin cargarlo en memoria. Para continuar, se
+    vuelve a llamar con `since` igual a la `secuencia` de la última línea recibida.
+
+    - **since**: Número de secuencia desde el cual leer (0 = desde el principio)
+    - **limit**: Máximo de cambios en esta respuesta
+    - **entidad**: Solo cambios de usuario, pelicula o favorito
+
+    Cada línea: `{"secuencia", "entidad", "id", "operacion", "fecha", "datos"}`, donde
+    `datos` es la fila después del cambio (antes del cambio si la operación es delete).
+    """
+    engine = session.get_bind()
+    tabla = Cambio.__table__
+
+    def generar():
+        ultimo, restantes = since, limit
+        # Sesión propia: la respuesta se sigue enviando después de que termina el endpoint
+        with Session(engine) as lectura:
+            while restantes > 0:
+                statement = select(*tabla.c).where(tabla.c.id > ultimo)
+                if entidad:
+                    statement = statement.where(tabla.c.entidad == entidad)
+                tamaño = min(TAMAÑO_LOTE, restantes)
+                lote = lectura.exec(statement.order_by(tabla.c.id).limit(tamaño)).all()
+                for cambio in lote:
+                    encabezado = json.dumps({
+                        "secuencia": cambio.id,
+                        "entidad": cambio.entidad,
+                        "id": cambio.id_entidad,
+                        "operacion": cambio.operacion,
+                        "fecha": cambio.fecha.isoformat(),
+                    }, ensure_ascii=False)
+                    # datos ya está guardado como JSON: se inserta tal cual, sin decodificarlo
+                    yield f'{encabezado[:-1]}, "datos": {cambio.datos or "null"}}}\n'
+                if len(lote) < tamaño:
+                    return
+                ultimo = lote[-1].id
+                restantes -= len(lote)
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
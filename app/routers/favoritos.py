@@ -3,16 +3,28 @@ Router de Favoritos.
 Endpoints para gestionar las relaciones de favoritos entre usuarios y películas.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List
+from collections import defaultdict
 
-from app.database import get_session
-from app.models import Favorito, Usuario, Pelicula
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+from typing import Dict, List, Set, Tuple
+
+from app.cache_favoritos import cache_favoritos, contiene
+from app.cola_favoritos import AGREGAR, cola_favoritos, encolar_o_rechazar
+from app.consultas import consultas
+from app.database import get_session, get_session_lectura, obtener_vivo
+from app.favoritos_en_vivo import central_favoritos
+from app.formatos import FormatoRespuesta, negociar_formato
+from app.models import Favorito, Usuario, Pelicula, vivos
+from app.purga import borrar_favoritos
 from app.schemas import (
     FavoritoCreate,
     FavoritoRead,
-    FavoritoWithDetails
+    FavoritoWithDetails,
+    ResultadoVerificacion,
+    VerificacionFavoritos
 )
 
 router = APIRouter(
@@ -21,6 +33,18 @@ router = APIRouter(
 )
 
 
+def _obtener_favorito_visible(session: Session, favorito_id: int) -> Favorito:
+    """El favorito por ID; 404 si no existe o si su usuario o película está eliminado."""
+    favorito = session.get(Favorito, favorito_id)
+    if (not favorito or favorito.usuario.fecha_eliminacion is not None
+            or favorito.pelicula.fecha_eliminacion is not None):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Favorito con id {favorito_id} no encontrado"
+        )
+    return favorito
+
+
 @router.get("/", response_model=List[FavoritoRead])
 def listar_favoritos(
     session: Session = Depends(get_session),
@@ -33,8 +57,8 @@ def listar_favoritos(
     - **skip**: Número de registros a omitir (para paginación)
     - **limit**: Número máximo de registros a retornar
     """
-    statement = select(Favorito).offset(skip).limit(limit)
-    favoritos = session.exec(statement).all()
+    statement = consultas.sentencia("listar_favoritos")
+    favoritos = session.exec(statement, params={"skip": skip, "limit": limit}).all()
     return favoritos
 
 
@@ -48,26 +72,39 @@ def crear_favorito(
 
     - **id_usuario**: ID del usuario
     - **id_pelicula**: ID de la película
+
+    En modo write-behind responde 202 sin `id`: el favorito se crea en el siguiente lote.
     """
-    usuario = session.get(Usuario, favorito.id_usuario)
+    usuario = obtener_vivo(session, Usuario, favorito.id_usuario)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con id {favorito.id_usuario} no encontrado"
         )
 
-    pelicula = session.get(Pelicula, favorito.id_pelicula)
+    pelicula = obtener_vivo(session, Pelicula, favorito.id_pelicula)
     if not pelicula:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Película con id {favorito.id_pelicula} no encontrada"
         )
 
-    statement = select(Favorito).where(
-        Favorito.id_usuario == favorito.id_usuario,
-        Favorito.id_pelicula == favorito.id_pelicula
-    )
-    existing_favorito = session.exec(statement).first()
+    if cola_favoritos.activa:
+        if cola_favoritos.es_favorito(session, favorito.id_usuario, favorito.id_pelicula):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Este favorito ya existe"
+            )
+        encolar_o_rechazar(favorito.id_usuario, favorito.id_pelicula, AGREGAR)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"id_usuario": favorito.id_usuario, "id_pelicula": favorito.id_pelicula, "pendiente": True}
+        )
+
+    statement = consultas.sentencia("existe_favorito")
+    existing_favorito = session.exec(
+        statement, params={"id_usuario": favorito.id_usuario, "id_pelicula": favorito.id_pelicula}
+    ).first()
     if existing_favorito:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -91,13 +128,7 @@ def obtener_favorito(
 
     - **favorito_id**: ID del favorito
     """
-    favorito = session.get(Favorito, favorito_id)
-    if not favorito:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Favorito con id {favorito_id} no encontrado"
-        )
-
+    favorito = _obtener_favorito_visible(session, favorito_id)
     return favorito
 
 
@@ -111,13 +142,7 @@ def eliminar_favorito(
 
     - **favorito_id**: ID del favorito a eliminar
     """
-    favorito = session.get(Favorito, favorito_id)
-    if not favorito:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Favorito con id {favorito_id} no encontrado"
-        )
-
+    favorito = _obtener_favorito_visible(session, favorito_id)
     session.delete(favorito)
     session.commit()
     return None
@@ -126,23 +151,26 @@ def eliminar_favorito(
 @router.get("/usuario/{usuario_id}", response_model=List[FavoritoWithDetails])
 def favoritos_por_usuario(
     usuario_id: int,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
 ):
     """
     Lista todos los favoritos de un usuario específico.
 
     - **usuario_id**: ID del usuario
+    - **formato**: `columnar` para recibir las claves una vez (usuario y película se aplanan:
+      `pelicula.titulo`)
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    statement = select(Favorito).where(Favorito.id_usuario == usuario_id)
-    favoritos = session.exec(statement).all()
-    return favoritos
+    statement = consultas.sentencia("favoritos_de_usuario")
+    favoritos = session.exec(statement, params={"id_usuario": usuario_id}).all()
+    return formato.responder(favoritos, FavoritoWithDetails)
 
 
 @router.get("/pelicula/{pelicula_id}", response_model=List[FavoritoWithDetails])
@@ -155,15 +183,15 @@ def favoritos_por_pelicula(
 
     - **pelicula_id**: ID de la película
     """
-    pelicula = session.get(Pelicula, pelicula_id)
+    pelicula = obtener_vivo(session, Pelicula, pelicula_id)
     if not pelicula:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Película con id {pelicula_id} no encontrada"
         )
 
-    statement = select(Favorito).where(Favorito.id_pelicula == pelicula_id)
-    favoritos = session.exec(statement).all()
+    statement = consultas.sentencia("favoritos_de_pelicula")
+    favoritos = session.exec(statement, params={"id_pelicula": pelicula_id}).all()
     return favoritos
 
 
@@ -180,12 +208,17 @@ def verificar_favorito(
     - **pelicula_id**: ID de la película
 
     Retorna un objeto con el estado y el ID del favorito si existe.
+    Las operaciones aún en la cola write-behind tienen prioridad sobre la base de datos.
+    El "no" sale de la caché de favoritos sin consultar la base.
     """
-    statement = select(Favorito).where(
-        Favorito.id_usuario == usuario_id,
-        Favorito.id_pelicula == pelicula_id
-    )
-    favorito = session.exec(statement).first()
+    pendiente = cola_favoritos.estado_pendiente(usuario_id, pelicula_id) if cola_favoritos.activa else None
+    if pendiente is not None:
+        return {"es_favorito": pendiente, "pendiente": True}
+    if not cache_favoritos.es_favorito(session, usuario_id, pelicula_id):
+        return {"es_favorito": False}
+
+    statement = consultas.sentencia("favorito_por_par")
+    favorito = session.exec(statement, params={"id_usuario": usuario_id, "id_pelicula": pelicula_id}).first()
 
     if favorito:
         return {
@@ -197,9 +230,75 @@ def verificar_favorito(
         return {"es_favorito": False}
 
 
+@router.post("/verificar", response_model=List[ResultadoVerificacion])
+def verificar_favoritos(
+    verificacion: VerificacionFavoritos,
+    session: Session = Depends(get_session_lectura)
+):
+    """
+    Verifica muchos favoritos en una sola petición (por ejemplo, los corazones de una
+    grilla de películas), en lugar de un GET /verificar por película.
+
+    - **id_usuario** y **peliculas**: un usuario y las películas a verificar, o
+    - **pares**: pares usuario-película
+
+    Los usuarios que ya están en la caché de favoritos se responden desde memoria y
+    el resto con una consulta sobre el índice único (id_usuario, id_pelicula), en el
+    mismo orden que la petición. Lo pendiente en la cola write-behind tiene prioridad.
+    """
+    pares = verificacion.lista_pares()
+    pendientes = {}
+    if cola_favoritos.activa:
+        for par in pares:
+            estado = cola_favoritos.estado_pendiente(par.id_usuario, par.id_pelicula)
+            if estado is not None:
+                pendientes[(par.id_usuario, par.id_pelicula)] = estado
+
+    existentes: Set[Tuple[int, int]] = set()
+    cacheados = {}
+    por_usuario: Dict[int, Set[int]] = defaultdict(set)
+    for par in pares:
+        clave = (par.id_usuario, par.id_pelicula)
+        if clave in pendientes:
+            continue
+        if par.id_usuario not in cacheados:
+            cacheados[par.id_usuario] = cache_favoritos.en_cache(par.id_usuario)
+        ids = cacheados[par.id_usuario]
+        if ids is None:
+            por_usuario[par.id_usuario].add(par.id_pelicula)
+        elif contiene(ids, par.id_pelicula):
+            existentes.add(clave)
+
+    if por_usuario:
+        tabla = Favorito.__table__
+        statement = (
+            select(tabla.c.id_usuario, tabla.c.id_pelicula)
+            .join(Usuario, Usuario.id == tabla.c.id_usuario)
+            .join(Pelicula, Pelicula.id == tabla.c.id_pelicula)
+            .where(vivos(Usuario), vivos(Pelicula), or_(*(
+                and_(tabla.c.id_usuario == id_usuario, tabla.c.id_pelicula.in_(sorted(peliculas)))
+                for id_usuario, peliculas in por_usuario.items()
+            )))
+        )
+        existentes.update(tuple(fila) for fila in session.exec(statement))
+
+    resultados = []
+    for par in pares:
+        clave = (par.id_usuario, par.id_pelicula)
+        pendiente = pendientes.get(clave)
+        resultados.append(ResultadoVerificacion(
+            id_usuario=par.id_usuario,
+            id_pelicula=par.id_pelicula,
+            es_favorito=pendiente if pendiente is not None else clave in existentes,
+            pendiente=pendiente is not None,
+        ))
+    return resultados
+
+
 @router.get("/estadisticas/generales")
 def estadisticas_favoritos(
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
 ):
     """
     Obtiene estadísticas generales sobre los favoritos en la plataforma.
@@ -212,11 +311,19 @@ def estadisticas_favoritos(
     """
     from sqlalchemy import func
 
-    total_favoritos = session.exec(select(func.count(Favorito.id))).one()
+    # Solo cuentan los favoritos entre usuarios y películas vivos
+    total_favoritos = session.exec(
+        select(func.count(Favorito.id))
+        .join(Usuario, Usuario.id == Favorito.id_usuario)
+        .join(Pelicula, Pelicula.id == Favorito.id_pelicula)
+        .where(vivos(Usuario), vivos(Pelicula))
+    ).one()
 
     statement_usuario = (
         select(Usuario, func.count(Favorito.id).label("count"))
         .join(Favorito)
+        .join(Pelicula, and_(Pelicula.id == Favorito.id_pelicula, vivos(Pelicula)))
+        .where(vivos(Usuario))
         .group_by(Usuario.id)
         .order_by(func.count(Favorito.id).desc())
         .limit(1)
@@ -226,13 +333,15 @@ def estadisticas_favoritos(
     statement_pelicula = (
         select(Pelicula, func.count(Favorito.id).label("count"))
         .join(Favorito)
+        .join(Usuario, and_(Usuario.id == Favorito.id_usuario, vivos(Usuario)))
+        .where(vivos(Pelicula))
         .group_by(Pelicula.id)
         .order_by(func.count(Favorito.id).desc())
         .limit(1)
     )
     top_pelicula = session.exec(statement_pelicula).first()
 
-    return {
+    return formato.responder({
         "total_favoritos": total_favoritos,
         "usuario_top": {
             "nombre": top_usuario[0].nombre if top_usuario else None,
@@ -242,7 +351,7 @@ def estadisticas_favoritos(
             "titulo": top_pelicula[0].titulo if top_pelicula else None,
             "cantidad_favoritos": top_pelicula[1] if top_pelicula else 0
         }
-    }
+    })
 
 
 @router.delete("/usuario/{usuario_id}/todos", status_code=status.HTTP_204_NO_CONTENT)
@@ -257,18 +366,34 @@ def eliminar_todos_favoritos_usuario(
 
     Esta acción es irreversible.
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    statement = select(Favorito).where(Favorito.id_usuario == usuario_id)
-    favoritos = session.exec(statement).all()
-
-    for favorito in favoritos:
-        session.delete(favorito)
-
+    # Lo encolado y aún no confirmado también se descarta; si no, reaparecería al vaciar la cola
+    if cola_favoritos.activa:
+        cola_favoritos.cancelar_usuario(usuario_id)
+    borrar_favoritos(session, "id_usuario", usuario_id)
     session.commit()
     return None
+
+
+@router.websocket("/ws")
+async def favoritos_en_vivo(websocket: WebSocket, usuarios: str = ""):
+    """
+    Recibe en vivo los favoritos agregados y eliminados de los usuarios suscritos.
+
+    - **usuarios**: IDs separados por coma a los que suscribirse al conectar (ej: 1,2,3)
+
+    Después se pueden agregar o quitar usuarios enviando
+    {"accion": "suscribir" | "desuscribir", "usuarios": [...]}. Ver app/favoritos_en_vivo.py.
+    """
+    try:
+        iniciales = [int(u) for u in usuarios.split(",") if u.strip()]
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await central_favoritos.atender(websocket, iniciales)
@@ -3,13 +3,37 @@ Router de Películas.
 Endpoints para gestionar películas en la plataforma.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import and_, func, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select, or_, col
 from typing import List, Optional
 
-from app.database import get_session
-from app.models import Pelicula, Favorito
-from app.schemas import PeliculaCreate, PeliculaRead, PeliculaUpdate
+from app.database import (
+    actualizar_con_version,
+    etag_de_version,
+    get_session,
+    insert_ignorando_duplicados,
+    insert_o_actualizar,
+    marcar_eliminado,
+    obtener_vivo,
+    version_de_if_match,
+)
+from app.autocompletado import indice_autocompletado
+from app.consultas import consultas, parametros_busqueda
+from app.formatos import FormatoRespuesta, negociar_formato
+from app.models import Pelicula, Favorito, Usuario, VIVAS, columnas_busqueda, vivos
+from app.notificaciones import pelicula_eliminada, pelicula_guardada
+from app.registro_cambios import INSERT, UPDATE, anotar_cambios
+from app.ranking_tendencia import ranking_tendencia
+from app.schemas import (
+    PeliculaActualizacionMasiva,
+    PeliculaCreate,
+    PeliculaRead,
+    PeliculaTendencia,
+    PeliculaUpdate,
+)
+from utils import generar_slug, normalizar_texto
 
 # TODO: Crear el router con prefijo y tags
 router = APIRouter(
@@ -17,11 +41,14 @@ router = APIRouter(
     tags=["Películas"]
 )
 
+MAXIMO_LOTE = 1000
+
 
 # TODO: Endpoint para listar todas las películas
 @router.get("/", response_model=List[PeliculaRead])
 def listar_peliculas(
     session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato),
     skip: int = 0,
     limit: int = 100
 ):
@@ -30,11 +57,14 @@ def listar_peliculas(
     
     - **skip**: Número de registros a omitir (para paginación)
     - **limit**: Número máximo de registros a retornar
+    - **formato**: `columnar` para recibir las claves una vez y un arreglo por columna
+
+    Con `Accept: application/msgpack` responde en MessagePack.
     """
     # TODO: Consultar todas las películas con paginación
-    statement = select(Pelicula).offset(skip).limit(limit)
-    peliculas = session.exec(statement).all()
-    return peliculas
+    statement = consultas.sentencia("listar_peliculas")
+    peliculas = session.exec(statement, params={"skip": skip, "limit": limit}).all()
+    return formato.responder(peliculas, PeliculaRead)
 
 
 # TODO: Endpoint para crear una nueva película
@@ -53,44 +83,143 @@ def crear_pelicula(
     - **año**: Año de estreno
     - **clasificacion**: Clasificación por edad (G, PG, PG-13, R, etc.)
     - **sinopsis**: Breve descripción de la trama
-    """
-    statement = select(Pelicula).where(
-        Pelicula.titulo == pelicula.titulo,
-        Pelicula.año == pelicula.año
-    )
 
-    existing_pelicula = session.exec(statement).first()
-    if existing_pelicula:
+    Los duplicados (mismo título y año) los detecta el índice único en el mismo
+    INSERT, sin una consulta previa y sin carreras entre peticiones concurrentes.
+    """
+    db_pelicula = Pelicula.model_validate(pelicula)
+    # Los valores van como parámetros (no con .values()) para reutilizar la sentencia compilada
+    # Las columnas de búsqueda (normalizadas y slug) las calculan los defaults de la tabla
+    tabla = Pelicula.__table__
+    statement = insert_ignorando_duplicados(Pelicula, session).returning(*tabla.c)
+    nueva = session.exec(statement, params=db_pelicula.model_dump(exclude={"id"})).first()
+    if nueva is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Ya existe una película con el título '{pelicula.titulo}' del año {pelicula.año}"
         )
-
-    db_pelicula = Pelicula.model_validate(pelicula)
-    session.add(db_pelicula)
+    pelicula_guardada(session, nueva.id, db_pelicula.titulo, db_pelicula.director)
+    anotar_cambios(session, "pelicula", INSERT, [nueva._mapping])
     session.commit()
-    session.refresh(db_pelicula)
 
+    db_pelicula.id = nueva.id
+    db_pelicula.slug = nueva.slug
     return db_pelicula
 
 
+@router.post("/lote")
+def importar_peliculas(
+    peliculas: List[PeliculaCreate],
+    session: Session = Depends(get_session)
+):
+    """
+    Importa varias películas en una sola transacción.
+
+    Si ya existe una película con el mismo título y año, se actualizan sus datos
+    (upsert); si no, se crea. Dentro del lote, la última aparición de cada
+    título y año es la que se guarda.
+
+    - **peliculas**: Lista de películas (máximo 1000)
+    """
+    if len(peliculas) > MAXIMO_LOTE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAXIMO_LOTE} películas por lote"
+        )
+
+    filas = {}
+    for pelicula in peliculas:
+        fila = Pelicula.model_validate(pelicula).model_dump(exclude={"id"})
+        filas[(fila["titulo"], fila["año"])] = fila
+
+    if filas:
+        tabla = Pelicula.__table__
+        statement = (
+            insert_o_actualizar(
+                Pelicula, session, claves=("titulo", "año"), excluir=("fecha_creacion", "fecha_eliminacion"),
+                donde=VIVAS
+            )
+            .returning(*tabla.c)
+        )
+        guardadas = session.exec(statement, params=list(filas.values())).all()
+        for fila in guardadas:
+            pelicula_guardada(session, fila.id, fila.titulo, fila.director)
+        # El upsert deja version=1 en las filas nuevas y la incrementa en las existentes
+        anotar_cambios(session, "pelicula", INSERT, [f._mapping for f in guardadas if f.version == 1])
+        anotar_cambios(session, "pelicula", UPDATE, [f._mapping for f in guardadas if f.version != 1])
+        session.commit()
+
+    return {"procesadas": len(filas)}
+
+
+@router.get("/autocomplete")
+def autocompletar(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefijo escrito por el usuario"),
+    limit: int = Query(10, ge=1, le=50),
+    tipo: Optional[str] = Query(None, pattern="^(titulo|director)$", description="titulo, director o ambos"),
+    session: Session = Depends(get_session)
+):
+    """
+    Sugerencias de títulos y directores que empiezan con `q`, de más a menos favoritos.
+    No distingue mayúsculas ni acentos; los títulos con artículo también se encuentran
+    sin él ("padrino" sugiere "El Padrino").
+
+    - **q**: Texto escrito hasta ahora
+    - **limit**: Máximo de sugerencias
+    - **tipo**: Restringir a "titulo" o "director"
+    """
+    indice_autocompletado.asegurar_cargado(session.get_bind())
+    return indice_autocompletado.buscar(q, limit, tipo)
+
+
+@router.get("/slug/{slug}", response_model=PeliculaRead)
+def obtener_pelicula_por_slug(
+    slug: str,
+    response: Response,
+    session: Session = Depends(get_session)
+):
+    """
+    Obtiene una película por su slug (título y año, por ejemplo "el-padrino-1972").
+    La búsqueda usa el índice de la columna slug.
+
+    - **slug**: Slug de la película; se normaliza igual que al guardarla
+    """
+    pelicula = session.exec(
+        select(Pelicula)
+        .where(Pelicula.slug == generar_slug(slug), vivos(Pelicula))
+        .order_by(Pelicula.id)
+        .limit(1)
+    ).first()
+    if not pelicula:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Película con slug '{slug}' no encontrada"
+        )
+    response.headers["ETag"] = etag_de_version(pelicula.version)
+    return pelicula
+
+
 # TODO: Endpoint para obtener una película por ID
 @router.get("/{pelicula_id}", response_model=PeliculaRead)
 def obtener_pelicula(
     pelicula_id: int,
+    response: Response,
     session: Session = Depends(get_session)
 ):
     """
     Obtiene una película específica por su ID.
     
     - **pelicula_id**: ID de la película
+
+    El encabezado ETag lleva la versión, para enviarla en If-Match al actualizar.
     """
-    pelicula = session.get(Pelicula, pelicula_id)
+    pelicula = obtener_vivo(session, Pelicula, pelicula_id)
     if not pelicula:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Película con id {pelicula_id} no encontrada"
         )
+    response.headers["ETag"] = etag_de_version(pelicula.version)
     return pelicula
 
 
@@ -99,6 +228,8 @@ def obtener_pelicula(
 def actualizar_pelicula(
     pelicula_id: int,
     pelicula_update: PeliculaUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     session: Session = Depends(get_session)
 ):
     """
@@ -106,24 +237,43 @@ def actualizar_pelicula(
     
     - **pelicula_id**: ID de la película a actualizar
     - Los campos son opcionales, solo se actualizan los proporcionados
+    - **If-Match** (encabezado): ETag obtenido al leer la película; si otra petición
+      la modificó desde entonces se responde 412 en lugar de sobrescribir sus cambios
     """
-    db_pelicula = session.get(Pelicula, pelicula_id)
+    try:
+        version = version_de_if_match(if_match)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Encabezado If-Match inválido"
+        )
 
-    if not db_pelicula:
+    cambios = pelicula_update.model_dump(exclude_unset=True)
+    cambios.update(columnas_busqueda(cambios))
+    try:
+        fila = actualizar_con_version(session, Pelicula, pelicula_id, cambios, version)
+    except IntegrityError:
+        session.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Película con id {pelicula_id} no encontrada"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe una película con el título y año indicados"
         )
 
-    pelicula_data = pelicula_update.model_dump(exclude_unset=True)
-    for key, value in pelicula_data.items():
-        setattr(db_pelicula, key, value)
+    if fila is None:
+        if obtener_vivo(session, Pelicula, pelicula_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Película con id {pelicula_id} no encontrada"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="La película fue modificada por otra petición; vuelva a leerla e intente de nuevo"
+        )
 
-    session.add(db_pelicula)
+    pelicula_guardada(session, fila.id, fila.titulo, fila.director)
     session.commit()
-    session.refresh(db_pelicula)
-
-    return db_pelicula
+    response.headers["ETag"] = etag_de_version(fila.version)
+    return fila._mapping
 
 
 # TODO: Endpoint para eliminar una película
@@ -137,22 +287,107 @@ def eliminar_pelicula(
     
     - **pelicula_id**: ID de la película a eliminar
     
-    También se eliminarán todos los favoritos asociados a esta película.
+    Es un borrado lógico: la película y sus favoritos dejan de aparecer de inmediato
+    y se borran después, en la compactación fuera de las horas pico (ver app/purga.py).
     """
-    # Buscar la película
-    pelicula = session.get(Pelicula, pelicula_id)
-    if not pelicula:
+    if marcar_eliminado(session, Pelicula, pelicula_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Película con id {pelicula_id} no encontrada"
         )
-    
-    # Eliminar la película (los favoritos se eliminan por CASCADE)
-    session.delete(pelicula)
+
+    pelicula_eliminada(session, pelicula_id)
     session.commit()
     return None
 
 
+def condiciones_busqueda(
+    titulo: Optional[str] = None,
+    director: Optional[str] = None,
+    genero: Optional[str] = None,
+    año: Optional[int] = None,
+    año_min: Optional[int] = None,
+    año_max: Optional[int] = None
+) -> list:
+    """
+    Condiciones WHERE de la búsqueda de películas, con los valores incluidos.
+    Las usa la actualización masiva (PATCH); buscar_peliculas usa las mismas
+    condiciones con parámetros desde el registro de consultas (app/consultas.py).
+    """
+    condiciones = []
+    # Título y director se comparan contra sus columnas normalizadas (sin mayúsculas
+    # ni acentos), que tienen índice propio, en lugar de aplicar lower() a la columna
+    if titulo:
+        condiciones.append(col(Pelicula.titulo_normalizado).contains(normalizar_texto(titulo)))
+    if director:
+        condiciones.append(col(Pelicula.director_normalizado).contains(normalizar_texto(director)))
+    if genero:
+        condiciones.append(col(Pelicula.genero).contains(genero))
+    if año:
+        condiciones.append(Pelicula.año == año)
+    if año_min:
+        condiciones.append(Pelicula.año >= año_min)
+    if año_max:
+        condiciones.append(Pelicula.año <= año_max)
+    return condiciones
+
+
+@router.patch("/")
+def actualizar_peliculas(
+    actualizacion: PeliculaActualizacionMasiva,
+    session: Session = Depends(get_session)
+):
+    """
+    Actualiza todas las películas que cumplen un filtro con un solo UPDATE.
+
+    - **filtro**: Mismos criterios que la búsqueda (título, director, género, año, año_min, año_max)
+    - **cambios**: Campos a asignar (director, género, duración, clasificación, sinopsis)
+    - **dry_run**: Si es true no modifica nada; retorna la cantidad y una muestra de las afectadas
+    - **todas**: Necesario para aplicar un filtro vacío (todo el catálogo)
+
+    Retorna la cantidad de películas afectadas. Cada película actualizada incrementa su versión.
+    """
+    cambios = actualizacion.cambios.model_dump(exclude_unset=True)
+    if not cambios:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debe indicar al menos un campo en cambios"
+        )
+
+    condiciones = condiciones_busqueda(**actualizacion.filtro.model_dump())
+    if not condiciones and not actualizacion.todas:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El filtro está vacío; envíe todas=true para actualizar todo el catálogo"
+        )
+
+    condiciones.append(vivos(Pelicula))
+    if actualizacion.dry_run:
+        afectadas = session.exec(select(func.count(Pelicula.id)).where(*condiciones)).one()
+        muestra = session.exec(
+            select(Pelicula).where(*condiciones).order_by(Pelicula.id).limit(actualizacion.muestra)
+        ).all()
+        return {
+            "dry_run": True,
+            "afectadas": afectadas,
+            "cambios": cambios,
+            "muestra": [PeliculaRead.model_validate(p) for p in muestra]
+        }
+
+    tabla = Pelicula.__table__
+    actualizadas = session.exec(
+        update(tabla)
+        .where(*condiciones)
+        .values(**cambios, **columnas_busqueda(cambios), version=tabla.c.version + 1)
+        .returning(*tabla.c)
+    ).all()
+    for fila in actualizadas:
+        pelicula_guardada(session, fila.id, fila.titulo, fila.director)
+    anotar_cambios(session, "pelicula", UPDATE, [fila._mapping for fila in actualizadas])
+    session.commit()
+    return {"dry_run": False, "afectadas": len(actualizadas), "cambios": cambios}
+
+
 # TODO: Endpoint para buscar películas
 @router.get("/buscar/", response_model=List[PeliculaRead])
 def buscar_peliculas(
@@ -168,34 +403,16 @@ def buscar_peliculas(
     Busca películas según diferentes criterios.
     Todos los parámetros son opcionales y se pueden combinar.
     
-    - **titulo**: Busca películas que contengan este texto en el título
-    - **director**: Busca películas que contengan este texto en el director
+    - **titulo**: Busca películas que contengan este texto en el título (sin distinguir mayúsculas ni acentos)
+    - **director**: Busca películas que contengan este texto en el director (sin distinguir mayúsculas ni acentos)
     - **genero**: Busca películas que contengan este género
     - **año**: Busca películas de un año específico
     - **año_min**: Busca películas desde este año en adelante
     - **año_max**: Busca películas hasta este año
     """
-    statement = select(Pelicula)
-
-    if titulo:
-        statement = statement.where(col(Pelicula.titulo).contains(titulo))
-
-    if director:
-        statement = statement.where(col(Pelicula.director).contains(director))
-
-    if genero:
-        statement = statement.where(col(Pelicula.genero).contains(genero))
-
-    if año:
-        statement = statement.where(Pelicula.año == año)
-
-    if año_min:
-        statement = statement.where(Pelicula.año >= año_min)
-
-    if año_max:
-        statement = statement.where(Pelicula.año <= año_max)
-
-    peliculas = session.exec(statement).all()
+    parametros = parametros_busqueda(titulo, director, genero, año, año_min, año_max)
+    statement = consultas.sentencia("buscar_peliculas", *parametros)
+    peliculas = session.exec(statement, params=parametros).all()
     return peliculas
 
 
@@ -211,11 +428,14 @@ def peliculas_populares(
     - **limit**: Número de películas a retornar (máximo 50)
     """
     from sqlalchemy import func
+    # Solo cuentan los favoritos de usuarios vivos; los de eliminados esperan la compactación
     statement = (
-        select(Pelicula, func.count(Favorito.id).label("count"))
+        select(Pelicula, func.count(Usuario.id).label("count"))
         .outerjoin(Favorito, Pelicula.id == Favorito.id_pelicula)
+        .outerjoin(Usuario, and_(Usuario.id == Favorito.id_usuario, vivos(Usuario)))
+        .where(vivos(Pelicula))
         .group_by(Pelicula.id)
-        .order_by(func.count(Favorito.id).desc())
+        .order_by(func.count(Usuario.id).desc())
         .limit(limit)
     )
 
@@ -224,6 +444,37 @@ def peliculas_populares(
     return peliculas
 
 
+@router.get("/populares/trending", response_model=List[PeliculaTendencia])
+def peliculas_en_tendencia(
+    limit: int = Query(10, ge=1, le=50, description="Número de películas a retornar"),
+    session: Session = Depends(get_session)
+):
+    """
+    Obtiene las películas en tendencia: cada favorito suma 1 al marcarse y su aporte
+    se reduce a la mitad cada `trending_vida_media_horas` horas.
+
+    El orden sale del ranking en memoria (app/ranking_tendencia.py); la base de
+    datos solo se consulta por clave primaria para los datos de las películas.
+
+    - **limit**: Número de películas a retornar (máximo 50)
+    """
+    ranking_tendencia.asegurar_cargado(session.get_bind())
+    top = ranking_tendencia.top(limit)
+    if not top:
+        return []
+    peliculas = {
+        pelicula.id: pelicula
+        for pelicula in session.exec(
+            select(Pelicula).where(col(Pelicula.id).in_([i for i, _ in top]), vivos(Pelicula))
+        ).all()
+    }
+    return [
+        PeliculaTendencia(**PeliculaRead.model_validate(peliculas[i]).model_dump(), puntaje=round(puntaje, 4))
+        for i, puntaje in top
+        if i in peliculas
+    ]
+
+
 # TODO: Opcional - Endpoint para obtener películas por clasificación
 @router.get("/clasificacion/{clasificacion}", response_model=List[PeliculaRead])
 def peliculas_por_clasificacion(
@@ -243,10 +494,8 @@ def peliculas_por_clasificacion(
             detail=f"Clasificación inválida. Use: {', '.join(clasificaciones_validas)}"
         )
 
-    statement = select(Pelicula).where(
-        Pelicula.clasificacion == clasificacion.upper()
-    ).limit(limit)
-    peliculas = session.exec(statement).all()
+    statement = consultas.sentencia("peliculas_por_clasificacion")
+    peliculas = session.exec(statement, params={"clasificacion": clasificacion.upper(), "limit": limit}).all()
     return peliculas
 
 
@@ -261,7 +510,7 @@ def peliculas_recientes(
     
     - **limit**: Número de películas a retornar
     """
-    statement = select(Pelicula).order_by(Pelicula.fecha_creacion.desc()).limit(limit)
-    peliculas = session.exec(statement).all()
+    statement = consultas.sentencia("peliculas_recientes")
+    peliculas = session.exec(statement, params={"limit": limit}).all()
     return peliculas
 
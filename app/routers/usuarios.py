@@ -3,12 +3,20 @@ Router de Usuarios.
 Endpoints para gestionar usuarios en la plataforma.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional
 
-from app.database import get_session
-from app.models import Usuario, Favorito, Pelicula
+from app.cache_favoritos import cache_favoritos
+from app.cola_favoritos import AGREGAR, ELIMINAR, cola_favoritos, encolar_o_rechazar
+from app.database import (
+    actualizar_con_version, etag_de_version, get_session, marcar_eliminado, obtener_vivo, select_filas,
+    version_de_if_match
+)
+from app.consultas import consultas
+from app.models import Usuario, Favorito, Pelicula, vivos
+from app.notificaciones import favorito_cambiado, usuario_cambiado
 from app.schemas import (
     UsuarioCreate,
     UsuarioRead,
@@ -35,8 +43,8 @@ def listar_usuarios(
     - **skip**: Número de registros a omitir (para paginación)
     - **limit**: Número máximo de registros a retornar
     """
-    statement = select(Usuario).offset(skip).limit(limit)
-    usuarios = session.exec(statement).all()
+    statement = consultas.sentencia("listar_usuarios")
+    usuarios = session.exec(statement, params={"skip": skip, "limit": limit}).all()
     return usuarios
 
 
@@ -51,7 +59,7 @@ def crear_usuario(
     - **nombre**: Nombre del usuario
     - **correo**: Correo electrónico único
     """
-    statement = select(Usuario).where(Usuario.correo == usuario.correo)
+    statement = select(Usuario).where(Usuario.correo == usuario.correo, vivos(Usuario))
     existing_user = session.exec(statement).first()
 
     if existing_user:
@@ -71,14 +79,17 @@ def crear_usuario(
 @router.get("/{usuario_id}", response_model=UsuarioRead)
 def obtener_usuario(
     usuario_id: int,
+    response: Response,
     session: Session = Depends(get_session)
 ):
     """
     Obtiene un usuario específico por su ID.
 
     - **usuario_id**: ID del usuario
+
+    El encabezado ETag lleva la versión, para enviarla en If-Match al actualizar.
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
 
     if not usuario:
         raise HTTPException(
@@ -86,6 +97,7 @@ def obtener_usuario(
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
+    response.headers["ETag"] = etag_de_version(usuario.version)
     return usuario
 
 
@@ -93,6 +105,8 @@ def obtener_usuario(
 def actualizar_usuario(
     usuario_id: int,
     usuario_update: UsuarioUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     session: Session = Depends(get_session)
 ):
     """
@@ -101,33 +115,44 @@ def actualizar_usuario(
     - **usuario_id**: ID del usuario a actualizar
     - **nombre**: Nuevo nombre (opcional)
     - **correo**: Nuevo correo (opcional)
+    - **If-Match** (encabezado): ETag obtenido al leer el usuario; si otra petición
+      lo modificó desde entonces se responde 412 en lugar de sobrescribir sus cambios
     """
-    db_usuario = session.get(Usuario, usuario_id)
+    try:
+        version = version_de_if_match(if_match)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Encabezado If-Match inválido"
+        )
 
-    if not db_usuario:
+    # La unicidad del correo la verifica la restricción UNIQUE en el mismo UPDATE
+    try:
+        fila = actualizar_con_version(
+            session, Usuario, usuario_id, usuario_update.model_dump(exclude_unset=True), version
+        )
+    except IntegrityError:
+        session.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Usuario con id {usuario_id} no encontrado"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ya existe un usuario con el correo '{usuario_update.correo}'"
         )
 
-    if usuario_update.correo and usuario_update.correo != db_usuario.correo:
-        statement = select(Usuario).where(Usuario.correo == usuario_update.correo)
-        existing_user = session.exec(statement).first()
-        if existing_user:
+    if fila is None:
+        if obtener_vivo(session, Usuario, usuario_id) is None:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Ya existe un usuario con el correo '{usuario_update.correo}'"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Usuario con id {usuario_id} no encontrado"
             )
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El usuario fue modificado por otra petición; vuelva a leerlo e intente de nuevo"
+        )
 
-    usuario_data = usuario_update.model_dump(exclude_unset=True)
-    for key, value in usuario_data.items():
-        setattr(db_usuario, key, value)
-
-    session.add(db_usuario)
+    usuario_cambiado(session, fila.id)
     session.commit()
-    session.refresh(db_usuario)
-
-    return db_usuario
+    response.headers["ETag"] = etag_de_version(fila.version)
+    return fila._mapping
 
 
 @router.delete("/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -140,16 +165,24 @@ def eliminar_usuario(
 
     - **usuario_id**: ID del usuario a eliminar
 
-    También se eliminarán todos los favoritos asociados al usuario.
+    Es un borrado lógico: el usuario y sus favoritos dejan de aparecer de inmediato
+    y se borran después, en la compactación fuera de las horas pico (ver app/purga.py).
     """
-    usuario = session.get(Usuario, usuario_id)
-    if not usuario:
+    # Sus favoritos se leen antes de marcarlo: después ya no aparecen en la consulta
+    statement = consultas.sentencia("favoritos_de_usuario")
+    favoritos = session.exec(statement, params={"id_usuario": usuario_id}).all()
+
+    if marcar_eliminado(session, Usuario, usuario_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    session.delete(usuario)
+    # Se anuncian como eliminados para que las cachés descuenten su popularidad
+    for favorito in favoritos:
+        favorito_cambiado(session, usuario_id, favorito.id_pelicula, agregado=False,
+                          fecha_marcado=favorito.fecha_marcado)
+    usuario_cambiado(session, usuario_id, eliminado=True)
     session.commit()
     return None
 
@@ -160,11 +193,14 @@ def listar_favoritos_usuario(
     session: Session = Depends(get_session)
 ):
     """
-    Lista todas las películas favoritas de un usuario.
+    Lista todas las películas favoritas de un usuario, ordenadas por ID.
 
     - **usuario_id**: ID del usuario
+
+    Los IDs salen de la caché de favoritos (app/cache_favoritos.py); la base solo
+    se consulta por clave primaria.
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
 
     if not usuario:
         raise HTTPException(
@@ -172,11 +208,10 @@ def listar_favoritos_usuario(
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    statement = (
-        select(Pelicula)
-        .join(Favorito)
-        .where(Favorito.id_usuario == usuario_id)
-    )
+    ids = cache_favoritos.peliculas(session, usuario_id)
+    if not ids:
+        return []
+    statement = select_filas(Pelicula).where(Pelicula.id.in_(ids.tolist()), vivos(Pelicula))
     peliculas = session.exec(statement).all()
 
     return peliculas
@@ -189,6 +224,7 @@ def listar_favoritos_usuario(
 def marcar_favorito(
     usuario_id: int,
     pelicula_id: int,
+    response: Response,
     session: Session = Depends(get_session)
 ):
     """
@@ -196,26 +232,35 @@ def marcar_favorito(
 
     - **usuario_id**: ID del usuario
     - **pelicula_id**: ID de la película
+
+    En modo write-behind responde 202: el favorito queda en cola y se confirma en el siguiente lote.
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    pelicula = session.get(Pelicula, pelicula_id)
+    pelicula = obtener_vivo(session, Pelicula, pelicula_id)
     if not pelicula:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Película con id {pelicula_id} no encontrada"
         )
 
-    statement = select(Favorito).where(
-        Favorito.id_usuario == usuario_id,
-        Favorito.id_pelicula == pelicula_id
-    )
-    existing_favorito = session.exec(statement).first()
+    if cola_favoritos.activa:
+        if cola_favoritos.es_favorito(session, usuario_id, pelicula_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La película ya está marcada como favorita"
+            )
+        encolar_o_rechazar(usuario_id, pelicula_id, AGREGAR)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Película marcada como favorita, pendiente de confirmar"}
+
+    statement = consultas.sentencia("existe_favorito")
+    existing_favorito = session.exec(statement, params={"id_usuario": usuario_id, "id_pelicula": pelicula_id}).first()
     if existing_favorito:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -236,6 +281,7 @@ def marcar_favorito(
 def eliminar_favorito(
     usuario_id: int,
     pelicula_id: int,
+    response: Response,
     session: Session = Depends(get_session)
 ):
     """
@@ -243,12 +289,21 @@ def eliminar_favorito(
 
     - **usuario_id**: ID del usuario
     - **pelicula_id**: ID de la película
+
+    En modo write-behind responde 202 y la eliminación se confirma en el siguiente lote.
     """
-    statement = select(Favorito).where(
-        Favorito.id_usuario == usuario_id,
-        Favorito.id_pelicula == pelicula_id
-    )
-    favorito = session.exec(statement).first()
+    if cola_favoritos.activa:
+        if not cola_favoritos.es_favorito(session, usuario_id, pelicula_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="El favorito no existe"
+            )
+        encolar_o_rechazar(usuario_id, pelicula_id, ELIMINAR)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return None
+
+    statement = consultas.sentencia("favorito_por_par")
+    favorito = session.exec(statement, params={"id_usuario": usuario_id, "id_pelicula": pelicula_id}).first()
 
     if not favorito:
         raise HTTPException(
@@ -271,7 +326,7 @@ def obtener_estadisticas_usuario(
 
     - **usuario_id**: ID del usuario
     """
-    usuario = session.get(Usuario, usuario_id)
+    usuario = obtener_vivo(session, Usuario, usuario_id)
 
     if not usuario:
         raise HTTPException(
@@ -279,18 +334,13 @@ def obtener_estadisticas_usuario(
             detail=f"Usuario con id {usuario_id} no encontrado"
         )
 
-    from sqlalchemy import func
-
-    total_favoritos = session.exec(
-        select(func.count(Favorito.id)).where(Favorito.id_usuario == usuario_id)
-    ).one()
+    ids = cache_favoritos.peliculas(session, usuario_id)
+    total_favoritos = len(ids)
 
-    statement_peliculas = (
-        select(Pelicula)
-        .join(Favorito)
-        .where(Favorito.id_usuario == usuario_id)
-    )
-    peliculas = session.exec(statement_peliculas).all()
+    peliculas = []
+    if ids:
+        statement_peliculas = select(Pelicula).where(Pelicula.id.in_(ids.tolist()), vivos(Pelicula))
+        peliculas = session.exec(statement_peliculas).all()
 
     generos = {}
     tiempo_total = 0
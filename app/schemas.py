@@ -5,7 +5,7 @@ Estos esquemas se usan en los endpoints de la API para:
 - Serializar datos de salida (response)
 """
 
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -50,6 +50,7 @@ class UsuarioRead(BaseModel):
     nombre: str
     correo: str
     fecha_registro: datetime
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -119,10 +120,20 @@ class PeliculaRead(BaseModel):
     clasificacion: str
     sinopsis: Optional[str]
     fecha_creacion: datetime
+    version: int
+    slug: str
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class PeliculaTendencia(PeliculaRead):
+    """
+    Schema para una película en tendencia: sus datos y su puntaje, la suma de sus
+    favoritos con el aporte de cada uno decayendo según su antigüedad.
+    """
+    puntaje: float
+
+
 # =============================================================================
 # ESQUEMAS DE FAVORITO
 # =============================================================================
@@ -155,6 +166,56 @@ class FavoritoWithDetails(FavoritoRead):
     pelicula: PeliculaRead
 
 
+MAXIMO_VERIFICACION = 1000
+
+
+class ParFavorito(BaseModel):
+    """
+    Un par usuario-película.
+    """
+    id_usuario: int
+    id_pelicula: int
+
+
+class VerificacionFavoritos(BaseModel):
+    """
+    Consulta de varios favoritos a la vez: un usuario con una lista de películas
+    (una grilla de películas) o una lista de pares usuario-película.
+    """
+    id_usuario: Optional[int] = None
+    peliculas: List[int] = Field(default_factory=list, max_length=MAXIMO_VERIFICACION)
+    pares: List[ParFavorito] = Field(default_factory=list, max_length=MAXIMO_VERIFICACION)
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {"id_usuario": 1, "peliculas": [1, 2, 3, 4]}
+        }
+    )
+
+    @model_validator(mode="after")
+    def una_sola_forma(self) -> "VerificacionFavoritos":
+        if self.pares and (self.id_usuario is not None or self.peliculas):
+            raise ValueError("Use id_usuario con peliculas, o pares, pero no ambos")
+        if self.peliculas and self.id_usuario is None:
+            raise ValueError("peliculas requiere id_usuario")
+        return self
+
+    def lista_pares(self) -> List[ParFavorito]:
+        if self.pares:
+            return self.pares
+        return [ParFavorito(id_usuario=self.id_usuario, id_pelicula=p) for p in self.peliculas]
+
+
+class ResultadoVerificacion(BaseModel):
+    """
+    Estado de un par: pendiente indica que sale de la cola write-behind aún sin confirmar.
+    """
+    id_usuario: int
+    id_pelicula: int
+    es_favorito: bool
+    pendiente: bool = False
+
+
 # =============================================================================
 # ESQUEMAS DE RESPUESTA GENÉRICOS
 # =============================================================================
@@ -189,3 +250,35 @@ class PeliculaSearchParams(BaseModel):
     año_min: Optional[int] = None
     año_max: Optional[int] = None
 
+
+class PeliculaCambiosMasivos(BaseModel):
+    """
+    Campos que se pueden asignar a muchas películas a la vez.
+    No incluye título ni año: asignarlos en bloque violaría la unicidad (título, año).
+    """
+    director: Optional[str] = Field(None, min_length=1, max_length=150)
+    genero: Optional[str] = Field(None, min_length=1, max_length=100)
+    duracion: Optional[int] = Field(None, gt=0)
+    clasificacion: Optional[str] = Field(None, max_length=10)
+    sinopsis: Optional[str] = Field(None, max_length=1000)
+
+
+class PeliculaActualizacionMasiva(BaseModel):
+    """
+    Actualización de todas las películas que cumplen un filtro.
+    """
+    filtro: PeliculaSearchParams
+    cambios: PeliculaCambiosMasivos
+    dry_run: bool = Field(False, description="Solo cuenta y muestra las películas afectadas")
+    muestra: int = Field(10, ge=0, le=100, description="Películas de ejemplo en dry_run")
+    todas: bool = Field(False, description="Confirma que un filtro vacío afecta a todo el catálogo")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "filtro": {"genero": "Animación", "año_min": 2000},
+                "cambios": {"clasificacion": "G"},
+                "dry_run": True
+            }
+        }
+    )
@@ -0,0 +1,392 @@
+"""
+Tendencias de favoritos por intervalo ("top de la semana", "favoritos por día").
+
+Los favoritos marcados se acumulan por película en la tabla `resumen_favoritos`,
+una fila por (granularidad, inicio del intervalo, película). Las consultas de
+tendencias suman unas pocas filas de esa tabla en lugar de recorrer `favorito`.
+
+El agregador la mantiene de forma incremental desde el registro de cambios
+(app/registro_cambios.py): cada pasada lee los cambios de favoritos posteriores al
+último número de secuencia procesado (tabla `progreso`), suma 1 al intervalo de
+`fecha_marcado` por cada alta y resta 1 por cada baja. Los resúmenes y el avance se
+guardan en la misma transacción, y el avance solo se mueve si nadie lo movió antes
+(como las versiones de usuarios y películas), así que con varios workers cada
+cambio se cuenta una sola vez. La primera pasada, sin avance guardado, construye
+los resúmenes desde `favorito` dentro de la ventana de retención.
+
+- `retencion`: granularidades activas ("hora", "dia", "semana") y cuántos
+  intervalos de cada una se conservan; los más viejos se borran en cada pasada y
+  las bajas de favoritos marcados antes del corte se ignoran.
+- Las películas eliminadas se excluyen al consultar. Los favoritos de un usuario
+  eliminado se descuentan al procesar su baja (el "delete" de `usuario` que anota
+  `database.marcar_eliminado`); las bajas de favoritos de ese usuario anotadas
+  después, como las de la compactación (app/purga.py), ya están descontadas y se
+  saltean.
+- Las tendencias llegan con hasta `intervalo` segundos de atraso.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models import Cambio, Favorito, Pelicula, Progreso, ResumenFavoritos, Usuario, vivos
+from app.registro_cambios import DELETE, INSERT
+
+logger = logging.getLogger(__name__)
+
+GRANULARIDADES = {
+    "hora": timedelta(hours=1),
+    "dia": timedelta(days=1),
+    "semana": timedelta(weeks=1),
+}
+
+
+def truncar(fecha: datetime, granularidad: str) -> datetime:
+    """Inicio del intervalo de `granularidad` que contiene `fecha` (las semanas empiezan el lunes)."""
+    if granularidad == "hora":
+        return fecha.replace(minute=0, second=0, microsecond=0)
+    dia = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularidad == "semana":
+        return dia - timedelta(days=dia.weekday())
+    return dia
+
+
+def sumar_resumenes(session: Session, deltas: Dict[tuple, int]) -> None:
+    """
+    Suma cada delta a su fila (granularidad, inicio, id_pelicula), creándola si no existe,
+    con un solo INSERT ... ON CONFLICT DO UPDATE.
+    """
+    filas = [
+        {"granularidad": g, "inicio": inicio, "id_pelicula": id_pelicula, "cantidad": cantidad}
+        for (g, inicio, id_pelicula), cantidad in deltas.items() if cantidad
+    ]
+    if not filas:
+        return
+    tabla = ResumenFavoritos.__table__
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        sentencia = insert(tabla)
+        sentencia = sentencia.on_duplicate_key_update(cantidad=tabla.c.cantidad + sentencia.inserted.cantidad)
+    else:
+        if dialecto == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        sentencia = insert(tabla)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=[c.name for c in tabla.primary_key],
+            set_={"cantidad": tabla.c.cantidad + sentencia.excluded.cantidad},
+        )
+    session.exec(sentencia, params=filas)
+
+
+class AgregadorTendencias:
+    """Mantiene los resúmenes de favoritos por intervalo y responde las consultas de tendencias."""
+
+    NOMBRE = "tendencias"
+
+    def __init__(self, retencion: Dict[str, int], lote: int = 5000, intervalo: float = 30.0):
+        desconocidas = set(retencion) - set(GRANULARIDADES)
+        if desconocidas:
+            raise ValueError(f"Granularidades desconocidas: {', '.join(sorted(desconocidas))}")
+        self.retencion = dict(retencion)
+        self.lote = lote
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self.pasadas = 0
+        self.cambios = 0
+        self.conflictos = 0
+        self.podados = 0
+        self.secuencia = 0
+
+    # ------------------------------------------------------------------
+    # Ventanas
+    # ------------------------------------------------------------------
+
+    def validar(self, granularidad: str, intervalos: int) -> None:
+        if granularidad not in self.retencion:
+            raise ValueError(f"Granularidad no disponible: use {', '.join(self.retencion)}")
+        if intervalos > self.retencion[granularidad]:
+            raise ValueError(f"Solo se conservan {self.retencion[granularidad]} intervalos de '{granularidad}'")
+
+    def desde(self, granularidad: str, intervalos: int, ahora: Optional[datetime] = None) -> datetime:
+        """Inicio del primero de los últimos `intervalos` intervalos, incluido el actual."""
+        actual = truncar(ahora or datetime.now(), granularidad)
+        return actual - GRANULARIDADES[granularidad] * (intervalos - 1)
+
+    def _cortes(self, ahora: Optional[datetime]) -> Dict[str, datetime]:
+        return {g: self.desde(g, intervalos, ahora) for g, intervalos in self.retencion.items()}
+
+    # ------------------------------------------------------------------
+    # Agregación
+    # ------------------------------------------------------------------
+
+    def _acumular(self, deltas: Counter, cortes: Dict[str, datetime], id_pelicula: int,
+                  fecha_marcado: datetime, signo: int) -> None:
+        for granularidad, corte in cortes.items():
+            inicio = truncar(fecha_marcado, granularidad)
+            if inicio >= corte:
+                deltas[(granularidad, inicio, id_pelicula)] += signo
+
+    def reconstruir(self, session: Session, ahora: Optional[datetime] = None) -> int:
+        """
+        Reemplaza los resúmenes con los favoritos actuales dentro de la retención y
+        deja el avance en el último cambio registrado. No confirma la transacción.
+
+        Returns:
+            int: Último número de secuencia incluido
+        """
+        cortes = self._cortes(ahora)
+        secuencia = session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+        deltas: Counter = Counter()
+        if cortes:
+            filas = session.exec(
+                select(Favorito.id_pelicula, Favorito.fecha_marcado)
+                .join(Usuario, Usuario.id == Favorito.id_usuario)
+                .where(Favorito.fecha_marcado >= min(cortes.values()), vivos(Usuario))
+                .execution_options(yield_per=10000)
+            )
+            for id_pelicula, fecha_marcado in filas:
+                self._acumular(deltas, cortes, id_pelicula, fecha_marcado, 1)
+        session.exec(delete(ResumenFavoritos))
+        sumar_resumenes(session, deltas)
+        progreso = session.get(Progreso, self.NOMBRE)
+        if progreso is None:
+            session.add(Progreso(nombre=self.NOMBRE, secuencia=secuencia))
+        else:
+            progreso.secuencia = secuencia
+            progreso.fecha = datetime.now()
+        return secuencia
+
+    def _favoritos_de_bajas(self, session: Session, bajas: Dict[int, int]) -> Iterable[Tuple[int, datetime]]:
+        """
+        (id_pelicula, fecha_marcado) de cada favorito de los usuarios en `bajas`
+        (id_usuario -> secuencia de su baja): los que siguen en la tabla y los que
+        se borraron después de la baja. Se lee primero la tabla y después el registro:
+        un favorito que la compactación borra entre las dos lecturas aparece en ambas
+        y se cuenta una vez por su id.
+        """
+        favoritos: Dict[int, Tuple[int, datetime]] = {}
+        tabla = Favorito.__table__
+        filas = session.exec(
+            select(tabla.c.id, tabla.c.id_pelicula, tabla.c.fecha_marcado)
+            .where(tabla.c.id_usuario.in_(list(bajas)))
+        )
+        for id_favorito, id_pelicula, fecha_marcado in filas:
+            favoritos[id_favorito] = (id_pelicula, fecha_marcado)
+
+        registro = Cambio.__table__
+        borrados = session.exec(
+            select(registro.c.id, registro.c.id_entidad, registro.c.datos)
+            .where(registro.c.entidad == "favorito", registro.c.operacion == DELETE,
+                   registro.c.id > min(bajas.values()))
+        )
+        for secuencia, id_favorito, datos in borrados:
+            if id_favorito in favoritos or not datos:
+                continue
+            datos = json.loads(datos)
+            baja = bajas.get(datos["id_usuario"])
+            if baja is not None and secuencia > baja:
+                favoritos[id_favorito] = (datos["id_pelicula"], datetime.fromisoformat(datos["fecha_marcado"]))
+        return favoritos.values()
+
+    def _bajas_de_usuarios(self, session: Session, ids_usuario: Iterable[int]) -> Dict[int, int]:
+        """Secuencia de la baja de cada usuario de `ids_usuario` que fue eliminado."""
+        ids_usuario = list(ids_usuario)
+        if not ids_usuario:
+            return {}
+        tabla = Cambio.__table__
+        return dict(session.exec(
+            select(tabla.c.id_entidad, func.min(tabla.c.id))
+            .where(tabla.c.entidad == "usuario", tabla.c.operacion == DELETE, tabla.c.id_entidad.in_(ids_usuario))
+            .group_by(tabla.c.id_entidad)
+        ).all())
+
+    def _procesar_lote(self, engine, ahora: Optional[datetime]) -> int:
+        with Session(engine) as session:
+            progreso = session.get(Progreso, self.NOMBRE)
+            if progreso is None:
+                secuencia = self.reconstruir(session, ahora)
+                session.commit()
+                with self._lock:
+                    self.secuencia = secuencia
+                return 0
+
+            anterior = progreso.secuencia
+            tabla = Cambio.__table__
+            cambios = session.exec(
+                select(tabla.c.id, tabla.c.entidad, tabla.c.id_entidad, tabla.c.operacion, tabla.c.datos)
+                .where(
+                    tabla.c.id > anterior,
+                    or_(tabla.c.entidad == "favorito", and_(tabla.c.entidad == "usuario", tabla.c.operacion == DELETE)),
+                )
+                .order_by(tabla.c.id)
+                .limit(self.lote)
+            ).all()
+            if not cambios:
+                return 0
+
+            cortes = self._cortes(ahora)
+            deltas: Counter = Counter()
+            favoritos = [
+                (cambio, json.loads(cambio.datos)) for cambio in cambios
+                if cambio.entidad == "favorito" and cambio.operacion in (INSERT, DELETE) and cambio.datos
+            ]
+            bajas = self._bajas_de_usuarios(
+                session, {datos["id_usuario"] for cambio, datos in favoritos if cambio.operacion == DELETE}
+            )
+            for cambio, datos in favoritos:
+                if cambio.operacion == DELETE and bajas.get(datos["id_usuario"], cambio.id) < cambio.id:
+                    continue  # Ya descontado con la baja del usuario
+                fecha_marcado = datetime.fromisoformat(datos["fecha_marcado"])
+                signo = 1 if cambio.operacion == INSERT else -1
+                self._acumular(deltas, cortes, datos["id_pelicula"], fecha_marcado, signo)
+
+            bajas_en_lote = {c.id_entidad: c.id for c in cambios if c.entidad == "usuario"}
+            if bajas_en_lote:
+                for id_pelicula, fecha_marcado in self._favoritos_de_bajas(session, bajas_en_lote):
+                    self._acumular(deltas, cortes, id_pelicula, fecha_marcado, -1)
+            sumar_resumenes(session, deltas)
+
+            nueva = cambios[-1].id
+            avance = session.exec(
+                update(Progreso)
+                .where(Progreso.nombre == self.NOMBRE, Progreso.secuencia == anterior)
+                .values(secuencia=nueva, fecha=datetime.now())
+            )
+            if avance.rowcount != 1:
+                # Otro worker procesó estos cambios primero
+                session.rollback()
+                with self._lock:
+                    self.conflictos += 1
+                return 0
+            session.commit()
+        with self._lock:
+            self.cambios += len(cambios)
+            self.secuencia = nueva
+        return len(cambios)
+
+    def podar(self, engine, ahora: Optional[datetime] = None) -> int:
+        """Borra los intervalos fuera de la retención, las granularidades inactivas y las filas en cero."""
+        tabla = ResumenFavoritos.__table__
+        with Session(engine) as session:
+            borradas = 0
+            for granularidad, corte in self._cortes(ahora).items():
+                borradas += session.exec(
+                    delete(tabla).where(tabla.c.granularidad == granularidad, tabla.c.inicio < corte)
+                ).rowcount
+            borradas += session.exec(
+                delete(tabla).where(or_(tabla.c.granularidad.not_in(list(self.retencion)), tabla.c.cantidad <= 0))
+            ).rowcount
+            session.commit()
+        with self._lock:
+            self.podados += borradas
+        return borradas
+
+    def procesar(self, engine, ahora: Optional[datetime] = None) -> int:
+        """
+        Aplica a los resúmenes todos los cambios pendientes, en transacciones de
+        `lote` cambios, y poda lo que salió de la retención.
+
+        Returns:
+            int: Cambios del registro procesados
+        """
+        total = 0
+        while True:
+            try:
+                procesados = self._procesar_lote(engine, ahora)
+            except (IntegrityError, OperationalError):
+                # Otro worker creó el avance o escribió a la vez: se reintenta en la próxima pasada
+                with self._lock:
+                    self.conflictos += 1
+                break
+            total += procesados
+            if procesados < self.lote:
+                break
+        self.podar(engine, ahora)
+        with self._lock:
+            self.pasadas += 1
+        return total
+
+    async def ejecutar(self, engine) -> None:
+        """Tarea de fondo: una pasada cada `intervalo` segundos."""
+        while True:
+            try:
+                await asyncio.to_thread(self.procesar, engine)
+            except Exception:
+                logger.exception("Error al agregar las tendencias de favoritos")
+            await asyncio.sleep(self.intervalo)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def top(self, session: Session, granularidad: str, intervalos: int, limite: int = 10,
+            ahora: Optional[datetime] = None) -> List[dict]:
+        """Películas vivas con más favoritos marcados en los últimos `intervalos` intervalos."""
+        self.validar(granularidad, intervalos)
+        favoritos = func.sum(ResumenFavoritos.cantidad).label("favoritos")
+        filas = session.exec(
+            select(Pelicula.id, Pelicula.titulo, Pelicula.año, favoritos)
+            .join(ResumenFavoritos, ResumenFavoritos.id_pelicula == Pelicula.id)
+            .where(
+                ResumenFavoritos.granularidad == granularidad,
+                ResumenFavoritos.inicio >= self.desde(granularidad, intervalos, ahora),
+                vivos(Pelicula),
+            )
+            .group_by(Pelicula.id)
+            .having(favoritos > 0)
+            .order_by(favoritos.desc(), Pelicula.id)
+            .limit(limite)
+        ).all()
+        return [
+            {"id_pelicula": id_pelicula, "titulo": titulo, "año": año, "favoritos": cantidad}
+            for id_pelicula, titulo, año, cantidad in filas
+        ]
+
+    def serie(self, session: Session, granularidad: str, intervalos: int, id_pelicula: Optional[int] = None,
+              ahora: Optional[datetime] = None) -> List[dict]:
+        """Favoritos marcados en cada uno de los últimos `intervalos` intervalos (en cero si no hubo)."""
+        self.validar(granularidad, intervalos)
+        desde = self.desde(granularidad, intervalos, ahora)
+        statement = (
+            select(ResumenFavoritos.inicio, func.sum(ResumenFavoritos.cantidad))
+            .join(Pelicula, Pelicula.id == ResumenFavoritos.id_pelicula)
+            .where(ResumenFavoritos.granularidad == granularidad, ResumenFavoritos.inicio >= desde, vivos(Pelicula))
+            .group_by(ResumenFavoritos.inicio)
+        )
+        if id_pelicula is not None:
+            statement = statement.where(ResumenFavoritos.id_pelicula == id_pelicula)
+        cantidades = dict(session.exec(statement).all())
+        paso = GRANULARIDADES[granularidad]
+        return [
+            {"inicio": desde + paso * i, "favoritos": cantidades.get(desde + paso * i, 0)}
+            for i in range(intervalos)
+        ]
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "secuencia": self.secuencia,
+                "pasadas": self.pasadas,
+                "cambios": self.cambios,
+                "conflictos": self.conflictos,
+                "podados": self.podados,
+            }
+
+
+agregador_tendencias = AgregadorTendencias(
+    retencion=settings.tendencias_retencion,
+    lote=settings.tendencias_lote,
+    intervalo=settings.tendencias_intervalo,
+)
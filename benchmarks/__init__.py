@@ -0,0 +1,32 @@
+"""
+Paquete de benchmarks de la API de Películas.
+Permite medir latencia y throughput de los endpoints contra datos sintéticos
+y detectar regresiones comparando con una línea base guardada en JSON.
+
+Uso:
+    python -m benchmarks --usuarios 1000 --peliculas 2000 --favoritos 20000
+    python -m benchmarks --guardar linea_base.json
+    python -m benchmarks --comparar linea_base.json --umbral 0.2
+"""
+
+from .carga import Contexto, Escenario, ESCENARIOS, sembrar_datos, ejecutar_benchmark
+from .reporte import (
+    calcular_metricas,
+    percentil,
+    guardar_linea_base,
+    cargar_linea_base,
+    comparar_con_linea_base,
+)
+
+__all__ = [
+    "Contexto",
+    "Escenario",
+    "ESCENARIOS",
+    "sembrar_datos",
+    "ejecutar_benchmark",
+    "calcular_metricas",
+    "percentil",
+    "guardar_linea_base",
+    "cargar_linea_base",
+    "comparar_con_linea_base",
+]
@@ -0,0 +1,83 @@
+"""
+Punto de entrada de línea de comandos para los benchmarks.
+
+Ejemplos:
+    python -m benchmarks --usuarios 2000 --peliculas 5000 --favoritos 50000
+    python -m benchmarks --escenarios listar_peliculas,buscar_peliculas --guardar base.json
+    python -m benchmarks --comparar base.json --umbral 0.15
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.carga import crear_engine_benchmark, ejecutar_benchmark, sembrar_datos
+from benchmarks.reporte import cargar_linea_base, comparar_con_linea_base, guardar_linea_base
+
+
+def construir_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark de carga de la API de Películas"
+    )
+    parser.add_argument("--usuarios", type=int, default=1000, help="Usuarios a sembrar")
+    parser.add_argument("--peliculas", type=int, default=1000, help="Películas a sembrar")
+    parser.add_argument("--favoritos", type=int, default=10000, help="Favoritos a sembrar")
+    parser.add_argument("--peticiones", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrencia", type=int, default=16, help="Clientes concurrentes")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla para datos reproducibles")
+    parser.add_argument("--escenarios", default="", help="Lista separada por comas (todos por defecto)")
+    parser.add_argument("--guardar", metavar="RUTA", help="Guarda los resultados como línea base")
+    parser.add_argument("--comparar", metavar="RUTA", help="Compara contra una línea base")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    return parser
+
+
+def _imprimir_tabla(resultados: dict) -> None:
+    encabezado = f"{'escenario':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}{'errores':>9}"
+    print(encabezado)
+    print("-" * len(encabezado))
+    for nombre, m in resultados.items():
+        print(
+            f"{nombre:<34}{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}"
+            f"{m['rps']:>10}{m['errores']:>9}"
+        )
+
+
+def main(argv=None) -> int:
+    args = construir_parser().parse_args(argv)
+    escenarios = [e.strip() for e in args.escenarios.split(",") if e.strip()] or None
+
+    # Importar la app aquí para no cargarla solo por mostrar --help
+    from main import app
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = crear_engine_benchmark(str(Path(directorio) / "benchmark.db"))
+        ctx = sembrar_datos(engine, args.usuarios, args.peliculas, args.favoritos, semilla=args.semilla)
+        resultados = asyncio.run(
+            ejecutar_benchmark(app, engine, ctx, args.peticiones, args.concurrencia, escenarios)
+        )
+        engine.dispose()
+
+    _imprimir_tabla(resultados)
+
+    if args.guardar:
+        guardar_linea_base(resultados, args.guardar)
+        print(f"\nLínea base guardada en {args.guardar}")
+
+    if args.comparar:
+        regresiones = comparar_con_linea_base(resultados, cargar_linea_base(args.comparar), args.umbral)
+        if regresiones:
+            print("\nRegresiones detectadas:")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            return 1
+        print("\nSin regresiones respecto a la línea base")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark del índice de autocompletado.
+
+Construye el índice con un catálogo sintético (1M de títulos por defecto) y
+popularidad Zipf, y mide la latencia de consultas con prefijos de 1 a 8 letras
+tomados de títulos y directores reales del catálogo.
+
+Uso:
+    python -m benchmarks.autocompletado --peliculas 1000000 --consultas 20000
+"""
+
+import argparse
+import random
+import time
+from typing import Dict
+
+from app.autocompletado import IndiceAutocompletado
+from app.datos_sinteticos import GeneradorDatos
+from benchmarks.reporte import percentil
+
+
+def construir_indice(peliculas: int, favoritos: int, semilla: int = 42) -> IndiceAutocompletado:
+    generador = GeneradorDatos(usuarios=max(1, favoritos // 50), peliculas=peliculas, favoritos=favoritos, semilla=semilla)
+    filas = [(f["id"], f["titulo"], f["director"]) for f in generador.iter_peliculas()]
+    popularidad: Dict[int, int] = {}
+    for favorito in generador.iter_favoritos():
+        popularidad[favorito["id_pelicula"]] = popularidad.get(favorito["id_pelicula"], 0) + 1
+
+    indice = IndiceAutocompletado()
+    indice.construir(filas, popularidad)
+    return indice
+
+
+def medir_consultas(indice: IndiceAutocompletado, consultas: int, semilla: int = 42) -> Dict[str, float]:
+    """
+    Ejecuta consultas con prefijos aleatorios y retorna percentiles de latencia en ms.
+    """
+    rng = random.Random(semilla)
+    muestras = [
+        (titulo if rng.random() < 0.8 else director)
+        for titulo, director, _ in rng.sample(list(indice._peliculas.values()), min(5000, len(indice)))
+    ]
+    latencias = []
+    for _ in range(consultas):
+        texto = rng.choice(muestras)
+        prefijo = texto[:rng.randint(1, 8)]
+        inicio = time.perf_counter()
+        indice.buscar(prefijo, 10)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+    return {
+        "consultas": consultas,
+        "p50_ms": round(percentil(latencias, 50), 4),
+        "p95_ms": round(percentil(latencias, 95), 4),
+        "p99_ms": round(percentil(latencias, 99), 4),
+        "max_ms": round(latencias[-1], 4),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.autocompletado",
+        description="Latencia del autocompletado sobre un catálogo grande"
+    )
+    parser.add_argument("--peliculas", type=int, default=1_000_000)
+    parser.add_argument("--favoritos", type=int, default=2_000_000)
+    parser.add_argument("--consultas", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    indice = construir_indice(args.peliculas, args.favoritos, args.semilla)
+    print(f"Índice de {len(indice)} películas construido en {time.perf_counter() - inicio:.1f} s")
+
+    resultado = medir_consultas(indice, args.consultas, args.semilla)
+    print(f"p50 {resultado['p50_ms']} ms | p95 {resultado['p95_ms']} ms | "
+          f"p99 {resultado['p99_ms']} ms | máx {resultado['max_ms']} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
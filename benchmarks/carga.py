@@ -0,0 +1,368 @@
+"""
+Generador de carga para la API de Películas.
+Siembra una base de datos SQLite temporal con datos sintéticos y ejecuta
+peticiones concurrentes contra cada endpoint usando un transporte ASGI
+en proceso (sin red ni servidor externo).
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.database import get_session
+from app.limitador import limitador_carga
+from app.models import Usuario, Pelicula, Favorito
+from benchmarks.reporte import calcular_metricas
+
+
+GENEROS = ["Drama", "Acción", "Comedia", "Ciencia Ficción", "Terror", "Animación", "Crimen", "Romance"]
+CLASIFICACIONES = ["G", "PG", "PG-13", "R", "NC-17"]
+
+
+class Contexto:
+    """
+    Estado compartido entre los escenarios de un benchmark.
+    Conoce el tamaño del dataset sembrado y reparte IDs sin repetir
+    para que las escrituras no choquen entre sí.
+    """
+
+    def __init__(self, usuarios: int, peliculas: int, favoritos: int, reserva: int, semilla: int = 42):
+        self.usuarios = usuarios
+        self.peliculas = peliculas
+        self.favoritos = favoritos
+        self.reserva = reserva
+        self.rng = random.Random(semilla)
+        self.contador = 0
+
+        # Filas sembradas solo para ser eliminadas por los escenarios DELETE
+        self.reserva_usuarios = deque(range(usuarios + 1, usuarios + reserva + 1))
+        self.reserva_peliculas = deque(range(peliculas + 1, peliculas + reserva + 1))
+        self.reserva_usuarios_favoritos = deque(range(usuarios + 1, usuarios + reserva + 1))
+
+        # Pares (usuario, película) libres: usan la mitad superior del catálogo,
+        # que la siembra deja sin favoritos
+        self._mitad = max(1, peliculas // 2)
+        self._siguiente_par = 0
+        self.pares_creados: deque = deque()
+        self.favoritos_creados: deque = deque()
+
+    def siguiente(self) -> int:
+        """Retorna un número único dentro del benchmark."""
+        self.contador += 1
+        return self.contador
+
+    def usuario_aleatorio(self) -> int:
+        return self.rng.randint(1, self.usuarios)
+
+    def pelicula_aleatoria(self) -> int:
+        return self.rng.randint(1, self.peliculas)
+
+    def par_libre(self) -> Tuple[int, int]:
+        """Retorna un par (usuario, película) que todavía no es favorito."""
+        i = self._siguiente_par
+        self._siguiente_par += 1
+        libres = self.peliculas - self._mitad
+        usuario = 1 + i % self.usuarios
+        pelicula = self._mitad + 1 + (i // self.usuarios) % libres
+        return usuario, pelicula
+
+
+class Escenario:
+    """
+    Describe cómo construir una petición contra un endpoint.
+
+    - **construir**: recibe el Contexto y retorna (url, cuerpo_json)
+    - **procesar**: opcional, recibe el Contexto y la respuesta
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        metodo: str,
+        construir: Callable[[Contexto], Optional[Tuple[str, Optional[dict]]]],
+        procesar: Optional[Callable[[Contexto, httpx.Response], None]] = None
+    ):
+        self.nombre = nombre
+        self.metodo = metodo
+        self.construir = construir
+        self.procesar = procesar
+
+    def __repr__(self):
+        return f"<Escenario({self.nombre}, {self.metodo})>"
+
+
+def _usuario_json(ctx: Contexto) -> Tuple[str, dict]:
+    n = ctx.siguiente()
+    return "/api/usuarios/", {"nombre": f"Usuario Bench {n}", "correo": f"bench{n}@ejemplo.com"}
+
+
+def _pelicula_json(ctx: Contexto) -> dict:
+    n = ctx.siguiente()
+    return {
+        "titulo": f"Película Benchmark {n}",
+        "director": f"Director {n % 97}",
+        "genero": ctx.rng.choice(GENEROS),
+        "duracion": ctx.rng.randint(80, 180),
+        "año": ctx.rng.randint(1950, 2024),
+        "clasificacion": ctx.rng.choice(CLASIFICACIONES),
+        "sinopsis": "Sinopsis generada para el benchmark."
+    }
+
+
+def _marcar_par(ctx: Contexto) -> Tuple[str, None]:
+    usuario, pelicula = ctx.par_libre()
+    ctx.pares_creados.append((usuario, pelicula))
+    return f"/api/usuarios/{usuario}/favoritos/{pelicula}", None
+
+
+def _desmarcar_par(ctx: Contexto) -> Optional[Tuple[str, None]]:
+    if not ctx.pares_creados:
+        return None
+    usuario, pelicula = ctx.pares_creados.popleft()
+    return f"/api/usuarios/{usuario}/favoritos/{pelicula}", None
+
+
+def _crear_favorito(ctx: Contexto) -> Tuple[str, dict]:
+    usuario, pelicula = ctx.par_libre()
+    return "/api/favoritos/", {"id_usuario": usuario, "id_pelicula": pelicula}
+
+
+def _guardar_favorito(ctx: Contexto, response: httpx.Response) -> None:
+    if response.status_code == 201:
+        ctx.favoritos_creados.append(response.json()["id"])
+
+
+def _eliminar_favorito(ctx: Contexto) -> Optional[Tuple[str, None]]:
+    if not ctx.favoritos_creados:
+        return None
+    return f"/api/favoritos/{ctx.favoritos_creados.popleft()}", None
+
+
+def _desde_reserva(cola: str, plantilla: str) -> Callable[[Contexto], Optional[Tuple[str, None]]]:
+    def construir(ctx: Contexto):
+        ids = getattr(ctx, cola)
+        if not ids:
+            return None
+        return plantilla.format(ids.popleft()), None
+    return construir
+
+
+# El orden importa: los escenarios DELETE consumen lo creado por los POST previos
+ESCENARIOS: List[Escenario] = [
+    # Generales
+    Escenario("root", "GET", lambda ctx: ("/", None)),
+    Escenario("health", "GET", lambda ctx: ("/health", None)),
+    Escenario("estadisticas_generales", "GET", lambda ctx: ("/api/estadisticas/", None)),
+
+    # Usuarios
+    Escenario("listar_usuarios", "GET", lambda ctx: ("/api/usuarios/?limit=100", None)),
+    Escenario("crear_usuario", "POST", _usuario_json),
+    Escenario("obtener_usuario", "GET", lambda ctx: (f"/api/usuarios/{ctx.usuario_aleatorio()}", None)),
+    Escenario("actualizar_usuario", "PUT", lambda ctx: (
+        f"/api/usuarios/{ctx.usuario_aleatorio()}", {"nombre": f"Renombrado {ctx.siguiente()}"}
+    )),
+    Escenario("listar_favoritos_usuario", "GET", lambda ctx: (
+        f"/api/usuarios/{ctx.usuario_aleatorio()}/favoritos", None
+    )),
+    Escenario("estadisticas_usuario", "GET", lambda ctx: (
+        f"/api/usuarios/{ctx.usuario_aleatorio()}/estadisticas", None
+    )),
+    Escenario("marcar_favorito", "POST", _marcar_par),
+    Escenario("desmarcar_favorito", "DELETE", _desmarcar_par),
+
+    # Películas
+    Escenario("listar_peliculas", "GET", lambda ctx: ("/api/peliculas/?limit=100", None)),
+    Escenario("crear_pelicula", "POST", lambda ctx: ("/api/peliculas/", _pelicula_json(ctx))),
+    Escenario("obtener_pelicula", "GET", lambda ctx: (f"/api/peliculas/{ctx.pelicula_aleatoria()}", None)),
+    Escenario("actualizar_pelicula", "PUT", lambda ctx: (
+        f"/api/peliculas/{ctx.pelicula_aleatoria()}", {"duracion": ctx.rng.randint(80, 180)}
+    )),
+    Escenario("buscar_peliculas", "GET", lambda ctx: (
+        f"/api/peliculas/buscar/?genero={ctx.rng.choice(GENEROS)}&año_min=1990", None
+    )),
+    Escenario("peliculas_populares", "GET", lambda ctx: ("/api/peliculas/populares/top?limit=10", None)),
+    Escenario("peliculas_por_clasificacion", "GET", lambda ctx: (
+        f"/api/peliculas/clasificacion/{ctx.rng.choice(CLASIFICACIONES)}", None
+    )),
+    Escenario("peliculas_recientes", "GET", lambda ctx: ("/api/peliculas/recientes/nuevas", None)),
+
+    # Favoritos
+    Escenario("listar_favoritos", "GET", lambda ctx: ("/api/favoritos/?limit=100", None)),
+    Escenario("crear_favorito", "POST", _crear_favorito, _guardar_favorito),
+    Escenario("obtener_favorito", "GET", lambda ctx: (f"/api/favoritos/{ctx.rng.randint(1, max(1, ctx.favoritos))}", None)),
+    Escenario("favoritos_por_usuario", "GET", lambda ctx: (
+        f"/api/favoritos/usuario/{ctx.usuario_aleatorio()}", None
+    )),
+    Escenario("favoritos_por_pelicula", "GET", lambda ctx: (
+        f"/api/favoritos/pelicula/{ctx.pelicula_aleatoria()}", None
+    )),
+    Escenario("verificar_favorito", "GET", lambda ctx: (
+        f"/api/favoritos/verificar/{ctx.usuario_aleatorio()}/{ctx.pelicula_aleatoria()}", None
+    )),
+    Escenario("estadisticas_favoritos", "GET", lambda ctx: ("/api/favoritos/estadisticas/generales", None)),
+    Escenario("eliminar_favorito", "DELETE", _eliminar_favorito),
+    Escenario("eliminar_todos_favoritos_usuario", "DELETE",
+              _desde_reserva("reserva_usuarios_favoritos", "/api/favoritos/usuario/{}/todos")),
+
+    # Eliminaciones de filas reservadas
+    Escenario("eliminar_pelicula", "DELETE", _desde_reserva("reserva_peliculas", "/api/peliculas/{}")),
+    Escenario("eliminar_usuario", "DELETE", _desde_reserva("reserva_usuarios", "/api/usuarios/{}")),
+]
+
+
+def sembrar_datos(
+    engine,
+    usuarios: int = 1000,
+    peliculas: int = 1000,
+    favoritos: int = 10000,
+    reserva: int = 200,
+    semilla: int = 42
+) -> Contexto:
+    """
+    Crea las tablas y siembra un dataset sintético de tamaño configurable.
+
+    Los favoritos se reparten entre los usuarios regulares usando solo la mitad
+    inferior del catálogo, para que los escenarios de escritura tengan pares libres.
+    Además se siembran `reserva` usuarios y películas extra (con algunos favoritos)
+    que los escenarios DELETE pueden eliminar.
+    """
+    rng = random.Random(semilla)
+    SQLModel.metadata.create_all(engine)
+    ahora = datetime.now()
+
+    filas_usuarios = [
+        {"nombre": f"Usuario {i}", "correo": f"usuario{i}@ejemplo.com", "fecha_registro": ahora}
+        for i in range(1, usuarios + reserva + 1)
+    ]
+    filas_peliculas = [
+        {
+            "titulo": f"Película {i}",
+            "director": f"Director {i % 211}",
+            "genero": ", ".join(rng.sample(GENEROS, rng.randint(1, 2))),
+            "duracion": rng.randint(80, 180),
+            "año": rng.randint(1950, 2024),
+            "clasificacion": rng.choice(CLASIFICACIONES),
+            "sinopsis": "Sinopsis sintética para pruebas de carga.",
+            "fecha_creacion": ahora,
+        }
+        for i in range(1, peliculas + reserva + 1)
+    ]
+
+    mitad = max(1, peliculas // 2)
+    por_usuario = min(mitad, favoritos // max(1, usuarios))
+    filas_favoritos = []
+    for usuario in range(1, usuarios + 1):
+        for pelicula in rng.sample(range(1, mitad + 1), por_usuario):
+            filas_favoritos.append({"id_usuario": usuario, "id_pelicula": pelicula, "fecha_marcado": ahora})
+    for usuario in range(usuarios + 1, usuarios + reserva + 1):
+        for pelicula in rng.sample(range(1, mitad + 1), min(mitad, 5)):
+            filas_favoritos.append({"id_usuario": usuario, "id_pelicula": pelicula, "fecha_marcado": ahora})
+
+    with Session(engine) as session:
+        session.execute(insert(Usuario), filas_usuarios)
+        session.execute(insert(Pelicula), filas_peliculas)
+        if filas_favoritos:
+            session.execute(insert(Favorito), filas_favoritos)
+        session.commit()
+
+    return Contexto(usuarios, peliculas, len(filas_favoritos), reserva, semilla)
+
+
+async def _ejecutar_escenario(
+    client: httpx.AsyncClient,
+    escenario: Escenario,
+    ctx: Contexto,
+    peticiones: int,
+    concurrencia: int
+) -> Dict[str, float]:
+    # Las peticiones se construyen por adelantado para no medir el armado del cuerpo
+    pendientes = deque()
+    for _ in range(peticiones):
+        peticion = escenario.construir(ctx)
+        if peticion is None:
+            break
+        pendientes.append(peticion)
+
+    latencias: List[float] = []
+    errores = 0
+
+    async def cliente():
+        nonlocal errores
+        while pendientes:
+            url, cuerpo = pendientes.popleft()
+            inicio = time.perf_counter()
+            response = await client.request(escenario.metodo, url, json=cuerpo)
+            latencias.append(time.perf_counter() - inicio)
+            if response.status_code >= 400:
+                errores += 1
+            if escenario.procesar:
+                escenario.procesar(ctx, response)
+
+    inicio_total = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio_total
+
+    return calcular_metricas(latencias, duracion, errores)
+
+
+async def ejecutar_benchmark(
+    app,
+    engine,
+    ctx: Contexto,
+    peticiones: int = 200,
+    concurrencia: int = 16,
+    escenarios: Optional[List[str]] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Ejecuta los escenarios contra la aplicación usando la base sembrada.
+
+    Args:
+        app: Aplicación FastAPI a medir
+        engine: Engine con los datos sembrados por sembrar_datos
+        ctx: Contexto retornado por sembrar_datos
+        peticiones (int): Peticiones por escenario
+        concurrencia (int): Clientes concurrentes por escenario
+        escenarios (list): Nombres de escenarios a ejecutar (todos si es None)
+
+    Returns:
+        dict: Métricas por escenario
+    """
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    # Todas las peticiones salen de la misma IP: se mide la aplicación, no los límites
+    habilitado, limitador_carga.habilitado = limitador_carga.habilitado, False
+    resultados = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for escenario in ESCENARIOS:
+                if escenarios and escenario.nombre not in escenarios:
+                    continue
+                resultados[escenario.nombre] = await _ejecutar_escenario(
+                    client, escenario, ctx, peticiones, concurrencia
+                )
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+        limitador_carga.habilitado = habilitado
+
+    return resultados
+
+
+def crear_engine_benchmark(ruta: str):
+    """
+    Crea un engine SQLite sobre un archivo dedicado al benchmark.
+    """
+    return create_engine(
+        f"sqlite:///{ruta}",
+        connect_args={"check_same_thread": False}
+    )
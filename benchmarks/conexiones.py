@@ -0,0 +1,192 @@
+"""
+Benchmark de conexiones WebSocket inactivas (WS /api/favoritos/ws).
+
+Levanta la API con uvicorn en un proceso aparte sobre una base temporal, abre
+`--conexiones` WebSockets (10k por defecto) suscritos a `--usuarios` usuarios y los
+mantiene abiertos sin tráfico. Mide la memoria del servidor por conexión y, con
+todas abiertas, la latencia de entrega de cambios de favoritos a los suscriptores.
+
+El proceso cliente y el servidor necesitan cada uno un descriptor por conexión:
+revise `ulimit -n` antes de correrlo.
+
+Uso:
+    python -m benchmarks.conexiones --conexiones 10000 --usuarios 100 --espera 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.reporte import percentil
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memoria_proceso_kb(pid: int) -> int:
+    """Memoria residente (VmRSS) de un proceso en KB, leída de /proc."""
+    with open(f"/proc/{pid}/status") as archivo:
+        for linea in archivo:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1])
+    return 0
+
+
+def iniciar_servidor(directorio: str, puerto: int, implementacion_ws: str = "auto") -> subprocess.Popen:
+    entorno = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{Path(directorio) / 'conexiones.db'}",
+        "DEBUG": "false",
+        "LIMITE_HABILITADO": "false",  # la siembra y las conexiones salen de una sola IP
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(puerto),
+         "--log-level", "warning", "--backlog", "4096", "--ws", implementacion_ws],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL,
+    )
+
+
+async def _esperar_servidor(http: httpx.AsyncClient, proceso: subprocess.Popen) -> None:
+    for _ in range(200):
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó al iniciar")
+        try:
+            if (await http.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+async def _sembrar(http: httpx.AsyncClient, usuarios: int, peliculas: int) -> tuple:
+    ids_usuarios = [
+        (await http.post("/api/usuarios/", json={"nombre": f"Usuario {i}", "correo": f"usuario{i}@email.com"})).json()["id"]
+        for i in range(usuarios)
+    ]
+    ids_peliculas = [
+        (await http.post("/api/peliculas/", json={
+            "titulo": f"Película {i}", "director": "Director", "genero": "Drama",
+            "duracion": 100, "año": 2000, "clasificacion": "PG"
+        })).json()["id"]
+        for i in range(peliculas)
+    ]
+    return ids_usuarios, ids_peliculas
+
+
+async def _abrir(url: str, cantidad: int, ids_usuarios: List[int], lote: int) -> list:
+    async def abrir_una(i: int):
+        ws = await connect(f"{url}?usuarios={ids_usuarios[i % len(ids_usuarios)]}",
+                           ping_interval=None, open_timeout=60)
+        json.loads(await ws.recv())  # confirmación de la suscripción
+        return ws
+
+    conexiones = []
+    for inicio in range(0, cantidad, lote):
+        conexiones += await asyncio.gather(*(abrir_una(i) for i in range(inicio, min(cantidad, inicio + lote))))
+    return conexiones
+
+
+async def _medir_entregas(http: httpx.AsyncClient, conexiones: list, ids_usuarios: List[int],
+                          ids_peliculas: List[int], cambios: int) -> List[float]:
+    """Alterna favoritos y mide cuánto tarda cada suscriptor en recibir el cambio."""
+    latencias: List[float] = []
+    for n in range(cambios):
+        posicion = n % len(ids_usuarios)
+        suscriptores = conexiones[posicion::len(ids_usuarios)]
+        id_usuario, id_pelicula = ids_usuarios[posicion], ids_peliculas[n % len(ids_peliculas)]
+
+        async def recibir(ws):
+            json.loads(await ws.recv())
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        espera = asyncio.gather(*(recibir(ws) for ws in suscriptores))
+        await http.post(f"/api/usuarios/{id_usuario}/favoritos/{id_pelicula}")
+        await asyncio.wait_for(espera, timeout=30)
+    return latencias
+
+
+async def ejecutar(conexiones: int, usuarios: int, espera: float, cambios: int, lote: int,
+                   implementacion_ws: str = "auto") -> Dict:
+    with tempfile.TemporaryDirectory() as directorio:
+        puerto = _puerto_libre()
+        proceso = iniciar_servidor(directorio, puerto, implementacion_ws)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", timeout=30) as http:
+                await _esperar_servidor(http, proceso)
+                ids_usuarios, ids_peliculas = await _sembrar(http, usuarios, max(1, cambios))
+                memoria_inicial = memoria_proceso_kb(proceso.pid)
+
+                inicio = time.perf_counter()
+                abiertas = await _abrir(f"ws://127.0.0.1:{puerto}/api/favoritos/ws", conexiones, ids_usuarios, lote)
+                segundos_apertura = time.perf_counter() - inicio
+                memoria_abiertas = memoria_proceso_kb(proceso.pid)
+
+                await asyncio.sleep(espera)
+                vivas = sum(1 for ws in abiertas if ws.close_code is None)
+
+                latencias = sorted(await _medir_entregas(http, abiertas, ids_usuarios, ids_peliculas, cambios))
+                await asyncio.gather(*(ws.close() for ws in abiertas))
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    return {
+        "conexiones": conexiones,
+        "vivas_tras_espera": vivas,
+        "apertura_s": round(segundos_apertura, 2),
+        "memoria_inicial_mb": round(memoria_inicial / 1024, 1),
+        "memoria_abiertas_mb": round(memoria_abiertas / 1024, 1),
+        "kb_por_conexion": round((memoria_abiertas - memoria_inicial) / max(1, conexiones), 1),
+        "entregas": len(latencias),
+        "entrega_p50_ms": round(percentil(latencias, 50), 2) if latencias else 0.0,
+        "entrega_p99_ms": round(percentil(latencias, 99), 2) if latencias else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.conexiones",
+        description="Conexiones WebSocket inactivas sostenidas por un proceso"
+    )
+    parser.add_argument("--conexiones", type=int, default=10000)
+    parser.add_argument("--usuarios", type=int, default=100, help="Usuarios entre los que se reparten las suscripciones")
+    parser.add_argument("--espera", type=float, default=10.0, help="Segundos con todas las conexiones inactivas")
+    parser.add_argument("--cambios", type=int, default=20, help="Favoritos a marcar con todas abiertas")
+    parser.add_argument("--lote", type=int, default=500, help="Conexiones abiertas en paralelo")
+    parser.add_argument("--ws", default="auto", help="Implementación WebSocket de uvicorn (auto, websockets, websockets-sansio)")
+    args = parser.parse_args(argv)
+
+    limite, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if limite < args.conexiones + 100:
+        print(f"Advertencia: ulimit -n es {limite}, insuficiente para {args.conexiones} conexiones")
+
+    r = asyncio.run(ejecutar(args.conexiones, args.usuarios, args.espera, args.cambios, args.lote, args.ws))
+    print(f"{r['vivas_tras_espera']}/{r['conexiones']} conexiones vivas tras {args.espera:.0f} s "
+          f"(abiertas en {r['apertura_s']} s)")
+    print(f"Memoria del servidor: {r['memoria_inicial_mb']} MB -> {r['memoria_abiertas_mb']} MB "
+          f"({r['kb_por_conexion']} KB por conexión)")
+    print(f"Entrega de {r['entregas']} cambios: p50 {r['entrega_p50_ms']} ms | p99 {r['entrega_p99_ms']} ms")
+    return 0 if r["vivas_tras_espera"] == r["conexiones"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""
+Microbenchmark del costo de construir las sentencias en cada petición.
+
+Para la búsqueda de películas (2^6 combinaciones de filtros) compara:
+
+- **por_peticion**: `select(...).where(*condiciones_busqueda(...))` en cada petición,
+  como antes; SQLAlchemy además recorre la sentencia para calcular su clave de caché
+- **registro**: la sentencia ya construida de `app/consultas.py` (clave memorizada)
+
+Mide dos cosas: solo construir la sentencia y su clave, y la petición completa
+(construir, ejecutar y leer las filas) sobre una base chica.
+
+Uso:
+    python -m benchmarks.consultas --peticiones 20000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from sqlmodel import SQLModel
+
+from app.consultas import consultas, parametros_busqueda
+from app.database import crear_engine_bd, crear_sesion_lectura, select_filas
+from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos
+from app.models import Pelicula
+from app.routers.peliculas import condiciones_busqueda
+
+VALORES = {
+    "titulo": "el", "director": "a", "genero": "Drama",
+    "año": 2001, "año_min": 1990, "año_max": 2010,
+}
+
+
+def generar_filtros(peticiones: int, semilla: int = 42) -> List[Dict]:
+    """Combinaciones aleatorias de los seis filtros de la búsqueda."""
+    rng = random.Random(semilla)
+    return [
+        {nombre: valor for nombre, valor in VALORES.items() if rng.random() < 0.5}
+        for _ in range(peticiones)
+    ]
+
+
+def _por_peticion(filtros: Dict):
+    return select_filas(Pelicula).where(*condiciones_busqueda(**filtros)), None
+
+
+def _registro(filtros: Dict):
+    parametros = parametros_busqueda(**filtros)
+    return consultas.sentencia("buscar_peliculas", *parametros), parametros
+
+
+MODOS = {"por_peticion": _por_peticion, "registro": _registro}
+
+
+def medir_construccion(filtros: List[Dict]) -> Dict[str, float]:
+    """Microsegundos por petición para obtener la sentencia y su clave de caché."""
+    resultados = {}
+    for modo, construir in MODOS.items():
+        inicio = time.perf_counter()
+        for valores in filtros:
+            statement, _ = construir(valores)
+            statement._generate_cache_key()
+        resultados[modo] = round((time.perf_counter() - inicio) / len(filtros) * 1e6, 2)
+    return resultados
+
+
+def medir_ejecucion(engine, filtros: List[Dict]) -> Dict[str, float]:
+    """Microsegundos por petición para construir, ejecutar y leer las filas."""
+    resultados = {}
+    with crear_sesion_lectura(engine) as session:
+        for modo, construir in MODOS.items():
+            inicio = time.perf_counter()
+            for valores in filtros:
+                statement, parametros = construir(valores)
+                session.exec(statement, params=parametros).all()
+            resultados[modo] = round((time.perf_counter() - inicio) / len(filtros) * 1e6, 2)
+    return resultados
+
+
+def ejecutar(peticiones: int = 20000, peliculas: int = 300, semilla: int = 42) -> Dict[str, dict]:
+    filtros = generar_filtros(peticiones, semilla)
+    consultas.reiniciar()
+    for valores in filtros[:200]:  # calentamiento: todas las variantes y la caché de SQL
+        for construir in MODOS.values():
+            construir(valores)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = crear_engine_bd(f"sqlite:///{Path(directorio) / 'consultas.db'}")
+        SQLModel.metadata.create_all(engine)
+        try:
+            generador = GeneradorDatos(usuarios=10, peliculas=peliculas, favoritos=0, semilla=semilla)
+            cargar_datos_sinteticos(engine, generador)
+            medir_ejecucion(engine, filtros[:200])
+            consultas.reiniciar()
+            construccion = medir_construccion(filtros)
+            ejecucion = medir_ejecucion(engine, filtros)
+        finally:
+            engine.dispose()
+    return {
+        "construccion_us": construccion,
+        "ejecucion_us": ejecucion,
+        "metricas": consultas.metricas(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.consultas",
+        description="Costo por petición de construir las sentencias de la búsqueda"
+    )
+    parser.add_argument("--peticiones", type=int, default=20000)
+    parser.add_argument("--peliculas", type=int, default=300, help="Catálogo chico: pocas filas por búsqueda")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(args.peticiones, args.peliculas, args.semilla)
+    print(f"{'modo':<14}{'construir µs':>14}{'petición µs':>14}")
+    for modo in MODOS:
+        print(f"{modo:<14}{resultado['construccion_us'][modo]:>14.2f}{resultado['ejecucion_us'][modo]:>14.2f}")
+    metricas = resultado["metricas"]
+    print(f"Variantes construidas: {metricas['variantes']} | reutilizadas: {metricas['tasa_reutilizadas']:.1%} | "
+          f"aciertos de SQL compilado: {metricas['sql_compilado']['tasa_aciertos']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
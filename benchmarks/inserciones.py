@@ -0,0 +1,132 @@
+"""
+Benchmark de inserción de películas.
+
+Compara tres formas de insertar evitando duplicados (título, año):
+
+- **consulta_previa**: SELECT por título y año antes de cada INSERT (el método anterior)
+- **conflicto**: un solo INSERT ... ON CONFLICT DO NOTHING RETURNING por película,
+  como hace ahora POST /api/peliculas/
+- **lote**: upsert de 1000 filas por transacción, como POST /api/peliculas/lote
+
+Uso:
+    python -m benchmarks.inserciones --cantidad 20000 --duplicados 0.1
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from sqlmodel import Session, SQLModel, select
+
+from app.database import crear_engine_bd, insert_ignorando_duplicados, insert_o_actualizar
+from app.datos_sinteticos import GeneradorDatos
+from app.models import VIVAS, Pelicula
+
+ESTRATEGIAS = ("consulta_previa", "conflicto", "lote")
+
+
+def generar_filas(cantidad: int, duplicados: float = 0.1, semilla: int = 42) -> List[Dict]:
+    """
+    Genera `cantidad` filas de película, de las cuales una fracción `duplicados`
+    repite el título y año de una fila anterior.
+    """
+    unicas = max(1, int(cantidad * (1 - duplicados)))
+    filas = [
+        {k: v for k, v in fila.items() if k != "id"}
+        for fila in GeneradorDatos(usuarios=0, peliculas=unicas, favoritos=0, semilla=semilla).iter_peliculas()
+    ]
+    rng = random.Random(semilla)
+    repetidas = [dict(rng.choice(filas)) for _ in range(cantidad - unicas)]
+    resultado = filas + repetidas
+    rng.shuffle(resultado)
+    return resultado
+
+
+def _consulta_previa(session: Session, filas: List[Dict]) -> int:
+    creadas = 0
+    for fila in filas:
+        existente = session.exec(
+            select(Pelicula).where(Pelicula.titulo == fila["titulo"], Pelicula.año == fila["año"])
+        ).first()
+        if existente:
+            continue
+        session.add(Pelicula(**fila))
+        session.commit()
+        creadas += 1
+    return creadas
+
+
+def _conflicto(session: Session, filas: List[Dict]) -> int:
+    creadas = 0
+    statement = insert_ignorando_duplicados(Pelicula, session).returning(Pelicula.__table__.c.id)
+    for fila in filas:
+        if session.exec(statement, params=fila).scalar() is not None:
+            creadas += 1
+        session.commit()
+    return creadas
+
+
+def _lote(session: Session, filas: List[Dict], tamaño: int = 1000) -> int:
+    statement = insert_o_actualizar(
+        Pelicula, session, claves=("titulo", "año"), excluir=("fecha_creacion", "fecha_eliminacion"), donde=VIVAS
+    )
+    for inicio in range(0, len(filas), tamaño):
+        unicas = {(f["titulo"], f["año"]): f for f in filas[inicio:inicio + tamaño]}
+        session.exec(statement, params=list(unicas.values()))
+        session.commit()
+    return len({(f["titulo"], f["año"]) for f in filas})
+
+
+def medir_inserciones(directorio: str, filas: List[Dict], estrategias=ESTRATEGIAS) -> Dict[str, dict]:
+    """
+    Inserta las mismas filas con cada estrategia, cada una sobre una base SQLite nueva.
+
+    Returns:
+        dict: Por estrategia, filas procesadas, películas creadas, segundos y filas por segundo
+    """
+    resultados = {}
+    funciones = {"consulta_previa": _consulta_previa, "conflicto": _conflicto, "lote": _lote}
+    for estrategia in estrategias:
+        engine = crear_engine_bd(f"sqlite:///{Path(directorio) / f'inserciones_{estrategia}.db'}")
+        SQLModel.metadata.create_all(engine)
+        try:
+            with Session(engine) as session:
+                inicio = time.perf_counter()
+                creadas = funciones[estrategia](session, filas)
+                segundos = time.perf_counter() - inicio
+        finally:
+            engine.dispose()
+        resultados[estrategia] = {
+            "filas": len(filas),
+            "creadas": creadas,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(len(filas) / segundos, 1) if segundos > 0 else 0.0,
+        }
+    return resultados
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.inserciones",
+        description="Throughput de inserción de películas con y sin consulta previa"
+    )
+    parser.add_argument("--cantidad", type=int, default=5000, help="Películas a insertar")
+    parser.add_argument("--duplicados", type=float, default=0.1, help="Fracción de filas repetidas")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    filas = generar_filas(args.cantidad, args.duplicados, args.semilla)
+    with tempfile.TemporaryDirectory() as directorio:
+        resultados = medir_inserciones(directorio, filas)
+
+    print(f"{'estrategia':<18}{'creadas':>10}{'segundos':>11}{'filas/s':>12}")
+    for estrategia, datos in resultados.items():
+        print(f"{estrategia:<18}{datos['creadas']:>10}{datos['segundos']:>11.3f}{datos['filas_por_segundo']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+"""
+Cálculo de métricas y manejo de líneas base para los benchmarks.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Dict, List
+
+
+# Métricas donde un valor mayor es peor (latencias) y donde un valor menor es peor (throughput)
+METRICAS_LATENCIA = ("p50_ms", "p95_ms", "p99_ms")
+METRICAS_THROUGHPUT = ("rps",)
+
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """
+    Calcula el percentil p (0-100) usando el método nearest-rank.
+
+    Args:
+        valores_ordenados (list): Valores ya ordenados de menor a mayor
+        p (float): Percentil a calcular
+
+    Returns:
+        float: Valor del percentil, 0.0 si no hay valores
+    """
+    if not valores_ordenados:
+        return 0.0
+    rango = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[rango - 1]
+
+
+def calcular_metricas(latencias: List[float], duracion_total: float, errores: int = 0) -> Dict[str, float]:
+    """
+    Resume las latencias (en segundos) de un escenario.
+
+    Retorna p50, p95 y p99 en milisegundos, peticiones por segundo y errores.
+    """
+    ordenadas = sorted(latencias)
+    return {
+        "peticiones": len(ordenadas),
+        "errores": errores,
+        "p50_ms": round(percentil(ordenadas, 50) * 1000, 3),
+        "p95_ms": round(percentil(ordenadas, 95) * 1000, 3),
+        "p99_ms": round(percentil(ordenadas, 99) * 1000, 3),
+        "rps": round(len(ordenadas) / duracion_total, 2) if duracion_total > 0 else 0.0,
+    }
+
+
+def guardar_linea_base(resultados: Dict[str, Dict[str, float]], ruta: str) -> None:
+    """
+    Guarda los resultados de un benchmark como línea base en formato JSON.
+    """
+    Path(ruta).write_text(
+        json.dumps(resultados, indent=2, ensure_ascii=False, sort_keys=True),
+        encoding="utf-8"
+    )
+
+
+def cargar_linea_base(ruta: str) -> Dict[str, Dict[str, float]]:
+    """
+    Carga una línea base guardada previamente con guardar_linea_base.
+    """
+    return json.loads(Path(ruta).read_text(encoding="utf-8"))
+
+
+def comparar_con_linea_base(
+    resultados: Dict[str, Dict[str, float]],
+    linea_base: Dict[str, Dict[str, float]],
+    umbral: float = 0.2
+) -> List[str]:
+    """
+    Compara los resultados actuales con la línea base.
+
+    Una latencia es regresión si supera la base en más del umbral (0.2 = 20%).
+    El throughput es regresión si cae por debajo de la base en más del umbral.
+    Solo se comparan los escenarios presentes en ambos conjuntos.
+
+    Returns:
+        list: Descripción de cada regresión encontrada (vacía si no hay)
+    """
+    regresiones = []
+    for nombre, base in sorted(linea_base.items()):
+        actual = resultados.get(nombre)
+        if actual is None:
+            continue
+
+        for metrica in METRICAS_LATENCIA:
+            if metrica in base and base[metrica] > 0:
+                limite = base[metrica] * (1 + umbral)
+                if actual[metrica] > limite:
+                    regresiones.append(
+                        f"{nombre}: {metrica} {actual[metrica]} > {round(limite, 3)} (base {base[metrica]})"
+                    )
+
+        for metrica in METRICAS_THROUGHPUT:
+            if metrica in base and base[metrica] > 0:
+                limite = base[metrica] * (1 - umbral)
+                if actual[metrica] < limite:
+                    regresiones.append(
+                        f"{nombre}: {metrica} {actual[metrica]} < {round(limite, 2)} (base {base[metrica]})"
+                    )
+
+    return regresiones
@@ -0,0 +1,123 @@
+"""
+Benchmark del costo por petición de la sesión del ORM en lecturas.
+
+Repite el trabajo típico de un GET (un usuario por clave primaria, una página de
+películas y los favoritos de un usuario, serializados como en la respuesta) y mide
+el tiempo de CPU del proceso por petición en tres modos:
+
+- **por_defecto**: `Session(engine)` y objetos del ORM, como antes en todas las peticiones
+- **solo_lectura**: `crear_sesion_lectura(engine)`, la que reciben ahora los GET
+- **solo_lectura_filas**: además, las listas con `select_filas` (sin identity map)
+
+Sin escrituras, autoflush y expire_on_commit casi no cuestan: la diferencia está en
+no construir ni registrar un objeto del ORM por fila.
+
+Uso:
+    python -m benchmarks.sesiones --peticiones 2000 --pagina 100
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, select
+
+from app.database import crear_engine_bd, crear_sesion_lectura, select_filas
+from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos
+from app.models import Favorito, Pelicula, Usuario
+from app.schemas import FavoritoRead, PeliculaRead, UsuarioRead
+
+# modo -> (fábrica de sesiones, construcción del SELECT de las listas)
+MODOS: Dict[str, Tuple[Callable, Callable]] = {
+    "por_defecto": (Session, select),
+    "solo_lectura": (crear_sesion_lectura, select),
+    "solo_lectura_filas": (crear_sesion_lectura, select_filas),
+}
+
+_USUARIO = TypeAdapter(UsuarioRead)
+_PELICULAS = TypeAdapter(List[PeliculaRead])
+_FAVORITOS = TypeAdapter(List[FavoritoRead])
+
+
+def _peticion(session: Session, seleccionar: Callable, id_usuario: int, pagina: int) -> int:
+    usuario = session.get(Usuario, id_usuario)
+    peliculas = session.exec(seleccionar(Pelicula).offset(id_usuario % 10).limit(pagina)).all()
+    favoritos = session.exec(seleccionar(Favorito).where(Favorito.id_usuario == id_usuario)).all()
+    return (
+        len(_USUARIO.dump_json(_USUARIO.validate_python(usuario, from_attributes=True)))
+        + len(_PELICULAS.dump_json(_PELICULAS.validate_python(peliculas, from_attributes=True)))
+        + len(_FAVORITOS.dump_json(_FAVORITOS.validate_python(favoritos, from_attributes=True)))
+    )
+
+
+def medir_sesiones(engine, usuarios: int, peticiones: int, pagina: int = 100,
+                   semilla: int = 42) -> Dict[str, dict]:
+    """
+    Ejecuta las mismas peticiones con cada modo, alternándolos para que todos vean
+    el mismo estado de cachés.
+
+    Returns:
+        dict: Por modo, peticiones, CPU total, microsegundos de CPU por petición y
+        ahorro relativo frente a por_defecto
+    """
+    rng = random.Random(semilla)
+    ids = [rng.randint(1, usuarios) for _ in range(peticiones)]
+    cpu = {modo: 0.0 for modo in MODOS}
+    for fabrica, seleccionar in MODOS.values():  # calentamiento
+        with fabrica(engine) as session:
+            _peticion(session, seleccionar, ids[0], pagina)
+
+    for id_usuario in ids:
+        for modo, (fabrica, seleccionar) in MODOS.items():
+            inicio = time.process_time()
+            with fabrica(engine) as session:
+                _peticion(session, seleccionar, id_usuario, pagina)
+            cpu[modo] += time.process_time() - inicio
+
+    base = cpu["por_defecto"]
+    return {
+        modo: {
+            "peticiones": peticiones,
+            "cpu_segundos": round(segundos, 3),
+            "cpu_us_por_peticion": round(segundos / peticiones * 1e6, 1),
+            "ahorro": round((base - segundos) / base, 4) if base else 0.0,
+        }
+        for modo, segundos in cpu.items()
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.sesiones",
+        description="CPU por petición de lectura según el tipo de sesión y de carga"
+    )
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--peliculas", type=int, default=2000)
+    parser.add_argument("--favoritos", type=int, default=20000)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--pagina", type=int, default=100, help="Películas por página")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = crear_engine_bd(f"sqlite:///{Path(directorio) / 'sesiones.db'}")
+        SQLModel.metadata.create_all(engine)
+        try:
+            generador = GeneradorDatos(args.usuarios, args.peliculas, args.favoritos, semilla=args.semilla)
+            cargar_datos_sinteticos(engine, generador)
+            resultados = medir_sesiones(engine, args.usuarios, args.peticiones, args.pagina, args.semilla)
+        finally:
+            engine.dispose()
+
+    print(f"{'modo':<22}{'CPU s':>10}{'µs/petición':>14}{'ahorro':>10}")
+    for modo, datos in resultados.items():
+        print(f"{modo:<22}{datos['cpu_segundos']:>10.3f}{datos['cpu_us_por_peticion']:>14.1f}{datos['ahorro']:>10.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,7 +7,8 @@ CREATE TABLE usuario (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     nombre VARCHAR(100) NOT NULL,
     correo VARCHAR(150) NOT NULL UNIQUE,
-    fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1
 );
 
 -- Índices para Usuario
@@ -24,11 +25,19 @@ CREATE TABLE pelicula (
     año INTEGER NOT NULL CHECK (año >= 1888 AND año <= 2100),
     clasificacion VARCHAR(10) NOT NULL,
     sinopsis VARCHAR(1000),
-    fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1,
+    -- Columnas de búsqueda: minúsculas y sin acentos; slug = título y año para URLs
+    titulo_normalizado VARCHAR(200) NOT NULL,
+    director_normalizado VARCHAR(150) NOT NULL,
+    slug VARCHAR(220) NOT NULL
 );
 
--- Índice para Pelicula
-CREATE INDEX ix_pelicula_titulo ON pelicula (titulo);
+-- Índice para Pelicula (único: no puede haber dos películas con el mismo título y año)
+CREATE UNIQUE INDEX "ix_pelicula_titulo_año" ON pelicula (titulo, año);
+CREATE INDEX ix_pelicula_titulo_normalizado ON pelicula (titulo_normalizado);
+CREATE INDEX ix_pelicula_director_normalizado ON pelicula (director_normalizado);
+CREATE INDEX ix_pelicula_slug ON pelicula (slug);
 
 -- Tabla Favorito (Tabla de unión)
 CREATE TABLE favorito (
@@ -45,6 +54,19 @@ CREATE TABLE favorito (
     CONSTRAINT unique_user_movie UNIQUE (id_usuario, id_pelicula)
 );
 
+-- Índice para contar favoritos por película (la restricción única ya cubre id_usuario)
+CREATE INDEX ix_favorito_id_pelicula ON favorito (id_pelicula);
+
+-- Registro de cambios (solo inserción): el id es el número de secuencia
+CREATE TABLE cambio (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entidad VARCHAR(20) NOT NULL,
+    id_entidad INTEGER NOT NULL,
+    operacion VARCHAR(10) NOT NULL,
+    datos TEXT,
+    fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Insertar Usuarios
 INSERT INTO usuario (nombre, correo, fecha_registro) VALUES
 ('María García', 'maria.garcia@email.com', datetime('now')),
@@ -54,17 +76,17 @@ INSERT INTO usuario (nombre, correo, fecha_registro) VALUES
 ('Laura Fernández', 'laura.fernandez@email.com', datetime('now'));
 
 -- Insertar Películas
-INSERT INTO pelicula (titulo, director, genero, duracion, año, clasificacion, sinopsis, fecha_creacion) VALUES
-('El Padrino', 'Francis Ford Coppola', 'Drama, Crimen', 175, 1972, 'R', 'La historia de una familia mafiosa italiana y su lucha por mantener el poder en el mundo del crimen organizado.', datetime('now')),
-('Inception', 'Christopher Nolan', 'Ciencia Ficción, Acción', 148, 2010, 'PG-13', 'Un ladrón que roba secretos corporativos mediante el uso de tecnología de sueños compartidos recibe la tarea inversa de plantar una idea.', datetime('now')),
-('Pulp Fiction', 'Quentin Tarantino', 'Crimen, Drama', 154, 1994, 'R', 'Las vidas de dos sicarios, un boxeador, la esposa de un gánster y dos bandidos se entrelazan en cuatro historias de violencia y redención.', datetime('now')),
-('Forrest Gump', 'Robert Zemeckis', 'Drama, Romance', 142, 1994, 'PG-13', 'Las décadas de vida de Forrest Gump, un hombre con buen corazón pero limitaciones intelectuales, que presencia eventos históricos importantes.', datetime('now')),
-('Matrix', 'Lana Wachowski, Lilly Wachowski', 'Ciencia Ficción, Acción', 136, 1999, 'R', 'Un hacker descubre que la realidad tal como la conocemos es una simulación creada por máquinas inteligentes.', datetime('now')),
-('El Señor de los Anillos: El Retorno del Rey', 'Peter Jackson', 'Fantasía, Aventura', 201, 2003, 'PG-13', 'Gandalf y Aragorn lideran el mundo de los hombres contra el ejército de Sauron para distraer su atención de Frodo y Sam.', datetime('now')),
-('Interestelar', 'Christopher Nolan', 'Ciencia Ficción, Drama', 169, 2014, 'PG-13', 'Un equipo de exploradores viaja a través de un agujero de gusano en el espacio para asegurar la supervivencia de la humanidad.', datetime('now')),
-('Parásitos', 'Bong Joon-ho', 'Drama, Thriller', 132, 2019, 'R', 'La codicia y la discriminación de clases amenazan la relación simbiótica recién formada entre la rica familia Park y el clan Kim.', datetime('now')),
-('El Caballero de la Noche', 'Christopher Nolan', 'Acción, Drama', 152, 2008, 'PG-13', 'Cuando el Joker emerge para sembrar el caos en Gotham City, Batman debe aceptar una de las pruebas psicológicas y físicas más grandes.', datetime('now')),
-('La La Land', 'Damien Chazelle', 'Romance, Musical', 128, 2016, 'PG-13', 'Mientras se esfuerzan por triunfar en sus carreras artísticas, un pianista de jazz y una aspirante a actriz se enamoran.', datetime('now'));
+INSERT INTO pelicula (titulo, director, genero, duracion, año, clasificacion, sinopsis, fecha_creacion, titulo_normalizado, director_normalizado, slug) VALUES
+('El Padrino', 'Francis Ford Coppola', 'Drama, Crimen', 175, 1972, 'R', 'La historia de una familia mafiosa italiana y su lucha por mantener el poder en el mundo del crimen organizado.', datetime('now'), 'el padrino', 'francis ford coppola', 'el-padrino-1972'),
+('Inception', 'Christopher Nolan', 'Ciencia Ficción, Acción', 148, 2010, 'PG-13', 'Un ladrón que roba secretos corporativos mediante el uso de tecnología de sueños compartidos recibe la tarea inversa de plantar una idea.', datetime('now'), 'inception', 'christopher nolan', 'inception-2010'),
+('Pulp Fiction', 'Quentin Tarantino', 'Crimen, Drama', 154, 1994, 'R', 'Las vidas de dos sicarios, un boxeador, la esposa de un gánster y dos bandidos se entrelazan en cuatro historias de violencia y redención.', datetime('now'), 'pulp fiction', 'quentin tarantino', 'pulp-fiction-1994'),
+('Forrest Gump', 'Robert Zemeckis', 'Drama, Romance', 142, 1994, 'PG-13', 'Las décadas de vida de Forrest Gump, un hombre con buen corazón pero limitaciones intelectuales, que presencia eventos históricos importantes.', datetime('now'), 'forrest gump', 'robert zemeckis', 'forrest-gump-1994'),
+('Matrix', 'Lana Wachowski, Lilly Wachowski', 'Ciencia Ficción, Acción', 136, 1999, 'R', 'Un hacker descubre que la realidad tal como la conocemos es una simulación creada por máquinas inteligentes.', datetime('now'), 'matrix', 'lana wachowski, lilly wachowski', 'matrix-1999'),
+('El Señor de los Anillos: El Retorno del Rey', 'Peter Jackson', 'Fantasía, Aventura', 201, 2003, 'PG-13', 'Gandalf y Aragorn lideran el mundo de los hombres contra el ejército de Sauron para distraer su atención de Frodo y Sam.', datetime('now'), 'el senor de los anillos: el retorno del rey', 'peter jackson', 'el-senor-de-los-anillos-el-retorno-del-rey-2003'),
+('Interestelar', 'Christopher Nolan', 'Ciencia Ficción, Drama', 169, 2014, 'PG-13', 'Un equipo de exploradores viaja a través de un agujero de gusano en el espacio para asegurar la supervivencia de la humanidad.', datetime('now'), 'interestelar', 'christopher nolan', 'interestelar-2014'),
+('Parásitos', 'Bong Joon-ho', 'Drama, Thriller', 132, 2019, 'R', 'La codicia y la discriminación de clases amenazan la relación simbiótica recién formada entre la rica familia Park y el clan Kim.', datetime('now'), 'parasitos', 'bong joon-ho', 'parasitos-2019'),
+('El Caballero de la Noche', 'Christopher Nolan', 'Acción, Drama', 152, 2008, 'PG-13', 'Cuando el Joker emerge para sembrar el caos en Gotham City, Batman debe aceptar una de las pruebas psicológicas y físicas más grandes.', datetime('now'), 'el caballero de la noche', 'christopher nolan', 'el-caballero-de-la-noche-2008'),
+('La La Land', 'Damien Chazelle', 'Romance, Musical', 128, 2016, 'PG-13', 'Mientras se esfuerzan por triunfar en sus carreras artísticas, un pianista de jazz y una aspirante a actriz se enamoran.', datetime('now'), 'la la land', 'damien chazelle', 'la-la-land-2016');
 
 -- Insertar favoritos de ejemplo
 INSERT INTO favorito (id_usuario, id_pelicula, fecha_marcado) VALUES
@@ -1,26 +1,61 @@
 const API_URL = "http://127.0.0.1:8000/api/estadisticas/";
+const STREAM_URL = `${API_URL}stream`;
 
-export async function cargarEstadisticas() {
-  const main = document.getElementById("contenido-principal");
-  main.innerHTML = "<h2>Estadísticas</h2><p>Cargando datos...</p>";
+// Una sola conexión SSE abierta: se cierra al volver a entrar o al cambiar de pestaña
+let fuente = null;
+
+function mostrarEstadisticas(main, stats) {
+  main.innerHTML = `
+    <h2>📊 Estadísticas</h2>
+    <ul id="estadisticas-vivo">
+      <li>Total de usuarios: ${stats.total_usuarios}</li>
+      <li>Total de películas: ${stats.total_peliculas}</li>
+      <li>Total de favoritos: ${stats.total_favoritos}</li>
+      <li>Película más popular: ${stats.pelicula_mas_popular}</li>
+      <li>Usuario más activo: ${stats.usuario_mas_activo}</li>
+    </ul>
+  `;
+}
 
+async function cargarUnaVez(main) {
   try {
     const response = await fetch(API_URL);
     if (!response.ok) throw new Error("Error al obtener estadísticas");
-
-    const stats = await response.json();
-
-    main.innerHTML = `
-      <h2>📊 Estadísticas</h2>
-      <ul>
-        <li>Total de usuarios: ${stats.total_usuarios}</li>
-        <li>Total de películas: ${stats.total_peliculas}</li>
-        <li>Total de favoritos: ${stats.total_favoritos}</li>
-        <li>Película más popular: ${stats.pelicula_mas_popular}</li>
-        <li>Usuario más activo: ${stats.usuario_mas_activo}</li>
-      </ul>
-    `;
+    mostrarEstadisticas(main, await response.json());
   } catch (error) {
     main.innerHTML = `<p style="color:red;">Error: ${error.message}</p>`;
   }
-}
\ No newline at end of file
+}
+
+export async function cargarEstadisticas() {
+  const main = document.getElementById("contenido-principal");
+  main.innerHTML = "<h2>Estadísticas</h2><p>Cargando datos...</p>";
+
+  if (fuente) fuente.close();
+  if (!window.EventSource) {
+    await cargarUnaVez(main);
+    return;
+  }
+
+  // El servidor envía el estado actual al conectar y luego solo cuando cambia
+  fuente = new EventSource(STREAM_URL);
+  let recibido = false;
+  fuente.addEventListener("estadisticas", (evento) => {
+    // Si el usuario se fue a otra pestaña, dejar de escuchar
+    if (recibido && !document.getElementById("estadisticas-vivo")) {
+      fuente.close();
+      fuente = null;
+      return;
+    }
+    recibido = true;
+    mostrarEstadisticas(main, JSON.parse(evento.data));
+  });
+  fuente.onerror = () => {
+    // EventSource reintenta solo; si nunca llegó nada, mostrar al menos una carga normal
+    if (!recibido) {
+      fuente.close();
+      fuente = null;
+      cargarUnaVez(main);
+    }
+  };
+}
@@ -29,13 +29,8 @@ export async function mostrarFormularioFavorito() {
   main.innerHTML = "<h2>Agregar favorito</h2><p>Cargando datos...</p>";
 
   try {
-    const [usuariosRes, peliculasRes] = await Promise.all([
-      fetch(API_URL_USUARIOS),
-      fetch(API_URL_PELICULAS),
-    ]);
-
+    const usuariosRes = await fetch(API_URL_USUARIOS);
     const usuarios = await usuariosRes.json();
-    const peliculas = await peliculasRes.json();
 
     const form = document.createElement("form");
     form.id = "form-favorito";
@@ -46,19 +41,24 @@ export async function mostrarFormularioFavorito() {
         </select>
       </label>
       <label>Película:
-        <select name="id_pelicula" required>
-          ${peliculas.map(p => `<option value="${p.id}">${p.titulo}</option>`).join("")}
-        </select>
+        <input name="pelicula" list="sugerencias-peliculas" placeholder="Escribe un título..." autocomplete="off" required>
+        <datalist id="sugerencias-peliculas"></datalist>
+        <input type="hidden" name="id_pelicula">
       </label>
       <button type="submit">Guardar</button>
     `;
 
     main.innerHTML = "<h2>Agregar favorito</h2>";
     main.appendChild(form);
+    activarAutocompletado(form);
 
     form.addEventListener("submit", async (e) => {
       e.preventDefault();
-      const datos = Object.fromEntries(new FormData(form));
+      const { pelicula, ...datos } = Object.fromEntries(new FormData(form));
+      if (!datos.id_pelicula) {
+        alert("Selecciona una película de las sugerencias");
+        return;
+      }
 
       try {
         const res = await fetch(API_URL_FAVORITOS, {
@@ -76,4 +76,28 @@ export async function mostrarFormularioFavorito() {
   } catch (error) {
     main.innerHTML = `<p style="color:red;">Error: ${error.message}</p>`;
   }
-}
\ No newline at end of file
+}
+
+// Sugerencias de títulos mientras se escribe, en lugar de descargar todo el catálogo
+function activarAutocompletado(form) {
+  const entrada = form.elements.pelicula;
+  const oculto = form.elements.id_pelicula;
+  const lista = form.querySelector("#sugerencias-peliculas");
+  let sugerencias = [];
+  let espera = null;
+
+  entrada.addEventListener("input", () => {
+    const elegida = sugerencias.find(s => s.texto === entrada.value);
+    oculto.value = elegida ? elegida.id_pelicula : "";
+    if (elegida) return;
+
+    clearTimeout(espera);
+    espera = setTimeout(async () => {
+      const q = entrada.value.trim();
+      if (!q) return;
+      const res = await fetch(`${API_URL_PELICULAS}autocomplete?tipo=titulo&q=${encodeURIComponent(q)}`);
+      sugerencias = await res.json();
+      lista.innerHTML = sugerencias.map(s => `<option value="${s.texto}">${s.director}</option>`).join("");
+    }, 150);
+  });
+}
@@ -1,12 +1,28 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.database import create_db_and_tables, get_session
-from app.routers import usuarios, peliculas, favoritos
+from app.database import create_db_and_tables, crear_engine_invalidacion, engine, get_session
+from app.estado import ID_PROCESO, canal_invalidacion
+from app.cola_favoritos import cola_favoritos
+from app.autocompletado import indice_autocompletado
+from app.analitica import catalogo_columnar
+from app.cache_favoritos import cache_favoritos
+from app.consultas import consultas
+from app.purga import compactador_eliminados
+from app.tendencias import agregador_tendencias
+from app.ranking_tendencia import ranking_tendencia
+from app.estadisticas import calcular_estadisticas, difusor_estadisticas
+from app.coalescencia import MiddlewareCoalescencia, coalescedor_lecturas
+from app.compresion import MiddlewareCompresion
+from app.formatos import FormatoRespuesta, negociar_formato
+from app.limitador import MiddlewareLimitador, limitador_carga
+from app.routers import usuarios, peliculas, favoritos, analitica, cambios
 from app.config import settings
-from sqlmodel import Session, select
-from sqlalchemy import func
+from sqlmodel import Session
 from fastapi import Depends
 
 
@@ -18,9 +34,51 @@ async def lifespan(app: FastAPI):
     """
     # Startup: Crear tablas en la base de datos
     create_db_and_tables()
+
+    # Con varios workers, escuchar las invalidaciones publicadas por los demás procesos
+    tarea_canal = None
+    if settings.workers > 1 or settings.invalidacion_url:
+        canal_invalidacion.conectar(crear_engine_invalidacion())
+        tarea_canal = asyncio.create_task(canal_invalidacion.escuchar(settings.invalidacion_intervalo))
+
+    # Cargar el índice de autocompletado en segundo plano (con catálogos grandes tarda unos segundos)
+    tarea_autocompletado = asyncio.create_task(asyncio.to_thread(indice_autocompletado.cargar, engine))
+    tarea_analitica = asyncio.create_task(asyncio.to_thread(catalogo_columnar.cargar, engine))
+
+    # Favoritos en modo write-behind: reaplicar journals pendientes y confirmar en lotes
+    tarea_favoritos = None
+    if settings.favoritos_write_behind:
+        cola_favoritos.iniciar(engine)
+        tarea_favoritos = asyncio.create_task(cola_favoritos.ejecutar())
+
+    # Borrar de verdad los usuarios y películas eliminados, fuera de las horas pico
+    tarea_compactacion = asyncio.create_task(compactador_eliminados.ejecutar(engine))
+
+    # Mantener los resúmenes de favoritos por hora y por día desde el registro de cambios
+    tarea_tendencias = asyncio.create_task(agregador_tendencias.ejecutar(engine))
+
+    # Recuperar el ranking de películas en tendencia y copiarlo periódicamente a la base
+    tarea_ranking = asyncio.create_task(ranking_tendencia.ejecutar(engine))
+
     yield
     
     # Shutdown: Limpiar recursos si es necesario
+    await tarea_autocompletado
+    await tarea_analitica
+    difusor_estadisticas.detener()
+    tarea_compactacion.cancel()
+    tarea_tendencias.cancel()
+    tarea_ranking.cancel()
+    if ranking_tendencia.cargado:
+        await asyncio.to_thread(ranking_tendencia.guardar, engine)
+    if tarea_favoritos:
+        tarea_favoritos.cancel()
+        # Se espera el lote en vuelo antes del vaciado final
+        await asyncio.gather(tarea_favoritos, return_exceptions=True)
+        cola_favoritos.detener()
+    if tarea_canal:
+        tarea_canal.cancel()
+        canal_invalidacion.desconectar()
     print("cerrando aplicación...")
 
 
@@ -42,6 +100,22 @@ app = FastAPI(
 )
 
 
+# Middlewares propios, del más interno al más externo (el último agregado queda por fuera):
+# limitación de tasa y carga, coalescencia de lecturas idénticas y compresión. CORS va
+# por fuera de todos para que las respuestas 429/503 también lleven sus encabezados.
+app.add_middleware(MiddlewareLimitador)
+app.add_middleware(MiddlewareCoalescencia)
+app.add_middleware(
+    MiddlewareCompresion,
+    minimo=settings.compresion_minimo_bytes,
+    niveles={
+        "gzip": settings.compresion_nivel_gzip,
+        "br": settings.compresion_nivel_brotli,
+        "zstd": settings.compresion_nivel_zstd,
+    },
+)
+
+
 # TODO: Configurar CORS para permitir solicitudes desde diferentes orígenes
 # Esto es importante para desarrollo con frontend separado
 app.add_middleware(
@@ -56,6 +130,8 @@ app.add_middleware(
 app.include_router(usuarios.router)
 app.include_router(peliculas.router)
 app.include_router(favoritos.router)
+app.include_router(analitica.router)
+app.include_router(cambios.router)
 
 
 # TODO: Crear un endpoint raíz que retorne información básica de la API
@@ -77,7 +153,9 @@ async def root():
             "usuarios": "/api/usuarios",
             "peliculas": "/api/peliculas",
             "favoritos": "/api/favoritos",
-            "estadisticas": "/api/estadisticas"
+            "estadisticas": "/api/estadisticas",
+            "analitica": "/api/analytics",
+            "cambios": "/api/changes"
         }
     }
 
@@ -96,12 +174,40 @@ async def health_check():
         "status": "healthy",
         "database": db_status,
         "environment": settings.environment,
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "proceso": ID_PROCESO
+    }
+
+
+@app.get("/metricas", tags=["Health"])
+async def metricas():
+    """
+    Contadores del proceso: lecturas coalescidas por ruta, aciertos de la caché de
+    favoritos, sentencias reutilizadas del registro de consultas, compactación de
+    los eliminados, avance de las tendencias, ranking de películas en tendencia y
+    peticiones rechazadas por el limitador.
+    """
+    return {
+        "proceso": ID_PROCESO,
+        "coalescencia": coalescedor_lecturas.metricas(),
+        "cache_favoritos": cache_favoritos.metricas(),
+        "consultas": consultas.metricas(),
+        "compactacion": compactador_eliminados.metricas(),
+        "tendencias": agregador_tendencias.metricas(),
+        "ranking_tendencia": ranking_tendencia.metricas(),
+        "limitador": {
+            "rechazadas_tasa": limitador_carga.rechazadas_tasa,
+            "rechazadas_carga": limitador_carga.rechazadas_carga,
+            "en_curso": limitador_carga.concurrencia.en_curso,
+        },
     }
 
 
 @app.get("/api/estadisticas/", tags=["Estadísticas"])
-async def obtener_estadisticas_generales(session: Session = Depends(get_session)):
+def obtener_estadisticas_generales(
+    session: Session = Depends(get_session),
+    formato: FormatoRespuesta = Depends(negociar_formato)
+):
     """
     Obtiene estadísticas generales de la plataforma.
 
@@ -111,47 +217,40 @@ async def obtener_estadisticas_generales(session: Session = Depends(get_session)
     - Total de favoritos
     - Película más popular
     - Usuario más activo
+
+    Con `Accept: application/msgpack` responde en MessagePack.
     """
-    from app.models import Usuario, Pelicula, Favorito
-
-    total_usuarios = session.exec(select(func.count(Usuario.id))).one()
-    total_peliculas = session.exec(select(func.count(Pelicula.id))).one()
-    total_favoritos = session.exec(select(func.count(Favorito.id))).one()
-
-    statement_pelicula = (
-        select(Pelicula, func.count(Favorito.id).label("count"))
-        .outerjoin(Favorito, Pelicula.id == Favorito.id_pelicula)
-        .group_by(Pelicula.id)
-        .order_by(func.count(Favorito.id).desc())
-        .limit(1)
-    )
-    top_pelicula = session.exec(statement_pelicula).first()
-
-    statement_usuario = (
-        select(Usuario, func.count(Favorito.id).label("count"))
-        .outerjoin(Favorito, Usuario.id == Favorito.id_usuario)
-        .group_by(Usuario.id)
-        .order_by(func.count(Favorito.id).desc())
-        .limit(1)
-    )
-    top_usuario = session.exec(statement_usuario).first()
+    return formato.responder(calcular_estadisticas(session))
 
-    return {
-        "total_usuarios": total_usuarios,
-        "total_peliculas": total_peliculas,
-        "total_favoritos": total_favoritos,
-        "pelicula_mas_popular": top_pelicula[0].titulo if top_pelicula and top_pelicula[1] > 0 else "Ninguna",
-        "usuario_mas_activo": top_usuario[0].nombre if top_usuario and top_usuario[1] > 0 else "Ninguno"
-    }
+
+@app.get("/api/estadisticas/stream", tags=["Estadísticas"])
+async def transmitir_estadisticas(request: Request):
+    """
+    Las mismas estadísticas como Server-Sent Events (evento "estadisticas").
+
+    Se envía el estado actual al conectar y después solo cuando cambia, como
+    máximo una vez por `estadisticas_intervalo_minimo` segundos. El cálculo se
+    comparte entre todos los clientes conectados al proceso.
+    """
+    return StreamingResponse(
+        difusor_estadisticas.eventos(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 if __name__ == "__main__":
-    import uvicorn
+    if settings.workers > 1:
+        from app.lanzador import lanzar
 
-    uvicorn.run(
-        "main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=settings.debug
-    )
+        lanzar()
+    else:
+        import uvicorn
+
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            reload=settings.debug
+        )
 
@@ -0,0 +1,74 @@
+"""
+Fixtures compartidas por todos los tests.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel
+
+from main import app
+from app import database
+from app.cache_favoritos import cache_favoritos
+from app.database import EnrutadorSesiones, crear_engine_bd
+from app.limitador import limitador_carga
+
+
+@pytest.fixture(autouse=True)
+def reiniciar_limitador():
+    """Todas las peticiones de TestClient salen de la misma IP: cada test empieza con cubetas llenas."""
+    limitador_carga.reiniciar()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def limpiar_cache_favoritos():
+    """Cada test usa su propia base: los favoritos cacheados de otro test no sirven."""
+    cache_favoritos.limpiar()
+    yield
+
+
+@pytest.fixture(name="crear_engine")
+def crear_engine_fixture(tmp_path):
+    """
+    Fábrica de bases SQLite en archivo temporal con el esquema creado:
+    crear_engine("nombre.db"). Se cierran al terminar el test.
+    """
+    engines = []
+
+    def crear(nombre: str = "prueba.db"):
+        engine = crear_engine_bd(f"sqlite:///{tmp_path / nombre}")
+        SQLModel.metadata.create_all(engine)
+        engines.append(engine)
+        return engine
+
+    yield crear
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(crear_engine, request):
+    """
+    Base temporal vacía. El nombre del archivo se puede cambiar con
+    @pytest.mark.parametrize("engine", ["otra.db"], indirect=True); para sembrar
+    datos, un test redefine `engine` recibiendo este mismo fixture.
+    """
+    return crear_engine(getattr(request, "param", "prueba.db"))
+
+
+@pytest.fixture(name="enrutador")
+def enrutador_fixture(engine, monkeypatch):
+    """
+    Enruta las sesiones de la aplicación a `engine` durante el test.
+    """
+    enrutador = EnrutadorSesiones(engine)
+    monkeypatch.setattr(database, "enrutador", enrutador)
+    return enrutador
+
+
+@pytest.fixture(name="client")
+def client_fixture(enrutador):
+    """
+    Cliente de pruebas con las sesiones apuntando a `engine`.
+    """
+    yield TestClient(app)
@@ -0,0 +1,109 @@
+"""
+Tests para el catálogo columnar de analítica y sus endpoints.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.analitica import CatalogoColumnar
+from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos
+from app.models import Favorito, Pelicula
+
+
+FILAS = [
+    (1, "Drama, Crimen", 175, 1972, "R"),
+    (2, "Ciencia Ficción", 148, 2010, "PG-13"),
+    (3, "Crimen, Drama", 154, 1994, "R"),
+    (4, "Drama", 142, 1994, "PG-13"),
+]
+FAVORITOS = {1: 3, 3: 2, 4: 1}
+
+
+@pytest.fixture(name="catalogo")
+def catalogo_fixture():
+    catalogo = CatalogoColumnar()
+    catalogo.construir(FILAS, FAVORITOS)
+    return catalogo
+
+
+def test_agrupar_por_genero_y_decada(catalogo: CatalogoColumnar):
+    """Una película con varios géneros cuenta en cada uno"""
+    grupos = catalogo.agrupar(["genero", "decada"])
+    assert [(g["genero"], g["decada"], g["peliculas"]) for g in grupos] == [
+        ("Ciencia Ficción", 2010, 1),
+        ("Crimen", 1970, 1),
+        ("Crimen", 1990, 1),
+        ("Drama", 1970, 1),
+        ("Drama", 1990, 2),
+    ]
+    drama_90 = grupos[-1]
+    assert drama_90["duracion_promedio"] == 148.0
+    assert drama_90["favoritos"] == 3
+
+
+def test_agrupar_por_clasificacion_ordenado(catalogo: CatalogoColumnar):
+    """Favoritos por clasificación, de mayor a menor, con filtro de años"""
+    grupos = catalogo.agrupar(["clasificacion"], ordenar="favoritos")
+    assert [(g["clasificacion"], g["favoritos"]) for g in grupos] == [("R", 5), ("PG-13", 1)]
+
+    grupos = catalogo.agrupar(["clasificacion"], año_min=1990, año_max=2000)
+    assert [(g["clasificacion"], g["peliculas"]) for g in grupos] == [("PG-13", 1), ("R", 1)]
+
+    assert catalogo.agrupar([]) == [{"peliculas": 4, "duracion_promedio": 154.75, "favoritos": 6, "favoritos_promedio": 1.5}]
+    assert catalogo.agrupar(["año"], año_min=3000) == []
+    with pytest.raises(ValueError):
+        catalogo.agrupar(["director"])
+
+
+def test_refresco_incremental_igual_a_recarga(engine):
+    """Tras cambios en la base, aplicar los mensajes da lo mismo que cargar de nuevo"""
+    cargar_datos_sinteticos(engine, GeneradorDatos(usuarios=30, peliculas=300, favoritos=600))
+
+    catalogo = CatalogoColumnar()
+    catalogo.suscribir()
+    try:
+        catalogo.cargar(engine)
+        with Session(engine) as session:
+            peliculas = session.exec(select(Pelicula).order_by(Pelicula.id).limit(20)).all()
+            peliculas[0].genero = "Documental"
+            peliculas[1].año = 1950
+            session.delete(peliculas[2])
+            session.add(Pelicula(titulo="Nueva", director="Alguien", genero="Western, Drama",
+                                 duracion=100, año=2024, clasificacion="G"))
+            for favorito in session.exec(select(Favorito).limit(15)).all():
+                session.delete(favorito)
+            session.add(Favorito(id_usuario=1, id_pelicula=peliculas[5].id))
+            session.commit()
+
+        assert catalogo.cambios_pendientes > 0
+        catalogo.asegurar_actualizado(engine)
+        assert catalogo.cambios_pendientes == 0
+
+        completo = CatalogoColumnar()
+        completo.cargar(engine)
+        for por in (["genero", "decada"], ["clasificacion"], ["año"], []):
+            assert catalogo.agrupar(por) == completo.agrupar(por)
+    finally:
+        catalogo.desuscribir()
+
+
+def test_endpoints(client: TestClient, monkeypatch):
+    """Los endpoints cargan la copia y validan las dimensiones"""
+    catalogo = CatalogoColumnar()
+    catalogo.suscribir()
+    monkeypatch.setattr("app.routers.analitica.catalogo_columnar", catalogo)
+
+    try:
+        pelicula = {"titulo": "Roma", "director": "Alfonso Cuarón", "genero": "Drama",
+                    "duracion": 135, "año": 2018, "clasificacion": "R"}
+        client.post("/api/peliculas/", json=pelicula)
+        assert client.get("/api/analytics/resumen").json()["peliculas"] == 1
+
+        client.post("/api/peliculas/", json={**pelicula, "titulo": "Rocky", "duracion": 119, "año": 1976})
+        response = client.get("/api/analytics/agrupar", params={"por": ["genero", "decada"]})
+        assert [(g["decada"], g["duracion_promedio"]) for g in response.json()] == [(1970, 119.0), (2010, 135.0)]
+
+        assert client.get("/api/analytics/agrupar", params={"por": "director"}).status_code == 400
+    finally:
+        catalogo.desuscribir()
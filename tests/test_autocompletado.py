@@ -0,0 +1,156 @@
+"""
+Tests para el índice de autocompletado de títulos y directores.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.autocompletado import IndiceAutocompletado
+
+
+PELICULAS = [
+    (1, "El Padrino", "Francis Ford Coppola"),
+    (2, "El Padrino II", "Francis Ford Coppola"),
+    (3, "Parásitos", "Bong Joon-ho"),
+    (4, "Pulp Fiction", "Quentin Tarantino"),
+    (5, "Papillon", "Franklin J. Schaffner"),
+]
+
+
+@pytest.fixture(name="indice")
+def indice_fixture():
+    indice = IndiceAutocompletado()
+    indice.construir(PELICULAS, {1: 5, 2: 1, 3: 8, 4: 3})
+    return indice
+
+
+def _textos(resultados) -> list:
+    return [r["texto"] for r in resultados]
+
+
+def test_prefijo_ordenado_por_popularidad(indice: IndiceAutocompletado):
+    """Las coincidencias se ordenan por favoritos, sin distinguir mayúsculas ni acentos"""
+    assert _textos(indice.buscar_titulos("pa")) == ["Parásitos", "El Padrino", "El Padrino II", "Papillon"]
+    assert _textos(indice.buscar_titulos("PARA")) == ["Parásitos"]
+    assert _textos(indice.buscar_titulos("p", limite=3)) == ["Parásitos", "El Padrino", "Pulp Fiction"]
+    assert indice.buscar_titulos("x") == []
+
+
+def test_titulos_sin_articulo(indice: IndiceAutocompletado):
+    """'padrino' encuentra 'El Padrino' y cada película aparece una sola vez"""
+    assert _textos(indice.buscar_titulos("padrino")) == ["El Padrino", "El Padrino II"]
+    assert _textos(indice.buscar_titulos("el pad")) == ["El Padrino", "El Padrino II"]
+
+
+def test_directores_por_popularidad_acumulada(indice: IndiceAutocompletado):
+    """Un director suma los favoritos de todas sus películas"""
+    directores = indice.buscar_directores("fran")
+    assert directores[0] == {"tipo": "director", "texto": "Francis Ford Coppola", "peliculas": 2, "popularidad": 6}
+    assert _textos(directores) == ["Francis Ford Coppola", "Franklin J. Schaffner"]
+
+
+def test_actualizacion_incremental(indice: IndiceAutocompletado):
+    """Altas, cambios de título, bajas y favoritos se reflejan sin recargar"""
+    indice.guardar_pelicula(6, "Pájaros de verano", "Ciro Guerra")
+    indice.sumar_popularidad(6, 20)
+    assert _textos(indice.buscar_titulos("pa", limite=3)) == ["Pájaros de verano", "Parásitos", "El Padrino"]
+
+    indice.guardar_pelicula(3, "Parasite", "Bong Joon-ho")
+    assert _textos(indice.buscar_titulos("parasi")) == ["Parasite"]
+
+    indice.quitar_pelicula(6)
+    assert _textos(indice.buscar_titulos("pa", limite=2)) == ["Parasite", "El Padrino"]
+    assert indice.buscar_directores("ciro") == []
+
+
+def test_rango_grande_usa_las_mas_populares():
+    """Con más coincidencias que maximo_rango se responde desde el top de popularidad"""
+    indice = IndiceAutocompletado(tamaño_top=50, maximo_rango=100)
+    indice.construir(
+        [(i, f"Amor {i:04d}", "Director") for i in range(1, 1001)],
+        {i: i for i in range(1, 1001)}
+    )
+    assert _textos(indice.buscar_titulos("amor", limite=3)) == ["Amor 1000", "Amor 0999", "Amor 0998"]
+
+    indice.sumar_popularidad(10, 5000)
+    assert _textos(indice.buscar_titulos("amor", limite=1)) == ["Amor 0010"]
+
+
+def test_lote_grande_se_fusiona_una_vez():
+    """Un lote grande no mueve las listas película por película; se busca igual antes y después de fusionar"""
+    indice = IndiceAutocompletado()
+    indice.construir([(i, f"Titulo {i:05d}", f"Director {i % 50}") for i in range(1, 5001)], {})
+
+    # Cambiar solo el director no toca las listas de títulos
+    indice._aplicar_lote([
+        ("peliculas", str(i), {"operacion": "guardada", "titulo": f"Titulo {i:05d}", "director": "Nueva Directora"})
+        for i in range(1, 1001)
+    ])
+    assert not indice._desfasadas
+    assert indice.buscar_directores("nueva")[0]["peliculas"] == 1000
+
+    # Un PATCH que renombra 2000 películas, y un borrado
+    mensajes = [
+        ("peliculas", str(i), {"operacion": "guardada", "titulo": f"Restaurada {i:05d}", "director": "Otro"})
+        for i in range(1, 2001)
+    ]
+    mensajes.append(("peliculas", "2001", {"operacion": "eliminada"}))
+    indice._aplicar_lote(mensajes)
+    assert indice.fusiones == 0 and len(indice._desfasadas) == 2001
+
+    # Con las listas aún sin fusionar, las búsquedas ya ven los cambios
+    def buscar():
+        return (
+            _textos(indice.buscar_titulos("restaurada 0000")),
+            _textos(indice.buscar_titulos("titulo 0200")),
+            indice.buscar_directores("nueva"),
+        )
+
+    esperado = (
+        [f"Restaurada {i:05d}" for i in range(1, 10)],
+        [f"Titulo {i:05d}" for i in range(2002, 2010)],
+        [],
+    )
+    assert buscar() == esperado
+
+    indice._fusionar()
+    assert indice.fusiones == 1 and not indice._desfasadas
+    assert buscar() == esperado
+    reconstruido = IndiceAutocompletado()
+    reconstruido.construir([(i, t, d) for i, (t, d, _) in indice._peliculas.items()], {})
+    assert indice._claves == reconstruido._claves
+
+    # Un mensaje suelto sigue moviendo las listas en el lugar
+    indice._aplicar_lote([("peliculas", "9", {"operacion": "eliminada"})])
+    indice._fusionar()
+    assert indice.fusiones == 1 and "restaurada 00009" not in indice._claves
+
+
+def test_endpoint_sigue_las_escrituras(client: TestClient, monkeypatch):
+    """El endpoint carga el índice y recibe los cambios publicados al confirmar"""
+    indice = IndiceAutocompletado()
+    indice.suscribir()
+    monkeypatch.setattr("app.routers.peliculas.indice_autocompletado", indice)
+
+    try:
+        assert client.get("/api/peliculas/autocomplete", params={"q": "ro"}).json() == []
+
+        pelicula = {"titulo": "Roma", "director": "Alfonso Cuarón", "genero": "Drama",
+                    "duracion": 135, "año": 2018, "clasificacion": "R"}
+        roma = client.post("/api/peliculas/", json=pelicula).json()
+        rocky = client.post("/api/peliculas/", json={**pelicula, "titulo": "Rocky", "director": "John G. Avildsen"}).json()
+        usuario = client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"}).json()
+        client.post(f"/api/usuarios/{usuario['id']}/favoritos/{rocky['id']}")
+
+        response = client.get("/api/peliculas/autocomplete", params={"q": "ro", "tipo": "titulo"})
+        assert _textos(response.json()) == ["Rocky", "Roma"]
+        assert response.json()[0]["popularidad"] == 1
+
+        client.put(f"/api/peliculas/{roma['id']}", json={"director": "Alfonso Cuaron Orozco"})
+        response = client.get("/api/peliculas/autocomplete", params={"q": "alfonso", "tipo": "director"})
+        assert _textos(response.json()) == ["Alfonso Cuaron Orozco"]
+
+        client.delete(f"/api/peliculas/{rocky['id']}")
+        assert _textos(client.get("/api/peliculas/autocomplete", params={"q": "ro"}).json()) == ["Roma"]
+    finally:
+        indice.desuscribir()
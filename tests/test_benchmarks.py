@@ -0,0 +1,131 @@
+"""
+Tests para el paquete de benchmarks.
+Ejecuta una corrida pequeña para verificar que todos los escenarios funcionan
+y prueba la detección de regresiones contra la línea base.
+"""
+
+import asyncio
+
+import pytest
+
+from main import app
+from benchmarks import (
+    ESCENARIOS,
+    cargar_linea_base,
+    comparar_con_linea_base,
+    ejecutar_benchmark,
+    guardar_linea_base,
+    percentil,
+    sembrar_datos,
+)
+from benchmarks.carga import crear_engine_benchmark
+
+
+@pytest.fixture(name="engine_benchmark")
+def engine_benchmark_fixture(tmp_path):
+    """
+    Crea un engine SQLite en un archivo temporal para el benchmark.
+    """
+    engine = crear_engine_benchmark(str(tmp_path / "benchmark.db"))
+    yield engine
+    engine.dispose()
+
+
+def test_benchmark_recorre_todos_los_escenarios(engine_benchmark):
+    """Una corrida pequeña produce métricas para cada escenario sin errores"""
+    ctx = sembrar_datos(engine_benchmark, usuarios=20, peliculas=40, favoritos=100, reserva=10)
+    resultados = asyncio.run(
+        ejecutar_benchmark(app, engine_benchmark, ctx, peticiones=5, concurrencia=2)
+    )
+
+    assert set(resultados) == {e.nombre for e in ESCENARIOS}
+    for nombre, metricas in resultados.items():
+        assert metricas["errores"] == 0, nombre
+        assert metricas["peticiones"] > 0, nombre
+        assert metricas["p50_ms"] <= metricas["p95_ms"] <= metricas["p99_ms"]
+        assert metricas["rps"] > 0
+
+
+def test_percentil_nearest_rank():
+    """Test del cálculo de percentiles"""
+    valores = [float(v) for v in range(1, 101)]
+    assert percentil(valores, 50) == 50.0
+    assert percentil(valores, 95) == 95.0
+    assert percentil(valores, 99) == 99.0
+    assert percentil([], 99) == 0.0
+
+
+def test_linea_base_detecta_regresiones(tmp_path):
+    """Latencias más altas o menos rps que el umbral se reportan como regresión"""
+    base = {"listar_peliculas": {"p50_ms": 2.0, "p95_ms": 4.0, "p99_ms": 5.0, "rps": 1000.0}}
+    ruta = tmp_path / "base.json"
+    guardar_linea_base(base, str(ruta))
+    assert cargar_linea_base(str(ruta)) == base
+
+    similar = {"listar_peliculas": {"p50_ms": 2.1, "p95_ms": 4.2, "p99_ms": 5.5, "rps": 950.0}}
+    assert comparar_con_linea_base(similar, base, umbral=0.2) == []
+
+    peor = {"listar_peliculas": {"p50_ms": 2.1, "p95_ms": 6.0, "p99_ms": 5.5, "rps": 700.0}}
+    regresiones = comparar_con_linea_base(peor, base, umbral=0.2)
+    assert len(regresiones) == 2
+    assert any("p95_ms" in r for r in regresiones)
+    assert any("rps" in r for r in regresiones)
+
+
+def test_benchmark_inserciones(tmp_path):
+    """Las tres estrategias de inserción crean las mismas películas"""
+    from benchmarks.inserciones import generar_filas, medir_inserciones
+
+    filas = generar_filas(60, duplicados=0.25)
+    resultados = medir_inserciones(str(tmp_path), filas)
+    assert {datos["creadas"] for datos in resultados.values()} == {45}
+
+
+def test_benchmark_autocompletado():
+    """El benchmark de autocompletado construye el índice y reporta percentiles"""
+    from benchmarks.autocompletado import construir_indice, medir_consultas
+
+    indice = construir_indice(peliculas=500, favoritos=2000)
+    resultado = medir_consultas(indice, consultas=200)
+    assert len(indice) == 500
+    assert resultado["consultas"] == 200
+    assert 0 < resultado["p50_ms"] <= resultado["p99_ms"] <= resultado["max_ms"]
+
+
+def test_benchmark_conexiones_websocket():
+    """Una corrida pequeña del benchmark de conexiones: todas siguen vivas y reciben los cambios"""
+    from benchmarks.conexiones import ejecutar
+
+    resultado = asyncio.run(ejecutar(conexiones=20, usuarios=4, espera=0, cambios=2, lote=10))
+    assert resultado["vivas_tras_espera"] == 20
+    assert resultado["entregas"] == 10
+    assert resultado["memoria_abiertas_mb"] > 0
+
+
+def test_benchmark_sesiones(tmp_path):
+    """Los tres modos de sesión procesan las mismas peticiones y reportan el ahorro"""
+    from sqlmodel import SQLModel
+
+    from app.database import crear_engine_bd
+    from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos
+    from benchmarks.sesiones import MODOS, medir_sesiones
+
+    engine = crear_engine_bd(f"sqlite:///{tmp_path / 'sesiones.db'}")
+    SQLModel.metadata.create_all(engine)
+    cargar_datos_sinteticos(engine, GeneradorDatos(usuarios=20, peliculas=50, favoritos=200))
+    resultados = medir_sesiones(engine, usuarios=20, peticiones=20, pagina=10)
+    engine.dispose()
+    assert set(resultados) == set(MODOS)
+    assert resultados["por_defecto"]["ahorro"] == 0.0
+    assert all(datos["cpu_us_por_peticion"] > 0 for datos in resultados.values())
+
+
+def test_benchmark_consultas():
+    """El registro construye cada combinación de filtros una vez y la reutiliza"""
+    from benchmarks.consultas import MODOS, ejecutar
+
+    resultado = ejecutar(peticiones=200, peliculas=30)
+    assert set(resultado["construccion_us"]) == set(MODOS)
+    assert set(resultado["ejecucion_us"]) == set(MODOS)
+    buscar = resultado["metricas"]["consultas"]["buscar_peliculas"]
+    assert buscar["construidas"] == 0 and buscar["reutilizadas"] == 400
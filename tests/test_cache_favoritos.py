@@ -0,0 +1,100 @@
+"""
+Tests para la caché de favoritos por usuario.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from main import app
+from app.cache_favoritos import CacheFavoritos, cache_favoritos
+from app.models import Favorito, Pelicula, Usuario
+
+# Las sesiones de la aplicación usan la base temporal de cada test
+pytestmark = pytest.mark.usefixtures("enrutador")
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    """
+    Base con tres usuarios y cuatro películas; el usuario 1 tiene las películas 2 y 3.
+    """
+    with Session(engine) as session:
+        for i in (1, 2, 3):
+            session.add(Usuario(nombre=f"Usuario {i}", correo=f"usuario{i}@email.com"))
+        for i in range(1, 5):
+            session.add(Pelicula(
+                titulo=f"Película {i}", director="Director", genero="Drama, Comedia",
+                duracion=100, año=2000, clasificacion="PG"
+            ))
+        session.commit()
+        session.add(Favorito(id_usuario=1, id_pelicula=2))
+        session.add(Favorito(id_usuario=1, id_pelicula=3))
+        session.commit()
+    return engine
+
+
+def _consultas_favorito(engine) -> list:
+    consultas = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *args: consultas.append(sql) if "FROM favorito" in sql else None)
+    return consultas
+
+
+def test_endpoints_comparten_la_carga(engine):
+    consultas = _consultas_favorito(engine)
+    client = TestClient(app)
+
+    assert [p["id"] for p in client.get("/api/usuarios/1/favoritos").json()] == [2, 3]
+    assert client.get("/api/favoritos/verificar/1/1").json() == {"es_favorito": False}
+    assert client.get("/api/usuarios/1/estadisticas").json()["total_favoritos"] == 2
+    assert client.post("/api/favoritos/verificar", json={"id_usuario": 1, "peliculas": [1, 2]}).json()[1]["es_favorito"]
+
+    assert len(consultas) == 1
+    metricas = client.get("/metricas").json()["cache_favoritos"]
+    assert metricas["usuarios"] == 1 and metricas["fallos"] == 1 and metricas["aciertos"] == 3
+
+
+def test_escrituras_y_cascadas_actualizan_la_cache(engine):
+    client = TestClient(app)
+    client.get("/api/usuarios/1/favoritos")
+
+    client.post("/api/usuarios/1/favoritos/4")
+    client.delete("/api/usuarios/1/favoritos/2")
+    assert list(cache_favoritos.en_cache(1)) == [3, 4]
+
+    client.delete("/api/peliculas/3")
+    assert list(cache_favoritos.en_cache(1)) == [4]
+    assert [p["id"] for p in client.get("/api/usuarios/1/favoritos").json()] == [4]
+
+    client.delete("/api/usuarios/1")
+    assert cache_favoritos.en_cache(1) is None
+
+
+def test_desalojo_lru_por_presupuesto(engine):
+    cache = CacheFavoritos(presupuesto_bytes=400)
+    with Session(engine) as session:
+        for id_usuario in (1, 2, 3):
+            cache.peliculas(session, id_usuario)
+        cache.peliculas(session, 2)
+        assert cache.metricas()["bytes"] <= 400
+        assert cache.desalojados >= 1 and cache.en_cache(1) is None
+        assert cache.en_cache(2) is not None
+
+    assert len(CacheFavoritos(presupuesto_bytes=0)) == 0
+
+
+def test_un_cambio_durante_la_carga_no_se_guarda(engine, monkeypatch):
+    cache = CacheFavoritos()
+    cargar = cache._cargar
+
+    def cargar_con_cambio(session, id_usuario):
+        ids = cargar(session, id_usuario)
+        cache._en_favorito("1:1", {"accion": "agregado", "id_usuario": 1, "id_pelicula": 1})
+        return ids
+
+    monkeypatch.setattr(cache, "_cargar", cargar_con_cambio)
+    with Session(engine) as session:
+        assert list(cache.peliculas(session, 1)) == [2, 3]
+    assert cache.en_cache(1) is None and not cache._cargando and not cache._sucios
@@ -0,0 +1,83 @@
+"""
+Tests para el registro de cambios (change data capture) y GET /api/changes.
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.models import Cambio, Usuario
+
+
+PELICULA = {
+    "titulo": "Roma", "director": "Alfonso Cuarón", "genero": "Drama",
+    "duracion": 135, "año": 2018, "clasificacion": "R"
+}
+
+
+def _cambios(client: TestClient, **params) -> list:
+    response = client.get("/api/changes/", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(linea) for linea in response.text.splitlines()]
+
+
+def test_registra_cambios_orm_y_core(client: TestClient):
+    """Altas, modificaciones y bajas quedan registradas en orden, con la fila completa"""
+    usuario = client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"}).json()
+    pelicula = client.post("/api/peliculas/", json=PELICULA).json()
+    client.put(f"/api/peliculas/{pelicula['id']}", json={"duracion": 140})
+    client.post(f"/api/usuarios/{usuario['id']}/favoritos/{pelicula['id']}")
+    client.post("/api/peliculas/lote", json=[{**PELICULA, "duracion": 150}, {**PELICULA, "titulo": "Rocky"}])
+    client.delete(f"/api/peliculas/{pelicula['id']}")
+
+    cambios = _cambios(client)
+    operaciones = [(c["entidad"], c["operacion"]) for c in cambios]
+    assert operaciones[:4] == [
+        ("usuario", "insert"),
+        ("pelicula", "insert"),
+        ("pelicula", "update"),
+        ("favorito", "insert"),
+    ]
+    # El lote es una sola sentencia: una película existente (update) y una nueva (insert)
+    assert sorted(operaciones[4:6]) == [("pelicula", "insert"), ("pelicula", "update")]
+    # Borrar la película es un borrado lógico; su favorito se registra al compactarla
+    assert operaciones[6:] == [("pelicula", "delete")]
+    secuencias = [c["secuencia"] for c in cambios]
+    assert secuencias == sorted(secuencias) and len(set(secuencias)) == len(secuencias)
+    assert cambios[2]["datos"]["duracion"] == 140 and cambios[2]["datos"]["version"] == 2
+    borrada = next(c for c in cambios[6:] if c["entidad"] == "pelicula")
+    assert borrada["id"] == pelicula["id"] and borrada["datos"]["titulo"] == "Roma"
+    assert cambios[0]["datos"]["correo"] == "ana@email.com"
+
+
+def test_sin_registro_si_no_hay_cambio(client: TestClient, engine):
+    """Un duplicado rechazado o una transacción deshecha no dejan registro"""
+    client.post("/api/peliculas/", json=PELICULA)
+    assert client.post("/api/peliculas/", json=PELICULA).status_code == 400
+
+    with Session(engine) as session:
+        session.add(Usuario(nombre="Temporal", correo="temporal@email.com"))
+        session.flush()
+        session.rollback()
+
+    with Session(engine) as session:
+        assert len(session.exec(select(Cambio)).all()) == 1
+
+
+def test_paginacion_por_secuencia(client: TestClient, monkeypatch):
+    """since, limit y entidad recorren el registro por lotes sin repetir ni saltar cambios"""
+    monkeypatch.setattr("app.routers.cambios.TAMAÑO_LOTE", 3)
+    client.post("/api/peliculas/lote", json=[{**PELICULA, "año": 2000 + i} for i in range(10)])
+    client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"})
+
+    todos = _cambios(client)
+    assert len(todos) == 11
+
+    primeros = _cambios(client, limit=4)
+    siguientes = _cambios(client, since=primeros[-1]["secuencia"])
+    assert primeros + siguientes == todos
+
+    assert [c["entidad"] for c in _cambios(client, entidad="usuario")] == ["usuario"]
+    assert _cambios(client, since=todos[-1]["secuencia"]) == []
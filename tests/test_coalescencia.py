@@ -0,0 +1,126 @@
+"""
+Tests para la coalescencia de lecturas idénticas concurrentes (single-flight).
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from main import app
+from app.coalescencia import Coalescedor, MiddlewareCoalescencia, coalescedor_lecturas
+
+
+def _app_contada(asincrona: bool):
+    """App con un endpoint lento que cuenta cuántas veces se ejecutó."""
+    api = FastAPI()
+    api.state.llamadas = 0
+
+    if asincrona:
+        @api.get("/lento")
+        async def lento(n: int = 0, a: int = 0):
+            api.state.llamadas += 1
+            llamada = api.state.llamadas
+            await asyncio.sleep(0.1)
+            return {"n": n, "llamada": llamada}
+    else:
+        @api.get("/lento")
+        def lento(n: int = 0, a: int = 0):
+            api.state.llamadas += 1
+            llamada = api.state.llamadas
+            time.sleep(0.1)
+            return {"n": n, "llamada": llamada}
+
+    @api.get("/falla")
+    async def falla():
+        api.state.llamadas += 1
+        await asyncio.sleep(0.05)
+        raise HTTPException(status_code=500, detail="error")
+
+    return api
+
+
+async def _pedir(aplicacion, rutas):
+    transporte = httpx.ASGITransport(app=aplicacion)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(ruta) for ruta in rutas))
+
+
+@pytest.mark.parametrize("asincrona", [False, True])
+def test_peticiones_identicas_comparten_una_ejecucion(asincrona):
+    api = _app_contada(asincrona)
+    coalescedor = Coalescedor(["/lento"])
+    respuestas = asyncio.run(_pedir(MiddlewareCoalescencia(api, coalescedor), ["/lento?n=1&a=2"] * 10 + ["/lento?a=2&n=1"]))
+
+    assert api.state.llamadas == 1
+    assert {r.text for r in respuestas} == {'{"n":1,"llamada":1}'}
+    metricas = coalescedor.metricas()
+    assert metricas["ejecutadas"] == 1 and metricas["compartidas"] == 10
+    assert metricas["tasa_compartidas"] == pytest.approx(10 / 11, abs=1e-4)
+    assert metricas["en_curso"] == 0
+
+
+def test_parametros_distintos_y_errores_no_se_comparten():
+    api = _app_contada(asincrona=True)
+    coalescedor = Coalescedor(["/lento", "/falla"])
+    aplicacion = MiddlewareCoalescencia(api, coalescedor)
+
+    respuestas = asyncio.run(_pedir(aplicacion, ["/lento?n=1", "/lento?n=2", "/lento?n=1"]))
+    assert api.state.llamadas == 2
+    assert [r.json()["n"] for r in respuestas] == [1, 2, 1]
+
+    # Un error de la líder no se reparte: cada seguidora hace su propia petición
+    api.state.llamadas = 0
+    respuestas = asyncio.run(_pedir(aplicacion, ["/falla"] * 3))
+    assert [r.status_code for r in respuestas] == [500] * 3
+    assert api.state.llamadas == 3
+    assert coalescedor.metricas()["rutas"]["/falla"]["sin_compartir"] == 2
+
+
+def test_un_cambio_corta_el_vuelo_en_curso():
+    """Lo que llega después de un cambio confirmado no se une a un cálculo anterior"""
+    api = _app_contada(asincrona=True)
+    coalescedor = Coalescedor(["/lento"])
+    aplicacion = MiddlewareCoalescencia(api, coalescedor)
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=aplicacion)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as client:
+            primera = asyncio.create_task(client.get("/lento"))
+            await asyncio.sleep(0.03)
+            coalescedor._en_cambio("1", {"operacion": "guardada"})
+            await asyncio.sleep(0)
+            segunda = await client.get("/lento")
+            return await primera, segunda
+
+    primera, segunda = asyncio.run(escenario())
+    assert api.state.llamadas == 2
+    assert primera.json()["llamada"] == 1 and segunda.json()["llamada"] == 2
+
+
+def test_busqueda_coalescida_y_comprimida(enrutador):
+    """Con la app completa: cada seguidora recibe su propia codificación y /metricas lo cuenta"""
+    coalescedor_lecturas.reiniciar()
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as client:
+            await client.post("/api/peliculas/lote", json=[
+                {"titulo": f"Película {i}", "director": "Director", "genero": "Drama", "duracion": 100,
+                 "año": 2000, "clasificacion": "PG", "sinopsis": "Una historia sobre cine. " * 5}
+                for i in range(30)
+            ])
+            encabezados = [{"Accept-Encoding": "gzip"}, {"Accept-Encoding": "identity"}] * 4
+            respuestas = await asyncio.gather(*(
+                client.get("/api/peliculas/buscar/", params={"titulo": "pel"}, headers=h) for h in encabezados
+            ))
+            return respuestas, (await client.get("/metricas")).json()
+
+    respuestas, metricas = asyncio.run(escenario())
+    assert {r.status_code for r in respuestas} == {200}
+    assert len({r.text for r in respuestas}) == 1 and len(respuestas[0].json()) == 30
+    assert [r.headers.get("content-encoding") for r in respuestas] == ["gzip", None] * 4
+    ruta = metricas["coalescencia"]["rutas"]["/api/peliculas/buscar"]
+    assert ruta["ejecutadas"] + ruta["compartidas"] == 8 and ruta["compartidas"] >= 1
@@ -0,0 +1,223 @@
+"""
+Tests para la cola write-behind de favoritos.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from main import app
+from app import database
+from app import cola_favoritos as modulo_cola
+from app.cola_favoritos import AGREGAR, ELIMINAR, ColaFavoritos, ColaLlena
+from app.models import Favorito, Pelicula, Usuario
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    """
+    Base SQLite en archivo con dos usuarios y dos películas.
+    """
+    with Session(engine) as session:
+        for i in (1, 2):
+            session.add(Usuario(nombre=f"Usuario {i}", correo=f"usuario{i}@email.com"))
+            session.add(Pelicula(
+                titulo=f"Película {i}", director="Director", genero="Drama",
+                duracion=100, año=2000, clasificacion="PG"
+            ))
+        session.commit()
+    return engine
+
+
+@pytest.fixture(name="cola")
+def cola_fixture(engine, enrutador, tmp_path, monkeypatch):
+    """
+    Cola activa sobre la base temporal, instalada como la cola global de la aplicación.
+    """
+    cola = ColaFavoritos(str(tmp_path / "favoritos.journal"), capacidad=3, espera_maxima=0.0)
+    cola.iniciar(engine)
+    monkeypatch.setattr(modulo_cola, "cola_favoritos", cola)
+    monkeypatch.setattr("app.routers.usuarios.cola_favoritos", cola)
+    monkeypatch.setattr("app.routers.favoritos.cola_favoritos", cola)
+    yield cola
+    cola.detener()
+
+
+def _pares(engine) -> set:
+    with Session(engine) as session:
+        return {(f.id_usuario, f.id_pelicula) for f in session.exec(select(Favorito)).all()}
+
+
+def test_lote_se_confirma_en_una_transaccion(cola: ColaFavoritos, engine):
+    """Las operaciones pendientes se aplican juntas y solo cuenta la última de cada par"""
+    cola.encolar(1, 1, AGREGAR)
+    cola.encolar(1, 2, AGREGAR)
+    cola.encolar(1, 2, ELIMINAR)
+    assert _pares(engine) == set()
+
+    assert cola.vaciar() == 3
+    assert _pares(engine) == {(1, 1)}
+    assert cola.lotes == 1 and len(cola) == 0
+
+
+def test_alta_de_un_padre_inexistente_no_traba_el_lote(cola: ColaFavoritos, engine, caplog):
+    """Un favorito de una película borrada o eliminada se descarta; el resto del lote se confirma"""
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Usuario, 2)
+        session.commit()
+    cola.encolar(1, 1, AGREGAR)
+    cola.encolar(1, 999, AGREGAR)
+    cola.encolar(2, 2, AGREGAR)
+
+    assert cola.vaciar() == 3
+    assert _pares(engine) == {(1, 1)}
+    assert len(cola) == 0
+    assert "Se descartan 2 favoritos" in caplog.text
+    with open(cola.ruta_journal, encoding="utf-8") as journal:
+        assert journal.read() == ""
+
+
+def test_verificar_ve_operaciones_pendientes(cola: ColaFavoritos, engine):
+    """verificar_favorito responde con lo encolado antes de que se confirme"""
+    client = TestClient(app)
+
+    response = client.post("/api/usuarios/1/favoritos/2")
+    assert response.status_code == 202
+    assert client.get("/api/favoritos/verificar/1/2").json() == {"es_favorito": True, "pendiente": True}
+    assert client.post("/api/usuarios/1/favoritos/2").status_code == 400
+    assert _pares(engine) == set()
+
+    cola.vaciar()
+    assert client.get("/api/favoritos/verificar/1/2").json()["es_favorito"] is True
+
+    assert client.delete("/api/usuarios/1/favoritos/2").status_code == 202
+    assert client.get("/api/favoritos/verificar/1/2").json() == {"es_favorito": False, "pendiente": True}
+    cola.vaciar()
+    assert _pares(engine) == set()
+
+
+def test_borrar_todos_descarta_lo_pendiente(cola: ColaFavoritos, engine, tmp_path):
+    """Un favorito encolado no reaparece al vaciar la cola después de borrar todos los del usuario"""
+    client = TestClient(app)
+    cola.encolar(2, 1, AGREGAR)
+    assert client.post("/api/usuarios/1/favoritos/1").status_code == 202
+
+    assert client.delete("/api/favoritos/usuario/1/todos").status_code == 204
+    cola.vaciar()
+    assert client.get("/api/favoritos/verificar/1/1").json()["es_favorito"] is False
+    assert _pares(engine) == {(2, 1)}
+    # El journal tampoco la conserva para una recuperación posterior
+    with open(cola.ruta_journal, encoding="utf-8") as journal:
+        assert journal.read() == ""
+
+
+def test_cola_llena_responde_503(cola: ColaFavoritos):
+    """Con la cola en su capacidad se rechaza con 503 y Retry-After"""
+    client = TestClient(app)
+    for pelicula in (1, 2):
+        cola.encolar(2, pelicula, AGREGAR)
+    assert client.post("/api/favoritos/", json={"id_usuario": 1, "id_pelicula": 1}).status_code == 202
+
+    response = client.post("/api/favoritos/", json={"id_usuario": 1, "id_pelicula": 2})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    with pytest.raises(ColaLlena):
+        cola.encolar(1, 2, AGREGAR)
+
+    cola.vaciar()
+    assert client.post("/api/favoritos/", json={"id_usuario": 1, "id_pelicula": 2}).status_code == 202
+
+
+def test_recuperacion_desde_el_journal(engine, tmp_path):
+    """Lo encolado por un proceso que cae se aplica al iniciar la siguiente cola"""
+    ruta = str(tmp_path / "caida.journal")
+    caida = ColaFavoritos(ruta)
+    caida.iniciar(engine)
+    caida.encolar(1, 1, AGREGAR)
+    caida.encolar(2, 2, AGREGAR)
+    # El proceso muere sin confirmar: se libera el bloqueo, los archivos quedan
+    caida._journal.close()
+    caida._bloqueo.close()
+
+    nueva = ColaFavoritos(ruta)
+    assert nueva.iniciar(engine) == 2
+    assert _pares(engine) == {(1, 1), (2, 2)}
+
+    # Reaplicar es idempotente
+    nueva.encolar(1, 1, AGREGAR)
+    nueva.vaciar()
+    assert _pares(engine) == {(1, 1), (2, 2)}
+    nueva.detener()
+
+
+def test_detener_con_la_base_fallando_conserva_el_journal(engine, tmp_path, monkeypatch):
+    """Detener no se queda reintentando: deja el journal para el próximo arranque"""
+    ruta = str(tmp_path / "detenida.journal")
+    cola = ColaFavoritos(ruta, intervalo=0)
+    cola.iniciar(engine)
+    cola.encolar(1, 1, AGREGAR)
+    intentos = []
+
+    def fallar(operaciones):
+        intentos.append(len(operaciones))
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(cola, "_aplicar", fallar)
+    assert cola.detener(intentos=3) is False
+    assert len(intentos) == 3
+    assert _pares(engine) == set()
+
+    monkeypatch.undo()
+    siguiente = ColaFavoritos(ruta)
+    assert siguiente.iniciar(engine) == 1
+    assert _pares(engine) == {(1, 1)}
+    assert siguiente.detener() is True
+    assert not list(tmp_path.glob("detenida.journal.*"))
+
+
+def test_cancelar_espera_el_lote_en_vuelo(cola: ColaFavoritos, engine, monkeypatch):
+    """La tarea cancelada termina después del lote que estaba confirmando"""
+    aplicar = cola._aplicar
+    en_vuelo = threading.Event()
+
+    def aplicar_lento(operaciones):
+        en_vuelo.set()
+        time.sleep(0.2)
+        aplicar(operaciones)
+
+    monkeypatch.setattr(cola, "_aplicar", aplicar_lento)
+
+    async def escenario():
+        tarea = asyncio.create_task(cola.ejecutar())
+        cola.encolar(1, 1, AGREGAR)
+        await asyncio.to_thread(en_vuelo.wait)
+        tarea.cancel()
+        await asyncio.gather(tarea, return_exceptions=True)
+        return _pares(engine), len(cola)
+
+    assert asyncio.run(escenario()) == ({(1, 1)}, 0)
+
+
+@pytest.mark.skipif(modulo_cola.fcntl is None, reason="Sin bloqueo de archivos entre procesos")
+def test_journal_vivo_no_se_recupera(engine, tmp_path):
+    """Otro worker no reaplica el journal de una cola viva, tampoco después de reescribirlo"""
+    ruta = str(tmp_path / "vivo.journal")
+    viva = ColaFavoritos(ruta, tamaño_lote=1)
+    viva.iniciar(engine)
+    viva.encolar(1, 1, AGREGAR)
+    viva.encolar(2, 2, AGREGAR)
+    otro_worker = ColaFavoritos(ruta)
+    assert otro_worker.recuperar() == 0
+
+    assert viva.vaciar() == 1  # reemplaza el journal por uno con la operación restante
+    assert otro_worker.recuperar() == 0
+    assert _pares(engine) == {(1, 1)}
+
+    viva.detener()
+    assert _pares(engine) == {(1, 1), (2, 2)}
+    assert not list(tmp_path.glob("vivo.journal.*"))
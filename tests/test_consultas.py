@@ -0,0 +1,129 @@
+"""
+Tests para el registro de consultas ya construidas (app/consultas.py).
+"""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.consultas import RegistroConsultas, consultas, parametros_busqueda
+from app.database import select_filas
+from app.models import Pelicula
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    """
+    Base temporal con tres películas.
+    """
+    with Session(engine) as session:
+        session.add(Pelicula(titulo="El Señor de los Anillos", director="Peter Jackson",
+                             genero="Fantasía", duracion=178, año=2001, clasificacion="PG-13"))
+        session.add(Pelicula(titulo="El Padrino", director="Francis Ford Coppola",
+                             genero="Drama", duracion=175, año=1972, clasificacion="R"))
+        session.add(Pelicula(titulo="Amélie", director="Jean-Pierre Jeunet",
+                             genero="Comedia, Drama", duracion=122, año=2001, clasificacion="R"))
+        session.commit()
+    return engine
+
+
+@pytest.fixture(name="client")
+def client_fixture(client):
+    """
+    Cliente sobre esa base con los contadores del registro en cero.
+    """
+    consultas.reiniciar()
+    return client
+
+
+def _titulos(client: TestClient, **filtros) -> list:
+    response = client.get("/api/peliculas/buscar/", params=filtros)
+    assert response.status_code == 200
+    return sorted(p["titulo"] for p in response.json())
+
+
+def test_busqueda_reutiliza_una_sentencia_por_combinacion(client: TestClient):
+    """Los mismos filtros con otros valores usan la misma sentencia y filtran igual"""
+    assert _titulos(client, titulo="señor") == ["El Señor de los Anillos"]
+    assert _titulos(client, titulo="PADRINO") == ["El Padrino"]
+    assert _titulos(client, genero="Drama", año=2001) == ["Amélie"]
+    assert _titulos(client, genero="Fantasía", año=2001) == ["El Señor de los Anillos"]
+    assert _titulos(client, año_min=1980, año_max=2010) == ["Amélie", "El Señor de los Anillos"]
+    assert len(_titulos(client)) == 3
+
+    buscar = consultas.metricas()["consultas"]["buscar_peliculas"]
+    assert buscar["construidas"] + buscar["reutilizadas"] == 6
+    assert buscar["reutilizadas"] >= 2
+    assert consultas.sentencia("buscar_peliculas", "titulo") is consultas.sentencia("buscar_peliculas", "titulo")
+    assert consultas.sentencia("buscar_peliculas", "titulo") is not consultas.sentencia("buscar_peliculas", "genero")
+
+
+def test_parametros_busqueda_normaliza_y_descarta_vacios():
+    assert parametros_busqueda(titulo="Señor", director="", año=0, genero="Drama") == {
+        "titulo": "senor", "genero": "Drama"
+    }
+    assert list(parametros_busqueda(año_max=2000, titulo="a", año_min=1990)) == ["titulo", "año_min", "año_max"]
+
+
+def test_metricas_cuentan_el_sql_compilado(client: TestClient):
+    for skip in range(3):
+        assert client.get("/api/peliculas/", params={"skip": skip, "limit": 1}).status_code == 200
+
+    metricas = client.get("/metricas").json()["consultas"]
+    assert metricas["consultas"]["listar_peliculas"]["reutilizadas"] >= 2
+    assert metricas["sql_compilado"]["aciertos"] >= 2
+    assert 0 < metricas["tasa_reutilizadas"] <= 1
+
+
+def test_solo_se_cuentan_los_engines_del_enrutador(client: TestClient, crear_engine):
+    """Un engine que no usa el enrutador (otra base, un script) no entra en las métricas"""
+    ajeno = crear_engine("ajena.db")
+    with Session(ajeno) as session:
+        for _ in range(3):
+            session.exec(select_filas(Pelicula)).all()
+    assert consultas.metricas()["sql_compilado"]["aciertos"] == 0
+
+    client.get("/api/peliculas/")
+    client.get("/api/peliculas/")
+    assert consultas.metricas()["sql_compilado"]["aciertos"] >= 1
+
+
+def test_registro_construye_cada_variante_una_vez():
+    registro = RegistroConsultas()
+    construcciones = []
+
+    @registro.definir("peliculas")
+    def _peliculas(*filtros):
+        construcciones.append(filtros)
+        return select_filas(Pelicula)
+
+    registro.sentencia("peliculas")
+    registro.sentencia("peliculas")
+    registro.sentencia("peliculas", "año")
+    assert construcciones == [(), ("año",)]
+    metricas = registro.metricas()
+    assert metricas["consultas"]["peliculas"] == {"construidas": 2, "reutilizadas": 1}
+    assert metricas["variantes"] == 2
+
+    registro.reiniciar()
+    registro.sentencia("peliculas")
+    assert registro.metricas()["consultas"]["peliculas"] == {"construidas": 0, "reutilizadas": 1}
+
+
+def test_metricas_exactas_con_varios_hilos():
+    """Los hilos del threadpool piden la misma sentencia a la vez sin perder cuentas"""
+    registro = RegistroConsultas()
+    registro.definir("peliculas")(lambda: select_filas(Pelicula))
+
+    def pedir():
+        for _ in range(2000):
+            registro.sentencia("peliculas")
+
+    hilos = [threading.Thread(target=pedir) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert registro.metricas()["consultas"]["peliculas"] == {"construidas": 1, "reutilizadas": 15999}
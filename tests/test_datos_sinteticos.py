@@ -0,0 +1,80 @@
+"""
+Tests para el generador de datos sintéticos.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.datos_sinteticos import GeneradorDatos, cargar_datos_sinteticos, generar_archivo_sqlite
+from app.models import Usuario, Pelicula, Favorito
+from benchmarks.carga import crear_engine_benchmark
+
+
+REFERENCIA = datetime(2025, 6, 1, 12, 0)
+
+
+def _generador(**kwargs) -> GeneradorDatos:
+    parametros = {"usuarios": 300, "peliculas": 500, "favoritos": 6000, "semilla": 7, "referencia": REFERENCIA}
+    parametros.update(kwargs)
+    return GeneradorDatos(**parametros)
+
+
+def test_misma_semilla_mismos_datos():
+    """La generación es determinista para una semilla y referencia dadas"""
+    a, b = _generador(), _generador()
+    assert list(a.iter_usuarios()) == list(b.iter_usuarios())
+    assert list(a.iter_peliculas()) == list(b.iter_peliculas())
+    assert list(a.iter_favoritos()) == list(b.iter_favoritos())
+
+    otra = _generador(semilla=8)
+    assert list(otra.iter_favoritos()) != list(a.iter_favoritos())
+
+
+def test_favoritos_unicos_y_con_sesgo():
+    """No hay pares repetidos, la popularidad es Zipf y los usuarios tienen cola pesada"""
+    generador = _generador()
+    favoritos = list(generador.iter_favoritos())
+    pares = {(f["id_usuario"], f["id_pelicula"]) for f in favoritos}
+    assert len(pares) == len(favoritos)
+    assert abs(len(favoritos) - generador.favoritos) < generador.favoritos * 0.15
+
+    por_pelicula = Counter(f["id_pelicula"] for f in favoritos).most_common()
+    assert por_pelicula[0][1] > 10 * por_pelicula[len(por_pelicula) // 2][1]
+
+    por_usuario = sorted(generador.cantidades_por_usuario(), reverse=True)
+    assert por_usuario[0] > 5 * por_usuario[len(por_usuario) // 2]
+
+
+def test_titulos_unicos_por_año():
+    """Los títulos generados no se repiten, incluso con catálogos grandes"""
+    peliculas = list(_generador(peliculas=5000).iter_peliculas())
+    assert len({p["titulo"] for p in peliculas}) == len(peliculas)
+
+
+def test_carga_masiva_respeta_filas_existentes(tmp_path):
+    """Cargar dos veces desplaza los IDs en lugar de chocar con las filas previas"""
+    engine = crear_engine_benchmark(str(tmp_path / "datos.db"))
+    primera = cargar_datos_sinteticos(engine, _generador(usuarios=50, peliculas=80, favoritos=400))
+    segunda = cargar_datos_sinteticos(engine, _generador(usuarios=50, peliculas=80, favoritos=400, semilla=9))
+
+    with Session(engine) as session:
+        assert session.exec(select(func.count(Usuario.id))).one() == 100
+        assert session.exec(select(func.count(Pelicula.id))).one() == 160
+        total_favoritos = session.exec(select(func.count(Favorito.id))).one()
+        assert total_favoritos == primera["favoritos"] + segunda["favoritos"]
+    engine.dispose()
+
+
+def test_generar_archivo_sqlite(tmp_path):
+    """Se produce un archivo SQLite utilizable con todas las filas"""
+    ruta = tmp_path / "grande.db"
+    totales = generar_archivo_sqlite(str(ruta), _generador())
+    assert ruta.exists()
+
+    engine = crear_engine_benchmark(str(ruta))
+    with Session(engine) as session:
+        assert session.exec(select(func.count(Favorito.id))).one() == totales["favoritos"]
+    engine.dispose()
@@ -0,0 +1,104 @@
+"""
+Tests para la difusión de estadísticas en vivo (Server-Sent Events).
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from main import app
+from app.estadisticas import DifusorEstadisticas
+from app.models import Pelicula, Usuario
+
+# Las sesiones de la aplicación usan la base temporal de cada test
+pytestmark = pytest.mark.usefixtures("enrutador")
+
+
+class _PeticionFalsa:
+    """Request mínima: se da por desconectada después de `vueltas` consultas."""
+
+    def __init__(self, vueltas: int):
+        self.vueltas = vueltas
+
+    async def is_disconnected(self) -> bool:
+        self.vueltas -= 1
+        return self.vueltas < 0
+
+
+def _crear_usuarios(engine, cantidad: int) -> None:
+    with Session(engine) as session:
+        for i in range(cantidad):
+            session.add(Usuario(nombre=f"Usuario {i}", correo=f"usuario{i}@email.com"))
+            session.commit()
+
+
+def test_calculo_compartido_y_coalescido(engine):
+    """Un cálculo para todos los clientes; una ráfaga de cambios produce un solo envío"""
+    async def escenario():
+        difusor = DifusorEstadisticas(intervalo_minimo=0.5, sondeo=5, heartbeat=5)
+        difusor.suscribir_canales()
+        uno, otro = await difusor.conectar(), await difusor.conectar()
+        try:
+            inicial = await asyncio.wait_for(uno.get(), 2)
+            assert await asyncio.wait_for(otro.get(), 2) == inicial
+            assert inicial["total_usuarios"] == 0 and difusor.calculos == 1
+
+            await asyncio.to_thread(_crear_usuarios, engine, 5)
+            siguiente = await asyncio.wait_for(uno.get(), 2)
+            assert siguiente["total_usuarios"] == 5
+            assert siguiente["secuencia"] > inicial["secuencia"]
+            assert difusor.calculos == 2 and difusor.envios == 2
+
+            # Un cambio que no altera las estadísticas se calcula pero no se envía
+            with Session(engine) as session:
+                usuario = session.exec(select(Usuario)).first()
+                usuario.correo = "otro@email.com"
+                session.add(usuario)
+                session.commit()
+            await asyncio.sleep(0.8)
+            assert difusor.calculos == 3 and difusor.envios == 2
+            assert uno.empty()
+        finally:
+            difusor.desconectar(uno)
+            difusor.desconectar(otro)
+            difusor.desuscribir_canales()
+        assert difusor.clientes == 0
+
+    asyncio.run(escenario())
+
+
+def test_eventos_sse(engine):
+    """El generador envía el estado actual y luego comentarios de heartbeat hasta la desconexión"""
+    async def escenario():
+        difusor = DifusorEstadisticas(intervalo_minimo=0.1, sondeo=5, heartbeat=0.2)
+        with Session(engine) as session:
+            session.add(Pelicula(titulo="Roma", director="Alfonso Cuarón", genero="Drama",
+                                 duracion=135, año=2018, clasificacion="R"))
+            session.commit()
+        eventos = [evento async for evento in difusor.eventos(_PeticionFalsa(vueltas=1))]
+        assert difusor.clientes == 0
+        return eventos
+
+    eventos = asyncio.run(escenario())
+    assert eventos[1:] == [": ping\n\n"]
+    lineas = eventos[0].strip().split("\n")
+    assert lineas[0] == "event: estadisticas"
+    assert lineas[1] == "id: 1"
+    datos = json.loads(lineas[2][len("data: "):])
+    assert datos["total_peliculas"] == 1 and datos["pelicula_mas_popular"] == "Ninguna"
+
+
+def test_endpoint_estadisticas(engine):
+    """El endpoint clásico usa el mismo cálculo"""
+    client = TestClient(app)
+    client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"})
+    assert client.get("/api/estadisticas/").json() == {
+        "total_usuarios": 1,
+        "total_peliculas": 0,
+        "total_favoritos": 0,
+        "pelicula_mas_popular": "Ninguna",
+        "usuario_mas_activo": "Ninguno",
+    }
@@ -0,0 +1,146 @@
+"""
+Tests para los favoritos en vivo por WebSocket (WS /api/favoritos/ws).
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app.favoritos_en_vivo import CIERRE_CONSUMIDOR_LENTO, CentralFavoritos, ConexionFavoritos
+
+
+PELICULA = {
+    "titulo": "Roma", "director": "Alfonso Cuarón", "genero": "Drama",
+    "duracion": 135, "año": 2018, "clasificacion": "R"
+}
+
+
+def _crear_datos(client: TestClient):
+    ana = client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"}).json()
+    luis = client.post("/api/usuarios/", json={"nombre": "Luis", "correo": "luis@email.com"}).json()
+    roma = client.post("/api/peliculas/", json=PELICULA).json()
+    rocky = client.post("/api/peliculas/", json={**PELICULA, "titulo": "Rocky", "año": 1976}).json()
+    return ana["id"], luis["id"], roma["id"], rocky["id"]
+
+
+def test_recibe_cambios_de_los_usuarios_suscritos(client: TestClient):
+    """Marcar, desmarcar, crear y borrar todos llegan como deltas; otros usuarios no"""
+    ana, luis, roma, rocky = _crear_datos(client)
+
+    with client.websocket_connect(f"/api/favoritos/ws?usuarios={ana}") as ws:
+        assert ws.receive_json() == {"tipo": "suscripciones", "usuarios": [ana]}
+
+        client.post(f"/api/usuarios/{luis}/favoritos/{roma}")
+        client.post(f"/api/usuarios/{ana}/favoritos/{roma}")
+        assert ws.receive_json() == {"tipo": "favorito", "accion": "agregado", "id_usuario": ana, "id_pelicula": roma}
+
+        client.delete(f"/api/usuarios/{ana}/favoritos/{roma}")
+        assert ws.receive_json()["accion"] == "eliminado"
+
+        client.post("/api/favoritos/", json={"id_usuario": ana, "id_pelicula": rocky})
+        assert ws.receive_json() == {"tipo": "favorito", "accion": "agregado", "id_usuario": ana, "id_pelicula": rocky}
+
+        client.post(f"/api/usuarios/{ana}/favoritos/{roma}")
+        ws.receive_json()
+        client.delete(f"/api/favoritos/usuario/{ana}/todos")
+        eliminados = {ws.receive_json()["id_pelicula"] for _ in range(2)}
+        assert eliminados == {roma, rocky}
+
+
+def test_suscribir_y_desuscribir(client: TestClient):
+    """Las suscripciones se cambian con mensajes; los comandos inválidos responden un error"""
+    ana, luis, roma, _ = _crear_datos(client)
+
+    with client.websocket_connect("/api/favoritos/ws") as ws:
+        ws.send_json({"accion": "suscribir", "usuarios": [ana, luis]})
+        assert ws.receive_json() == {"tipo": "suscripciones", "usuarios": sorted([ana, luis])}
+        ws.send_json({"accion": "desuscribir", "usuarios": [ana]})
+        assert ws.receive_json() == {"tipo": "suscripciones", "usuarios": [luis]}
+        ws.send_text("no es json")
+        assert ws.receive_json()["tipo"] == "error"
+        ws.send_json({"accion": "suscribir", "usuarios": ["1"]})
+        assert ws.receive_json()["tipo"] == "error"
+
+        client.post(f"/api/usuarios/{ana}/favoritos/{roma}")
+        client.post(f"/api/usuarios/{luis}/favoritos/{roma}")
+        assert ws.receive_json()["id_usuario"] == luis
+
+
+class _WebSocketFalso:
+    """WebSocket mínimo: nunca termina de enviar, como un cliente que no lee."""
+
+    def __init__(self):
+        self.cerrado_con = None
+
+    async def send_text(self, texto: str) -> None:
+        await asyncio.Event().wait()
+
+    async def close(self, code: int, reason: str = "") -> None:
+        self.cerrado_con = code
+
+
+def test_descarta_consumidor_lento():
+    """Si la cola de una conexión se llena, se cierra esa conexión y las demás siguen recibiendo"""
+    async def escenario():
+        central = CentralFavoritos(capacidad_cola=3, maximo_usuarios=2)
+        lenta = ConexionFavoritos(_WebSocketFalso(), central.capacidad_cola)
+        rapida = ConexionFavoritos(_WebSocketFalso(), 100)
+        lenta.tarea_envio = asyncio.create_task(central._enviar(lenta))
+        central._agregar_suscripciones(lenta, [1])
+        central._agregar_suscripciones(rapida, [1])
+        with pytest.raises(ValueError):
+            central._agregar_suscripciones(lenta, [2, 3])
+
+        for id_pelicula in range(6):
+            central._distribuir({"accion": "agregado", "id_usuario": 1, "id_pelicula": id_pelicula})
+        await asyncio.sleep(0)
+
+        assert lenta.descartada and not rapida.descartada
+        assert lenta.websocket.cerrado_con == CIERRE_CONSUMIDOR_LENTO
+        assert central.descartadas == 1 and central.suscriptores(1) == 1
+        assert rapida.cola.qsize() == 6
+        assert json.loads(rapida.cola.get_nowait())["id_pelicula"] == 0
+
+    asyncio.run(escenario())
+
+
+class _WebSocketCortado(_WebSocketFalso):
+    """WebSocket de un cliente que ya se desconectó."""
+
+    async def send_text(self, texto: str) -> None:
+        raise WebSocketDisconnect(code=1006)
+
+
+def test_envio_a_un_cliente_desconectado():
+    """Si el envío falla porque el cliente se fue, la tarea termina sin error y deja de recibir"""
+    async def escenario():
+        central = CentralFavoritos()
+        conexion = ConexionFavoritos(_WebSocketCortado(), central.capacidad_cola)
+        conexion.tarea_envio = asyncio.create_task(central._enviar(conexion))
+        central._agregar_suscripciones(conexion, [1])
+        central._distribuir({"accion": "agregado", "id_usuario": 1, "id_pelicula": 1})
+        await conexion.tarea_envio
+
+        assert conexion.desconectada and conexion.tarea_envio.exception() is None
+        assert central.suscriptores(1) == 0 and central.enviados == 0
+
+    asyncio.run(escenario())
+
+
+def test_el_cierre_de_un_descartado_se_conserva_hasta_terminar():
+    async def escenario():
+        central = CentralFavoritos(capacidad_cola=1)
+        conexion = ConexionFavoritos(_WebSocketFalso(), central.capacidad_cola)
+        central._agregar_suscripciones(conexion, [1])
+        for id_pelicula in range(2):
+            central._distribuir({"accion": "agregado", "id_usuario": 1, "id_pelicula": id_pelicula})
+        assert len(central._cierres) == 1
+        await asyncio.gather(*central._cierres)
+        await asyncio.sleep(0)
+        assert conexion.websocket.cerrado_con == CIERRE_CONSUMIDOR_LENTO
+        assert not central._cierres
+
+    asyncio.run(escenario())
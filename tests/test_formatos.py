@@ -0,0 +1,94 @@
+"""
+Tests para la compresión negociada y los formatos de respuesta (columnar, MessagePack).
+"""
+
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.compresion import elegir_codificacion, es_comprimible
+from app.formatos import MEDIA_JSON, MEDIA_MSGPACK, a_columnas, elegir_media
+
+
+def _crear_peliculas(client: TestClient, cantidad: int) -> None:
+    client.post("/api/peliculas/lote", json=[
+        {"titulo": f"Película {i}", "director": "Director", "genero": "Drama", "duracion": 100 + i,
+         "año": 2000, "clasificacion": "PG", "sinopsis": "Una historia sobre cine y memoria. " * 5}
+        for i in range(cantidad)
+    ])
+
+
+def test_lista_comprimida_con_gzip(client: TestClient):
+    """Las listas grandes se comprimen; las respuestas chicas y sin Accept-Encoding no"""
+    _crear_peliculas(client, 50)
+
+    sin_comprimir = client.get("/api/peliculas/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in sin_comprimir.headers
+    comprimida = client.get("/api/peliculas/", headers={"Accept-Encoding": "gzip"})
+    assert comprimida.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in comprimida.headers["vary"]
+    assert comprimida.json() == sin_comprimir.json()
+    assert comprimida.num_bytes_downloaded * 5 < len(sin_comprimir.content)
+
+    chica = client.get("/api/peliculas/", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in chica.headers
+
+
+def test_stream_comprimido(client: TestClient):
+    """El NDJSON de /api/changes se comprime por bloques y se descomprime igual"""
+    _crear_peliculas(client, 30)
+    with client.stream("GET", "/api/changes/", headers={"Accept-Encoding": "gzip"}) as respuesta:
+        assert respuesta.headers["content-encoding"] == "gzip"
+        assert "content-length" not in respuesta.headers
+        crudo = b"".join(respuesta.iter_raw())
+    assert len(gzip.decompress(crudo).splitlines()) == 30
+
+
+def test_negociacion():
+    assert elegir_codificacion("gzip, deflate", ["zstd", "br", "gzip"]) == "gzip"
+    assert elegir_codificacion("gzip, br, zstd", ["zstd", "br", "gzip"]) == "zstd"
+    assert elegir_codificacion("br;q=1.0, zstd;q=0.5", ["zstd", "br", "gzip"]) == "br"
+    assert elegir_codificacion("*;q=0.1, gzip;q=0", ["zstd", "gzip"]) == "zstd"
+    assert elegir_codificacion("identity", ["zstd", "br", "gzip"]) is None
+    assert not es_comprimible("text/event-stream; charset=utf-8")
+    assert es_comprimible("application/x-ndjson") and not es_comprimible("image/png")
+    assert elegir_media("text/html, */*;q=0.8") == MEDIA_JSON
+
+
+def test_formato_columnar(client: TestClient):
+    """Columnar: las claves van una sola vez y los objetos anidados se aplanan"""
+    _crear_peliculas(client, 3)
+    filas = client.get("/api/peliculas/").json()
+    columnar = client.get("/api/peliculas/", params={"formato": "columnar"}).json()
+    assert columnar["cantidad"] == 3
+    assert columnar["columnas"]["titulo"] == [f["titulo"] for f in filas]
+    assert set(columnar["columnas"]) == set(filas[0])
+
+    usuario = client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"}).json()
+    client.post(f"/api/usuarios/{usuario['id']}/favoritos/{filas[0]['id']}")
+    favoritos = client.get(f"/api/favoritos/usuario/{usuario['id']}", params={"formato": "columnar"}).json()
+    assert favoritos["columnas"]["pelicula.titulo"] == [filas[0]["titulo"]]
+    assert favoritos["columnas"]["usuario.nombre"] == ["Ana"]
+
+    assert client.get("/api/peliculas/", params={"formato": "tabla"}).status_code == 422
+    assert a_columnas([]) == {"cantidad": 0, "columnas": {}}
+
+
+def test_msgpack(client: TestClient):
+    msgpack = pytest.importorskip("msgpack")
+    _crear_peliculas(client, 3)
+    respuesta = client.get("/api/peliculas/", headers={"Accept": MEDIA_MSGPACK})
+    assert respuesta.headers["content-type"] == MEDIA_MSGPACK
+    assert msgpack.unpackb(respuesta.content) == client.get("/api/peliculas/").json()
+    estadisticas = client.get("/api/estadisticas/", headers={"Accept": MEDIA_MSGPACK})
+    assert msgpack.unpackb(estadisticas.content)["total_peliculas"] == 3
+
+
+@pytest.mark.parametrize("codificacion,modulo", [("br", "brotli"), ("zstd", "zstandard")])
+def test_brotli_y_zstd(client: TestClient, codificacion, modulo):
+    pytest.importorskip(modulo)
+    _crear_peliculas(client, 50)
+    respuesta = client.get("/api/peliculas/", headers={"Accept-Encoding": codificacion})
+    assert respuesta.headers["content-encoding"] == codificacion
+    assert len(respuesta.json()) == 50
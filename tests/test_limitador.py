@@ -0,0 +1,101 @@
+"""
+Tests para la limitación de tasa y el descarte de carga (app/limitador.py).
+"""
+
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.limitador import (
+    ESCRITURA,
+    LECTURA,
+    LimitadorCarga,
+    LimitadorConcurrencia,
+    MiddlewareLimitador,
+    limitador_carga,
+    normalizar_ruta,
+)
+
+
+def test_tasa_por_cliente_y_ruta(client: TestClient, monkeypatch):
+    """Las rutas pesadas se agotan con su propia tasa; las demás rutas y los sondeos siguen respondiendo"""
+    monkeypatch.setattr(limitador_carga, "tasas_rutas", {"/api/peliculas/buscar": 0.5})
+
+    assert client.get("/api/peliculas/buscar/", params={"titulo": "x"}).status_code == 200
+    respuesta = client.get("/api/peliculas/buscar/", params={"titulo": "y"})
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers["retry-after"]) >= 1
+    assert limitador_carga.rechazadas_tasa == 1
+
+    assert client.get("/api/peliculas/").status_code == 200
+    for _ in range(5):
+        assert client.get("/health").status_code == 200
+
+
+def test_cubetas_por_cliente():
+    limitador = LimitadorCarga(tasa=1, rafaga=2)
+    assert [limitador.consumir("a", "GET", "/api/usuarios/1") for _ in range(2)] == [0, 0]
+    assert limitador.consumir("a", "GET", "/api/usuarios/2/") > 0  # misma ruta normalizada
+    assert limitador.consumir("a", "POST", "/api/usuarios/1") == 0
+    assert limitador.consumir("b", "GET", "/api/usuarios/1") == 0
+    assert normalizar_ruta("/api/usuarios/12/favoritos/7/") == "/api/usuarios/{id}/favoritos/{id}"
+
+
+def test_carriles_y_descarte_por_espera():
+    """Las escrituras usan sus lugares reservados y pasan antes que las lecturas en cola"""
+    async def escenario():
+        limitador = LimitadorConcurrencia(maximo=2, reservadas_escritura=1, espera_objetivo=0.05, espera_maxima=0.2)
+        assert await limitador.adquirir(LECTURA)
+        # La segunda lectura no puede ocupar el lugar reservado
+        lectura = asyncio.create_task(limitador.adquirir(LECTURA))
+        await asyncio.sleep(0.1)
+        assert limitador.en_espera(LECTURA) == 1
+        assert not await limitador.adquirir(LECTURA)  # la cola ya está estancada: descarte inmediato
+        assert await limitador.adquirir(ESCRITURA)
+        assert not await lectura  # venció la espera máxima
+        assert limitador.en_espera(LECTURA) == 0
+
+        escritura = asyncio.create_task(limitador.adquirir(ESCRITURA))
+        otra_lectura = asyncio.create_task(limitador.adquirir(LECTURA))
+        await asyncio.sleep(0)
+        limitador.liberar()
+        assert await escritura
+        limitador.liberar()
+        limitador.liberar()
+        assert await otra_lectura
+        assert limitador.en_curso == 1
+
+    asyncio.run(escenario())
+
+
+def test_middleware_responde_503_sin_bloquear_escrituras():
+    lenta = FastAPI()
+
+    @lenta.get("/lento")
+    async def lento():
+        await asyncio.sleep(0.3)
+        return {"ok": True}
+
+    @lenta.post("/escribir")
+    async def escribir():
+        return {"ok": True}
+
+    limitador = LimitadorCarga(concurrencia=2, reservadas_escritura=1, espera_objetivo=0.05, espera_maxima=0.1)
+    app_limitada = MiddlewareLimitador(lenta, limitador)
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=app_limitada)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as client:
+            lecturas = [asyncio.create_task(client.get("/lento")) for _ in range(2)]
+            await asyncio.sleep(0.02)
+            escritura = await client.post("/escribir")
+            return escritura, [await tarea for tarea in lecturas]
+
+    escritura, lecturas = asyncio.run(escenario())
+    assert escritura.status_code == 200
+    assert sorted(r.status_code for r in lecturas) == [200, 503]
+    rechazada = next(r for r in lecturas if r.status_code == 503)
+    assert rechazada.headers["retry-after"] == "1"
+    assert limitador.rechazadas_carga == 1 and limitador.concurrencia.en_curso == 0
@@ -0,0 +1,166 @@
+"""
+Tests para la unicidad de películas por (título, año), la importación por lotes,
+el bloqueo optimista con If-Match y la búsqueda sin mayúsculas ni acentos.
+"""
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.database import rellenar_columnas_busqueda
+from app.models import Pelicula
+
+
+PELICULA = {
+    "titulo": "El Padrino", "director": "Francis Ford Coppola", "genero": "Drama",
+    "duracion": 175, "año": 1972, "clasificacion": "R"
+}
+
+
+def test_crear_pelicula_duplicada(client: TestClient):
+    """El mismo título y año se rechaza; el mismo título de otro año se acepta"""
+    response = client.post("/api/peliculas/", json=PELICULA)
+    assert response.status_code == 201
+    assert response.json()["id"] == 1
+
+    assert client.post("/api/peliculas/", json=PELICULA).status_code == 400
+    assert client.post("/api/peliculas/", json={**PELICULA, "año": 1990}).status_code == 201
+
+
+def test_actualizar_a_duplicada(client: TestClient):
+    """Cambiar el año a uno que ya existe con ese título se rechaza con 400"""
+    client.post("/api/peliculas/", json=PELICULA)
+    segunda = client.post("/api/peliculas/", json={**PELICULA, "año": 1990}).json()
+
+    response = client.put(f"/api/peliculas/{segunda['id']}", json={"año": 1972})
+    assert response.status_code == 400
+    assert "título y año" in response.json()["detail"]
+
+
+def test_importar_lote_hace_upsert(client: TestClient, engine):
+    """El lote crea las nuevas y actualiza las existentes por título y año"""
+    client.post("/api/peliculas/", json=PELICULA)
+
+    response = client.post("/api/peliculas/lote", json=[
+        {**PELICULA, "duracion": 177},
+        {**PELICULA, "titulo": "Inception", "año": 2010, "duracion": 140},
+        {**PELICULA, "titulo": "Inception", "año": 2010, "duracion": 148},
+    ])
+    assert response.status_code == 200
+    assert response.json() == {"procesadas": 2}
+
+    with Session(engine) as session:
+        peliculas = {p.titulo: p for p in session.exec(select(Pelicula)).all()}
+    assert len(peliculas) == 2
+    assert peliculas["El Padrino"].duracion == 177
+    assert peliculas["Inception"].duracion == 148
+
+
+def test_actualizar_con_if_match(client: TestClient):
+    """La versión sube en cada UPDATE y un If-Match viejo recibe 412"""
+    creada = client.post("/api/peliculas/", json=PELICULA).json()
+    etag = client.get(f"/api/peliculas/{creada['id']}").headers["etag"]
+    assert etag == '"1"'
+
+    response = client.put(f"/api/peliculas/{creada['id']}", json={"duracion": 177}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.json()["duracion"] == 177
+    assert response.headers["etag"] == '"2"'
+
+    # Otro cliente con la versión anterior no sobrescribe el cambio
+    response = client.put(f"/api/peliculas/{creada['id']}", json={"duracion": 90}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert client.get(f"/api/peliculas/{creada['id']}").json()["duracion"] == 177
+
+    # Sin If-Match se actualiza sin precondición
+    assert client.put(f"/api/peliculas/{creada['id']}", json={"duracion": 90}).json()["version"] == 3
+    assert client.put("/api/peliculas/999", json={"duracion": 90}, headers={"If-Match": '"1"'}).status_code == 404
+    assert client.put(f"/api/peliculas/{creada['id']}", json={}, headers={"If-Match": "abc"}).status_code == 400
+
+
+def test_actualizar_usuario_con_if_match(client: TestClient):
+    """Usuarios: 412 ante versión vieja y 400 ante correo repetido"""
+    ana = client.post("/api/usuarios/", json={"nombre": "Ana", "correo": "ana@email.com"}).json()
+    client.post("/api/usuarios/", json={"nombre": "Juan", "correo": "juan@email.com"})
+
+    response = client.put(f"/api/usuarios/{ana['id']}", json={"nombre": "Ana María"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.json()["nombre"] == "Ana María"
+    assert client.put(f"/api/usuarios/{ana['id']}", json={"nombre": "Otra"}, headers={"If-Match": '"1"'}).status_code == 412
+    assert client.put(f"/api/usuarios/{ana['id']}", json={"correo": "juan@email.com"}).status_code == 400
+
+
+def test_actualizacion_masiva(client: TestClient, engine):
+    """PATCH aplica los cambios a todas las películas del filtro en un solo UPDATE"""
+    client.post("/api/peliculas/lote", json=[
+        {**PELICULA, "titulo": f"Animada {i}", "genero": "Animación", "clasificacion": "PG", "año": 1990 + i}
+        for i in range(20)
+    ] + [PELICULA])
+
+    cuerpo = {"filtro": {"genero": "Animación", "año_min": 2000}, "cambios": {"clasificacion": "G"}}
+    response = client.patch("/api/peliculas/", json={**cuerpo, "dry_run": True, "muestra": 3})
+    assert response.status_code == 200
+    assert response.json()["afectadas"] == 10
+    assert [p["titulo"] for p in response.json()["muestra"]] == ["Animada 10", "Animada 11", "Animada 12"]
+
+    with Session(engine) as session:
+        assert not session.exec(select(Pelicula).where(Pelicula.clasificacion == "G")).all()
+
+    response = client.patch("/api/peliculas/", json=cuerpo)
+    assert response.json() == {"dry_run": False, "afectadas": 10, "cambios": {"clasificacion": "G"}}
+    with Session(engine) as session:
+        actualizadas = session.exec(select(Pelicula).where(Pelicula.clasificacion == "G")).all()
+    assert len(actualizadas) == 10
+    assert {p.version for p in actualizadas} == {2}
+
+    # Un filtro vacío requiere confirmación explícita
+    assert client.patch("/api/peliculas/", json={"filtro": {}, "cambios": {"duracion": 100}}).status_code == 400
+    assert client.patch("/api/peliculas/", json={"filtro": {"año": 1972}, "cambios": {}}).status_code == 400
+    response = client.patch("/api/peliculas/", json={"filtro": {}, "cambios": {"duracion": 100}, "todas": True})
+    assert response.json()["afectadas"] == 21
+
+
+def test_busqueda_sin_mayusculas_ni_acentos(client: TestClient):
+    """La búsqueda encuentra 'Señor' con 'SENOR' y 'Parásitos' con 'parasitos'"""
+    client.post("/api/peliculas/", json={**PELICULA, "titulo": "El Señor de los Anillos", "director": "Peter Jackson"})
+    client.post("/api/peliculas/", json={**PELICULA, "titulo": "Parásitos", "director": "Bong Joon-ho", "año": 2019})
+
+    titulos = lambda params: [p["titulo"] for p in client.get("/api/peliculas/buscar/", params=params).json()]
+    assert titulos({"titulo": "SENOR"}) == ["El Señor de los Anillos"]
+    assert titulos({"titulo": "parasitos"}) == ["Parásitos"]
+    assert titulos({"director": "JOON"}) == ["Parásitos"]
+
+    client.patch("/api/peliculas/", json={"filtro": {"titulo": "señor"}, "cambios": {"director": "Pétér Jäckson"}})
+    assert titulos({"director": "peter jackson"}) == ["El Señor de los Anillos"]
+
+
+def test_slug_se_mantiene_al_actualizar(client: TestClient):
+    """El slug combina título y año y se recalcula aunque el PUT cambie solo uno de ellos"""
+    creada = client.post("/api/peliculas/", json={**PELICULA, "titulo": "El Señor de los Anillos"}).json()
+    assert creada["slug"] == "el-senor-de-los-anillos-1972"
+    assert client.get("/api/peliculas/slug/el-senor-de-los-anillos-1972").json()["id"] == creada["id"]
+
+    assert client.put(f"/api/peliculas/{creada['id']}", json={"año": 2001}).json()["slug"] == "el-senor-de-los-anillos-2001"
+    assert client.put(f"/api/peliculas/{creada['id']}", json={"titulo": "La Comunidad"}).json()["slug"] == "la-comunidad-2001"
+    assert client.put(f"/api/peliculas/{creada['id']}", json={"titulo": "¡Ay!", "año": 1990}).json()["slug"] == "ay-1990"
+    assert client.get("/api/peliculas/slug/la-comunidad-2001").status_code == 404
+
+    client.post("/api/peliculas/lote", json=[{**PELICULA, "titulo": "Roma", "año": 2018}])
+    assert client.get("/api/peliculas/slug/Roma-2018").json()["titulo"] == "Roma"
+
+
+def test_rellenar_columnas_busqueda(engine):
+    """Las películas sin columnas de búsqueda (base anterior) se completan"""
+    with Session(engine) as session:
+        session.add(Pelicula(**PELICULA))
+        session.commit()
+        session.connection().execute(
+            Pelicula.__table__.update().values(titulo_normalizado="", director_normalizado="", slug="")
+        )
+        session.commit()
+
+        assert rellenar_columnas_busqueda(session) == 1
+        pelicula = session.exec(select(Pelicula)).one()
+        session.refresh(pelicula)
+        assert (pelicula.titulo_normalizado, pelicula.slug) == ("el padrino", "el-padrino-1972")
+        assert rellenar_columnas_busqueda(session) == 0
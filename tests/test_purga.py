@@ -0,0 +1,187 @@
+"""
+Tests para el borrado lógico de usuarios y películas y su compactación (app/purga.py):
+las filas eliminadas desaparecen de las consultas, y el compactador las borra con
+sus favoritos en lotes, solo dentro de su horario.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, func, insert
+from sqlmodel import Session, select
+
+from app import database
+from app import purga as modulo_purga
+from app.models import Cambio, Favorito, Pelicula, Usuario
+from app.purga import CompactadorEliminados
+
+FAVORITOS_POPULAR = 100_000
+
+
+def _sembrar(engine, usuarios: int) -> None:
+    """Usuarios 1..N, películas 1 (todos la marcan) y 2 (la marca el usuario 1)."""
+    ahora = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Usuario.__table__), [
+            {"nombre": f"Usuario {i}", "correo": f"usuario{i}@email.com", "fecha_registro": ahora}
+            for i in range(1, usuarios + 1)
+        ])
+        conn.execute(insert(Pelicula.__table__), [
+            {"titulo": titulo, "director": "Director", "genero": "Drama", "duracion": 100,
+             "año": 2000, "clasificacion": "PG", "fecha_creacion": ahora}
+            for titulo in ("Popular", "Otra")
+        ])
+        conn.execute(insert(Favorito.__table__), [
+            {"id_usuario": i, "id_pelicula": 1, "fecha_marcado": ahora} for i in range(1, usuarios + 1)
+        ] + [{"id_usuario": 1, "id_pelicula": 2, "fecha_marcado": ahora}])
+
+
+def _contar(engine, modelo, **filtros) -> int:
+    with Session(engine) as session:
+        statement = select(func.count()).select_from(modelo)
+        for columna, valor in filtros.items():
+            statement = statement.where(getattr(modelo, columna) == valor)
+        return session.exec(statement).one()
+
+
+def test_eliminados_desaparecen_de_las_consultas(client: TestClient, engine):
+    """El borrado lógico no toca los favoritos, pero ninguna consulta los muestra"""
+    _sembrar(engine, usuarios=3)
+
+    assert client.delete("/api/usuarios/1").status_code == 204
+    assert client.delete("/api/usuarios/1").status_code == 404
+    assert _contar(engine, Favorito) == 4
+    assert client.get("/api/usuarios/1").status_code == 404
+    assert [u["id"] for u in client.get("/api/usuarios/").json()] == [2, 3]
+    assert sorted(f["id_usuario"] for f in client.get("/api/favoritos/pelicula/1").json()) == [2, 3]
+    assert client.get("/api/favoritos/pelicula/2").json() == []
+
+    assert client.delete("/api/peliculas/1").status_code == 204
+    assert client.get("/api/peliculas/1").status_code == 404
+    assert [p["titulo"] for p in client.get("/api/peliculas/").json()] == ["Otra"]
+    assert [p["titulo"] for p in client.get("/api/peliculas/buscar/", params={"titulo": "popular"}).json()] == []
+    assert client.get("/api/favoritos/").json() == []
+    assert client.get("/api/usuarios/2/favoritos").json() == []
+    assert client.post("/api/usuarios/2/favoritos/1").status_code == 404
+
+    generales = client.get("/api/favoritos/estadisticas/generales").json()
+    assert generales["total_favoritos"] == 0 and generales["pelicula_top"]["titulo"] is None
+    assert [p["titulo"] for p in client.get("/api/peliculas/populares/top").json()] == ["Otra"]
+    assert _contar(engine, Favorito) == 4 and _contar(engine, Pelicula) == 2
+
+
+def test_se_puede_recrear_lo_eliminado(client: TestClient, engine):
+    """Los índices únicos son parciales: el mismo correo o título y año vuelven a estar libres"""
+    _sembrar(engine, usuarios=1)
+    client.delete("/api/usuarios/1")
+    client.delete("/api/peliculas/2")
+
+    response = client.post("/api/usuarios/", json={"nombre": "Otra vez", "correo": "usuario1@email.com"})
+    assert response.status_code == 201
+    pelicula = {"titulo": "Otra", "director": "Director", "genero": "Drama", "duracion": 90,
+                "año": 2000, "clasificacion": "PG"}
+    assert client.post("/api/peliculas/", json=pelicula).status_code == 201
+    assert client.post("/api/peliculas/", json=pelicula).status_code == 400
+    # El upsert del lote actualiza la película viva, no la eliminada
+    assert client.post("/api/peliculas/lote", json=[{**pelicula, "duracion": 95}]).status_code == 200
+    assert _contar(engine, Pelicula, titulo="Otra") == 2
+    assert _contar(engine, Pelicula, duracion=95) == 1
+
+
+@contextmanager
+def _sentencias(engine):
+    """Registra el SQL que se ejecuta en `engine` dentro del bloque."""
+    ejecutadas = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        ejecutadas.append(" ".join(statement.split()).upper())
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        yield ejecutadas
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+
+def test_compactacion_con_100k_favoritos(client: TestClient, engine):
+    """Eliminar es un UPDATE de una fila; el compactador borra después los 100k favoritos"""
+    _sembrar(engine, usuarios=FAVORITOS_POPULAR)
+
+    with _sentencias(engine) as ejecutadas:
+        assert client.delete("/api/peliculas/1").status_code == 204
+    # Un UPDATE de la película; ningún favorito se toca ni se lee
+    assert sum(s.startswith("UPDATE PELICULA") for s in ejecutadas) == 1
+    assert not any("FAVORITO" in s for s in ejecutadas)
+    assert _contar(engine, Favorito, id_pelicula=1) == FAVORITOS_POPULAR
+
+    compactador = CompactadorEliminados(lote=10_000, pausa=0)
+    with _sentencias(engine) as ejecutadas:
+        assert compactador.compactar(engine) == 1
+
+    assert _contar(engine, Favorito) == 1
+    assert _contar(engine, Pelicula) == 1
+    assert _contar(engine, Cambio, entidad="favorito", operacion="delete") == FAVORITOS_POPULAR
+    metricas = compactador.metricas()
+    assert metricas["compactados"] == 1 and metricas["lotes"] == 11
+    assert metricas["favoritos_borrados"] == FAVORITOS_POPULAR
+    # Un DELETE por lote (el último vuelve vacío), nunca uno que abarque los 100k
+    assert sum(s.startswith("DELETE FROM FAVORITO") for s in ejecutadas) == 11
+
+
+def test_compactacion_solo_en_horario(engine, monkeypatch):
+    """Fuera de horario no compacta; si el horario termina a mitad, retoma en la siguiente"""
+    _sembrar(engine, usuarios=25)
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Pelicula, 1)
+        session.commit()
+
+    compactador = CompactadorEliminados(lote=10, pausa=0, horas=[3])
+    assert not compactador.en_horario(datetime(2024, 1, 1, 12))
+    assert compactador.en_horario(datetime(2024, 1, 1, 3, 30))
+
+    horario = iter([True, True, False])
+    monkeypatch.setattr(compactador, "en_horario", lambda ahora=None: next(horario, True))
+    assert compactador.compactar(engine) == 0
+    assert _contar(engine, Favorito, id_pelicula=1) == 5
+    assert compactador.metricas()["interrumpidas"] == 1
+
+    assert compactador.compactar(engine) == 1
+    assert _contar(engine, Favorito) == 1 and _contar(engine, Pelicula) == 1
+    assert compactador.metricas()["favoritos_borrados"] == 25
+
+
+def test_compactacion_borra_favoritos_tardios(engine, monkeypatch):
+    """Un favorito que llega entre el último lote y el borrado de la fila lo borra la cascada"""
+    _sembrar(engine, usuarios=5)
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Usuario, 2)
+        session.commit()
+    borrar = modulo_purga.borrar_favoritos
+
+    def borrar_con_marca(session, columna, valor, limite=0, publicar=True):
+        borrados = borrar(session, columna, valor, limite, publicar)
+        session.exec(insert(Favorito.__table__).values(
+            id_usuario=valor, id_pelicula=2, fecha_marcado=datetime.now()
+        ))
+        return borrados
+
+    monkeypatch.setattr(modulo_purga, "borrar_favoritos", borrar_con_marca)
+    assert CompactadorEliminados(lote=10, pausa=0).compactar(engine) == 1
+    assert _contar(engine, Usuario) == 4
+    assert _contar(engine, Favorito, id_usuario=2) == 0
+
+
+def test_la_base_borra_en_cascada(engine):
+    """Con foreign_keys=ON, un DELETE fuera del ORM tampoco deja favoritos huérfanos"""
+    _sembrar(engine, usuarios=5)
+    with Session(engine) as session:
+        session.exec(delete(Pelicula).where(Pelicula.id == 1))
+        session.commit()
+    assert _contar(engine, Favorito) == 1
+
+    with Session(engine) as session:
+        session.add(Favorito(id_usuario=1, id_pelicula=99))
+        with pytest.raises(Exception):
+            session.commit()
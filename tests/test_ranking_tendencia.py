@@ -0,0 +1,207 @@
+"""
+Tests para el ranking de películas en tendencia (app/ranking_tendencia.py):
+puntajes que decaen con la antigüedad de cada favorito, top en memoria y
+copia periódica a la tabla puntaje_tendencia.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app import database
+from app import ranking_tendencia as modulo_ranking
+from app.models import Favorito, Pelicula, PuntajeTendencia, ResumenFavoritos, Usuario
+from app.ranking_tendencia import RankingTendencia
+
+HORA = 3600.0
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    ahora = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Usuario.__table__), [
+            {"nombre": f"Usuario {i}", "correo": f"usuario{i}@email.com", "fecha_registro": ahora}
+            for i in range(1, 6)
+        ])
+        conn.execute(insert(Pelicula.__table__), [
+            {"titulo": titulo, "director": "Director", "genero": "Drama", "duracion": 100,
+             "año": 2000, "clasificacion": "PG", "fecha_creacion": ahora}
+            for titulo in ("Uno", "Dos", "Tres")
+        ])
+    return engine
+
+
+def test_el_puntaje_se_reduce_a_la_mitad_cada_vida_media():
+    ranking = RankingTendencia(vida_media=HORA)
+    ranking.sumar(1, ahora=T0)
+    ranking.sumar(1, ahora=T0)
+    ranking.sumar(2, ahora=T0)
+
+    assert ranking.puntaje(1, ahora=T0) == pytest.approx(2)
+    assert ranking.puntaje(1, ahora=T0 + HORA) == pytest.approx(1)
+    assert ranking.puntaje(1, ahora=T0 + 3 * HORA) == pytest.approx(0.25)
+    # El paso del tiempo no cambia el orden, solo escala los puntajes
+    assert ranking.top(ahora=T0 + 10 * HORA) == [
+        (1, pytest.approx(2 / 1024)), (2, pytest.approx(1 / 1024))
+    ]
+
+
+def test_un_favorito_reciente_supera_a_muchos_viejos():
+    ranking = RankingTendencia(vida_media=HORA)
+    for _ in range(10):
+        ranking.sumar(1, ahora=T0)
+    for _ in range(3):
+        ranking.sumar(2, ahora=T0 + 4 * HORA)
+
+    assert [i for i, _ in ranking.top(ahora=T0 + 4 * HORA)] == [2, 1]
+    assert ranking.puntaje(1, ahora=T0 + 4 * HORA) == pytest.approx(10 / 16)
+
+
+def test_el_cambio_de_base_conserva_los_puntajes():
+    """Meses después, el exponente se reinicia sin alterar puntajes ni orden"""
+    ranking = RankingTendencia(vida_media=HORA)
+    ranking.sumar(1, ahora=T0)
+    ranking.sumar(2, ahora=T0)
+    tarde = T0 + 2000 * HORA
+    ranking.sumar(2, ahora=tarde)
+    ranking.sumar(3, ahora=tarde)
+
+    assert [i for i, _ in ranking.top(ahora=tarde)] == [2, 3]
+    assert ranking.puntaje(2, ahora=tarde + HORA) == pytest.approx(0.5)
+
+
+def test_quitar_favoritos_y_peliculas_reconstruye_el_top():
+    ranking = RankingTendencia(vida_media=HORA, tamaño_top=2)
+    for id_pelicula, cantidad in ((1, 3), (2, 2), (3, 1)):
+        for _ in range(cantidad):
+            ranking.sumar(id_pelicula, ahora=T0)
+    assert [i for i, _ in ranking.top(ahora=T0)] == [1, 2]
+
+    # Sale una del top mientras hay otra afuera: el top se rearma al leerlo
+    ranking.sumar(2, -1, ahora=T0)
+    ranking.sumar(2, -1, ahora=T0)
+    assert [i for i, _ in ranking.top(ahora=T0)] == [1, 3]
+    assert ranking.metricas()["reconstrucciones"] == 1
+
+    # Nunca baja de 0, aunque el favorito quitado se hubiera marcado hace mucho
+    ranking.sumar(3, -1, ahora=T0 + HORA)
+    ranking.sumar(3, -1, ahora=T0 + HORA)
+    assert ranking.puntaje(3, ahora=T0 + HORA) == 0
+    assert len(ranking) == 1
+
+    ranking.quitar_pelicula(1)
+    assert ranking.top(ahora=T0) == []
+
+
+def test_quitar_un_favorito_viejo_resta_su_aporte_decaido():
+    ranking = RankingTendencia(vida_media=HORA)
+    ranking.sumar(1, ahora=T0)
+    ranking.sumar(1, ahora=T0)
+    ranking.sumar(1, ahora=T0 + 2 * HORA)
+
+    # Cada favorito marcado en T0 vale 1/4 dos horas después, no 1
+    ranking.sumar(1, -1, ahora=T0 + 2 * HORA, marcado=T0)
+    assert ranking.puntaje(1, ahora=T0 + 2 * HORA) == pytest.approx(1.25)
+    ranking.sumar(1, -1, ahora=T0 + 2 * HORA, marcado=T0)
+    assert ranking.puntaje(1, ahora=T0 + 2 * HORA) == pytest.approx(1)
+
+    # Un alta anunciada tarde cuenta desde que se marcó
+    ranking.sumar(2, ahora=T0 + 2 * HORA, marcado=T0 + HORA)
+    assert ranking.puntaje(2, ahora=T0 + 2 * HORA) == pytest.approx(0.5)
+
+
+def test_eliminar_un_usuario_descuenta_sus_favoritos_decaidos(client: TestClient, engine):
+    """Los favoritos viejos de un usuario eliminado no se llevan el puntaje de los recientes"""
+    hace_un_dia = datetime.now() - timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(insert(Favorito.__table__), [
+            {"id_usuario": 1, "id_pelicula": p, "fecha_marcado": hace_un_dia} for p in (1, 2)
+        ])
+    ranking = RankingTendencia(vida_media=HORA)
+    ranking.suscribir()
+    try:
+        for usuario in (2, 3):
+            assert client.post(f"/api/usuarios/{usuario}/favoritos/1").status_code == 201
+        assert client.delete("/api/usuarios/1").status_code == 204
+        assert ranking.top() == [(1, pytest.approx(2, rel=1e-3))]
+    finally:
+        ranking.desuscribir()
+
+
+def test_mensajes_de_los_canales(client: TestClient, monkeypatch):
+    ranking = RankingTendencia()
+    ranking.suscribir()
+    try:
+        for usuario in (1, 2):
+            client.post(f"/api/usuarios/{usuario}/favoritos/2")
+        client.post("/api/usuarios/1/favoritos/3")
+        client.delete("/api/usuarios/1/favoritos/3")
+        assert [i for i, _ in ranking.top()] == [2]
+        assert ranking.metricas()["eventos"] == 4
+
+        assert client.delete("/api/peliculas/2").status_code == 204
+        assert ranking.top() == []
+    finally:
+        ranking.desuscribir()
+
+
+def test_guardar_y_cargar_conserva_el_decaimiento(engine):
+    ranking = RankingTendencia(vida_media=HORA)
+    ahora = time.time()
+    for _ in range(4):
+        ranking.sumar(1, ahora=ahora)
+    ranking.sumar(2, ahora=ahora - HORA)
+    assert ranking.guardar(engine, ahora=ahora) == 2
+
+    with Session(engine) as session:
+        guardados = {p.id_pelicula: p.puntaje for p in session.exec(select(PuntajeTendencia)).all()}
+    assert guardados == {1: pytest.approx(4), 2: pytest.approx(0.5)}
+
+    recuperado = RankingTendencia(vida_media=HORA)
+    recuperado.asegurar_cargado(engine)
+    assert recuperado.cargado
+    assert recuperado.top(ahora=ahora + HORA) == [(1, pytest.approx(2)), (2, pytest.approx(0.25))]
+
+
+def test_primer_arranque_desde_los_resumenes(engine):
+    """Sin puntajes guardados, se parte de los resúmenes por hora de las películas vivas"""
+    hora_actual = datetime.now().replace(minute=0, second=0, microsecond=0)
+    with engine.begin() as conn:
+        conn.execute(insert(ResumenFavoritos.__table__), [
+            {"granularidad": "hora", "inicio": hora_actual, "id_pelicula": 1, "cantidad": 1},
+            {"granularidad": "hora", "inicio": hora_actual - timedelta(hours=48), "id_pelicula": 2, "cantidad": 50},
+            {"granularidad": "dia", "inicio": hora_actual, "id_pelicula": 2, "cantidad": 50},
+            {"granularidad": "hora", "inicio": hora_actual, "id_pelicula": 3, "cantidad": 9},
+        ])
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Pelicula, 3)
+        session.commit()
+
+    ranking = RankingTendencia(vida_media=4 * HORA)
+    ranking.cargar(engine)
+    top = dict(ranking.top())
+    assert list(top) == [1, 2]
+    assert top[1] == pytest.approx(1, rel=0.2)
+    assert top[2] == pytest.approx(50 / 2 ** 12, rel=0.2)
+
+
+def test_endpoint_de_tendencia(client: TestClient, engine, monkeypatch):
+    ranking = RankingTendencia()
+    monkeypatch.setattr(modulo_ranking, "ranking_tendencia", ranking)
+    monkeypatch.setattr("app.routers.peliculas.ranking_tendencia", ranking)
+    ahora = time.time()
+    ranking.sumar(3, ahora=ahora)
+    ranking.sumar(3, ahora=ahora)
+    ranking.sumar(1, ahora=ahora)
+    ranking.sumar(99, ahora=ahora)  # película que ya no existe
+
+    response = client.get("/api/peliculas/populares/trending", params={"limit": 5})
+    assert response.status_code == 200
+    assert [(p["titulo"], round(p["puntaje"])) for p in response.json()] == [("Tres", 2), ("Uno", 1)]
+    assert client.get("/api/peliculas/populares/trending", params={"limit": 100}).status_code == 422
@@ -0,0 +1,137 @@
+"""
+Tests para el enrutamiento de sesiones entre la primaria y las réplicas de lectura.
+Las "réplicas" son archivos SQLite locales con datos distintos, para poder
+verificar de dónde se leyó cada respuesta.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import InvalidRequestError
+from sqlmodel import Session, SQLModel
+
+from main import app
+from app import database
+from app.database import SOLO_LECTURA, EnrutadorSesiones, crear_engine_bd
+from app.models import Pelicula
+
+
+def _crear_base(ruta, titulo: str):
+    engine = crear_engine_bd(f"sqlite:///{ruta}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Pelicula(
+            titulo=titulo, director="Director", genero="Drama",
+            duracion=100, año=2000, clasificacion="PG"
+        ))
+        session.commit()
+    return engine
+
+
+@pytest.fixture(name="bases")
+def bases_fixture(tmp_path):
+    """
+    Una primaria y dos réplicas, cada una con una película de título distinto.
+    """
+    engines = {
+        "primaria": _crear_base(tmp_path / "primaria.db", "Desde primaria"),
+        "replica_1": _crear_base(tmp_path / "replica_1.db", "Desde réplica 1"),
+        "replica_2": _crear_base(tmp_path / "replica_2.db", "Desde réplica 2"),
+    }
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture(name="client")
+def client_fixture(bases, monkeypatch):
+    """
+    Cliente de pruebas con el enrutador apuntando a las bases temporales.
+    """
+    enrutador = EnrutadorSesiones(bases["primaria"], [bases["replica_1"], bases["replica_2"]])
+    monkeypatch.setattr(database, "enrutador", enrutador)
+    yield TestClient(app)
+
+
+def _titulos(response) -> list:
+    assert response.status_code == 200
+    return [p["titulo"] for p in response.json()]
+
+
+def test_lecturas_rotan_entre_replicas(client: TestClient):
+    """Las peticiones GET se reparten por turno entre las réplicas"""
+    origenes = {_titulos(client.get("/api/peliculas/"))[0] for _ in range(4)}
+    assert origenes == {"Desde réplica 1", "Desde réplica 2"}
+
+
+def test_escrituras_van_a_la_primaria(client: TestClient, bases):
+    """POST se ejecuta sobre la primaria"""
+    response = client.post("/api/peliculas/", json={
+        "titulo": "Nueva", "director": "D", "genero": "Drama",
+        "duracion": 90, "año": 2021, "clasificacion": "PG"
+    })
+    assert response.status_code == 201
+
+    with Session(bases["primaria"]) as session:
+        assert session.get(Pelicula, response.json()["id"]).titulo == "Nueva"
+
+
+def test_lectura_de_las_propias_escrituras(client: TestClient):
+    """Después de escribir, el mismo cliente lee de la primaria; los demás siguen en réplicas"""
+    client.post(
+        "/api/peliculas/",
+        json={"titulo": "Recién creada", "director": "D", "genero": "Drama",
+              "duracion": 90, "año": 2021, "clasificacion": "PG"},
+        headers={"X-Cliente-Id": "escritor"}
+    )
+
+    for _ in range(3):
+        titulos = _titulos(client.get("/api/peliculas/", headers={"X-Cliente-Id": "escritor"}))
+        assert "Recién creada" in titulos
+
+    otros = _titulos(client.get("/api/peliculas/", headers={"X-Cliente-Id": "lector"}))
+    assert "Recién creada" not in otros
+
+
+def test_replica_caida_usa_otra_o_la_primaria(bases, tmp_path, monkeypatch):
+    """Una réplica que no conecta se descarta y se usa la siguiente disponible"""
+    caida = crear_engine_bd(f"sqlite:///{tmp_path / 'no_existe' / 'replica.db'}")
+    enrutador = EnrutadorSesiones(bases["primaria"], [caida, bases["replica_2"]])
+    monkeypatch.setattr(database, "enrutador", enrutador)
+    client = TestClient(app)
+
+    for _ in range(3):
+        assert _titulos(client.get("/api/peliculas/")) == ["Desde réplica 2"]
+    assert enrutador.replicas_disponibles() == [1]
+
+    # Sin réplicas disponibles se lee de la primaria
+    enrutador.marcar_caida(1)
+    assert _titulos(client.get("/api/peliculas/")) == ["Desde primaria"]
+
+
+def test_estrategia_menos_conexiones(bases):
+    """Con menos_conexiones se elige la réplica con menos conexiones abiertas"""
+    enrutador = EnrutadorSesiones(
+        bases["primaria"], [bases["replica_1"], bases["replica_2"]], estrategia="menos_conexiones"
+    )
+    primera = enrutador.sesion_lectura()
+    segunda = enrutador.sesion_lectura()
+    assert {primera.info["replica"], segunda.info["replica"]} == {0, 1}
+    primera.close()
+    segunda.close()
+
+    with pytest.raises(ValueError):
+        EnrutadorSesiones(bases["primaria"], estrategia="aleatoria")
+
+
+def test_sesiones_de_lectura_no_escriben(bases):
+    """Las sesiones de lectura (réplica o primaria) no hacen autoflush ni aceptan cambios"""
+    for enrutador in (EnrutadorSesiones(bases["primaria"], [bases["replica_1"]]), EnrutadorSesiones(bases["primaria"])):
+        with enrutador.sesion_lectura() as session:
+            assert session.info[SOLO_LECTURA] and not session.autoflush
+            pelicula = session.get(Pelicula, 1)
+            pelicula.titulo = "Cambiado"
+            with pytest.raises(InvalidRequestError):
+                session.commit()
+
+    with enrutador.sesion_escritura() as session:
+        assert SOLO_LECTURA not in session.info and session.autoflush
@@ -0,0 +1,210 @@
+"""
+Tests para las tendencias de favoritos por intervalo (app/tendencias.py):
+resúmenes por hora y por día mantenidos desde el registro de cambios.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, insert, update
+from sqlmodel import Session, select
+
+from app import database
+from app import tendencias as modulo_tendencias
+from app.models import Favorito, Pelicula, Progreso, ResumenFavoritos, Usuario
+from app.purga import CompactadorEliminados
+from app.tendencias import AgregadorTendencias, truncar
+
+# Miércoles
+AHORA = datetime(2025, 3, 12, 15, 30)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Usuario.__table__), [
+            {"nombre": f"Usuario {i}", "correo": f"usuario{i}@email.com", "fecha_registro": AHORA}
+            for i in range(1, 6)
+        ])
+        conn.execute(insert(Pelicula.__table__), [
+            {"titulo": titulo, "director": "Director", "genero": "Drama", "duracion": 100,
+             "año": 2000, "clasificacion": "PG", "fecha_creacion": AHORA}
+            for titulo in ("Uno", "Dos", "Tres")
+        ])
+    return engine
+
+
+def _favoritos(engine, *marcas) -> None:
+    """Inserta (usuario, película, fecha_marcado) sin pasar por el registro de cambios."""
+    with engine.begin() as conn:
+        conn.execute(insert(Favorito.__table__), [
+            {"id_usuario": u, "id_pelicula": p, "fecha_marcado": fecha} for u, p, fecha in marcas
+        ])
+
+
+def _filas(engine, granularidad: str) -> int:
+    with Session(engine) as session:
+        return len(session.exec(
+            select(ResumenFavoritos).where(ResumenFavoritos.granularidad == granularidad)
+        ).all())
+
+
+def test_truncar_por_granularidad():
+    assert truncar(AHORA, "hora") == datetime(2025, 3, 12, 15)
+    assert truncar(AHORA, "dia") == datetime(2025, 3, 12)
+    assert truncar(AHORA, "semana") == datetime(2025, 3, 10)
+
+
+def test_primera_pasada_reconstruye_dentro_de_la_retencion(engine):
+    """Sin avance guardado, los resúmenes salen de la tabla favorito, solo dentro de la retención"""
+    _favoritos(
+        engine,
+        (1, 1, AHORA - timedelta(minutes=10)),
+        (2, 1, AHORA - timedelta(hours=2)),
+        (3, 1, AHORA - timedelta(days=1)),
+        (1, 2, AHORA - timedelta(days=2)),
+        (2, 2, AHORA - timedelta(days=2, hours=1)),
+        (3, 2, AHORA - timedelta(days=30)),  # fuera de la retención diaria
+    )
+    agregador = AgregadorTendencias({"hora": 24, "dia": 7})
+    agregador.procesar(engine, AHORA)
+
+    with Session(engine) as session:
+        assert agregador.top(session, "dia", 7, ahora=AHORA) == [
+            {"id_pelicula": 1, "titulo": "Uno", "año": 2000, "favoritos": 3},
+            {"id_pelicula": 2, "titulo": "Dos", "año": 2000, "favoritos": 2},
+        ]
+        assert [p["id_pelicula"] for p in agregador.top(session, "hora", 3, ahora=AHORA)] == [1]
+        serie = agregador.serie(session, "dia", 4, ahora=AHORA)
+        assert [(s["inicio"].day, s["favoritos"]) for s in serie] == [(9, 0), (10, 2), (11, 1), (12, 2)]
+        assert session.get(Progreso, "tendencias") is not None
+    assert _filas(engine, "dia") == 3
+
+
+def test_agregacion_incremental_sin_leer_favorito(client: TestClient, engine):
+    """Altas y bajas llegan por el registro de cambios; las pasadas y consultas no leen favorito"""
+    agregador = AgregadorTendencias({"hora": 24, "dia": 7})
+    agregador.procesar(engine)
+
+    for usuario in (1, 2, 3):
+        assert client.post(f"/api/usuarios/{usuario}/favoritos/3").status_code == 201
+    client.post("/api/usuarios/1/favoritos/2")
+    client.delete("/api/usuarios/1/favoritos/2")
+
+    sentencias = []
+    event.listen(engine, "before_cursor_execute", lambda *args: sentencias.append(args[2]))
+    assert agregador.procesar(engine) == 5
+    assert agregador.procesar(engine) == 0
+    with Session(engine) as session:
+        top = agregador.top(session, "dia", 7)
+        serie = agregador.serie(session, "hora", 24, id_pelicula=3)
+    assert not any("FROM favorito" in sql for sql in sentencias)
+
+    assert [(p["id_pelicula"], p["favoritos"]) for p in top] == [(3, 3)]
+    assert len(serie) == 24 and sum(s["favoritos"] for s in serie) == 3
+    assert agregador.metricas()["cambios"] == 5
+
+
+def test_avance_movido_por_otro_worker(engine, monkeypatch):
+    """Si otro worker procesó los mismos cambios primero, la pasada se descarta sin contarlos"""
+    agregador = AgregadorTendencias({"dia": 7})
+    agregador.procesar(engine)
+    with Session(engine) as session:
+        session.add(Favorito(id_usuario=1, id_pelicula=1))
+        session.commit()
+
+    sumar = modulo_tendencias.sumar_resumenes
+
+    def sumar_tras_otro_worker(session, deltas):
+        # Otro worker avanza entre la lectura de los cambios y la escritura de los resúmenes
+        with engine.begin() as conn:
+            conn.execute(update(Progreso).values(secuencia=Progreso.secuencia + 1))
+        sumar(session, deltas)
+
+    monkeypatch.setattr(modulo_tendencias, "sumar_resumenes", sumar_tras_otro_worker)
+    assert agregador.procesar(engine) == 0
+    assert agregador.metricas()["conflictos"] == 1
+    assert _filas(engine, "dia") == 0
+
+
+def test_retencion_y_peliculas_eliminadas(engine):
+    """Los intervalos viejos se podan; las películas eliminadas no aparecen en las tendencias"""
+    _favoritos(engine, (1, 1, AHORA), (2, 2, AHORA), (3, 2, AHORA))
+    agregador = AgregadorTendencias({"hora": 2, "dia": 7})
+    agregador.procesar(engine, AHORA)
+    assert _filas(engine, "hora") == 2
+
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Pelicula, 2)
+        session.commit()
+        assert [p["id_pelicula"] for p in agregador.top(session, "dia", 7, ahora=AHORA)] == [1]
+        assert agregador.serie(session, "dia", 1, ahora=AHORA)[0]["favoritos"] == 1
+
+    agregador.procesar(engine, AHORA + timedelta(hours=3))
+    assert _filas(engine, "hora") == 0
+    assert _filas(engine, "dia") == 2
+
+    with pytest.raises(ValueError):
+        agregador.top(session, "hora", 3)
+    with pytest.raises(ValueError):
+        agregador.top(session, "semana", 1)
+    with pytest.raises(ValueError):
+        AgregadorTendencias({"minuto": 60})
+
+
+def test_usuarios_eliminados_se_descuentan_una_vez(engine):
+    """La baja del usuario descuenta sus favoritos; la compactación posterior no los vuelve a restar"""
+    _favoritos(engine, (1, 1, AHORA), (1, 2, AHORA), (2, 1, AHORA), (2, 2, AHORA), (3, 1, AHORA), (4, 2, AHORA))
+    agregador = AgregadorTendencias({"dia": 7})
+    agregador.procesar(engine, AHORA)
+
+    def top():
+        with Session(engine) as session:
+            return [(p["id_pelicula"], p["favoritos"]) for p in agregador.top(session, "dia", 7, ahora=AHORA)]
+
+    assert top() == [(1, 3), (2, 3)]
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Usuario, 1)
+        session.commit()
+    agregador.procesar(engine, AHORA)
+    assert top() == [(1, 2), (2, 2)]
+
+    # El usuario 2 se compacta antes de que el agregador vea su baja
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Usuario, 2)
+        session.commit()
+    compactador = CompactadorEliminados(lote=1, pausa=0)
+    assert compactador.compactar(engine) == 2
+    agregador.procesar(engine, AHORA)
+    assert top() == [(1, 1), (2, 1)]
+
+    # Una reconstrucción deja fuera a los eliminados que todavía no se compactaron
+    with Session(engine) as session:
+        database.marcar_eliminado(session, Usuario, 3)
+        session.commit()
+        session.exec(delete(Progreso))
+        session.commit()
+    agregador.procesar(engine, AHORA)
+    assert top() == [(2, 1)]
+    compactador.compactar(engine)
+    agregador.procesar(engine, AHORA)
+    assert top() == [(2, 1)]
+
+
+def test_endpoints_de_tendencias(client: TestClient, engine):
+    hoy = datetime.now()
+    _favoritos(engine, (1, 1, hoy), (2, 1, hoy), (3, 2, hoy - timedelta(days=1)))
+    AgregadorTendencias({"hora": 72, "dia": 90}).procesar(engine)
+
+    response = client.get("/api/analytics/tendencias/top", params={"granularidad": "dia", "intervalos": 7})
+    assert response.status_code == 200
+    assert [(p["titulo"], p["favoritos"]) for p in response.json()] == [("Uno", 2), ("Dos", 1)]
+
+    response = client.get("/api/analytics/tendencias/serie", params={"intervalos": 3})
+    assert [s["favoritos"] for s in response.json()] == [0, 1, 2]
+
+    response = client.get("/api/analytics/tendencias/top", params={"granularidad": "minuto"})
+    assert response.status_code == 400
+    response = client.get("/api/analytics/tendencias/serie", params={"granularidad": "hora", "intervalos": 1000})
+    assert response.status_code == 400
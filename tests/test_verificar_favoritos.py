@@ -0,0 +1,81 @@
+"""
+Tests para la verificación de favoritos por lote (POST /api/favoritos/verificar).
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from main import app
+from app.cola_favoritos import AGREGAR, ELIMINAR, ColaFavoritos
+from app.models import Favorito, Pelicula, Usuario
+from app.schemas import MAXIMO_VERIFICACION
+
+# Las sesiones de la aplicación usan la base temporal de cada test
+pytestmark = pytest.mark.usefixtures("enrutador")
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+    """
+    Base con dos usuarios, cinco películas y los favoritos (1, 1), (1, 3) y (2, 2).
+    """
+    with Session(engine) as session:
+        for i in (1, 2):
+            session.add(Usuario(nombre=f"Usuario {i}", correo=f"usuario{i}@email.com"))
+        for i in range(1, 6):
+            session.add(Pelicula(
+                titulo=f"Película {i}", director="Director", genero="Drama",
+                duracion=100, año=2000, clasificacion="PG"
+            ))
+        session.commit()
+        for id_usuario, id_pelicula in ((1, 1), (1, 3), (2, 2)):
+            session.add(Favorito(id_usuario=id_usuario, id_pelicula=id_pelicula))
+        session.commit()
+    return engine
+
+
+def test_un_usuario_varias_peliculas_en_una_consulta(engine):
+    consultas = []
+    event.listen(engine, "before_cursor_execute", lambda *args: consultas.append(args[2]))
+
+    respuesta = TestClient(app).post("/api/favoritos/verificar", json={"id_usuario": 1, "peliculas": [3, 2, 1, 3]})
+
+    assert respuesta.status_code == 200
+    assert [(r["id_pelicula"], r["es_favorito"]) for r in respuesta.json()] == [(3, True), (2, False), (1, True), (3, True)]
+    assert len([c for c in consultas if "favorito" in c.lower()]) == 1
+
+
+def test_pares_de_varios_usuarios(engine):
+    client = TestClient(app)
+    respuesta = client.post("/api/favoritos/verificar", json={"pares": [
+        {"id_usuario": 2, "id_pelicula": 2},
+        {"id_usuario": 1, "id_pelicula": 2},
+        {"id_usuario": 2, "id_pelicula": 1},
+        {"id_usuario": 9, "id_pelicula": 9},
+    ]})
+    assert [r["es_favorito"] for r in respuesta.json()] == [True, False, False, False]
+    assert client.post("/api/favoritos/verificar", json={}).json() == []
+
+
+@pytest.mark.parametrize("cuerpo", [
+    {"peliculas": [1, 2]},
+    {"id_usuario": 1, "peliculas": [1], "pares": [{"id_usuario": 1, "id_pelicula": 1}]},
+    {"id_usuario": 1, "peliculas": list(range(MAXIMO_VERIFICACION + 1))},
+])
+def test_cuerpos_invalidos(engine, cuerpo):
+    assert TestClient(app).post("/api/favoritos/verificar", json=cuerpo).status_code == 422
+
+
+def test_pendientes_de_la_cola_tienen_prioridad(engine, tmp_path, monkeypatch):
+    cola = ColaFavoritos(str(tmp_path / "favoritos.journal"), intervalo=60.0)
+    cola.iniciar(engine)
+    monkeypatch.setattr("app.routers.favoritos.cola_favoritos", cola)
+    try:
+        cola.encolar(1, 1, ELIMINAR)
+        cola.encolar(1, 2, AGREGAR)
+        respuesta = TestClient(app).post("/api/favoritos/verificar", json={"id_usuario": 1, "peliculas": [1, 2, 3]})
+    finally:
+        cola.detener()
+    assert [(r["es_favorito"], r["pendiente"]) for r in respuesta.json()] == [(False, True), (True, True), (True, False)]
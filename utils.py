@@ -3,6 +3,7 @@ Módulo de utilidades para la aplicación.
 Contiene funciones auxiliares utilizadas en diferentes partes de la aplicación.
 """
 import re
+import unicodedata
 from datetime import datetime
 
 def validar_correo(correo):
@@ -32,6 +33,21 @@ def formatear_duracion(minutos):
     # TODO: pendiente de implementar
     pass 
 
+def normalizar_texto(texto):
+    """
+    Normaliza un texto para compararlo sin distinguir mayúsculas ni acentos.
+    También colapsa los espacios repetidos ("  El  Señor " -> "el senor").
+    
+    Args:
+        texto (str): Texto a normalizar
+        
+    Returns:
+        str: Texto en minúsculas (casefold), sin acentos ni espacios sobrantes
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.split())
+
 def generar_slug(texto):
     """
     Genera un slug a partir de un texto.
@@ -41,20 +57,22 @@ def generar_slug(texto):
         texto (str): Texto a convertir en slug
         
     Returns:
-        str: Slug generado
+        str: Slug generado ("El Señor de los Anillos" -> "el-senor-de-los-anillos")
     """
-    # TODO: Convertir a minúsculas
-    slug = texto
-    
-    # TODO: Reemplazar espacios con guiones
+    # Convertir a minúsculas y quitar acentos
+    slug = normalizar_texto(texto)
     
-    # TODO: Eliminar caracteres no alfanuméricos (excepto guiones)
+    # Reemplazar espacios con guiones
+    slug = slug.replace(" ", "-")
     
-    # TODO: Reemplazar múltiples guiones con uno solo
+    # Eliminar caracteres no alfanuméricos (excepto guiones)
+    slug = re.sub(r"[^a-z0-9-]", "", slug)
     
-    # TODO: Eliminar guiones al inicio y final
+    # Reemplazar múltiples guiones con uno solo
+    slug = re.sub(r"-{2,}", "-", slug)
     
-    return slug
+    # Eliminar guiones al inicio y final
+    return slug.strip("-")
 
 def obtener_año_actual():
     """